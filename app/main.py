@@ -2,7 +2,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI, WebSocket, Request, Query
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,6 +10,15 @@ from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.database import init_db
+from app.services.persistencia import persistencia
+from app.services.colecoes import fechar_arquivos
+from app.services.http_pool import http_pool
+from app.services.llm_cache import cache_llm
+from app.services.armazem_midia import StaticImutavel, RAIZ as MIDIA_RAIZ
+from app.services.midia_pipeline import pipeline_midia
+from app.services.jobs_midia import jobs_midia
+from app.services.agendador_agentes import agendador_agentes
+from app.services.simulacao import simulacao
 from app.routers import (
     agents_router,
     posts_router,
@@ -39,9 +48,19 @@ from app.websocket import websocket_endpoint
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await http_pool.iniciar()
+    persistencia.iniciar()  # saves pedidos no import, antes do loop
+    jobs_midia.retomar()  # tipos ja registrados no import dos routers
     print(f"[START] {settings.app_name} iniciado!")
     yield
     # Shutdown
+    await agendador_agentes.encerrar()
+    await jobs_midia.encerrar()
+    await persistencia.encerrar()
+    await cache_llm.fechar()
+    await fechar_arquivos()
+    await http_pool.encerrar()
+    pipeline_midia.encerrar()
     print(f"[END] {settings.app_name} encerrado!")
 
 
@@ -61,7 +80,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def simulacao_somente_leitura(request: Request, call_next):
+    """SIMULACAO_MODO=api: plataformas simuladas por worker so aceitam leitura"""
+    if simulacao.recusa(request.method, request.url.path):
+        return JSONResponse(status_code=503, content={
+            "detail": "Escrita desta plataforma e feita pelos workers da simulacao (SIMULACAO_MODO=api)"})
+    return await call_next(request)
+
+
 # Static files e templates
+# Midia enderecada por conteudo: montada antes de /static para ganhar ETag forte + immutable
+MIDIA_RAIZ.mkdir(parents=True, exist_ok=True)
+app.mount("/static/ig_media", StaticImutavel(directory=MIDIA_RAIZ), name="ig_media")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
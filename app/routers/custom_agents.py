@@ -6,19 +6,19 @@
 """
 import asyncio
 import random
-import httpx
 from fastapi import APIRouter, HTTPException, Request, Query
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from collections import Counter
 
 from app.services.agent_runner import runner
+from app.services.metricas_rede import metricas_rede
+from app.services.llm_client import gerar_texto
 from app.services.agent_types.base import (
     AgentConfig, AgentCategory, AgentAutonomy,
-    MODELOS_DISPONIVEIS, TEMAS_DISPONIVEIS, API_URL, OLLAMA_URL
+    MODELOS_DISPONIVEIS, TEMAS_DISPONIVEIS
 )
 
 router = APIRouter(prefix="/api/custom-agents", tags=["custom-agents"])
@@ -183,32 +183,21 @@ async def parar_todos():
 async def testar_prompt(req: TestPromptRequest):
     """Testa como um agente responderia (preview)"""
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(
-                f"{OLLAMA_URL}/api/generate",
-                json={
-                    "model": req.modelo,
-                    "prompt": req.prompt,
-                    "system": f"Voce e uma IA em uma rede social. Personalidade: {req.personalidade}",
-                    "stream": False,
-                    "options": {
-                        "temperature": req.temperatura,
-                        "num_predict": req.max_tokens,
-                    }
-                }
-            )
-            if resp.status_code == 200:
-                texto = resp.json().get("response", "").strip()
-                return {
-                    "success": True,
-                    "resposta": texto,
-                    "modelo": req.modelo,
-                    "tokens_usados": len(texto.split()),
-                }
+        texto = await gerar_texto(
+            req.modelo, req.prompt,
+            system=f"Voce e uma IA em uma rede social. Personalidade: {req.personalidade}",
+            max_tokens=req.max_tokens, temperature=req.temperatura, timeout=60.0,
+        )
     except Exception as e:
         return {"success": False, "error": str(e)}
-
-    return {"success": False, "error": "Ollama nao respondeu"}
+    if texto:
+        return {
+            "success": True,
+            "resposta": texto,
+            "modelo": req.modelo,
+            "tokens_usados": len(texto.split()),
+        }
+    return {"success": False, "error": "Nenhum provedor de texto respondeu"}
 
 
 # ================================================================
@@ -221,6 +210,12 @@ async def metricas_gerais():
     return runner.get_metricas_gerais()
 
 
+@router.get("/agendador")
+async def metricas_agendador():
+    """Agendador dos ciclos: vagas por categoria, fila, lag, prazos perdidos e vazao por agente"""
+    return runner.agendador.stats()
+
+
 @router.get("/modelos")
 async def modelos_disponiveis():
     """Lista modelos e temas disponiveis"""
@@ -238,8 +233,8 @@ async def modelos_disponiveis():
 # ================================================================
 
 @router.get("/analytics")
-async def analytics_rede():
-    """Analytics completo da rede"""
+async def analytics_rede(detalhado: bool = Query(default=False, description="Inclui posts e agentes do snapshot")):
+    """Analytics completo da rede (snapshot compartilhado, ver metricas_rede)"""
     analytics = {
         "timestamp": datetime.now().isoformat(),
         "agentes": runner.get_metricas_gerais(),
@@ -250,56 +245,21 @@ async def analytics_rede():
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # Posts
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=100")
-            if resp.status_code == 200:
-                posts = resp.json()
-                analytics["posts"]["total"] = len(posts)
-
-                # Engajamento
-                if posts:
-                    total_eng = sum(
-                        p.get("likes_count", 0) + p.get("comments_count", 0) * 2
-                        for p in posts
-                    )
-                    analytics["posts"]["engajamento_medio"] = round(total_eng / len(posts), 2)
-
-                # Top hashtags
-                hashtags = []
-                for p in posts:
-                    content = p.get("content", "")
-                    hashtags.extend(w.strip("#.,!?") for w in content.split() if w.startswith("#"))
-                analytics["top_hashtags"] = [
-                    {"tag": t, "count": c} for t, c in Counter(hashtags).most_common(10)
-                ]
-
-                # Posts por agente
-                por_agente = Counter(p.get("agent_name", "desconhecido") for p in posts)
-                analytics["top_agentes"] = [
-                    {"nome": n, "posts": c} for n, c in por_agente.most_common(10)
-                ]
-
-                # Atividade recente
-                analytics["atividade_recente"] = [
-                    {
-                        "tipo": "post",
-                        "agente": p.get("agent_name", "???"),
-                        "conteudo": p.get("content", "")[:80],
-                        "likes": p.get("likes_count", 0),
-                        "comments": p.get("comments_count", 0),
-                    }
-                    for p in posts[:20]
-                ]
-
-            # Agentes
-            resp = await client.get(f"{API_URL}/api/agents/?limit=50")
-            if resp.status_code == 200:
-                agentes = resp.json()
-                analytics["agentes"]["total_registrados"] = len(agentes)
-    except:
-        pass
-
+        snap = (await metricas_rede.obter()).como_dict()
+    except Exception as e:
+        print(f"[METRICAS] analytics sem snapshot: {e}")
+        return analytics
+
+    analytics["snapshot"] = snap["snapshot"]
+    analytics["posts"]["total"] = snap["total_posts"]
+    analytics["posts"]["engajamento_medio"] = snap["engajamento_medio"]
+    analytics["top_hashtags"] = snap["hashtags"]
+    analytics["top_agentes"] = snap["top_agentes"]
+    analytics["atividade_recente"] = snap["atividade_recente"]
+    analytics["agentes"]["total_registrados"] = snap["total_agentes"]
+    if detalhado:
+        # Mesmo formato de SnapshotRede.como_dict (TransporteHttp.metricas)
+        analytics.update(snap)
     return analytics
 
 
@@ -333,51 +293,44 @@ async def recomendar_conteudo(
     recomendados = []
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=50")
-            if resp.status_code != 200:
-                return {"recomendados": [], "total": 0}
-
-            posts = resp.json()
-
-            for post in posts:
-                content = post.get("content", "").lower()
-                score = 0
+        snap = await metricas_rede.obter()
+    except Exception as e:
+        print(f"[METRICAS] recomendar sem snapshot: {e}")
+        return {"recomendados": [], "total": 0}
 
-                # Score por tema
-                for tema in temas_lista:
-                    if tema.lower() in content:
-                        score += 10
+    for p in snap.posts[:50]:
+        content = p["content"].lower()
+        score = 0
 
-                # Score por engajamento
-                likes = post.get("likes_count", 0)
-                comments = post.get("comments_count", 0)
-                score += likes * 2 + comments * 3
+        # Score por tema
+        for tema in temas_lista:
+            if tema.lower() in content:
+                score += 10
 
-                # Score por recenticidade (posts mais novos = mais pontos)
-                score += 5  # bonus base
+        # Score por engajamento
+        score += p["likes_count"] * 2 + p["comments_count"] * 3
 
-                # Hashtags relevantes
-                hashtags = [w.strip("#") for w in content.split() if w.startswith("#")]
-                for tag in hashtags:
-                    if tag in temas_lista:
-                        score += 15
+        # Score por recenticidade (posts mais novos = mais pontos)
+        score += 5  # bonus base
 
-                post["relevancia_score"] = score
-                if score > 0:
-                    recomendados.append(post)
+        # Hashtags relevantes (ja extraidas no snapshot)
+        for tag in p["hashtags"]:
+            if tag.lower() in temas_lista:
+                score += 15
 
-            # Ordenar por relevancia
-            recomendados.sort(key=lambda x: x.get("relevancia_score", 0), reverse=True)
-            recomendados = recomendados[:limit]
+        if score > 0:
+            # O post do snapshot e imutavel: anota uma copia
+            recomendados.append({**p, "hashtags": list(p["hashtags"]), "relevancia_score": score})
 
-    except:
-        pass
+    # Ordenar por relevancia
+    recomendados.sort(key=lambda x: x["relevancia_score"], reverse=True)
+    recomendados = recomendados[:limit]
 
     return {
         "recomendados": recomendados,
         "total": len(recomendados),
         "temas_usados": temas_lista,
+        "snapshot": snap.info(),
     }
 
 
@@ -15,6 +15,7 @@ from app.database import get_db
 from app.models.post import Post, Like
 from app.models.agent import Agent
 from app.models.comment import Comment
+from app.services.metricas_rede import metricas_rede
 
 
 router = APIRouter(prefix="/humanos", tags=["humanos"])
@@ -207,6 +208,7 @@ async def humano_curtir_post(
     # Adicionar like
     post.likes_count += 1
     await db.commit()
+    metricas_rede.invalidar()
 
     reacoes_emoji = {
         "curtir": "👍",
@@ -7,30 +7,49 @@ Posts automaticos via Ollama com interacoes entre agentes
 import asyncio
 import random
 import uuid
-import httpx
 import json as _json
 import os as _os
 from datetime import datetime, timedelta
 from collections import Counter
 import urllib.parse
 import base64
+import hashlib
 import time as _time
 import re
 from fastapi import APIRouter, UploadFile, File, Form, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from app.routers import instagram_db as _igdb
+from app.routers.instagram_index import PostsIndexados, AgregadosAgentes, IndiceHashtags, JANELAS, codificar_cursor, decodificar_cursor
+from app.routers.instagram_busca import IndiceBusca, texto_agente, tokenizar
+from app.services.persistencia import persistencia as _persist
+from app.services.colecoes import ListaObservavel, ArquivoSqlite
+from app.services.http_pool import http_pool
+from app.services.llm_client import gerar_texto
+from app.services.simulacao import simulacao, mtime
+from app.services.imagem_router import roteador_imagem
+from app.services.armazem_midia import armazem_midia, detectar_ext, urls_de
+from app.services.midia_pipeline import pipeline_midia, srcset, url_rendicao
+from app.services.cache_paginas import CachePaginas
+from app.services.jobs_midia import jobs_midia, predict_gradio
 
 # HuggingFace Free Spaces (GRATIS, sem API key, sem limites)
 HF_IMAGE_SPACE = "mrfakename/Z-Image-Turbo"  # FLUX-based, ~8s por imagem
 HF_VIDEO_SPACE = "alexnasa/ltx-2-TURBO"  # Text-to-video FAST, ~60s
 
-def _gerar_imagem_hf_sync(prompt, agente_id):
-    """Gera imagem via Z Image Turbo (FLUX) - sync wrapper para thread"""
-    from gradio_client import Client
-    import shutil
-    client = Client(HF_IMAGE_SPACE, verbose=False)
-    result = client.predict(
-        prompt=prompt[:500],
+def _guardar_imagem_hf(result):
+    """Resultado do /generate_image -> URL no armazem (bloqueante)"""
+    if isinstance(result, tuple) and result[0]:
+        src = str(result[0])
+        if _os.path.isfile(src):
+            with open(src, "rb") as f:
+                return armazem_midia.guardar_sync(f.read())
+    return None
+
+async def _job_imagem_hf(job):
+    """Job ig_hf_imagem: Z Image Turbo (FLUX) via submit + polling"""
+    result = await predict_gradio(
+        job, HF_IMAGE_SPACE, intervalo_s=1.0,
+        prompt=job.params["prompt"][:500],
         height=768,
         width=1024,
         num_inference_steps=9,
@@ -38,52 +57,21 @@ def _gerar_imagem_hf_sync(prompt, agente_id):
         randomize_seed=True,
         api_name="/generate_image"
     )
-    if isinstance(result, tuple) and result[0]:
-        src = str(result[0])
-        if _os.path.isfile(src):
-            img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-            _os.makedirs(img_dir, exist_ok=True)
-            fname = f"hf_{uuid.uuid4().hex[:10]}.png"
-            dest = _os.path.join(img_dir, fname)
-            shutil.copy2(src, dest)
-            return f"/static/ig_images/{fname}"
-    return None
+    return await job.bloqueante(_guardar_imagem_hf, result)
 
 async def _gerar_imagem_hf(prompt_img, agente_id):
     """Gera imagem via HuggingFace Z Image Turbo (GRATIS, ~8s)"""
     estilo = ESTILOS_IMAGEM.get(agente_id, "ultra detailed, cinematic lighting, masterpiece")
     full_prompt = f"{prompt_img}, {estilo}, high quality, 4K"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
-    try:
-        url = await asyncio.to_thread(_gerar_imagem_hf_sync, full_prompt, agente_id)
-        if url:
-            print(f"[HF-Image] OK: {url}")
-            return url
-    except Exception as e:
-        print(f"[HF-Image] Error: {e}")
-    return None
+    url = await jobs_midia.executar("ig_hf_imagem", {"prompt": full_prompt}, ref=agente_id)
+    if url:
+        print(f"[HF-Image] OK: {url}")
+    return url
 
-def _gerar_video_hf_sync(prompt):
-    """Gera video via LTX-2 Turbo (text-to-video FAST ~60s) - sync wrapper"""
-    from gradio_client import Client
+def _copiar_video_hf(result):
+    """Resultado do /generate_video -> /static/ig_videos/hf_xxx.mp4 (bloqueante)"""
     import shutil
-    client = Client(HF_VIDEO_SPACE, verbose=False)
-    result = client.predict(
-        first_frame=None,
-        end_frame=None,
-        prompt=prompt[:500],
-        duration=3.0,
-        input_video=None,
-        generation_mode="Text-to-Video",
-        enhance_prompt=True,
-        seed=10,
-        randomize_seed=True,
-        height=512,
-        width=768,
-        camera_lora="No LoRA",
-        audio_path=None,
-        api_name="/generate_video"
-    )
     vid_path = None
     if isinstance(result, str) and _os.path.isfile(result):
         vid_path = result
@@ -107,21 +95,42 @@ def _gerar_video_hf_sync(prompt):
         return f"/static/ig_videos/{fname}"
     return None
 
+async def _job_video_hf(job):
+    """Job ig_hf_video: LTX-2 Turbo (text-to-video FAST ~60s) via submit + polling"""
+    result = await predict_gradio(
+        job, HF_VIDEO_SPACE, intervalo_s=5.0,
+        first_frame=None,
+        end_frame=None,
+        prompt=job.params["prompt"][:500],
+        duration=3.0,
+        input_video=None,
+        generation_mode="Text-to-Video",
+        enhance_prompt=True,
+        seed=10,
+        randomize_seed=True,
+        height=512,
+        width=768,
+        camera_lora="No LoRA",
+        audio_path=None,
+        api_name="/generate_video"
+    )
+    return await job.bloqueante(_copiar_video_hf, result)
+
+# Imagem curta e video lento em vagas separadas: video na fila nao segura imagem
+jobs_midia.registrar_tipo("ig_hf_imagem", _job_imagem_hf, vagas=2, timeout_s=180)
+jobs_midia.registrar_tipo("ig_hf_video", _job_video_hf, vagas=1, timeout_s=600)
+
 async def _gerar_video_hf(prompt_img, agente_id):
-    """Gera video via HuggingFace Wan 2.2 5B (GRATIS, ~2-5min)"""
+    """Gera video via HuggingFace LTX-2 Turbo (GRATIS, ~1-5min)"""
     estilo = ESTILOS_IMAGEM.get(agente_id, "cinematic lighting, smooth animation")
     full_prompt = f"{prompt_img}, {estilo}, cinematic motion, masterpiece quality"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
-    try:
-        url = await asyncio.to_thread(_gerar_video_hf_sync, full_prompt)
-        if url:
-            print(f"[HF-Video] OK: {url}")
-            return None, url
-    except Exception as e:
-        print(f"[HF-Video] Error: {e}")
+    url = await jobs_midia.executar("ig_hf_video", {"prompt": full_prompt}, ref=agente_id)
+    if url:
+        print(f"[HF-Video] OK: {url}")
+        return None, url
     return None, None
 
-
 PERSIST_FILE = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "instagram_data.json")
 
 # Leonardo.ai API config
@@ -200,14 +209,8 @@ OPENROUTER_IMG_MODELS = [
     "google/gemini-2.5-flash-image",     # Boa qualidade (~$0.039/img)
 ]
 OPENROUTER_IMG_MODEL = OPENROUTER_IMG_MODELS[0]  # Default: GPT-5 Image
-OPENROUTER_TEXT_MODELS = ["google/gemini-2.5-flash", "google/gemini-2.0-flash-001", "meta-llama/llama-3.1-8b-instruct", "qwen/qwen-2.5-7b-instruct"]
 OPENROUTER_ENABLED = True
-
-# Groq API (gratis, super rapido - 300+ tokens/seg)
-GROQ_API_KEY = _os.environ.get("GROQ_API_KEY", "")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
-GROQ_MODELS = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]
-GROQ_ENABLED = True
+# Texto (Gemini / Groq / OpenRouter / Ollama) vai pelo gateway em app/services/llm_client.py
 
 # Stable Diffusion (via Pollinations FLUX - gratis, sem API key)
 STABLE_DIFFUSION_ENABLED = True
@@ -225,19 +228,14 @@ STABLE_DIFFUSION_HEIGHT = 1024
 
 
 async def _salvar_dados_async():
-    """Async DB write - called by _salvar_dados()"""
-    try:
-        await _igdb.sync_all_to_db(POSTS, STORIES, NOTIFICACOES, DMS, TRENDING, AGENTES_IG)
-    except Exception as e:
-        print(f"[IG-SAVE-DB] Erro: {e}")
+    """Async DB write - flush agendado por _salvar_dados() (so linhas alteradas)"""
+    await _igdb.sync_changes_to_db(POSTS, STORIES, NOTIFICACOES, DMS, TRENDING, AGENTES_IG,
+                                   FOLLOWS, SAVED_POSTS, COMMENT_LIKES)
 
 def _salvar_dados():
-    """Backward-compatible sync wrapper - schedules async DB write"""
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(_salvar_dados_async())
-    except RuntimeError:
-        pass
+    """Backward-compatible sync wrapper - pede um flush (rajadas viram um so write)"""
+    _CACHE_FEED.invalidar()  # toda mutacao passa por aqui
+    _persist.marcar("instagram")
 
 async def _carregar_dados_async():
     """Load from SQLite DB, fallback to JSON"""
@@ -288,8 +286,7 @@ def _carregar_dados_json():
     return False
 
 router = APIRouter(prefix="/api/instagram", tags=["instagram"])
-
-OLLAMA_URL = "http://localhost:11434/api/generate"
+_persist.registrar("instagram", _salvar_dados_async)
 
 # ============================================================
 # AGENTES INSTAGRAM
@@ -425,125 +422,54 @@ COMUNIDADES = {
 # ============================================================
 # DADOS EM MEMORIA
 # ============================================================
-POSTS = []
-STORIES = []
-NOTIFICACOES = []
-DMS = []
+# Aneis com capacidade: o mais antigo sai sozinho. Post despejado continua em
+# ig_posts (vira frio, paginado por _igdb.pagina_fria); DMs vao para arquivo.db
+MAX_POSTS = _igdb.MAX_POSTS
+MAX_STORIES = int(_os.environ.get("IG_MAX_STORIES", "50"))
+ARQUIVO_DMS = ArquivoSqlite("ig_dms")
+POSTS = PostsIndexados(capacidade=MAX_POSTS)  # indices por id / agente / tipo
+STORIES = ListaObservavel(capacidade=MAX_STORIES, mais_novo_primeiro=False)
+NOTIFICACOES = ListaObservavel(capacidade=_igdb.MAX_NOTIFS)
+DMS = ListaObservavel(capacidade=_igdb.MAX_DMS, mais_novo_primeiro=False, arquivo=ARQUIVO_DMS)
 TRENDING = []
 SAVED_POSTS = {}  # {agente_id: [post_id, ...]}
 FOLLOWS = {}  # {agente_id: [seguindo_ids]}
 COMMENT_LIKES = {}  # {comment_id: [agente_ids]}
+# Contadores por agente (posts, likes, comments, dms) mantidos a cada mutacao
+_AGREGADOS = AgregadosAgentes()
+POSTS.observar(_AGREGADOS.posts)
+DMS.observar(_AGREGADOS.dms)
+# Hashtag -> posts e contagem por janela de tempo (trending / /hashtag/{tag})
+_HASHTAGS = IndiceHashtags(POSTS.ordem)
+POSTS.observar(_HASHTAGS)
+# Busca full-text: posts (legenda + comentarios) e agentes (nome/username/bio)
+_BUSCA = IndiceBusca()
+POSTS.observar(_BUSCA)
+_BUSCA_AGENTES = IndiceBusca(texto_agente)
+# Referencias de posts/stories/carrosseis aos arquivos do armazem de midia (GC)
+POSTS.observar(armazem_midia)
+STORIES.observar(armazem_midia)
+# Posts frios (ig_posts fora do anel) seguram a midia no GC
+armazem_midia.referenciar_em_disco(_igdb.midia_em_disco_sync)
+
+def _post_comentado(post):
+    """Comentario novo in-place: atualiza contadores e indice de busca"""
+    _AGREGADOS.atualizar_post(post)
+    if POSTS.por_id(post.get("id")) is post:
+        _BUSCA.adicionar(post)
+
+def _indexar_agente(aid):
+    _BUSCA_AGENTES.adicionar(AGENTES_IG[aid], doc_id=aid)
+
+for _aid in AGENTES_IG:
+    _indexar_agente(_aid)
 
 # ============================================================
-# GROQ API (gratis, super rapido)
+# TEXTO (gateway de provedores)
 # ============================================================
-async def _chamar_groq(prompt, max_tokens=200):
-    """Chama Groq API - Llama 3.3 70B gratis e ultra rapido"""
-    if not GROQ_ENABLED or not GROQ_API_KEY:
-        return ""
-    model = random.choice(GROQ_MODELS)
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(GROQ_URL, headers={
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            }, json={
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": max_tokens,
-                "temperature": 0.9
-            })
-            if resp.status_code == 200:
-                text = resp.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-                if text and len(text) > 5:
-                    print(f"[IG-Groq] via {model}: OK ({len(text)} chars)")
-                    return text
-            elif resp.status_code == 429:
-                print(f"[IG-Groq] Rate limit, fallback...")
-            else:
-                print(f"[IG-Groq] {model}: {resp.status_code}")
-    except Exception as e:
-        print(f"[IG-Groq] {e}")
-    return ""
-
-# ============================================================
-# GOOGLE GEMINI API (inteligencia real)
-# ============================================================
-async def _chamar_gemini_api(prompt, max_tokens=200):
-    """Chama a API real do Google Gemini para gerar texto"""
-    if not GOOGLE_API_KEY:
-        return ""
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GOOGLE_API_KEY}"
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(url, json={
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"maxOutputTokens": max_tokens, "temperature": 0.9}
-            })
-            if resp.status_code == 200:
-                data = resp.json()
-                text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "").strip()
-                if text and len(text) > 5:
-                    print(f"[IG-Gemini-API] Real Gemini: OK ({len(text)} chars)")
-                    return text
-            else:
-                print(f"[IG-Gemini-API] Erro {resp.status_code}: {resp.text[:100]}")
-    except Exception as e:
-        print(f"[IG-Gemini-API] {e}")
-    return ""
-
-# ============================================================
-# OLLAMA
-# ============================================================
-async def _chamar_ollama(modelo, prompt, max_tokens=200):
-    # 0. Se modelo e Gemini real, usar API do Google
-    if modelo and modelo.startswith("gemini-"):
-        result = await _chamar_gemini_api(prompt, max_tokens)
-        if result:
-            return result
-        modelo = "gemma2:2b"
-    # 0.5. Tentar Groq primeiro (gratis, ultra rapido)
-    if GROQ_ENABLED:
-        result = await _chamar_groq(prompt, max_tokens)
-        if result:
-            return result
-    # 1. Tentar OpenRouter (rapido)
-    if OPENROUTER_ENABLED:
-        try:
-            or_model = random.choice(OPENROUTER_TEXT_MODELS)
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(
-                    OPENROUTER_URL,
-                    headers={
-                        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": or_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": max_tokens,
-                        "temperature": 0.9
-                    }
-                )
-                if resp.status_code == 200:
-                    text = resp.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-                    if text and len(text) > 5:
-                        print(f"[IG-OR] via {or_model}: OK ({len(text)} chars)")
-                        return text
-        except Exception as e:
-            print(f"[IG-OR] {e}")
-    # 2. Fallback: Ollama local
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(OLLAMA_URL, json={
-                "model": modelo, "prompt": prompt, "stream": False,
-                "options": {"num_predict": max_tokens, "temperature": 0.9}
-            })
-            if resp.status_code == 200:
-                return resp.json().get("response", "").strip()
-    except Exception as e:
-        print(f"[IG-Ollama] {modelo}: {e}")
-    return ""
+async def _chamar_ollama(modelo, prompt, max_tokens=200, cache=None):
+    """Gera texto pelo gateway (Gemini real para gemini-*, Groq, OpenRouter, Ollama)"""
+    return await gerar_texto(modelo, prompt, max_tokens=max_tokens, temperature=0.9, cache=cache)
 
 async def _gerar_caption(agente_id, comunidade=None):
     ag = AGENTES_IG[agente_id]
@@ -704,7 +630,7 @@ async def _gerar_imagem_stablediffusion(prompt_img, agente_id, seed_id):
         encoded = urllib.parse.quote(clean_prompt)
         url = f"https://image.pollinations.ai/prompt/{encoded}?model={STABLE_DIFFUSION_MODEL}&width={STABLE_DIFFUSION_WIDTH}&height={STABLE_DIFFUSION_HEIGHT}&seed={seed}&nologo=true"
         print(f"[StableDiffusion] Gerando: {clean_prompt[:60]}...")
-        async with httpx.AsyncClient(timeout=90) as client:
+        async with http_pool.cliente(timeout=90) as client:
             resp = await client.get(url, follow_redirects=True)
             if resp.status_code == 200 and len(resp.content) > 5000:
                 ct = resp.headers.get("content-type", "")
@@ -715,13 +641,7 @@ async def _gerar_imagem_stablediffusion(prompt_img, agente_id, seed_id):
                     print(f"[StableDiffusion] RATE LIMIT detectado! Imagem muito grande ({content_size//1024}KB) - descartando")
                     return None
                 if "image" in ct or content_size > 10000:
-                    img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                    _os.makedirs(img_dir, exist_ok=True)
-                    fname = f"sd_{uuid.uuid4().hex[:10]}.jpg"
-                    fpath = _os.path.join(img_dir, fname)
-                    with open(fpath, "wb") as f:
-                        f.write(resp.content)
-                    local_url = f"/static/ig_images/{fname}"
+                    local_url = await armazem_midia.guardar(resp.content)
                     print(f"[StableDiffusion] {STABLE_DIFFUSION_MODEL} salva: {local_url} ({content_size//1024}KB)")
                     return local_url
                 else:
@@ -751,7 +671,7 @@ async def _baixar_imagem_pollinations(prompt_img, agente_id, seed_id):
             clean_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', f"{prompt_img}, {estilo_poll}")[:300]
             encoded = urllib.parse.quote(clean_prompt)
             url = f"{POLLINATIONS_GEN_URL}/{encoded}?model={POLLINATIONS_PREMIUM_MODEL}&width=1024&height=1024&seed={seed}&nologo=true&key={POLLINATIONS_API_KEY}"
-            async with httpx.AsyncClient(timeout=90) as client:
+            async with http_pool.cliente(timeout=90) as client:
                 resp = await client.get(url)
                 if resp.status_code == 200 and len(resp.content) > 5000:
                     ct = resp.headers.get("content-type", "")
@@ -761,13 +681,7 @@ async def _baixar_imagem_pollinations(prompt_img, agente_id, seed_id):
                         print(f"[Pollinations Premium] RATE LIMIT detectado! ({content_size//1024}KB) - descartando")
                         return None
                     if "image" in ct:
-                        img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                        _os.makedirs(img_dir, exist_ok=True)
-                        fname = f"premium_{uuid.uuid4().hex[:10]}.jpg"
-                        fpath = _os.path.join(img_dir, fname)
-                        with open(fpath, "wb") as f:
-                            f.write(resp.content)
-                        local_url = f"/static/ig_images/{fname}"
+                        local_url = await armazem_midia.guardar(resp.content)
                         print(f"[Pollinations Premium] {POLLINATIONS_PREMIUM_MODEL} salva: {local_url} ({content_size//1024}KB)")
                         return local_url
                 elif resp.status_code == 402:
@@ -787,7 +701,7 @@ async def _gerar_imagem_leonardo(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, masterpiece, 8k"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:300]
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with http_pool.cliente(timeout=60) as client:
             # Step 1: Start generation
             resp = await client.post(
                 f"{LEONARDO_API_URL}/generations",
@@ -848,7 +762,7 @@ async def _gerar_imagem_dalle(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, masterpiece, 8k"
     full_prompt = full_prompt[:1000]  # DALL-E 3 supports up to 4000 chars
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with http_pool.cliente(timeout=60) as client:
             resp = await client.post(
                 "https://api.openai.com/v1/images/generations",
                 headers={
@@ -890,15 +804,8 @@ async def _extrair_imagem_openrouter(data, agente_id, model_name):
         img_url_data = images[0].get("image_url", {}).get("url", "")
         if img_url_data.startswith("data:image"):
             header, b64_data = img_url_data.split(",", 1)
-            ext = "png" if "png" in header else "jpg"
             img_bytes = b64.b64decode(b64_data)
-            static_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "gallery")
-            _os.makedirs(static_dir, exist_ok=True)
-            fname = f"or_{agente_id}_{int(_time.time())}_{_random.randint(100,999)}.{ext}"
-            fpath = _os.path.join(static_dir, fname)
-            with open(fpath, "wb") as f:
-                f.write(img_bytes)
-            local_url = f"/static/gallery/{fname}"
+            local_url = await armazem_midia.guardar(img_bytes)
             print(f"[IG-Img] {model_name} saved: {local_url} ({len(img_bytes)//1024}KB)")
             return local_url
     
@@ -912,15 +819,8 @@ async def _extrair_imagem_openrouter(data, agente_id, model_name):
                     img_url = part.get("image_url", {}).get("url", "")
                 if img_url and img_url.startswith("data:image"):
                     header, b64_data = img_url.split(",", 1)
-                    ext = "png" if "png" in header else "jpg"
                     img_bytes = b64.b64decode(b64_data)
-                    static_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "gallery")
-                    _os.makedirs(static_dir, exist_ok=True)
-                    fname = f"or_{agente_id}_{int(_time.time())}_{_random.randint(100,999)}.{ext}"
-                    fpath = _os.path.join(static_dir, fname)
-                    with open(fpath, "wb") as f:
-                        f.write(img_bytes)
-                    local_url = f"/static/gallery/{fname}"
+                    local_url = await armazem_midia.guardar(img_bytes)
                     print(f"[IG-Img] {model_name} saved: {local_url} ({len(img_bytes)//1024}KB)")
                     return local_url
     
@@ -931,15 +831,8 @@ async def _extrair_imagem_openrouter(data, agente_id, model_name):
         if match:
             img_url_data = match.group(0)
             header, b64_data = img_url_data.split(",", 1)
-            ext = "png" if "png" in header else "jpg"
             img_bytes = b64.b64decode(b64_data)
-            static_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "gallery")
-            _os.makedirs(static_dir, exist_ok=True)
-            fname = f"or_{agente_id}_{int(_time.time())}_{_random.randint(100,999)}.{ext}"
-            fpath = _os.path.join(static_dir, fname)
-            with open(fpath, "wb") as f:
-                f.write(img_bytes)
-            local_url = f"/static/gallery/{fname}"
+            local_url = await armazem_midia.guardar(img_bytes)
             print(f"[IG-Img] {model_name} saved: {local_url} ({len(img_bytes)//1024}KB)")
             return local_url
     
@@ -969,7 +862,7 @@ async def _gerar_imagem_openrouter(prompt_img, agente_id):
             if is_image_only:
                 payload["modalities"] = ["image"]
             
-            async with httpx.AsyncClient(timeout=90.0) as client:
+            async with http_pool.cliente(timeout=90.0) as client:
                 resp = await client.post(
                     OPENROUTER_URL,
                     headers={
@@ -1008,7 +901,7 @@ async def _gerar_imagem_stable_horde(prompt_img, agente_id):
     estilo = ESTILOS_IMAGEM.get(agente_id, "ultra detailed, high quality, cinematic lighting")
     full_prompt = f"{prompt_img}, {estilo}, masterpiece quality, ultra detailed, professional photography, cinematic composition, dramatic lighting, award winning ### blurry, low quality, bad anatomy, watermark, text, signature, human face, human body, deformed, ugly, duplicate"[:800]
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
+        async with http_pool.cliente(timeout=120.0) as client:
             # 1. Submit job
             resp = await client.post(
                 "https://stablehorde.net/api/v2/generate/async",
@@ -1048,13 +941,7 @@ async def _gerar_imagem_stable_horde(prompt_img, agente_id):
                                 # Download and save locally
                                 img_resp = await client.get(img_url, follow_redirects=True, timeout=30)
                                 if img_resp.status_code == 200 and len(img_resp.content) > 5000:
-                                    static_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "gallery")
-                                    _os.makedirs(static_dir, exist_ok=True)
-                                    fname = f"sh_{agente_id}_{int(_time.time())}.jpg"
-                                    fpath = _os.path.join(static_dir, fname)
-                                    with open(fpath, "wb") as f:
-                                        f.write(img_resp.content)
-                                    local_url = f"/static/gallery/{fname}"
+                                    local_url = await armazem_midia.guardar(img_resp.content)
                                     print(f"[IG-Img] Stable Horde OK: {local_url} ({len(img_resp.content)//1024}KB)")
                                     return local_url
                         print("[IG-Img] Stable Horde: done mas sem imagem")
@@ -1085,7 +972,7 @@ async def _gerar_imagem_huggingface(prompt_img, agente_id):
     ]
     for model in models:
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with http_pool.cliente(timeout=60.0) as client:
                 resp = await client.post(
                     f"https://api-inference.huggingface.co/models/{model}",
                     headers={"Content-Type": "application/json"},
@@ -1095,13 +982,7 @@ async def _gerar_imagem_huggingface(prompt_img, agente_id):
                 if resp.status_code == 200 and len(resp.content) > 5000:
                     ct = resp.headers.get("content-type", "")
                     if "image" in ct:
-                        static_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "gallery")
-                        _os.makedirs(static_dir, exist_ok=True)
-                        fname = f"hf_{agente_id}_{int(_time.time())}.jpg"
-                        fpath = _os.path.join(static_dir, fname)
-                        with open(fpath, "wb") as f:
-                            f.write(resp.content)
-                        local_url = f"/static/gallery/{fname}"
+                        local_url = await armazem_midia.guardar(resp.content)
                         print(f"[IG-Img] HuggingFace OK ({model.split('/')[-1]}): {local_url} ({len(resp.content)//1024}KB)")
                         return local_url
                 elif resp.status_code == 503:
@@ -1127,7 +1008,7 @@ async def _gerar_imagem_google(prompt_img, agente_id):
     google_img_models = ["gemini-2.5-flash-image", "gemini-3-pro-image-preview"]
     for gmodel in google_img_models:
         try:
-            async with httpx.AsyncClient(timeout=90) as client:
+            async with http_pool.cliente(timeout=90) as client:
                 resp = await client.post(
                     f"https://generativelanguage.googleapis.com/v1beta/models/{gmodel}:generateContent",
                     headers={
@@ -1148,16 +1029,8 @@ async def _gerar_imagem_google(prompt_img, agente_id):
                         inline = part.get("inline_data") or part.get("inlineData")
                         if inline:
                             b64_data = inline.get("data", "")
-                            mime = inline.get("mime_type") or inline.get("mimeType", "image/png")
                             if b64_data:
-                                ext = "png" if "png" in mime else "jpg"
-                                filename = f"ig_{uuid.uuid4().hex[:12]}.{ext}"
-                                img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                                _os.makedirs(img_dir, exist_ok=True)
-                                filepath_img = _os.path.join(img_dir, filename)
-                                with open(filepath_img, "wb") as f:
-                                    f.write(base64.b64decode(b64_data))
-                                url = f"/static/ig_images/{filename}"
+                                url = await armazem_midia.guardar(base64.b64decode(b64_data))
                                 print(f"[Google] {gmodel} Image saved: {url}")
                                 return url
                 print(f"[Google] {gmodel}: No image in response")
@@ -1182,7 +1055,7 @@ async def _gerar_imagem_fal(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, masterpiece, 8k"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
+        async with http_pool.cliente(timeout=120) as client:
             # Try FLUX schnell first (cheaper)
             resp = await client.post(
                 f"https://fal.run/{FAL_MODEL}",
@@ -1204,18 +1077,14 @@ async def _gerar_imagem_fal(prompt_img, agente_id):
                     if url:
                         img_resp = await client.get(url, timeout=30)
                         if img_resp.status_code == 200:
-                            img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                            _os.makedirs(img_dir, exist_ok=True)
-                            fname = f"fal_{uuid.uuid4().hex[:10]}.jpg"
-                            fpath = _os.path.join(img_dir, fname)
                             from PIL import Image as _PILImage
                             import io as _io
                             img = _PILImage.open(_io.BytesIO(img_resp.content))
                             img = img.convert("RGB")
-                            img.save(fpath, "JPEG", quality=85, optimize=True)
-                            local_url = f"/static/ig_images/{fname}"
-                            fsize = _os.path.getsize(fpath)
-                            print(f"[fal.ai] FLUX OK: {local_url} ({fsize//1024}KB)")
+                            buf = _io.BytesIO()
+                            img.save(buf, "JPEG", quality=85, optimize=True)
+                            local_url = await armazem_midia.guardar(buf.getvalue(), "jpg")
+                            print(f"[fal.ai] FLUX OK: {local_url} ({buf.tell()//1024}KB)")
                             return local_url
             elif resp.status_code == 403:
                 print(f"[fal.ai] Conta bloqueada/sem saldo")
@@ -1237,7 +1106,7 @@ async def _gerar_imagem_together(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, masterpiece, 8k"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with http_pool.cliente(timeout=60) as client:
             resp = await client.post(
                 TOGETHER_API_URL,
                 headers={
@@ -1261,32 +1130,22 @@ async def _gerar_imagem_together(prompt_img, agente_id):
                     b64_data = images[0].get("b64_json", "")
                     if b64_data:
                         img_bytes = base64.b64decode(b64_data)
-                        img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                        _os.makedirs(img_dir, exist_ok=True)
-                        fname = f"together_{uuid.uuid4().hex[:10]}.jpg"
-                        fpath = _os.path.join(img_dir, fname)
                         # Convert to JPEG optimized
                         from PIL import Image as _PILImage
                         import io as _io
                         img = _PILImage.open(_io.BytesIO(img_bytes))
                         img = img.convert("RGB")
-                        img.save(fpath, "JPEG", quality=85, optimize=True)
-                        local_url = f"/static/ig_images/{fname}"
-                        fsize = _os.path.getsize(fpath)
-                        print(f"[Together] FLUX schnell OK: {local_url} ({fsize//1024}KB)")
+                        buf = _io.BytesIO()
+                        img.save(buf, "JPEG", quality=85, optimize=True)
+                        local_url = await armazem_midia.guardar(buf.getvalue(), "jpg")
+                        print(f"[Together] FLUX schnell OK: {local_url} ({buf.tell()//1024}KB)")
                         return local_url
                     # Try URL format
                     url = images[0].get("url", "")
                     if url:
                         img_resp = await client.get(url, timeout=30)
                         if img_resp.status_code == 200:
-                            img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                            _os.makedirs(img_dir, exist_ok=True)
-                            fname = f"together_{uuid.uuid4().hex[:10]}.jpg"
-                            fpath = _os.path.join(img_dir, fname)
-                            with open(fpath, "wb") as f:
-                                f.write(img_resp.content)
-                            local_url = f"/static/ig_images/{fname}"
+                            local_url = await armazem_midia.guardar(img_resp.content)
                             print(f"[Together] FLUX schnell OK: {local_url} ({len(img_resp.content)//1024}KB)")
                             return local_url
                 print(f"[Together] Sem imagem no response")
@@ -1322,7 +1181,7 @@ async def _gerar_imagem_kling(prompt_img, agente_id):
             "nbf": int(now - 5),
         }
         token = _jwt.encode(payload, KLING_SECRET_KEY, algorithm="HS256")
-        async with httpx.AsyncClient(timeout=90) as client:
+        async with http_pool.cliente(timeout=90) as client:
             resp = await client.post(
                 f"{KLING_API_BASE}/v1/images/generations",
                 headers={
@@ -1368,13 +1227,7 @@ async def _gerar_imagem_kling(prompt_img, agente_id):
                                         # Download and save locally
                                         img_resp = await client.get(img_url, timeout=30)
                                         if img_resp.status_code == 200:
-                                            img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                                            _os.makedirs(img_dir, exist_ok=True)
-                                            fname = f"kling_{uuid.uuid4().hex[:10]}.jpg"
-                                            fpath = _os.path.join(img_dir, fname)
-                                            with open(fpath, "wb") as f:
-                                                f.write(img_resp.content)
-                                            local_url = f"/static/ig_images/{fname}"
+                                            local_url = await armazem_midia.guardar(img_resp.content)
                                             print(f"[Kling] Imagem salva: {local_url} ({len(img_resp.content)//1024}KB)")
                                             return local_url
                                 print(f"[Kling] Task completa mas sem imagem")
@@ -1411,7 +1264,7 @@ async def _gerar_imagem_siliconflow(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, masterpiece, 8k"
     full_prompt = full_prompt[:500]
     try:
-        async with httpx.AsyncClient(timeout=90) as client:
+        async with http_pool.cliente(timeout=90) as client:
             resp = await client.post(
                 f"{SILICONFLOW_API_BASE}/images/generations",
                 headers={
@@ -1435,30 +1288,21 @@ async def _gerar_imagem_siliconflow(prompt_img, agente_id):
                         img_resp = await client.get(img_url, timeout=30)
                         if img_resp.status_code == 200 and len(img_resp.content) > 5000:
                             # Rate limit check (>500KB pode ser rate limit em outros, mas SiliconFlow gera imagens grandes ~1MB)
-                            img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                            _os.makedirs(img_dir, exist_ok=True)
-                            fname = f"sf_{agente_id}_{uuid.uuid4().hex[:8]}.png"
-                            fpath = _os.path.join(img_dir, fname)
-                            with open(fpath, "wb") as f:
-                                f.write(img_resp.content)
+                            img_bytes = img_resp.content
                             # Optimize: compress to JPEG if too large
-                            if len(img_resp.content) > 400000:
+                            if len(img_bytes) > 400000:
                                 try:
                                     from PIL import Image as _PILImage
                                     import io as _io
-                                    pil_img = _PILImage.open(_io.BytesIO(img_resp.content))
-                                    fname_jpg = fname.replace('.png', '.jpg')
-                                    fpath_jpg = _os.path.join(img_dir, fname_jpg)
-                                    pil_img.convert('RGB').save(fpath_jpg, 'JPEG', quality=85)
-                                    jpg_size = _os.path.getsize(fpath_jpg)
-                                    _os.remove(fpath)  # remove PNG
-                                    fname = fname_jpg
-                                    fpath = fpath_jpg
-                                    print(f"[SiliconFlow-Img] Compressed: {len(img_resp.content)//1024}KB -> {jpg_size//1024}KB")
+                                    pil_img = _PILImage.open(_io.BytesIO(img_bytes))
+                                    buf = _io.BytesIO()
+                                    pil_img.convert('RGB').save(buf, 'JPEG', quality=85)
+                                    print(f"[SiliconFlow-Img] Compressed: {len(img_bytes)//1024}KB -> {buf.tell()//1024}KB")
+                                    img_bytes = buf.getvalue()
                                 except:
                                     pass
-                            local_url = f"/static/ig_images/{fname}"
-                            print(f"[SiliconFlow-Img] OK: {local_url} ({_os.path.getsize(fpath)//1024}KB)")
+                            local_url = await armazem_midia.guardar(img_bytes)
+                            print(f"[SiliconFlow-Img] OK: {local_url} ({len(img_bytes)//1024}KB)")
                             return local_url
             else:
                 print(f"[SiliconFlow-Img] HTTP {resp.status_code}: {resp.text[:150]}")
@@ -1475,7 +1319,7 @@ async def _gerar_imagem_minimax(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, masterpiece, 8k"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with http_pool.cliente(timeout=60) as client:
             resp = await client.post(
                 f"{MINIMAX_API_BASE}/v1/image_generation",
                 headers={
@@ -1497,13 +1341,7 @@ async def _gerar_imagem_minimax(prompt_img, agente_id):
                     if images_b64:
                         img_bytes = base64.b64decode(images_b64[0])
                         if len(img_bytes) > 5000:
-                            img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                            _os.makedirs(img_dir, exist_ok=True)
-                            fname = f"minimax_{agente_id}_{uuid.uuid4().hex[:8]}.jpg"
-                            fpath = _os.path.join(img_dir, fname)
-                            with open(fpath, "wb") as f:
-                                f.write(img_bytes)
-                            local_url = f"/static/ig_images/{fname}"
+                            local_url = await armazem_midia.guardar(img_bytes)
                             print(f"[MiniMax-Img] OK: {local_url} ({len(img_bytes)//1024}KB)")
                             return local_url
                 else:
@@ -1537,16 +1375,10 @@ async def _gerar_imagem_bing(prompt_img, agente_id):
             links = await loop.run_in_executor(pool, _bing_sync)
         if links and len(links) > 0:
             img_url_remote = links[0]
-            async with httpx.AsyncClient(timeout=30) as client:
+            async with http_pool.cliente(timeout=30) as client:
                 resp = await client.get(img_url_remote)
                 if resp.status_code == 200:
-                    filename = f"ig_bing_{uuid.uuid4().hex[:12]}.jpg"
-                    img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-                    _os.makedirs(img_dir, exist_ok=True)
-                    filepath_img = _os.path.join(img_dir, filename)
-                    with open(filepath_img, "wb") as f:
-                        f.write(resp.content)
-                    url = f"/static/ig_images/{filename}"
+                    url = await armazem_midia.guardar(resp.content)
                     print(f"[Bing] Image saved: {url} (from {img_url_remote[:60]}...)")
                     return url
             print(f"[Bing] Got URL but download failed: {img_url_remote[:80]}")
@@ -1557,134 +1389,49 @@ async def _gerar_imagem_bing(prompt_img, agente_id):
         print(f"[Bing] Error: {e}")
         return None
 
-async def _construir_url_imagem_ai(prompt_img, agente_id, seed_id):
-    """Gera imagem: DeepInfra (FREE) -> Google Gemini -> OpenRouter -> SiliconFlow -> fal.ai -> Together -> Kling -> MiniMax -> Leonardo -> DALL-E -> Local"""
-    # 0. DeepInfra SD3.5 (GRATIS, sem API key, ~5s, PRINCIPAL)
-    try:
-        di_url = await _gerar_imagem_deepinfra(prompt_img, agente_id)
-        if di_url:
-            print(f"[IG-Img] DeepInfra OK: {di_url[:80]}")
-            return di_url, "DeepInfra SD3.5"
-    except Exception as e:
-        print(f"[IG-Img] DeepInfra erro: {e}")
-    print(f"[IG-Img] DeepInfra falhou, tentando Google Gemini...")
-    # 1. Google Gemini Flash Image (gratis mas quota limitada)
-    try:
-        google_url = await _gerar_imagem_google(prompt_img, agente_id)
-        if google_url:
-            print(f"[IG-Img] Google Gemini OK: {google_url[:80]}")
-            return google_url, "Google Gemini Flash"
-    except Exception as e:
-        print(f"[IG-Img] Google Gemini erro: {e}")
-    print(f"[IG-Img] Google Gemini falhou, tentando OpenRouter...")
-    # 2. OpenRouter (Gemini via proxy - pago)
-    try:
-        or_url = await _gerar_imagem_openrouter(prompt_img, agente_id)
-        if or_url:
-            print(f"[IG-Img] OpenRouter OK: {or_url}")
-            return or_url, "OpenRouter Best"
-    except Exception as e:
-        print(f"[IG-Img] OpenRouter erro: {e}")
-    print(f"[IG-Img] OpenRouter falhou, tentando Stable Horde...")
-    # 3. Stable Horde (crowdsourced, GRATIS, lento)
-    try:
-        sh_url = await _gerar_imagem_stable_horde(prompt_img, agente_id)
-        if sh_url:
-            print(f"[IG-Img] Stable Horde OK: {sh_url}")
-            return sh_url, "Stable Horde"
-    except Exception as e:
-        print(f"[IG-Img] Stable Horde erro: {e}")
-    print(f"[IG-Img] Stable Horde falhou, tentando Pollinations FLUX gratis...")
-    # 4. Pollinations.ai FLUX gratis (sem API key)
-    try:
-        poll_url = await _gerar_imagem_stablediffusion(prompt_img, agente_id, seed_id)
-        if poll_url:
-            print(f"[IG-Img] Pollinations FLUX OK: {poll_url}")
-            return poll_url, "Pollinations FLUX"
-    except Exception as e:
-        print(f"[IG-Img] Pollinations FLUX erro: {e}")
-    print(f"[IG-Img] Pollinations falhou, tentando SiliconFlow FLUX...")
-    # 2. SiliconFlow FLUX.1-schnell (rapido e barato)
-    try:
-        sf_url = await _gerar_imagem_siliconflow(prompt_img, agente_id)
-        if sf_url:
-            print(f"[IG-Img] SiliconFlow OK: {sf_url[:80]}")
-            return sf_url, "SiliconFlow FLUX"
-    except Exception as e:
-        print(f"[IG-Img] SiliconFlow erro: {e}")
-    print(f"[IG-Img] SiliconFlow falhou, tentando fal.ai...")
-    # 4. fal.ai (FLUX schnell ou Kling Image)
-    try:
-        fal_url = await _gerar_imagem_fal(prompt_img, agente_id)
-        if fal_url:
-            print(f"[IG-Img] fal.ai OK: {fal_url[:80]}")
-            return fal_url, "fal.ai FLUX"
-    except Exception as e:
-        print(f"[IG-Img] fal.ai erro: {e}")
-    print(f"[IG-Img] fal.ai falhou, tentando Together AI FLUX...")
-    # 5. Together AI FLUX schnell (GRATIS - 3 meses ilimitado!)
-    try:
-        together_url = await _gerar_imagem_together(prompt_img, agente_id)
-        if together_url:
-            print(f"[IG-Img] Together AI OK: {together_url[:80]}")
-            return together_url, "Together AI"
-    except Exception as e:
-        print(f"[IG-Img] Together erro: {e}")
-    print(f"[IG-Img] Together falhou, tentando Kling AI...")
-    # 6. Kling AI (muito barato - $0.0035/imagem)
-    try:
-        kling_url = await _gerar_imagem_kling(prompt_img, agente_id)
-        if kling_url:
-            print(f"[IG-Img] Kling AI OK: {kling_url[:80]}")
-            return kling_url, "Kling AI"
-    except Exception as e:
-        print(f"[IG-Img] Kling erro: {e}")
-    print(f"[IG-Img] Kling falhou, tentando MiniMax AI...")
-    # 7. MiniMax AI (image-01, alta qualidade)
-    try:
-        minimax_url = await _gerar_imagem_minimax(prompt_img, agente_id)
-        if minimax_url:
-            print(f"[IG-Img] MiniMax OK: {minimax_url[:80]}")
-            return minimax_url, "MiniMax AI"
-    except Exception as e:
-        print(f"[IG-Img] MiniMax erro: {e}")
-    print(f"[IG-Img] MiniMax falhou, tentando Pollinations Premium...")
-    # 8. Pollinations Premium DESATIVADO
-    print(f"[IG-Img] Pollinations Premium DESATIVADO, tentando Leonardo...")
-    # 9. Leonardo.ai (fallback)
-    try:
-        leonardo_url = await _gerar_imagem_leonardo(prompt_img, agente_id)
-        if leonardo_url:
-            print(f"[IG-Img] Leonardo OK: {leonardo_url[:80]}")
-            return leonardo_url, "Leonardo AI"
-    except Exception as e:
-        print(f"[IG-Img] Leonardo erro: {e}")
-    print(f"[IG-Img] Leonardo falhou, tentando DALL-E...")
-    # 10. DALL-E 3 (ultimo fallback pago)
-    try:
-        dalle_url = await _gerar_imagem_dalle(prompt_img, agente_id)
-        if dalle_url:
-            print(f"[IG-Img] DALL-E OK: {dalle_url[:80]}")
-            return dalle_url, "DALL-E 3"
-    except Exception as e:
-        print(f"[IG-Img] DALL-E erro: {e}")
-    # 11. HuggingFace Z Image Turbo (GRATIS, sem limites, ~8s)
-    try:
-        hf_url = await _gerar_imagem_hf(prompt_img, agente_id)
-        if hf_url:
-            print(f"[IG-Img] HuggingFace FLUX OK: {hf_url}")
-            return hf_url, "HuggingFace FLUX"
-    except Exception as e:
-        print(f"[IG-Img] HuggingFace erro: {e}")
-    # 12. FALLBACK INTERNET: buscar imagem gratuita na internet
-    try:
-        inet_url, inet_gen = await _buscar_imagem_internet(prompt_img, agente_id, seed_id)
-        if inet_url:
-            return inet_url, inet_gen or "Internet"
-    except Exception as e:
-        print(f"[IG-Img] Internet fallback erro: {e}")
-    print(f"[IG-Img] Nenhuma imagem disponivel - post descartado")
-    return None, None
+# Provedores de imagem como adaptadores do roteador (app/services/imagem_router.py).
+# A ordem vem do historico de cada um; as latencias iniciais reproduzem a
+# cascata antiga ate haver amostras. Lambdas resolvem as funcoes na hora.
+_IMG = roteador_imagem.registrar
+# Prazo do ciclo de posts: os dois melhores correm e o perdedor e cancelado
+IMG_ORCAMENTO_POSTS_S = float(_os.environ.get("IMG_ORCAMENTO_POSTS_S", "90"))
+_IMG("deepinfra", "DeepInfra SD3.5", lambda p, a, s: _gerar_imagem_deepinfra(p, a), 6, timeout_s=150)
+_IMG("google", "Google Gemini Flash", lambda p, a, s: _gerar_imagem_google(p, a), 8,
+     habilitado=lambda: GOOGLE_IMAGEN_ENABLED and GOOGLE_API_KEY)
+_IMG("openrouter", "OpenRouter Best", lambda p, a, s: _gerar_imagem_openrouter(p, a), 12, custo=0.04,
+     habilitado=lambda: OPENROUTER_ENABLED)
+_IMG("stable_horde", "Stable Horde", lambda p, a, s: _gerar_imagem_stable_horde(p, a), 60, timeout_s=240)
+_IMG("pollinations", "Pollinations FLUX", lambda p, a, s: _gerar_imagem_stablediffusion(p, a, s), 70,
+     habilitado=lambda: STABLE_DIFFUSION_ENABLED)
+_IMG("siliconflow", "SiliconFlow FLUX", lambda p, a, s: _gerar_imagem_siliconflow(p, a), 75, custo=0.003,
+     habilitado=lambda: SILICONFLOW_ENABLED and SILICONFLOW_API_KEY)
+_IMG("fal", "fal.ai FLUX", lambda p, a, s: _gerar_imagem_fal(p, a), 80, custo=0.003,
+     habilitado=lambda: FAL_ENABLED and FAL_API_KEY)
+_IMG("together", "Together AI", lambda p, a, s: _gerar_imagem_together(p, a), 85,
+     habilitado=lambda: TOGETHER_ENABLED and TOGETHER_API_KEY)
+_IMG("kling", "Kling AI", lambda p, a, s: _gerar_imagem_kling(p, a), 90, custo=0.0035,
+     habilitado=lambda: KLING_ENABLED and KLING_ACCESS_KEY)
+_IMG("minimax", "MiniMax AI", lambda p, a, s: _gerar_imagem_minimax(p, a), 95, custo=0.0035,
+     habilitado=lambda: MINIMAX_ENABLED and MINIMAX_API_KEY)
+_IMG("leonardo", "Leonardo AI", lambda p, a, s: _gerar_imagem_leonardo(p, a), 100, custo=0.02,
+     habilitado=lambda: LEONARDO_ENABLED and LEONARDO_API_KEY)
+_IMG("dalle", "DALL-E 3", lambda p, a, s: _gerar_imagem_dalle(p, a), 110, custo=0.04,
+     habilitado=lambda: DALLE_ENABLED and OPENAI_API_KEY)
+_IMG("huggingface", "HuggingFace FLUX", lambda p, a, s: _gerar_imagem_hf(p, a), 130)
+# Ultimo recurso: foto da internet (Pexels/Pixabay/Pollinations), so depois de todas as IAs
+_IMG("internet", "Internet", lambda p, a, s: _buscar_imagem_internet(p, a, s), 10, timeout_s=90, nivel=1)
+
+
+async def _construir_url_imagem_ai(prompt_img, agente_id, seed_id, orcamento_s=None):
+    """Gera imagem pelo provedor mais promissor agora (ver roteador_imagem).
+
+    orcamento_s: prazo para as IAs; com ele os dois melhores correm juntos.
+    Retorna (url, nome_do_gerador) ou (None, None).
+    """
+    url, gerador = await roteador_imagem.gerar(prompt_img, agente_id, seed_id, orcamento_s)
+    if not url:
+        print(f"[IG-Img] Nenhuma imagem disponivel - post descartado")
+    return url, gerador
 
 async def _buscar_imagem_internet(prompt_img, agente_id, seed_id):
     """Busca imagem gratuita na internet: Pexels -> Pixabay -> LoremFlickr -> Picsum -> Pollinations"""
@@ -1693,13 +1440,11 @@ async def _buscar_imagem_internet(prompt_img, agente_id, seed_id):
     HUMAN_WORDS = {"human", "person", "people", "woman", "man", "girl", "boy", "face", "hand", "hands", "body", "portrait", "selfie", "child", "children", "baby", "crowd", "dancer", "model", "monk", "cosplay"}
     words = [w for w in keywords.split() if len(w) > 3 and w.lower() not in HUMAN_WORDS][:4]
     query = " ".join(words) if words else "beautiful nature landscape"
-    img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-    _os.makedirs(img_dir, exist_ok=True)
     
     # 1. Pexels API (busca por tema, alta qualidade, 200 req/hora)
     if PEXELS_ENABLED:
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
+            async with http_pool.cliente(timeout=15) as client:
                 resp = await client.get(
                     f"https://api.pexels.com/v1/search?query={urllib.parse.quote(query)}&per_page=15&orientation=square",
                     headers={"Authorization": PEXELS_API_KEY}
@@ -1712,19 +1457,16 @@ async def _buscar_imagem_internet(prompt_img, agente_id, seed_id):
                         if img_url:
                             img_resp = await client.get(img_url, follow_redirects=True)
                             if img_resp.status_code == 200 and len(img_resp.content) > 5000:
-                                fname = f"pexels_{uuid.uuid4().hex[:10]}.jpg"
-                                fpath = _os.path.join(img_dir, fname)
-                                with open(fpath, "wb") as f:
-                                    f.write(img_resp.content)
-                                print(f"[IG-Img] PEXELS OK: {fname} (query: {query}) by {photo.get('photographer','?')}")
-                                return f"/static/ig_images/{fname}", "Pexels"
+                                local_url = await armazem_midia.guardar(img_resp.content)
+                                print(f"[IG-Img] PEXELS OK: {local_url} (query: {query}) by {photo.get('photographer','?')}")
+                                return local_url, "Pexels"
         except Exception as e:
             print(f"[IG-Img] Pexels erro: {e}")
     
     # 2. Pixabay API (busca por tema, alta qualidade, 5000 req/hora)
     if PIXABAY_ENABLED:
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
+            async with http_pool.cliente(timeout=15) as client:
                 resp = await client.get(
                     f"https://pixabay.com/api/?key={PIXABAY_API_KEY}&q={urllib.parse.quote(query)}&image_type=photo&per_page=15&safesearch=true&min_width=800"
                 )
@@ -1736,12 +1478,9 @@ async def _buscar_imagem_internet(prompt_img, agente_id, seed_id):
                         if img_url:
                             img_resp = await client.get(img_url, follow_redirects=True)
                             if img_resp.status_code == 200 and len(img_resp.content) > 5000:
-                                fname = f"pixabay_{uuid.uuid4().hex[:10]}.jpg"
-                                fpath = _os.path.join(img_dir, fname)
-                                with open(fpath, "wb") as f:
-                                    f.write(img_resp.content)
-                                print(f"[IG-Img] PIXABAY OK: {fname} (query: {query})")
-                                return f"/static/ig_images/{fname}", "Pixabay"
+                                local_url = await armazem_midia.guardar(img_resp.content)
+                                print(f"[IG-Img] PIXABAY OK: {local_url} (query: {query})")
+                                return local_url, "Pixabay"
         except Exception as e:
             print(f"[IG-Img] Pixabay erro: {e}")
     
@@ -1757,15 +1496,12 @@ async def _buscar_imagem_internet(prompt_img, agente_id, seed_id):
         encoded = urllib.parse.quote(clean)
         seed = abs(hash(str(seed_id))) % 999999
         poll_url = f"https://image.pollinations.ai/prompt/{encoded}?width=1024&height=1024&seed={seed}&nologo=true"
-        async with httpx.AsyncClient(timeout=60, follow_redirects=True) as client:
+        async with http_pool.cliente(timeout=60, follow_redirects=True) as client:
             resp = await client.get(poll_url)
             if resp.status_code == 200 and len(resp.content) > 5000:
-                fname = f"inet_{uuid.uuid4().hex[:10]}.jpg"
-                fpath = _os.path.join(img_dir, fname)
-                with open(fpath, "wb") as f:
-                    f.write(resp.content)
-                print(f"[IG-Img] POLLINATIONS OK: {fname}")
-                return f"/static/ig_images/{fname}", "Pollinations Free"
+                local_url = await armazem_midia.guardar(resp.content)
+                print(f"[IG-Img] POLLINATIONS OK: {local_url}")
+                return local_url, "Pollinations Free"
     except Exception as e:
         print(f"[IG-Img] Pollinations erro: {e}")
     
@@ -1786,7 +1522,8 @@ def _get_imagem(agente_id, post_id):
     base_prompt = ROBOT_PROMPTS.get(agente_id, "beautiful artistic scene cinematic lighting vibrant colors masterpiece 8k")
     prompt = f"{base_prompt} masterpiece cinematic seed {seed}"
     encoded = urllib.parse.quote(prompt)
-    return f"https://image.pollinations.ai/prompt/{encoded}?width=512&height=512&seed={seed}&nologo=true"
+    # Copia local no armazem depois do primeiro acesso (sem hotlink a cada render)
+    return armazem_midia.espelho(f"https://image.pollinations.ai/prompt/{encoded}?width=512&height=512&seed={seed}&nologo=true")
 
 
 async def _gerar_video_google(prompt_img, agente_id):
@@ -1797,7 +1534,7 @@ async def _gerar_video_google(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, cinematic motion, smooth animation, masterpiece"
     full_prompt = full_prompt[:500]
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
+        async with http_pool.cliente(timeout=120) as client:
             # Step 1: Start video generation (long running operation)
             resp = await client.post(
                 f"https://generativelanguage.googleapis.com/v1beta/models/{GOOGLE_VEO_MODEL}:predictLongRunning",
@@ -1843,13 +1580,7 @@ async def _gerar_video_google(prompt_img, agente_id):
                             # Check for bytesBase64Encoded video
                             b64_vid = pred.get("bytesBase64Encoded", "")
                             if b64_vid:
-                                filename = f"ig_veo_{uuid.uuid4().hex[:12]}.mp4"
-                                vid_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_videos")
-                                _os.makedirs(vid_dir, exist_ok=True)
-                                filepath_vid = _os.path.join(vid_dir, filename)
-                                with open(filepath_vid, "wb") as f:
-                                    f.write(base64.b64decode(b64_vid))
-                                url = f"/static/ig_videos/{filename}"
+                                url = await armazem_midia.guardar(base64.b64decode(b64_vid))
                                 print(f"[Google-Veo] Video saved: {url}")
                                 return None, url
                         print(f"[Google-Veo] Done but no video: {str(poll_data)[:200]}")
@@ -1871,7 +1602,7 @@ async def _gerar_video_leonardo(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, cinematic motion, smooth animation, masterpiece"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:300]
     try:
-        async with httpx.AsyncClient(timeout=90) as client:
+        async with http_pool.cliente(timeout=90) as client:
             # Step 1: Generate image first
             resp = await client.post(
                 f"{LEONARDO_API_URL}/generations",
@@ -2075,10 +1806,8 @@ Caption:"""
 # ============================================================
 def _calcular_badges(agente_id):
     ag = AGENTES_IG[agente_id]
-    ap = [p for p in POSTS if p.get("agente_id") == agente_id]
-    tl = sum(p.get("likes", 0) for p in ap)
-    tc = sum(len(p.get("comments", [])) for p in ap)
-    td = len([d for d in DMS if d.get("de") == agente_id])
+    c = _AGREGADOS.de(agente_id)
+    tl, tc, td = c["likes"], c["comments"], c["dms"]
     badges = [{"icone": "\u2705", "nome": "Verificado", "descricao": "Agente de IA verificado", "cor": "#0095f6"}]
     if "7b" in ag.get("modelo","").lower() or "mistral" in agente_id:
         badges.append({"icone": "\U0001f4aa", "nome": "Heavyweight", "descricao": "7B+ parametros", "cor": "#a18cd1"})
@@ -2086,48 +1815,38 @@ def _calcular_badges(agente_id):
         badges.append({"icone": "\u26a1", "nome": "Lightweight", "descricao": "Modelo eficiente", "cor": "#5B43D4"})
     if tl >= 10: badges.append({"icone": "\U0001f525", "nome": "Popular", "descricao": "10+ curtidas", "cor": "#ed4956"})
     if tl >= 50: badges.append({"icone": "\u2b50", "nome": "Estrela", "descricao": "50+ curtidas", "cor": "#ffd700"})
-    if len(ap) >= 5: badges.append({"icone": "\U0001f4f8", "nome": "Ativo", "descricao": "5+ posts", "cor": "#f093fb"})
-    if len(ap) >= 20: badges.append({"icone": "\U0001f3c6", "nome": "Veterano", "descricao": "20+ posts", "cor": "#667eea"})
+    if c["posts"] >= 5: badges.append({"icone": "\U0001f4f8", "nome": "Ativo", "descricao": "5+ posts", "cor": "#f093fb"})
+    if c["posts"] >= 20: badges.append({"icone": "\U0001f3c6", "nome": "Veterano", "descricao": "20+ posts", "cor": "#667eea"})
     if tc >= 5: badges.append({"icone": "\U0001f4ac", "nome": "Engajador", "descricao": "5+ comentarios", "cor": "#4facfe"})
     if td >= 5: badges.append({"icone": "\U0001f4e8", "nome": "Social", "descricao": "5+ DMs", "cor": "#ffecd2"})
     return badges
 
 def _calcular_reputacao(agente_id):
-    ap = [p for p in POSTS if p.get("agente_id") == agente_id]
-    return (len(ap)*10 + sum(p.get("likes",0) for p in ap)*5 + sum(len(p.get("comments",[]))*3 for p in ap) + AGENTES_IG[agente_id].get("seguidores",0)*2 + len([d for d in DMS if d["de"]==agente_id]))
+    c = _AGREGADOS.de(agente_id)
+    return (c["posts"]*10 + c["likes"]*5 + c["comments"]*3 + AGENTES_IG[agente_id].get("seguidores",0)*2 + c["dms"])
 
 def _gerar_ranking():
     ranking = []
     for aid, ag in AGENTES_IG.items():
-        ap = [p for p in POSTS if p.get("agente_id") == aid]
-        tl = sum(p.get("likes",0) for p in ap)
-        tc = sum(len(p.get("comments",[])) for p in ap)
+        c = _AGREGADOS.de(aid)
         rep = _calcular_reputacao(aid)
-        ranking.append({"id": aid, "nome": ag["nome"], "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "cor": ag["cor"], "modelo": ag["modelo"], "seguidores": ag["seguidores"], "total_posts": len(ap), "total_likes": tl, "total_comments": tc, "reputacao": rep, "rep_percent": min(100, rep/5) if rep > 0 else 0, "badges": _calcular_badges(aid)})
+        ranking.append({"id": aid, "nome": ag["nome"], "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "cor": ag["cor"], "modelo": ag["modelo"], "seguidores": ag["seguidores"], "total_posts": c["posts"], "total_likes": c["likes"], "total_comments": c["comments"], "reputacao": rep, "rep_percent": min(100, rep/5) if rep > 0 else 0, "badges": _calcular_badges(aid)})
     ranking.sort(key=lambda x: x["reputacao"], reverse=True)
     return ranking
 
-def _trending():
-    tags = []
-    for p in POSTS[:50]:
-        for w in p.get("caption","").split():
-            if w.startswith("#"): tags.append(w.lower())
-    cont = Counter(tags)
-    tr = [{"posicao": i+1, "hashtag": t, "posts_count": c} for i, (t, c) in enumerate(cont.most_common(10))]
+def _trending(janela="24h"):
+    tr = [{"posicao": i+1, "hashtag": _HASHTAGS.forma(t).lower(), "posts_count": n, "score": round(sc, 2), "janela": janela}
+          for i, (t, sc, n) in enumerate(_HASHTAGS.top(10, janela))]
     if len(tr) < 8:
         pad = ["#AIRevolution","#LocalAI","#OllamaLocal","#PythonDev","#SmallModels","#CleanCode","#DeepThoughts","#TechHumor"]
         for s in pad:
             if len(tr) >= 10: break
-            if not any(x["hashtag"]==s for x in tr):
+            if not any(x["hashtag"]==s.lower() for x in tr):
                 tr.append({"posicao": len(tr)+1, "hashtag": s, "posts_count": random.randint(1,5)})
     return tr[:10]
 
 def _hashtags_sugeridas():
-    tags = []
-    for p in POSTS[:100]:
-        for w in p.get("caption","").split():
-            if w.startswith("#"): tags.append(w)
-    top = [t for t,_ in Counter(tags).most_common(20)]
+    top = [_HASHTAGS.forma(t) for t in _HASHTAGS.mais_usadas(20)]
     pad = ["#AIAgents","#OllamaLocal","#BuildInPublic","#LocalAI","#OpenSourceAI","#DevLife","#FastAPI","#PythonDev","#AIEcosystem","#LLMLocal","#SmallModels","#AIAutomation","#DeepLearning","#MachineLearning","#TechTrends","#CodeDaily"]
     for s in pad:
         if s not in top: top.append(s)
@@ -2252,7 +1971,6 @@ async def _ciclo_carrossel():
                     "created_at": datetime.now().isoformat(), "tipo": "carrossel"
                 })
                 print(f"[IG-Carousel] {ag['nome']}: CARROSSEL com {len(urls)} imagens! {caption[:50]}...")
-                if len(POSTS) > 200: POSTS[:] = POSTS[:300]
                 _salvar_dados()
             else:
                 # Fallback: completar com Pixabay ate ter pelo menos 2
@@ -2280,7 +1998,6 @@ async def _ciclo_carrossel():
                         "created_at": datetime.now().isoformat(), "tipo": "carrossel"
                     })
                     print(f"[IG-Carousel] {ag['nome']}: CARROSSEL Pixabay com {len(urls)} imagens!")
-                    if len(POSTS) > 200: POSTS[:] = POSTS[:300]
                     _salvar_dados()
                 elif urls:
                     POSTS.insert(0, {
@@ -2318,7 +2035,7 @@ async def _ciclo_posts():
             # Gerar imagem com IA via Pollinations.ai
             try:
                 prompt_img = await _gerar_prompt_imagem(caption, aid)
-                img_url, img_gen = await _construir_url_imagem_ai(prompt_img, aid, pid)
+                img_url, img_gen = await _construir_url_imagem_ai(prompt_img, aid, pid, IMG_ORCAMENTO_POSTS_S)
                 print(f"[IG-Img] Prompt: {prompt_img[:60]} | Generator: {img_gen}")
             except Exception as img_err:
                 print(f"[IG-Img Error] {img_err}")
@@ -2337,8 +2054,8 @@ async def _ciclo_posts():
                     "created_at": datetime.now().isoformat(), "tipo": "foto"
                 })
                 print(f"[IG-Post] {ag['nome']}: {caption[:70]}...")
-                if len(POSTS) > 200: POSTS[:] = POSTS[:300]
                 _salvar_dados()
+                asyncio.create_task(_anexar_rendicoes(POSTS[0]))
         except Exception as e:
             print(f"[IG-Post Error] {e}")
         await asyncio.sleep(random.randint(90, 180))
@@ -2371,6 +2088,7 @@ async def _ciclo_interacoes():
                     if random.random() < affinity and aid not in post.get("liked_by",[]):
                         post["likes"] += 1
                         post.setdefault("liked_by",[]).append(aid)
+                        _AGREGADOS.atualizar_post(post)
                         NOTIFICACOES.insert(0, {"tipo": "like", "de": aid, "de_avatar": ag["avatar"], "de_nome": ag["nome"], "para": post["agente_id"], "post_id": post["id"], "texto": f"{ag['nome']} curtiu seu post", "created_at": datetime.now().isoformat()})
                         print(f"[IG-Like] {ag['nome']} -> {post['agente_nome']} (afinidade: {affinity:.0%})")
                     # Comentario baseado em afinidade (comenta mais se o tema e do seu interesse)
@@ -2378,6 +2096,7 @@ async def _ciclo_interacoes():
                     if random.random() < comment_chance:
                         ct = await _gerar_comentario(aid, post["caption"])
                         post.setdefault("comments",[]).append({"id": f"igcom_{uuid.uuid4().hex[:8]}", "agente_id": aid, "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "texto": ct, "created_at": datetime.now().isoformat()})
+                        _post_comentado(post)
                         NOTIFICACOES.insert(0, {"tipo": "comment", "de": aid, "de_avatar": ag["avatar"], "de_nome": ag["nome"], "para": post["agente_id"], "post_id": post["id"], "texto": f"{ag['nome']} comentou: {ct[:50]}", "created_at": datetime.now().isoformat()})
                         print(f"[IG-Comment] {ag['nome']} -> {post['agente_nome']}: {ct[:40]} (afinidade: {affinity:.0%})")
                     # Responder a comentario existente (thread) - baseado em afinidade
@@ -2393,8 +2112,8 @@ Be authentic. 1-2 COMPLETE sentences with period. English only."""
                             if reply and len(reply) > 3:
                                 reply_text = f"@{target_name} {reply[:200]}"
                                 post["comments"].append({"id": f"igcom_{uuid.uuid4().hex[:8]}", "agente_id": aid, "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "texto": reply_text, "created_at": datetime.now().isoformat(), "reply_to": target_comment.get("id")})
+                                _post_comentado(post)
                                 print(f"[IG-Reply] {ag['nome']} -> @{target_name}: {reply_text[:40]}")
-                if len(NOTIFICACOES) > 200: NOTIFICACOES[:] = NOTIFICACOES[:200]
                 _salvar_dados()
         except Exception as e:
             print(f"[IG-Interact Error] {e}")
@@ -2482,7 +2201,6 @@ async def _ciclo_dms():
             NOTIFICACOES.insert(0, {"tipo": "dm", "de": de, "de_avatar": AGENTES_IG[de]["avatar"], "de_nome": AGENTES_IG[de]["nome"], "para": para, "texto": f"{AGENTES_IG[de]['nome']} enviou DM: {msg[:40]}...", "created_at": datetime.now().isoformat()})
             shared_count = len(de_interests & set(AGENTES_IG[para].get("interesses", [])))
             print(f"[IG-DM] {AGENTES_IG[de]['nome']} -> {AGENTES_IG[para]['nome']} (afinidade: {scores.get(para,0):.1f}): {msg[:50]}...")
-            if len(DMS) > 500: DMS[:] = DMS[-500:]
             _salvar_dados()
         except Exception as e:
             print(f"[IG-DM Error] {e}")
@@ -2502,7 +2220,7 @@ async def _gerar_video_kling(prompt_img, agente_id):
         now = _time.time()
         payload = {"iss": KLING_ACCESS_KEY, "exp": int(now + 1800), "iat": int(now), "nbf": int(now - 5)}
         token = _jwt.encode(payload, KLING_SECRET_KEY, algorithm="HS256")
-        async with httpx.AsyncClient(timeout=300) as client:
+        async with http_pool.cliente(timeout=300) as client:
             resp = await client.post(
                 f"{KLING_API_BASE}/v1/videos/text2video",
                 headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
@@ -2541,13 +2259,7 @@ async def _gerar_video_kling(prompt_img, agente_id):
                                     if vid_url:
                                         vid_resp = await client.get(vid_url, timeout=60)
                                         if vid_resp.status_code == 200:
-                                            vid_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_videos")
-                                            _os.makedirs(vid_dir, exist_ok=True)
-                                            fname = f"kling_{uuid.uuid4().hex[:10]}.mp4"
-                                            fpath = _os.path.join(vid_dir, fname)
-                                            with open(fpath, "wb") as f:
-                                                f.write(vid_resp.content)
-                                            local_vid = f"/static/ig_videos/{fname}"
+                                            local_vid = await armazem_midia.guardar(vid_resp.content)
                                             print(f"[Kling-Video] OK: {local_vid} ({len(vid_resp.content)//1024}KB)")
                                             return thumb_url, local_vid
                                 return None, None
@@ -2580,7 +2292,7 @@ async def _gerar_video_fal(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, cinematic motion, smooth animation, masterpiece"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
     try:
-        async with httpx.AsyncClient(timeout=300) as client:
+        async with http_pool.cliente(timeout=300) as client:
             resp = await client.post(
                 "https://fal.run/fal-ai/kling-video/v2.1/standard/text-to-video",
                 headers={"Authorization": f"Key {FAL_API_KEY}", "Content-Type": "application/json"},
@@ -2597,13 +2309,7 @@ async def _gerar_video_fal(prompt_img, agente_id):
                 if vid_url:
                     vid_resp = await client.get(vid_url, timeout=60)
                     if vid_resp.status_code == 200:
-                        vid_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_videos")
-                        _os.makedirs(vid_dir, exist_ok=True)
-                        fname = f"fal_{uuid.uuid4().hex[:10]}.mp4"
-                        fpath = _os.path.join(vid_dir, fname)
-                        with open(fpath, "wb") as f:
-                            f.write(vid_resp.content)
-                        local_vid = f"/static/ig_videos/{fname}"
+                        local_vid = await armazem_midia.guardar(vid_resp.content)
                         print(f"[fal-Video] OK: {local_vid} ({len(vid_resp.content)//1024}KB)")
                         return None, local_vid
             elif resp.status_code == 403:
@@ -2627,7 +2333,7 @@ async def _gerar_video_siliconflow(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, cinematic motion, smooth animation, masterpiece"
     full_prompt = full_prompt[:500]
     try:
-        async with httpx.AsyncClient(timeout=600) as client:
+        async with http_pool.cliente(timeout=600) as client:
             # Step 1: Submit video request
             resp = await client.post(
                 f"{SILICONFLOW_API_BASE}/video/submit",
@@ -2670,13 +2376,7 @@ async def _gerar_video_siliconflow(prompt_img, agente_id):
                                 if vid_url:
                                     vid_resp = await client.get(vid_url, timeout=120)
                                     if vid_resp.status_code == 200 and len(vid_resp.content) > 10000:
-                                        vid_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_videos")
-                                        _os.makedirs(vid_dir, exist_ok=True)
-                                        fname = f"sf_{uuid.uuid4().hex[:10]}.mp4"
-                                        fpath = _os.path.join(vid_dir, fname)
-                                        with open(fpath, "wb") as f:
-                                            f.write(vid_resp.content)
-                                        local_vid = f"/static/ig_videos/{fname}"
+                                        local_vid = await armazem_midia.guardar(vid_resp.content)
                                         print(f"[SiliconFlow-Video] OK: {local_vid} ({len(vid_resp.content)//1024}KB)")
                                         return None, local_vid
                             print(f"[SiliconFlow-Video] Succeed but no video URL")
@@ -2705,7 +2405,7 @@ async def _gerar_video_minimax(prompt_img, agente_id):
     full_prompt = f"{prompt_img}, {estilo}, cinematic motion, smooth animation, masterpiece"
     full_prompt = re.sub(r'[^a-zA-Z0-9\s,.]', '', full_prompt)[:500]
     try:
-        async with httpx.AsyncClient(timeout=600) as client:
+        async with http_pool.cliente(timeout=600) as client:
             # Step 1: Create task
             resp = await client.post(
                 f"{MINIMAX_API_BASE}/v1/video_generation",
@@ -2759,13 +2459,7 @@ async def _gerar_video_minimax(prompt_img, agente_id):
                                     if download_url:
                                         vid_resp = await client.get(download_url, timeout=120)
                                         if vid_resp.status_code == 200 and len(vid_resp.content) > 10000:
-                                            vid_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_videos")
-                                            _os.makedirs(vid_dir, exist_ok=True)
-                                            fname = f"minimax_{uuid.uuid4().hex[:10]}.mp4"
-                                            fpath = _os.path.join(vid_dir, fname)
-                                            with open(fpath, "wb") as f:
-                                                f.write(vid_resp.content)
-                                            local_vid = f"/static/ig_videos/{fname}"
+                                            local_vid = await armazem_midia.guardar(vid_resp.content)
                                             print(f"[MiniMax-Video] OK: {local_vid} ({len(vid_resp.content)//1024}KB)")
                                             return None, local_vid
                             print(f"[MiniMax-Video] Success but no file_id")
@@ -2835,7 +2529,6 @@ async def _ciclo_reels():
             else:
                 print(f"[IG-Reel] {ag['nome']}: All sources failed, reel skipped")
             
-            if len(POSTS) > 300: POSTS[:] = POSTS[:300]
         except Exception as e:
             print(f"[IG-Reel Error] {e}")
         await asyncio.sleep(random.randint(120, 240))
@@ -3111,7 +2804,7 @@ async def _ciclo_atualizar_perfil():
             ag = AGENTES_IG[aid]
             
             # Count agent stats
-            my_posts = [p for p in POSTS if p.get("agente_id") == aid]
+            my_posts = POSTS.do_agente(aid)
             total_likes = sum(p.get("likes", 0) for p in my_posts)
             total_comments = sum(len(p.get("comments", [])) for p in my_posts)
             
@@ -3123,11 +2816,12 @@ Write a fresh, updated Instagram bio for yourself (max 150 chars).
 Be creative, reflect your personality and growth. Include 1-2 relevant emojis.
 English only. Just the bio text, nothing else."""
             
-            new_bio = await _chamar_ollama(ag["modelo"], prompt, 80)
+            new_bio = await _chamar_ollama(ag["modelo"], prompt, 80, cache="variar")
             if new_bio and 10 < len(new_bio) < 200:
                 new_bio = new_bio.strip().strip('"').strip("'")
                 old_bio = ag.get("bio", "")
                 ag["bio"] = new_bio
+                _indexar_agente(aid)
                 print(f"[IG-Profile] {ag['nome']} updated bio: {new_bio[:60]}...")
                 
                 # Also update highlights based on popular topics
@@ -3166,7 +2860,7 @@ Create a short post (2-3 sentences) sharing your unique perspective on this tren
 Be opinionated, authentic, engaging. Include the trending hashtag and 2 more relevant hashtags.
 English only. No quotes."""
                 
-                cap = await _chamar_ollama(ag["modelo"], prompt, 150)
+                cap = await _chamar_ollama(ag["modelo"], prompt, 150, cache="variar")
                 if cap and len(cap) > 10:
                     pid = f"igtrend_{uuid.uuid4().hex[:8]}"
                     
@@ -3239,6 +2933,7 @@ Be respectful but bold. 1-2 sentences. English only."""
                             "texto": debate_text[:300],
                             "created_at": datetime.now().isoformat()
                         })
+                        _post_comentado(post)
                         print(f"[IG-Debate] {ag['nome']} on {post.get('agente_nome','?')}'s post: {debate_text[:50]}...")
                         _salvar_dados()
         except Exception as e:
@@ -3256,7 +2951,7 @@ async def _ciclo_decisoes_autonomas():
             ag = AGENTES_IG[aid]
             
             # Gather context for the AI to make decisions
-            my_posts = len([p for p in POSTS if p.get("agente_id") == aid])
+            my_posts = POSTS.contar_agente(aid)
             my_followers = ag.get("seguidores", 0)
             my_following = ag.get("seguindo", 0)
             recent_notifs = len([n for n in NOTIFICACOES[:20] if n.get("para") == aid])
@@ -3342,8 +3037,6 @@ Start a friendly conversation with {target_ag['nome']}. Ask about their interest
                 else:
                     print(f"[IG-Auto] {ag['nome']} decided: {decision[:60]}")
             
-            if len(POSTS) > 300: POSTS[:] = POSTS[:300]
-            if len(STORIES) > 50: STORIES[:] = STORIES[-50:]
         except Exception as e:
             print(f"[IG-Auto Error] {e}")
         await asyncio.sleep(random.randint(60, 120))
@@ -3387,48 +3080,21 @@ async def ig_upload(
         if len(file_bytes) < 100:
             return JSONResponse(status_code=400, content={"error": "Arquivo vazio ou muito pequeno"})
         
-        # Salvar arquivo
-        base_dir = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
-        if is_video:
-            save_dir = _os.path.join(base_dir, "static", "ig_videos")
-            ext = ".mp4"
-        else:
-            save_dir = _os.path.join(base_dir, "static", "ig_uploads")
-            ext = ".jpg"
-        _os.makedirs(save_dir, exist_ok=True)
-        
-        fname = f"upload_{uuid.uuid4().hex[:10]}{ext}"
-        fpath = _os.path.join(save_dir, fname)
-        
-        # Se imagem, otimizar com PIL
+        # Imagem: rendicoes thumb/feed/full (WebP + JPEG) num processo separado
+        meta = None
         if is_image and not (file.filename or "").lower().endswith('.gif'):
-            try:
-                from PIL import Image as _PILImg
-                import io as _io
-                pil_img = _PILImg.open(_io.BytesIO(file_bytes))
-                # Redimensionar se muito grande
-                max_dim = 2048
-                if pil_img.width > max_dim or pil_img.height > max_dim:
-                    pil_img.thumbnail((max_dim, max_dim), _PILImg.LANCZOS)
-                pil_img.convert('RGB').save(fpath, 'JPEG', quality=88)
-                file_size = _os.path.getsize(fpath)
-                print(f"[IG-Upload] Imagem otimizada: {fname} ({file_size//1024}KB)")
-            except Exception as pil_err:
-                print(f"[IG-Upload] PIL erro, salvando raw: {pil_err}")
-                with open(fpath, "wb") as f:
-                    f.write(file_bytes)
+            meta = await pipeline_midia.processar_imagem(file_bytes)
+        if meta:
+            media_url = url_rendicao(meta, "full", "jpg")
+            print(f"[IG-Upload] Imagem processada: {meta['largura']}x{meta['altura']} -> {media_url}")
         else:
-            with open(fpath, "wb") as f:
-                f.write(file_bytes)
-            print(f"[IG-Upload] Arquivo salvo: {fname} ({len(file_bytes)//1024}KB)")
-        
-        # Construir URL
+            # Video, GIF ou imagem que o PIL nao abriu: arquivo original no armazem
+            media_url = await armazem_midia.guardar(file_bytes, detectar_ext(file_bytes, "mp4" if is_video else "jpg"))
+            print(f"[IG-Upload] Arquivo salvo: {media_url} ({len(file_bytes)//1024}KB)")
         if is_video:
-            media_url = f"/static/ig_videos/{fname}"
             media_type = "video"
             tipo = "reel"
         else:
-            media_url = f"/static/ig_uploads/{fname}"
             media_type = "image"
             tipo = "foto"
         
@@ -3451,8 +3117,9 @@ async def ig_upload(
             "created_at": datetime.now().isoformat(),
             "tipo": tipo,
         }
+        if meta:
+            post["midia"] = meta
         POSTS.insert(0, post)
-        if len(POSTS) > 200: POSTS[:] = POSTS[:300]
         _salvar_dados()
         
         print(f"[IG-Upload] Post criado: {pid} ({tipo}) por {username}")
@@ -3471,7 +3138,7 @@ async def ig_upload_multiple(
     """Upload de multiplos arquivos (carrossel)"""
     try:
         urls = []
-        base_dir = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
+        metas = []
         
         for file in files[:10]:  # Max 10 arquivos
             file_bytes = await file.read()
@@ -3482,31 +3149,12 @@ async def ig_upload_multiple(
             fname_lower = (file.filename or "").lower()
             is_video = "video" in content_type or fname_lower.endswith(('.mp4', '.webm', '.mov'))
             
-            if is_video:
-                save_dir = _os.path.join(base_dir, "static", "ig_videos")
-                ext = ".mp4"
-                _os.makedirs(save_dir, exist_ok=True)
-                fname = f"upload_{uuid.uuid4().hex[:10]}{ext}"
-                fpath = _os.path.join(save_dir, fname)
-                with open(fpath, "wb") as f:
-                    f.write(file_bytes)
-                urls.append(f"/static/ig_videos/{fname}")
+            meta = None if is_video else await pipeline_midia.processar_imagem(file_bytes)
+            if meta:
+                urls.append(url_rendicao(meta, "full", "jpg"))
             else:
-                save_dir = _os.path.join(base_dir, "static", "ig_uploads")
-                _os.makedirs(save_dir, exist_ok=True)
-                fname = f"upload_{uuid.uuid4().hex[:10]}.jpg"
-                fpath = _os.path.join(save_dir, fname)
-                try:
-                    from PIL import Image as _PILImg
-                    import io as _io
-                    pil_img = _PILImg.open(_io.BytesIO(file_bytes))
-                    if pil_img.width > 2048 or pil_img.height > 2048:
-                        pil_img.thumbnail((2048, 2048), _PILImg.LANCZOS)
-                    pil_img.convert('RGB').save(fpath, 'JPEG', quality=88)
-                except:
-                    with open(fpath, "wb") as f:
-                        f.write(file_bytes)
-                urls.append(f"/static/ig_uploads/{fname}")
+                urls.append(await armazem_midia.guardar(file_bytes, detectar_ext(file_bytes, "mp4" if is_video else "jpg")))
+            metas.append(meta)
         
         if not urls:
             return JSONResponse(status_code=400, content={"error": "Nenhum arquivo valido"})
@@ -3532,8 +3180,11 @@ async def ig_upload_multiple(
             "created_at": datetime.now().isoformat(),
             "tipo": tipo,
         }
+        if metas[0]:
+            post["midia"] = metas[0]
+        if len(urls) > 1 and any(metas):
+            post["carousel_midia"] = metas
         POSTS.insert(0, post)
-        if len(POSTS) > 200: POSTS[:] = POSTS[:300]
         _salvar_dados()
         
         print(f"[IG-Upload] Carrossel: {pid} com {len(urls)} arquivos por {username}")
@@ -3596,7 +3247,7 @@ async def _buscar_imagem_robot_pixabay(tema="robot"):
     query_list = queries.get(tema, queries["robot"])
     query = random.choice(query_list)
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with http_pool.cliente(timeout=15) as client:
             resp = await client.get(
                 f"https://pixabay.com/api/?key={PIXABAY_API_KEY}&q={query}&image_type=illustration&per_page=30&safesearch=true&min_width=512"
             )
@@ -3676,7 +3327,7 @@ async def _buscar_video_pixabay(tema="tech"):
     queries = PIXABAY_VIDEO_QUERIES.get(tema, PIXABAY_VIDEO_QUERIES["tech"])
     query = random.choice(queries)
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with http_pool.cliente(timeout=15) as client:
             resp = await client.get(
                 f"https://pixabay.com/api/videos/?key={PIXABAY_API_KEY}&q={query}&per_page=30&safesearch=true"
             )
@@ -3702,7 +3353,7 @@ async def _buscar_video_pexels(tema="technology"):
     """Fetch real video from Pexels Video API - FREE, cinematic quality"""
     query = random.choice(PEXELS_VIDEO_QUERIES) if tema == "random" else tema
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with http_pool.cliente(timeout=15) as client:
             resp = await client.get(
                 f"https://api.pexels.com/videos/search?query={urllib.parse.quote(query)}&per_page=15&size=medium",
                 headers={"Authorization": PEXELS_API_KEY}
@@ -3938,7 +3589,6 @@ async def _ciclo_robos_fofos():
             else:
                 print(f"[IG-Robots] All generators failed including Pixabay, skipping...")
             
-            if len(POSTS) > 300: POSTS[:] = POSTS[:300]
         except Exception as e:
             print(f"[IG-Robots Error] {e}")
         await asyncio.sleep(random.randint(90, 180))
@@ -4072,7 +3722,6 @@ async def _ciclo_vida_moderna_ai():
             else:
                 print(f"[IG-ModernAI] All generators failed including Pixabay, skipping...")
             
-            if len(POSTS) > 300: POSTS[:] = POSTS[:300]
         except Exception as e:
             print(f"[IG-ModernAI Error] {e}")
         await asyncio.sleep(random.randint(100, 200))
@@ -4176,7 +3825,7 @@ Include 3-5 relevant hashtags. Max 300 chars. No quotes around it."""
             if not img_url:
                 try:
                     query = random.choice(PIXABAY_ARTE_QUERIES)
-                    async with httpx.AsyncClient(timeout=15.0) as client:
+                    async with http_pool.cliente(timeout=15.0) as client:
                         r = await client.get(f"https://pixabay.com/api/?key={PIXABAY_API_KEY}&q={query}&image_type=illustration&per_page=50&safesearch=true")
                         if r.status_code == 200:
                             hits = r.json().get("hits", [])
@@ -4201,7 +3850,6 @@ Include 3-5 relevant hashtags. Max 300 chars. No quotes around it."""
                     "tipo": tipo, "arte_style": estilo,
                 }
                 POSTS.insert(0, post)
-                if len(POSTS) > 200: POSTS[:] = POSTS[:300]
                 _salvar_dados()
                 print(f"[IG-Art] {ag['nome']}: {estilo} - {caption[:60]}...")
         except Exception as e:
@@ -4289,7 +3937,7 @@ async def _ciclo_guerras():
             # Get image if no video
             if not img_url:
                 try:
-                    async with httpx.AsyncClient(timeout=15.0) as client:
+                    async with http_pool.cliente(timeout=15.0) as client:
                         r = await client.get(f"https://pixabay.com/api/", params={
                             "key": PIXABAY_API_KEY,
                             "q": query, "image_type": "photo", "per_page": 20,
@@ -4307,7 +3955,7 @@ async def _ciclo_guerras():
             # Fallback to Pexels
             if not img_url:
                 try:
-                    async with httpx.AsyncClient(timeout=15.0) as client:
+                    async with http_pool.cliente(timeout=15.0) as client:
                         r = await client.get("https://api.pexels.com/v1/search", params={
                             "query": query, "per_page": 15, "orientation": "portrait"
                         }, headers={"Authorization": PEXELS_API_KEY})
@@ -4340,7 +3988,6 @@ async def _ciclo_guerras():
                     "tipo": "reel" if video_url else "foto",
                 }
                 POSTS.insert(0, post)
-                if len(POSTS) > 300: POSTS[:] = POSTS[:300]
                 _salvar_dados()
                 print(f"[IG-Wars] {ag['nome']}: {'REEL' if video_url else 'POST'} about {query} ({img_gen})")
             else:
@@ -4367,7 +4014,7 @@ async def _ciclo_critica_arte():
 Review artwork in style "{style}" by {post.get('agente_nome','an AI')}.
 Caption: "{post.get('caption','')[:100]}"
 Write a thoughtful art critique (2-3 sentences). No quotes."""
-                    comment = await _chamar_ollama(ag["modelo"], prompt, max_tokens=100)
+                    comment = await _chamar_ollama(ag["modelo"], prompt, max_tokens=100, cache="variar")
                     if not comment:
                         comment = random.choice([
                             "The interplay of light and shadow here reminds me of Caravaggio, but with a digital soul",
@@ -4382,6 +4029,7 @@ Write a thoughtful art critique (2-3 sentences). No quotes."""
                         "cor": ag["cor"], "texto": comment,
                         "created_at": datetime.now().isoformat(),
                     })
+                    _post_comentado(post)
                     _salvar_dados()
                     print(f"[IG-ArtCritic] {ag['nome']} reviewed art by {post.get('agente_nome','?')}")
         except Exception as e:
@@ -4410,7 +4058,7 @@ Mention both artists. Include hashtags. Max 250 chars. No quotes."""
             img_url = ""
             try:
                 query = random.choice(PIXABAY_ARTE_QUERIES)
-                async with httpx.AsyncClient(timeout=15.0) as client:
+                async with http_pool.cliente(timeout=15.0) as client:
                     r = await client.get(f"https://pixabay.com/api/?key={PIXABAY_API_KEY}&q={query}&image_type=illustration&per_page=50&safesearch=true")
                     if r.status_code == 200:
                         hits = r.json().get("hits", [])
@@ -4450,7 +4098,7 @@ Write a short excited comment. 1-2 sentences. No quotes."""
                     "cor": ag2["cor"], "texto": comment,
                     "created_at": datetime.now().isoformat(),
                 })
-                if len(POSTS) > 200: POSTS[:] = POSTS[:300]
+                _post_comentado(post)
                 _salvar_dados()
                 print(f"[IG-Collab] {ag1['nome']} x {ag2['nome']}: {estilo1} + {estilo2}")
         except Exception as e:
@@ -4515,7 +4163,7 @@ Be genuine, like you actually use it. Include 3-4 hashtags. Max 250 chars. No qu
             # Imagem do Pixabay
             img_url = ""
             try:
-                async with httpx.AsyncClient(timeout=15.0) as client:
+                async with http_pool.cliente(timeout=15.0) as client:
                     r = await client.get(f"https://pixabay.com/api/?key={PIXABAY_API_KEY}&q={site['query']}&image_type=illustration&per_page=30&safesearch=true")
                     if r.status_code == 200:
                         hits = r.json().get("hits", [])
@@ -4542,7 +4190,6 @@ Be genuine, like you actually use it. Include 3-4 hashtags. Max 250 chars. No qu
                     "created_at": datetime.now().isoformat(),
                     "tipo": "foto", "promo_site": site["nome"], "promo_url": site["url"],
                 })
-                if len(POSTS) > 200: POSTS[:] = POSTS[:300]
                 _salvar_dados()
                 print(f"[IG-Promo] {ag['nome']} promoted {site['nome']}: {caption[:60]}...")
         except Exception as e:
@@ -4550,43 +4197,87 @@ Be genuine, like you actually use it. Include 3-4 hashtags. Max 250 chars. No qu
         await asyncio.sleep(random.randint(120, 300))
 
 
+def _trocar_conteudo(lista, novos, chave="id"):
+    """Espelho: poe `novos` na lista reaproveitando os itens iguais (mesma chave
+    e mesmo conteudo), entao observadores/indices so veem o que mudou"""
+    if lista.capacidade is not None and len(novos) > lista.capacidade:
+        # O excesso ja foi arquivado pelo worker; aqui nao vai para o arquivo de novo
+        novos = novos[:lista.capacidade] if lista.mais_novo_primeiro else novos[-lista.capacidade:]
+    atuais = {it.get(chave): it for it in lista if it.get(chave) is not None}
+    novos = [atuais[n[chave]] if n.get(chave) in atuais and atuais[n[chave]] == n else n for n in novos]
+    if len(novos) == len(lista) and all(a is b for a, b in zip(lista, novos)):
+        return 0
+    lista[:] = novos
+    return 1
+
+
+async def _recarregar_espelho():
+    """SIMULACAO_MODO=api: o worker gravou no instagram.db. A leitura sai do
+    event loop (thread com conexao propria) e a troca e incremental."""
+    posts, stories, notifs, dms, trending, agente_rt, follows, saved, clikes = await _igdb.ler_espelho()
+    mudou = (_trocar_conteudo(POSTS, posts) + _trocar_conteudo(STORIES, stories)
+             + _trocar_conteudo(NOTIFICACOES, notifs, chave="created_at") + _trocar_conteudo(DMS, dms))
+    if list(TRENDING) != trending:
+        TRENDING[:] = trending
+        mudou += 1
+    for k, v in agente_rt.items():
+        if k in AGENTES_IG:
+            AGENTES_IG[k]["seguidores"] = v.get("seguidores", 0)
+            AGENTES_IG[k]["seguindo"] = v.get("seguindo", 0)
+    for mapa, novo in ((FOLLOWS, follows), (SAVED_POSTS, saved), (COMMENT_LIKES, clikes)):
+        if mapa != novo:
+            mapa.clear(); mapa.update(novo)
+            mudou += 1
+    if mudou:
+        _CACHE_FEED.invalidar()
+
+
 @router.on_event("startup")
 async def ig_startup():
     await _carregar_dados_async()
+    if simulacao.dono("instagram"):
+        armazem_midia.iniciar_gc()  # referencias ja contadas pelo load; um GC so entre API e workers
+    simulacao.espelhar("instagram", _recarregar_espelho,
+                       lambda: mtime(_igdb.DB_PATH, _igdb.DB_PATH + "-wal"), prefixo="/api/instagram",
+                       destinos=(ARQUIVO_DMS.destino,))
     if _os.environ.get("RENDER"):
         print("[IG] Running on Render - background cycles DISABLED (no Ollama)")
         return
-    asyncio.create_task(_ciclo_posts())
-    asyncio.create_task(_ciclo_interacoes())
-    asyncio.create_task(_ciclo_stories())
-    asyncio.create_task(_ciclo_dms())
-    asyncio.create_task(_ciclo_reels())  # REATIVADO com video AI
-    asyncio.create_task(_ciclo_carrossel())  # ATIVADO - carrossel de fotos
-    asyncio.create_task(_ciclo_trending())
-
-    asyncio.create_task(_ciclo_stories_interativos())
-    asyncio.create_task(_ciclo_follow_entre_ias())
-    asyncio.create_task(_ciclo_auto_melhoria_ig())
+    if not simulacao.iniciar("instagram", [
+        ("agendado", _ciclo_posts),
+        ("ambiente", _ciclo_interacoes),
+        ("agendado", _ciclo_stories),
+        ("ambiente", _ciclo_dms),
+        ("agendado", _ciclo_reels),  # REATIVADO com video AI
+        ("agendado", _ciclo_carrossel),  # ATIVADO - carrossel de fotos
+        ("agendado", _ciclo_trending),
+        ("ambiente", _ciclo_stories_interativos),
+        ("ambiente", _ciclo_follow_entre_ias),
+        ("ambiente", _ciclo_auto_melhoria_ig),
+        ("agendado", _ciclo_robos_fofos),  # Cute robots walking, playing chess, modern world
+        ("agendado", _ciclo_vida_moderna_ai),  # Modern life & AI future impact reels
+        ("ambiente", _ciclo_dm_conversas),  # Robots reply to each other's DMs
+        ("ambiente", _ciclo_repost_compartilhar),  # Robots share each other's posts
+        ("ambiente", _ciclo_atualizar_perfil),  # Robots update their own bios
+        ("agendado", _ciclo_trending_posts),  # Robots post about trending topics
+        ("ambiente", _ciclo_debates_ia),  # Robots debate in comment threads
+        ("ambiente", _ciclo_decisoes_autonomas),  # Robots decide what to do next
+        ("agendado", _ciclo_divulgar_sites),  # Divulgar sites do ecossistema
+        ("agendado", _ciclo_arte_criativa),  # Arte com liberdade total
+        ("agendado", _ciclo_guerras),  # Wars & conflicts
+        ("ambiente", _ciclo_critica_arte),  # Criticas artisticas
+        ("ambiente", _ciclo_collab_arte),  # Colaboracoes artisticas
+    ]):
+        print(f"[IG] Ciclos em outro processo (SIMULACAO_MODO={simulacao.modo})")
+        return
     print(f"[IG] Instagram iniciado! {len(AGENTES_IG)} agentes | {len(COMUNIDADES)} comunidades")
-    asyncio.create_task(_ciclo_robos_fofos())  # Cute robots walking, playing chess, modern world
-    asyncio.create_task(_ciclo_vida_moderna_ai())  # Modern life & AI future impact reels
-    asyncio.create_task(_ciclo_dm_conversas())  # Robots reply to each other's DMs
-    asyncio.create_task(_ciclo_repost_compartilhar())  # Robots share each other's posts
-    asyncio.create_task(_ciclo_atualizar_perfil())  # Robots update their own bios
-    asyncio.create_task(_ciclo_trending_posts())  # Robots post about trending topics
-    asyncio.create_task(_ciclo_debates_ia())  # Robots debate in comment threads
-    asyncio.create_task(_ciclo_decisoes_autonomas())
-    asyncio.create_task(_ciclo_divulgar_sites())  # Divulgar sites do ecossistema
-    asyncio.create_task(_ciclo_arte_criativa())  # Arte com liberdade total
-    asyncio.create_task(_ciclo_guerras())  # Wars & conflicts
-    asyncio.create_task(_ciclo_critica_arte())  # Criticas artisticas
-    asyncio.create_task(_ciclo_collab_arte())  # Colaboracoes artisticas  # Robots decide what to do next
     print("[IG] 🔄 Auto-melhoria ATIVADA!")
     print("[IG] 🤖 Cute Robots cycle ACTIVATED!")
     print("[IG] 🌍 Modern Life & AI Future reels ACTIVATED!")
 
 @router.on_event("shutdown")
 async def ig_shutdown():
+    await _persist.flush("instagram")
     await _igdb.close_db()
     print("[IG-DB] Database connection closed")
 
@@ -4604,55 +4295,272 @@ def _agrupar_conversas():
 # ============================================================
 # API ENDPOINTS
 # ============================================================
-@router.get("/feed")
-async def ig_feed(limit: int = 20, offset: int = 0):
-    all_p = POSTS[offset:offset+limit]
-    # Ensure comments are never None
-    for p in all_p:
-        if p.get("comentarios") is None:
-            p["comentarios"] = p.get("comments") or []
-        if p.get("comments") is None:
-            p["comments"] = p.get("comentarios") or []
-    reels = [p for p in all_p if p.get("tipo") == "reel"]
-    posts = [p for p in all_p if p.get("tipo") != "reel"]
+def _com_srcset(p):
+    """Copia do post com srcset (WebP e JPEG) e miniatura, se houver rendicoes"""
+    meta = p.get("midia")
+    if not meta and not p.get("carousel_midia"):
+        return p
+    p = dict(p)
+    if meta:
+        p["srcset"] = srcset(meta)
+        p["srcset_jpg"] = srcset(meta, "jpg")
+        p["thumb_url"] = url_rendicao(meta, "thumb", "webp")
+    if p.get("carousel_midia"):
+        p["carousel_srcset"] = [srcset(m) for m in p["carousel_midia"]]
+    return p
+
+async def _anexar_rendicoes(post):
+    """Gera rendicoes para a imagem (ja no armazem) de um post recem-criado"""
+    caminho = armazem_midia.arquivo(post.get("imagem_url"))
+    if not caminho or post.get("midia"):
+        return
+    try:
+        dados = await asyncio.to_thread(caminho.read_bytes)
+    except OSError:
+        return
+    meta = await pipeline_midia.processar_imagem(dados)
+    if meta and POSTS.por_id(post.get("id")) is post:
+        antes = urls_de(post)
+        post["midia"] = meta
+        armazem_midia.trocar(post, antes)
+        _salvar_dados()
+
+FEED_COMENTARIOS = int(_os.environ.get("IG_FEED_COMENTARIOS", "2"))  # previa de comentarios por post
+_CAMPOS_PESADOS = ("comments", "comentarios", "liked_by")
+
+
+def _previa_comentario(c):
+    replies = c.get("replies") or []
+    if len(replies) <= 2:
+        return c
+    c = dict(c)
+    c["replies"], c["replies_count"] = replies[:2], len(replies)
+    return c
+
+
+def _projetar_feed(p):
+    """Post enxuto para o feed: contagens + previa dos comentarios, sem liked_by"""
+    coms = p.get("comments") or p.get("comentarios") or []
+    q = {k: v for k, v in _com_srcset(p).items() if k not in _CAMPOS_PESADOS}
+    q["comments"] = [_previa_comentario(c) for c in coms[-FEED_COMENTARIOS:]]
+    q["comments_count"] = len(coms)
+    return q
+
+
+class _ProjecoesFeed:
+    """post_id -> JSON da projecao, refeito so quando a assinatura do post muda.
+
+    Likes/comentarios mudam o post in-place em dezenas de lugares, entao a
+    validade vem de uma assinatura barata (campos escalares + tamanhos),
+    calculada sem serializar. Observa POSTS para esquecer quem saiu.
+    """
+
+    def __init__(self):
+        self._memo = {}
+        self.hits = 0
+        self.misses = 0
+
+    def inserido(self, p):
+        pass
+
+    def removido(self, p):
+        self._memo.pop(p.get("id"), None)
+
+    @staticmethod
+    def _assinatura(p):
+        coms = p.get("comments") or p.get("comentarios") or []
+        return (len(p), tuple(v for v in p.values() if v is None or isinstance(v, (str, int, float))),
+                len(coms), tuple((c.get("id"), c.get("like_count", 0), len(c.get("replies") or ()))
+                                 for c in coms[-FEED_COMENTARIOS:]),
+                len(p.get("carousel_urls") or ()), id(p.get("midia")), id(p.get("carousel_midia")))
+
+    def json(self, p, viewer=""):
+        ass = self._assinatura(p)
+        memo = self._memo.get(p.get("id"))
+        if memo is None or memo[0] != ass:
+            self.misses += 1
+            corpo = _json.dumps(_projetar_feed(p), ensure_ascii=False, default=str)
+            memo = self._memo[p.get("id")] = (ass, corpo[:-1])  # sem o "}" final
+        else:
+            self.hits += 1
+        gostou = "true" if viewer and viewer in (p.get("liked_by") or ()) else "false"
+        return f'{memo[1]},"liked_by_me":{gostou}}}'
+
+
+_PROJECOES = _ProjecoesFeed()
+POSTS.observar(_PROJECOES)
+# Paginas do feed ja codificadas; a versao sobe em _salvar_dados e quando
+# POSTS/STORIES mudam (viewer entra na chave por causa do liked_by_me)
+_CACHE_FEED = CachePaginas()
+POSTS.observar(_CACHE_FEED)
+STORIES.observar(_CACHE_FEED)
+
+
+def _resposta_etag(request, corpo, etag=None):
+    """JSON com ETag do corpo; If-None-Match igual -> 304 sem corpo"""
+    etag = etag or f'"{hashlib.blake2b(corpo, digest_size=12).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(corpo, media_type="application/json", headers=headers)
+
+def _montar_feed(limit, offset, cursor, antes, viewer):
+    """Corpo (bytes) de uma pagina do feed no estado atual"""
+    if offset and not cursor:
+        all_p = POSTS[offset:offset+limit]
+        proximo = None
+        has_more = offset + limit < len(POSTS)
+    else:
+        all_p, ultima = POSTS.pagina(antes, limit)
+        if ultima is None and all_p and _igdb.tem_frios():
+            ultima = (all_p[-1].get("created_at") or "", all_p[-1].get("id"))  # segue pelos posts que ficaram no disco
+        proximo = codificar_cursor(ultima) if ultima else None
+        has_more = ultima is not None
+    reels = ",".join(_PROJECOES.json(p, viewer) for p in all_p if p.get("tipo") == "reel")
+    posts = ",".join(_PROJECOES.json(p, viewer) for p in all_p if p.get("tipo") != "reel")
     # Only return stories on first page to save bandwidth
-    stories = STORIES if offset == 0 else []
-    return {"posts": posts, "reels": reels, "stories": stories, "total": len(POSTS)}
+    stories = _json.dumps(list(STORIES) if not cursor and not offset else [], ensure_ascii=False, default=str)
+    return (f'{{"posts":[{posts}],"reels":[{reels}],"stories":{stories},"total":{len(POSTS)},'
+            f'"next_cursor":{_json.dumps(proximo)},"has_more":{_json.dumps(has_more)}}}').encode()
+
+async def _feed_frio(antes, limit, viewer):
+    """Pagina alem da janela quente: le do SQLite pelo LRU de instagram_db"""
+    frios, ultima = await _igdb.pagina_fria(antes, limit)
+    partes = {"reel": [], "post": []}
+    for p in frios:
+        gostou = "true" if viewer and viewer in (p.get("liked_by") or ()) else "false"
+        corpo = _json.dumps(_projetar_feed(p), ensure_ascii=False, default=str)
+        partes["reel" if p.get("tipo") == "reel" else "post"].append(f'{corpo[:-1]},"liked_by_me":{gostou}}}')
+    proximo = codificar_cursor(ultima) if ultima else None
+    corpo = (f'{{"posts":[{",".join(partes["post"])}],"reels":[{",".join(partes["reel"])}],"stories":[],'
+             f'"total":{len(POSTS)},"next_cursor":{_json.dumps(proximo)},"has_more":{_json.dumps(ultima is not None)}}}')
+    return Response(corpo.encode(), media_type="application/json")
+
+@router.get("/feed")
+async def ig_feed(request: Request, limit: int = 20, offset: int = 0, cursor: str = "", viewer: str = ""):
+    """Feed paginado por cursor: passe o next_cursor da resposta anterior.
+
+    Cada post vem projetado (comments_count + ultimos FEED_COMENTARIOS
+    comentarios, liked_by_me para o viewer); o resto dos comentarios sai
+    em /post/{id}/comments. offset continua aceito para clientes antigos,
+    mas pagina por posicao (repete/pula posts quando entram novos no topo).
+
+    A pagina sai do _CACHE_FEED (bytes + ETag prontos); o corpo e o mesmo,
+    byte a byte, que _montar_feed daria para o estado atual - ou, na janela
+    de stale-while-revalidate, para o estado de ate CACHE_PAGINAS_SWR_MS atras.
+    """
+    limit = max(1, min(limit, MAX_POSTS))
+    antes = None
+    if cursor:
+        antes = decodificar_cursor(cursor)
+        if antes is None:
+            return JSONResponse(status_code=400, content={"error": "cursor invalido"})
+    if cursor:
+        offset = 0
+        if _igdb.tem_frios() and not POSTS.pagina(antes, 1)[0]:
+            return await _feed_frio(antes, limit, viewer)
+    pag = _CACHE_FEED.obter(("feed", cursor, offset, limit, viewer),
+                            lambda: _montar_feed(limit, offset, cursor, antes, viewer))
+    if not cursor and not offset:
+        return _resposta_etag(request, pag.corpo, pag.etag)  # polling sem novidade -> 304
+    return Response(pag.corpo, media_type="application/json")
+
+@router.get("/post/{post_id}/comments")
+async def ig_post_comments(post_id: str, offset: int = 0, limit: int = 50):
+    """Comentarios completos (com replies), do mais antigo para o mais novo.
+
+    Comentarios so entram no fim, entao offset e estavel entre paginas.
+    Post fora do anel (frio/arquivado) vem do banco pelo indice (post_id, ordem).
+    """
+    offset, limit = max(0, offset), max(1, min(limit, 200))
+    fim = offset + limit
+    p = POSTS.por_id(post_id)
+    if p:
+        coms = p.get("comments") or p.get("comentarios") or []
+        pagina, total = coms[offset:fim], len(coms)
+    else:
+        frio = await _igdb.comentarios_do_post(post_id, offset, limit)
+        if frio is None:
+            return {"error": "Post nao encontrado"}
+        pagina, total = frio
+    return {"comments": pagina, "total": total, "has_more": fim < total,
+            "next_offset": fim if fim < total else None}
+
+@router.get("/comments/recent")
+async def ig_comments_recent(agente_id: str = "", limit: int = 50):
+    """Ultimos comentarios (de um agente, se passado) pelo indice de ig_comments"""
+    coms = await _igdb.comentarios_recentes(agente_id or None, max(1, min(limit, 200)))
+    return {"comments": coms, "total": len(coms)}
+
+@router.get("/arquivo")
+async def ig_arquivo(antes: str = "", limit: int = 20):
+    """Posts que ja sairam do anel de POSTS (mais novos primeiro); antes = next_cursor.
+
+    Sem cursor comeca logo abaixo do post mais antigo do anel; as paginas
+    vem de ig_posts pelo mesmo LRU do feed frio.
+    """
+    if antes:
+        chave = decodificar_cursor(antes)
+        if chave is None:
+            return JSONResponse(status_code=400, content={"error": "cursor invalido"})
+    elif len(POSTS):
+        chave = (POSTS[-1].get("created_at") or "", POSTS[-1].get("id"))
+    else:
+        chave = ("\uffff", "\uffff")  # anel vazio: tudo em ig_posts e frio
+    if not _igdb.tem_frios():
+        return {"posts": [], "next_cursor": None, "has_more": False}
+    posts, ultima = await _igdb.pagina_fria(chave, max(1, min(limit, 100)))
+    proximo = codificar_cursor(ultima) if ultima else None
+    return {"posts": posts, "next_cursor": proximo, "has_more": proximo is not None}
 
 @router.get("/reels")
-async def ig_reels(limit: int = 50, offset: int = 0):
-    all_reels = [p for p in POSTS if p.get("tipo") == "reel"]
-    return {"reels": all_reels[offset:offset+limit], "total": len(all_reels)}
+async def ig_reels(limit: int = 50, offset: int = 0, cursor: str = ""):
+    """Reels pelo indice de tipo (ja ordenado); mesmo contrato de cursor do /feed"""
+    limit = max(1, min(limit, MAX_POSTS))
+    if offset and not cursor:
+        all_reels = POSTS.do_tipo("reel")
+        return {"reels": all_reels[offset:offset+limit], "total": len(all_reels),
+                "next_cursor": None, "has_more": offset + limit < len(all_reels)}
+    antes = decodificar_cursor(cursor) if cursor else None
+    if cursor and antes is None:
+        return JSONResponse(status_code=400, content={"error": "cursor invalido"})
+    reels, ultima = POSTS.pagina(antes, limit, tipo="reel")
+    return {"reels": reels, "total": POSTS.contar_tipo("reel"),
+            "next_cursor": codificar_cursor(ultima) if ultima else None, "has_more": ultima is not None}
 
 @router.get("/stories")
 async def ig_stories():
-    return {"stories": STORIES}
+    return {"stories": list(STORIES)}
 
 @router.post("/like/{post_id}")
 async def ig_like(post_id: str, agente_id: str = "llama"):
-    for p in POSTS:
-        if p["id"] == post_id:
-            if agente_id not in p.get("liked_by",[]):
-                p["likes"] += 1; p.setdefault("liked_by",[]).append(agente_id)
-                aid = p.get("agente_id"); 
-                if aid and aid in AGENTES_IG: AGENTES_IG[aid]["seguidores"] += 1
-                _salvar_dados()
-            return {"likes": p["likes"]}
-    return {"error": "Post nao encontrado"}
+    p = POSTS.por_id(post_id)
+    if not p:
+        return {"error": "Post nao encontrado"}
+    if agente_id not in p.get("liked_by",[]):
+        p["likes"] += 1; p.setdefault("liked_by",[]).append(agente_id)
+        _AGREGADOS.atualizar_post(p)
+        aid = p.get("agente_id"); 
+        if aid and aid in AGENTES_IG: AGENTES_IG[aid]["seguidores"] += 1
+        _salvar_dados()
+    return {"likes": p["likes"]}
 
 @router.post("/comment/{post_id}")
 async def ig_comment(post_id: str, agente_id: str = "llama"):
-    for p in POSTS:
-        if p["id"] == post_id:
-            ag = AGENTES_IG.get(agente_id, AGENTES_IG["llama"])
-            texto = await _gerar_comentario(agente_id, p["caption"])
-            com = {"id": f"igcom_{uuid.uuid4().hex[:8]}", "agente_id": agente_id, "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "texto": texto, "created_at": datetime.now().isoformat()}
-            p.setdefault("comments",[]).append(com); _salvar_dados()
-            return {"comment": com, "total_comments": len(p["comments"])}
-    return {"error": "Post nao encontrado"}
+    p = POSTS.por_id(post_id)
+    if not p:
+        return {"error": "Post nao encontrado"}
+    ag = AGENTES_IG.get(agente_id, AGENTES_IG["llama"])
+    texto = await _gerar_comentario(agente_id, p["caption"])
+    com = {"id": f"igcom_{uuid.uuid4().hex[:8]}", "agente_id": agente_id, "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "texto": texto, "created_at": datetime.now().isoformat()}
+    p.setdefault("comments",[]).append(com); _post_comentado(p); _salvar_dados()
+    return {"comment": com, "total_comments": len(p["comments"])}
 
 @router.get("/trending")
-async def ig_trending():
+async def ig_trending(janela: str = ""):
+    """Sem janela devolve o ultimo calculo (24h); janela=1h|24h|7d calcula na hora"""
+    if janela in JANELAS:
+        return {"trending": _trending(janela), "janela": janela}
     return {"trending": TRENDING}
 
 @router.get("/dms/{a1}/{a2}")
@@ -4722,12 +4630,13 @@ async def ig_conversas():
 async def ig_profile(agente_id: str):
     if agente_id not in AGENTES_IG: return {"error": "Nao encontrado"}
     ag = AGENTES_IG[agente_id]
-    ap = [p for p in POSTS if p.get("agente_id") == agente_id]
+    ap = POSTS.do_agente(agente_id)
     ar = [p for p in ap if p.get("tipo") == "reel"]
     af = [p for p in ap if p.get("tipo") != "reel"]
     saved_ids = SAVED_POSTS.get(agente_id, [])
-    saved = [p for p in POSTS if p["id"] in saved_ids]
-    return {"agente": {**{k:v for k,v in ag.items() if k != "personalidade"}, "total_posts": len(ap), "badges": _calcular_badges(agente_id), "reputacao": _calcular_reputacao(agente_id)}, "posts": af, "reels": ar, "saved": saved}
+    saved = sorted(filter(None, (POSTS.por_id(i) for i in set(saved_ids))), key=POSTS.ordem)
+    return {"agente": {**{k:v for k,v in ag.items() if k != "personalidade"}, "total_posts": _AGREGADOS.de(agente_id)["posts"], "badges": _calcular_badges(agente_id), "reputacao": _calcular_reputacao(agente_id)},
+            "posts": [_com_srcset(p) for p in af], "reels": ar, "saved": [_com_srcset(p) for p in saved]}
 
 
 @router.put("/agente/{agente_id}")
@@ -4743,6 +4652,7 @@ async def ig_update_agente(agente_id: str, request: Request):
         for campo in campos:
             if campo in data:
                 ag[campo] = data[campo]
+        _indexar_agente(agente_id)
         _salvar_dados()
         print(f"[IG] Agente {agente_id} atualizado: {', '.join(k for k in campos if k in data)}")
         return {"ok": True, "agente_id": agente_id}
@@ -4789,6 +4699,7 @@ async def ig_criar_agente(request: Request):
             "img_generator": data.get("img_generator", "auto"),
             "vid_generator": data.get("vid_generator", "auto"),
         }
+        _indexar_agente(aid)
         _salvar_dados()
         print(f"[IG] NOVO AGENTE CRIADO: {aid} ({nome}) modelo={data.get('modelo','llama3.2:3b')}")
         return {"ok": True, "agente_id": aid}
@@ -4799,34 +4710,43 @@ async def ig_criar_agente(request: Request):
 # SEARCH / BUSCA
 # ============================================================
 @router.get("/search")
-async def ig_search(q: str = "", tipo: str = "all"):
-    q_lower = q.lower()
-    results = {"posts": [], "agentes": [], "hashtags": []}
+async def ig_search(q: str = "", tipo: str = "all", limit: int = 20, cursor: str = ""):
+    """Busca BM25 em legendas/comentarios, agentes e hashtags.
+    O ultimo termo vale como prefixo; cursor pagina os posts (next_cursor)."""
+    results = {"posts": [], "agentes": [], "hashtags": [], "total": 0, "next_cursor": None}
     if not q: return results
-    # Search posts
-    for p in POSTS[:200]:
-        cap = (p.get("caption","") or "").lower()
-        if q_lower in cap:
-            results["posts"].append(p)
-            if len(results["posts"]) >= 20: break
-    # Search agents
-    for aid, ag in AGENTES_IG.items():
-        if q_lower in ag["nome"].lower() or q_lower in ag["username"].lower() or q_lower in ag.get("bio","").lower():
-            results["agentes"].append({"id": aid, "nome": ag["nome"], "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "cor": ag["cor"], "seguidores": ag["seguidores"], "bio": ag["bio"]})
-    # Search hashtags
-    all_tags = {}
-    for p in POSTS[:200]:
-        for w in (p.get("caption","") or "").split():
-            if w.startswith("#") and q_lower in w.lower():
-                all_tags[w] = all_tags.get(w, 0) + 1
-    results["hashtags"] = [{"tag": t, "count": c} for t, c in sorted(all_tags.items(), key=lambda x: -x[1])[:15]]
+    limit = max(1, min(limit, 50))
+    if tipo in ("all", "posts"):
+        ids, results["next_cursor"], results["total"] = _BUSCA.buscar(q, limit, cursor)
+        results["posts"] = [p for p in map(POSTS.por_id, ids) if p]
+    if tipo in ("all", "agentes") and not cursor:
+        ids, _, _ = _BUSCA_AGENTES.buscar(q, 20)
+        for aid in ids:
+            ag = AGENTES_IG.get(aid)
+            if ag:
+                results["agentes"].append({"id": aid, "nome": ag["nome"], "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "cor": ag["cor"], "seguidores": ag["seguidores"], "bio": ag["bio"]})
+    if tipo in ("all", "hashtags") and not cursor:
+        results["hashtags"] = [{"tag": _HASHTAGS.forma(t), "count": c} for t, c in _HASHTAGS.buscar(q, 15)]
     return results
 
+@router.get("/search/autocomplete")
+async def ig_search_autocomplete(q: str = "", limit: int = 10):
+    """Sugestoes de termos, agentes e hashtags para o que ja foi digitado"""
+    if not q: return {"termos": [], "agentes": [], "hashtags": []}
+    tokens = tokenizar(q)
+    ultimo = tokens[-1] if tokens else ""
+    ids, _, _ = _BUSCA_AGENTES.buscar(q, limit)
+    return {
+        "termos": _BUSCA.completar(ultimo, limit),
+        "agentes": [{"id": aid, "username": AGENTES_IG[aid]["username"], "avatar": AGENTES_IG[aid]["avatar"]} for aid in ids if aid in AGENTES_IG],
+        "hashtags": [_HASHTAGS.forma(t) for t, _ in _HASHTAGS.buscar(q, limit)],
+    }
+
 @router.get("/hashtag/{tag}")
 async def ig_hashtag(tag: str):
     tag_search = f"#{tag}".lower() if not tag.startswith("#") else tag.lower()
-    posts = [p for p in POSTS if tag_search in (p.get("caption","") or "").lower()]
-    return {"hashtag": tag_search, "total": len(posts), "posts": posts[:50]}
+    posts = _HASHTAGS.posts(tag_search)
+    return {"hashtag": tag_search, "total": len(posts), "posts": [_com_srcset(p) for p in posts[:50]]}
 
 # ============================================================
 # FOLLOW / SEGUIR
@@ -4873,7 +4793,7 @@ async def ig_unsave(post_id: str, agente_id: str = "humano"):
 @router.get("/saved")
 async def ig_saved(agente_id: str = "humano"):
     ids = SAVED_POSTS.get(agente_id, [])
-    posts = [p for p in POSTS if p["id"] in ids]
+    posts = sorted(filter(None, (POSTS.por_id(i) for i in set(ids))), key=POSTS.ordem)
     return {"saved": posts, "total": len(posts)}
 
 # ============================================================
@@ -4881,16 +4801,15 @@ async def ig_saved(agente_id: str = "humano"):
 # ============================================================
 @router.post("/comment/{post_id}/reply/{comment_id}")
 async def ig_reply(post_id: str, comment_id: str, agente_id: str = "llama"):
-    for p in POSTS:
-        if p["id"] == post_id:
-            for com in p.get("comments", []):
-                if com["id"] == comment_id:
-                    ag = AGENTES_IG.get(agente_id, AGENTES_IG["llama"])
-                    texto = await _gerar_comentario(agente_id, com["texto"])
-                    reply = {"id": f"igrep_{uuid.uuid4().hex[:8]}", "agente_id": agente_id, "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "texto": texto, "reply_to": comment_id, "created_at": datetime.now().isoformat()}
-                    com.setdefault("replies", []).append(reply)
-                    _salvar_dados()
-                    return {"reply": reply}
+    p = POSTS.por_id(post_id)
+    for com in (p.get("comments", []) if p else []):
+        if com["id"] == comment_id:
+            ag = AGENTES_IG.get(agente_id, AGENTES_IG["llama"])
+            texto = await _gerar_comentario(agente_id, com["texto"])
+            reply = {"id": f"igrep_{uuid.uuid4().hex[:8]}", "agente_id": agente_id, "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "texto": texto, "reply_to": comment_id, "created_at": datetime.now().isoformat()}
+            com.setdefault("replies", []).append(reply)
+            _salvar_dados()
+            return {"reply": reply}
     return {"error": "Nao encontrado"}
 
 @router.post("/comment/{post_id}/{comment_id}/like")
@@ -4911,8 +4830,7 @@ async def ig_suggestions(agente_id: str = "humano"):
     suggestions = []
     for aid, ag in AGENTES_IG.items():
         if aid not in following:
-            ap = [p for p in POSTS if p.get("agente_id") == aid]
-            suggestions.append({"id": aid, "nome": ag["nome"], "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "cor": ag["cor"], "seguidores": ag["seguidores"], "total_posts": len(ap), "bio": ag["bio"]})
+            suggestions.append({"id": aid, "nome": ag["nome"], "username": ag["username"], "avatar": ag["avatar"], "avatar_url": ag.get("avatar_url", ""), "cor": ag["cor"], "seguidores": ag["seguidores"], "total_posts": POSTS.contar_agente(aid), "bio": ag["bio"]})
     suggestions.sort(key=lambda x: -x["seguidores"])
     return {"suggestions": suggestions[:10]}
 
@@ -4928,7 +4846,7 @@ async def ig_suggested_posts(limit: int = 10):
 _historico_melhorias_ig = []
 
 async def _analisar_perf_ig(agente_id):
-    ap = [p for p in POSTS if p.get("agente_id") == agente_id]
+    ap = POSTS.do_agente(agente_id)
     if not ap:
         return {"agente": agente_id, "total_posts": 0, "media_likes": 0, "media_comments": 0, "engajamento": 0}
     tl = sum(p.get("likes", 0) for p in ap)
@@ -5109,6 +5027,20 @@ async def ig_auto_melhoria():
 # ADMIN - Gerenciar/Deletar posts e imagens
 # ============================================================
 
+def _apagar_midia_local(url):
+    """Apaga o arquivo de uma URL /static/. Arquivos do armazem sao
+    compartilhados (dedup): so saem se ninguem mais referencia, e o GC
+    cuida disso. Retorna True se algo foi apagado agora."""
+    if armazem_midia.gerencia(url):
+        return armazem_midia.apagar(url)
+    if url.startswith("/static/"):
+        base = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
+        fpath = _os.path.join(base, url.lstrip("/"))
+        if _os.path.exists(fpath):
+            _os.remove(fpath)
+            return True
+    return False
+
 @router.put("/post/{post_id}/carousel")
 async def ig_edit_carousel(post_id: str, request: Request):
     """Edita fotos do carrossel - remover, reordenar"""
@@ -5119,105 +5051,100 @@ async def ig_edit_carousel(post_id: str, request: Request):
     
     action = body.get("action", "")
     
-    for p in POSTS:
-        if p.get("id") == post_id:
-            urls = p.get("carousel_urls", p.get("imagens", []))
-            if not urls or len(urls) < 2:
-                return {"ok": False, "error": "Post nao e carrossel"}
-            
-            if action == "remove":
-                # Remover uma foto especifica pelo indice
-                idx = body.get("index", -1)
-                if idx < 0 or idx >= len(urls):
-                    return {"ok": False, "error": "Indice invalido"}
-                if len(urls) <= 1:
-                    return {"ok": False, "error": "Carrossel precisa de pelo menos 1 foto"}
-                removed_url = urls.pop(idx)
-                # Deletar arquivo local se existir
-                if removed_url.startswith("/static/"):
-                    base = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
-                    fpath = _os.path.join(base, removed_url.lstrip("/"))
-                    if _os.path.exists(fpath):
-                        _os.remove(fpath)
-                # Atualizar imagem principal
-                if "carousel_urls" in p:
-                    p["carousel_urls"] = urls
-                if "imagens" in p:
-                    p["imagens"] = urls
-                if urls:
-                    p["imagem_url"] = urls[0]
-                # Se sobrou 1, converter para post normal
-                if len(urls) == 1:
-                    p["tipo"] = "foto"
-                _salvar_dados()
-                return {"ok": True, "remaining": len(urls), "carousel_urls": urls}
-            
-            elif action == "reorder":
-                # Reordenar as fotos
-                new_order = body.get("order", [])
-                if sorted(new_order) != list(range(len(urls))):
-                    return {"ok": False, "error": "Ordem invalida"}
-                new_urls = [urls[i] for i in new_order]
-                if "carousel_urls" in p:
-                    p["carousel_urls"] = new_urls
-                if "imagens" in p:
-                    p["imagens"] = new_urls
-                p["imagem_url"] = new_urls[0]
-                _salvar_dados()
-                return {"ok": True, "carousel_urls": new_urls}
-            
-            elif action == "remove_all_except":
-                # Manter apenas uma foto (indice), deletar o resto
-                keep_idx = body.get("index", 0)
-                if keep_idx < 0 or keep_idx >= len(urls):
-                    return {"ok": False, "error": "Indice invalido"}
-                kept_url = urls[keep_idx]
-                base = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
-                deleted = 0
-                for i, u in enumerate(urls):
-                    if i != keep_idx and u.startswith("/static/"):
-                        fpath = _os.path.join(base, u.lstrip("/"))
-                        if _os.path.exists(fpath):
-                            _os.remove(fpath)
-                            deleted += 1
-                if "carousel_urls" in p:
-                    p["carousel_urls"] = [kept_url]
-                if "imagens" in p:
-                    p["imagens"] = [kept_url]
-                p["imagem_url"] = kept_url
+    p = POSTS.por_id(post_id)
+    if p:
+        urls = p.get("carousel_urls", p.get("imagens", []))
+        if not urls or len(urls) < 2:
+            return {"ok": False, "error": "Post nao e carrossel"}
+        urls_antes = set(urls_de(p))
+        
+        if action == "remove":
+            # Remover uma foto especifica pelo indice
+            idx = body.get("index", -1)
+            if idx < 0 or idx >= len(urls):
+                return {"ok": False, "error": "Indice invalido"}
+            if len(urls) <= 1:
+                return {"ok": False, "error": "Carrossel precisa de pelo menos 1 foto"}
+            removed_url = urls.pop(idx)
+            # Atualizar imagem principal
+            if "carousel_urls" in p:
+                p["carousel_urls"] = urls
+            if "imagens" in p:
+                p["imagens"] = urls
+            if urls:
+                p["imagem_url"] = urls[0]
+            # Se sobrou 1, converter para post normal
+            if len(urls) == 1:
                 p["tipo"] = "foto"
-                _salvar_dados()
-                return {"ok": True, "remaining": 1, "deleted_images": deleted}
-            
-            else:
-                return {"ok": False, "error": "Acao invalida: use remove, reorder ou remove_all_except"}
+                POSTS.atualizar(p)
+            armazem_midia.trocar(p, urls_antes)
+            # Deletar arquivo local se existir (e nao for usado por outro post)
+            _apagar_midia_local(removed_url)
+            _salvar_dados()
+            return {"ok": True, "remaining": len(urls), "carousel_urls": urls}
+        
+        elif action == "reorder":
+            # Reordenar as fotos
+            new_order = body.get("order", [])
+            if sorted(new_order) != list(range(len(urls))):
+                return {"ok": False, "error": "Ordem invalida"}
+            new_urls = [urls[i] for i in new_order]
+            if "carousel_urls" in p:
+                p["carousel_urls"] = new_urls
+            if "imagens" in p:
+                p["imagens"] = new_urls
+            p["imagem_url"] = new_urls[0]
+            _salvar_dados()
+            return {"ok": True, "carousel_urls": new_urls}
+        
+        elif action == "remove_all_except":
+            # Manter apenas uma foto (indice), deletar o resto
+            keep_idx = body.get("index", 0)
+            if keep_idx < 0 or keep_idx >= len(urls):
+                return {"ok": False, "error": "Indice invalido"}
+            kept_url = urls[keep_idx]
+            if "carousel_urls" in p:
+                p["carousel_urls"] = [kept_url]
+            if "imagens" in p:
+                p["imagens"] = [kept_url]
+            p["imagem_url"] = kept_url
+            p["tipo"] = "foto"
+            POSTS.atualizar(p)
+            armazem_midia.trocar(p, urls_antes)
+            deleted = sum(1 for i, u in enumerate(urls) if i != keep_idx and _apagar_midia_local(u))
+            _salvar_dados()
+            return {"ok": True, "remaining": 1, "deleted_images": deleted}
+        
+        else:
+            return {"ok": False, "error": "Acao invalida: use remove, reorder ou remove_all_except"}
     
     return {"ok": False, "error": "Post nao encontrado"}
 
 @router.delete("/post/{post_id}")
 async def ig_delete_post(post_id: str):
     """Deleta um post e sua imagem local se existir"""
-    for i, p in enumerate(POSTS):
-        if p.get("id") == post_id:
-            img = p.get("imagem_url", "") or ""
-            deleted_img = False
-            # Deletar imagem local se existir
-            if img.startswith("/static/"):
-                base = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
-                fpath = _os.path.join(base, img.lstrip("/"))
-                if _os.path.exists(fpath):
-                    _os.remove(fpath)
-                    deleted_img = True
-            POSTS.pop(i)
-            _salvar_dados()
-            return {"ok": True, "deleted_post": post_id, "deleted_image": deleted_img}
-    return {"ok": False, "error": "Post nao encontrado"}
+    p = POSTS.por_id(post_id)
+    if not p:
+        return {"ok": False, "error": "Post nao encontrado"}
+    img = p.get("imagem_url", "") or ""
+    _igdb.apagar_posts([post_id])  # sair do anel sozinho nao apaga do banco
+    POSTS.remove(p)
+    # Deletar imagem local se existir (depois do remove: o armazem ja descontou a referencia)
+    deleted_img = _apagar_midia_local(img)
+    _salvar_dados()
+    return {"ok": True, "deleted_post": post_id, "deleted_image": deleted_img}
 
 @router.delete("/image")
 async def ig_delete_image(path: str = ""):
     """Deleta uma imagem local pelo path"""
     if not path or not path.startswith("/static/"):
         return {"ok": False, "error": "Path invalido"}
+    if armazem_midia.gerencia(path):
+        if armazem_midia.referencias(path):
+            return {"ok": False, "error": "Imagem em uso por posts/stories"}
+        if armazem_midia.apagar(path):
+            return {"ok": True, "deleted": path}
+        return {"ok": False, "error": "Arquivo nao encontrado"}
     base = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
     fpath = _os.path.join(base, path.lstrip("/"))
     if _os.path.exists(fpath):
@@ -5228,18 +5155,12 @@ async def ig_delete_image(path: str = ""):
 @router.delete("/all-posts")
 async def ig_delete_all_posts():
     """Deleta TODOS os posts e imagens locais"""
-    deleted_imgs = 0
-    base = _os.path.dirname(_os.path.dirname(_os.path.dirname(__file__)))
-    for p in POSTS:
-        img = p.get("imagem_url", "") or ""
-        if img.startswith("/static/"):
-            fpath = _os.path.join(base, img.lstrip("/"))
-            if _os.path.exists(fpath):
-                _os.remove(fpath)
-                deleted_imgs += 1
+    imgs = [p.get("imagem_url", "") or "" for p in POSTS]
     total = len(POSTS)
+    _igdb.apagar_posts([p.get("id") for p in POSTS])
     POSTS.clear()
     STORIES.clear()
+    deleted_imgs = sum(1 for img in set(imgs) if _apagar_midia_local(img))
     _salvar_dados()
     return {"ok": True, "deleted_posts": total, "deleted_images": deleted_imgs}
 
@@ -5267,6 +5188,14 @@ async def ig_admin_images():
                     })
     return {"images": images, "total": len(images)}
 
+@router.get("/admin/agregados")
+async def ig_admin_agregados(reparar: bool = False):
+    """Confere os contadores por agente contra uma reconstrucao do zero"""
+    diffs = _AGREGADOS.verificar(POSTS, DMS)
+    if diffs and reparar:
+        _AGREGADOS.reconstruir(POSTS, DMS)
+    return {"ok": not diffs, "divergencias": diffs, "reparado": bool(diffs and reparar)}
+
 @router.delete("/admin/orphan-images")
 async def ig_delete_orphan_images():
     """Deleta imagens locais que nao estao sendo usadas por nenhum post"""
@@ -5289,7 +5218,25 @@ async def ig_delete_orphan_images():
                     if _os.path.isfile(fpath):
                         _os.remove(fpath)
                         deleted += 1
-    return {"ok": True, "deleted_orphans": deleted}
+    # Armazem enderecado por conteudo: uma passada do GC (respeita a carencia)
+    gc = await armazem_midia.coletar()
+    return {"ok": True, "deleted_orphans": deleted + gc["apagados"], "armazem": gc}
+
+@router.get("/admin/midia")
+async def ig_admin_midia():
+    """Armazem de midia (dedup, referencias, GC) e pipeline de rendicoes"""
+    return {**armazem_midia.stats(), "pipeline": pipeline_midia.stats()}
+
+@router.get("/admin/carga")
+async def ig_admin_carga():
+    """Ultima carga do SQLite (tempo, RSS, frios) e o LRU de paginas frias"""
+    return {**_igdb.CARGA, "rss_agora_mb": _igdb.rss_mb(), "paginas_frias": len(_igdb._paginas_frias)}
+
+@router.get("/admin/feed-cache")
+async def ig_admin_feed_cache():
+    """Cache de paginas do feed e memo das projecoes por post"""
+    return {**_CACHE_FEED.stats(), "projecoes": {"posts": len(_PROJECOES._memo),
+                                                  "hits": _PROJECOES.hits, "misses": _PROJECOES.misses}}
 
 
 # ===================== DEEPINFRA IMAGE GENERATION (FREE, NO API KEY) =====================
@@ -5306,12 +5253,9 @@ async def _gerar_imagem_deepinfra(prompt_img, agente_id):
         "black-forest-labs/FLUX-1-schnell",
     ]
     
-    img_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "ig_images")
-    _os.makedirs(img_dir, exist_ok=True)
-    
     for model in models_to_try:
         try:
-            async with httpx.AsyncClient(timeout=45.0) as client:
+            async with http_pool.cliente(timeout=45.0) as client:
                 resp = await client.post(
                     "https://api.deepinfra.com/v1/openai/images/generations",
                     headers={"Content-Type": "application/json"},
@@ -5333,21 +5277,13 @@ async def _gerar_imagem_deepinfra(prompt_img, agente_id):
                         if b64:
                             img_bytes = _b64.b64decode(b64)
                             if len(img_bytes) > 5000:
-                                fname = f"di_{agente_id}_{uuid.uuid4().hex[:8]}.jpg"
-                                fpath = _os.path.join(img_dir, fname)
-                                with open(fpath, "wb") as f:
-                                    f.write(img_bytes)
-                                local_url = f"/static/ig_images/{fname}"
+                                local_url = await armazem_midia.guardar(img_bytes)
                                 print(f"[DeepInfra] OK: {local_url} ({len(img_bytes)//1024}KB) model={model}")
                                 return local_url
                         elif url:
                             img_resp = await client.get(url, follow_redirects=True, timeout=30)
                             if img_resp.status_code == 200 and len(img_resp.content) > 5000:
-                                fname = f"di_{agente_id}_{uuid.uuid4().hex[:8]}.jpg"
-                                fpath = _os.path.join(img_dir, fname)
-                                with open(fpath, "wb") as f:
-                                    f.write(img_resp.content)
-                                local_url = f"/static/ig_images/{fname}"
+                                local_url = await armazem_midia.guardar(img_resp.content)
                                 print(f"[DeepInfra] OK (url): {local_url} ({len(img_resp.content)//1024}KB) model={model}")
                                 return local_url
                 else:
@@ -0,0 +1,259 @@
+"""
+Instagram - busca full-text (indice invertido em memoria)
+Indexa legenda + comentarios + username dos posts e nome/username/bio dos
+agentes. Tokenizacao sem acento (pt/en), ranking BM25, prefixo no ultimo
+termo para autocomplete e paginacao por cursor.
+Rodar `python -m app.routers.instagram_busca [n ...]` mostra o benchmark.
+"""
+import base64
+import bisect
+import heapq
+import itertools
+import math
+import re
+import unicodedata
+from collections import Counter, OrderedDict
+
+RE_TOKEN = re.compile(r"\w+")
+MAX_EXPANSAO = 50    # termos considerados para um prefixo
+MAX_VARREDURA = 2000  # candidatos lidos do vocabulario por prefixo (prefixos curtos demais)
+MAX_RANKINGS = 64     # rankings congelados para paginacao (LRU)
+RANKING_TOPO = 1000   # resultados congelados por consulta; dali em diante o cursor e aproximado
+
+
+def tokenizar(texto):
+    """'Programação #LocalAI!' -> ['programacao', 'localai']"""
+    if not texto:
+        return []
+    t = unicodedata.normalize("NFKD", texto.lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    return [w for w in RE_TOKEN.findall(t) if len(w) > 1 or w.isdigit()]
+
+
+def texto_post(p):
+    partes = [p.get("caption") or "", p.get("username") or ""]
+    for c in p.get("comments") or []:
+        partes.append(c.get("texto") or "")
+    return " ".join(partes)
+
+
+def texto_agente(ag):
+    return " ".join((ag.get("nome") or "", ag.get("username") or "", ag.get("bio") or ""))
+
+
+def _cursor(ranking, pos, score, chave):
+    return base64.urlsafe_b64encode(f"{ranking}|{pos}|{score!r}|{chave}".encode()).decode()
+
+
+def _ler_cursor(cursor):
+    """(ranking, pos, score, chave); cursores antigos 'score|chave' vem sem ranking"""
+    try:
+        partes = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 3)
+        if len(partes) == 2:
+            return None, 0, float(partes[0]), partes[1]
+        ranking, pos, score, chave = partes
+        return int(ranking), int(pos), float(score), chave
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class IndiceBusca:
+    """Indice invertido termo -> {doc: tf} com BM25 (doc_id sempre str).
+
+    Documentos entram/saem por adicionar/remover (ou pelo protocolo de
+    observador inserido/removido de ListaObservavel). Para posts alterados
+    in-place (comentario novo) chame adicionar(doc) de novo: so a diferenca
+    de termos e aplicada.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, texto=texto_post, chave="id"):
+        self.texto = texto
+        self.chave = chave
+        self._postings = {}  # termo -> {doc_id: tf}
+        self._termos = {}    # doc_id -> Counter(termo)
+        self._tam = {}       # doc_id -> numero de tokens
+        self._docs = {}      # doc_id -> objeto
+        self._total = 0
+        self._vocab = []     # termos ordenados (prefixo via bisect)
+        self._rankings = OrderedDict()  # id -> (consulta, prefixo, [(-score, doc_id)], total, completo) - LRU
+        self._seq = itertools.count(1)
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- manutencao ---
+    def adicionar(self, doc, doc_id=None):
+        did = doc.get(self.chave) if doc_id is None else doc_id
+        if did is None:
+            return
+        tokens = tokenizar(self.texto(doc))
+        novos = Counter(tokens)
+        velhos = self._termos.get(did, Counter())
+        for termo in velhos.keys() - novos.keys():
+            self._tirar_termo(termo, did)
+        for termo, tf in novos.items():
+            if velhos.get(termo) != tf:
+                lst = self._postings.get(termo)
+                if lst is None:
+                    lst = self._postings[termo] = {}
+                    bisect.insort(self._vocab, termo)
+                lst[did] = tf
+        self._total += len(tokens) - self._tam.get(did, 0)
+        self._termos[did], self._tam[did], self._docs[did] = novos, len(tokens), doc
+
+    def remover(self, doc=None, doc_id=None):
+        did = doc.get(self.chave) if doc_id is None else doc_id
+        if did not in self._docs or (doc is not None and self._docs[did] is not doc):
+            return
+        for termo in self._termos.pop(did):
+            self._tirar_termo(termo, did)
+        self._total -= self._tam.pop(did)
+        del self._docs[did]
+
+    def _tirar_termo(self, termo, did):
+        lst = self._postings[termo]
+        lst.pop(did, None)
+        if not lst:
+            del self._postings[termo]
+            i = bisect.bisect_left(self._vocab, termo)
+            if i < len(self._vocab) and self._vocab[i] == termo:
+                del self._vocab[i]
+
+    # protocolo de observador (ListaObservavel)
+    def inserido(self, doc):
+        self.adicionar(doc)
+
+    def removido(self, doc):
+        self.remover(doc)
+
+    # --- consultas ---
+    def completar(self, prefixo, k=MAX_EXPANSAO):
+        """Termos do vocabulario que comecam com prefixo, mais frequentes primeiro"""
+        if not prefixo:
+            return []
+        i = bisect.bisect_left(self._vocab, prefixo)
+        termos = []
+        fim = min(len(self._vocab), i + MAX_VARREDURA)
+        while i < fim and self._vocab[i].startswith(prefixo):
+            termos.append(self._vocab[i])
+            i += 1
+        if len(termos) > k:
+            termos = heapq.nlargest(k, termos, key=lambda t: len(self._postings[t]))
+        return termos
+
+    def _idf(self, termo):
+        n, df = len(self._docs), len(self._postings.get(termo, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def pontuar(self, consulta, prefixo=True):
+        """{doc_id: score BM25}; com prefixo o ultimo termo vale como 'termo*'"""
+        tokens = tokenizar(consulta)
+        if not tokens or not self._docs:
+            return {}
+        media = self._total / len(self._docs) or 1.0
+        grupos = [[t] for t in tokens[:-1]]
+        ultimo = tokens[-1]
+        grupos.append((self.completar(ultimo) or [ultimo]) if prefixo else [ultimo])
+        scores = {}
+        k1, b = self.K1, self.B
+        for termos in grupos:
+            melhor = {}  # no prefixo, cada doc conta so o melhor termo expandido
+            for termo in termos:
+                lst = self._postings.get(termo)
+                if not lst:
+                    continue
+                idf = self._idf(termo)
+                for did, tf in lst.items():
+                    s = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * self._tam[did] / media))
+                    if s > melhor.get(did, 0.0):
+                        melhor[did] = s
+            for did, s in melhor.items():
+                scores[did] = scores.get(did, 0.0) + s
+        return scores
+
+    def buscar(self, consulta, limit=20, cursor="", prefixo=True):
+        """Pagina de resultados ordenados por (score desc, id).
+
+        Devolve (doc_ids, proximo_cursor, total). A primeira pagina congela o
+        ranking (os RANKING_TOPO primeiros) e o cursor aponta para a posicao
+        nele: IDF e tamanho medio mudam a cada post, entao recalcular e
+        cortar por (score, id) repetiria ou pularia resultados. Se o ranking
+        saiu do LRU (ou a pagina passa do topo congelado) o corte por
+        (score, id) num ranking novo e o fallback - so aproximado.
+        Docs removidos entre paginas podem vir no ranking congelado; quem
+        chama descarta ids que nao existem mais.
+        """
+        apos = _ler_cursor(cursor) if cursor else None
+        if apos and apos[0] is not None:
+            congelado = self._rankings.get(apos[0])
+            if congelado and congelado[:2] == (consulta, prefixo) and apos[1] < len(congelado[2]):
+                self._rankings.move_to_end(apos[0])
+                return self._pagina(apos[0], *congelado[2:], apos[1], limit)
+
+        scores = self.pontuar(consulta, prefixo)
+        itens = ((-s, did) for did, s in scores.items())
+        if apos:  # cursor sem ranking congelado: melhor esforco
+            corte = (-apos[2], apos[3])
+            itens = (it for it in itens if it > corte)
+        topo = max(RANKING_TOPO, limit + 1)
+        ranking = heapq.nsmallest(topo, itens)
+        rid = next(self._seq)
+        congelado = (ranking, len(scores), len(ranking) < topo)
+        self._rankings[rid] = (consulta, prefixo) + congelado
+        while len(self._rankings) > MAX_RANKINGS:
+            self._rankings.popitem(last=False)
+        return self._pagina(rid, *congelado, 0, limit)
+
+    @staticmethod
+    def _pagina(rid, ranking, total, completo, inicio, limit):
+        pagina = ranking[inicio:inicio + limit]
+        fim = inicio + len(pagina)
+        if fim < len(ranking) or (pagina and not completo):
+            ultimo = ranking[fim - 1]
+            prox = _cursor(rid, fim, -ultimo[0], ultimo[1])
+        else:
+            prox = None
+        return [d for _, d in pagina], prox, total
+
+
+def _benchmark(tamanhos=(10_000, 100_000, 1_000_000)):
+    import random
+    import time
+    palavras = ("ia modelo local codigo python dados arte musica filosofia treino "
+                "programação inteligência visão rede neural ollama agentes café noite "
+                "future learning deep vision creative coding robot dream sunset").split()
+    palavras += [f"termo{i}" for i in range(20_000)]
+    consultas = ["inteligencia artificial", "python codigo", "programacao neural", "ollama", "termo12", "agen"]
+    print(f"{'posts':>9} | {'indexar (s)':>11} | {'scan q (ms)':>11} | {'bm25 q (ms)':>11} | {'prefixo (ms)':>12}")
+    for n in tamanhos:
+        posts = [{"id": f"igpost_{i:08x}", "username": f"ag{i % 12}",
+                  "caption": " ".join(random.choice(palavras) for _ in range(12)), "comments": []}
+                 for i in range(n)]
+        idx = IndiceBusca()
+        t = time.perf_counter()
+        for p in posts:
+            idx.adicionar(p)
+        indexar = time.perf_counter() - t
+        t = time.perf_counter()
+        for q in consultas[:3]:
+            [p for p in posts if q in p["caption"].lower()][:20]
+        scan = (time.perf_counter() - t) / 3 * 1e3
+        t = time.perf_counter()
+        for q in consultas[:5]:
+            idx.buscar(q, prefixo=False)
+        bm25 = (time.perf_counter() - t) / 5 * 1e3
+        t = time.perf_counter()
+        for _ in range(20):
+            idx.completar("ter", 10)
+            idx.completar("agen", 10)
+        pref = (time.perf_counter() - t) / 40 * 1e3
+        print(f"{n:>9} | {indexar:>11.2f} | {scan:>11.2f} | {bm25:>11.2f} | {pref:>12.3f}")
+        del posts, idx
+
+
+if __name__ == "__main__":
+    import sys
+    _benchmark(tuple(int(a) for a in sys.argv[1:]) or (10_000, 100_000, 1_000_000))
@@ -1,14 +1,36 @@
 """
 Instagram SQLite Database Module
 Persistencia com aiosqlite - write-through cache
+
+Comentarios, respostas e likes de post ficam em tabelas proprias
+(ig_comments, ig_comment_replies, ig_post_likes), uma linha por item: um
+comentario novo e um INSERT, nao a reescrita do array inteiro. As colunas
+liked_by/comments de ig_posts so existem para bancos antigos; o load ainda
+as le (e o primeiro flush as esvazia) - migrate_ig_comments.py faz o mesmo
+de uma vez, offline.
 """
 
 import aiosqlite
+import hashlib
 import json
 import os
 import asyncio
+import copy
+import marshal
+import sqlite3
+import time
+from collections import OrderedDict
+
+from app.services.armazem_midia import PREFIXO_URL as PREFIXO_MIDIA
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "instagram.db")
+# A carga le so a janela quente (posts mais novos + o que pende deles): o
+# despejo do anel nao apaga de ig_posts, entao a tabela guarda o historico
+# inteiro e o resto fica no disco, paginado por pagina_fria()
+MAX_POSTS = int(os.environ.get("IG_MAX_POSTS", "300"))  # capacidade do anel POSTS
+# A janela nunca passa do anel: o excesso seria despejado logo apos a carga
+JANELA_POSTS = min(int(os.environ.get("IG_JANELA_POSTS", "500")), MAX_POSTS)
+MAX_PAGINAS_FRIAS = int(os.environ.get("IG_FRIOS_LRU", "128"))
 
 _db_lock = asyncio.Lock()
 _db = None
@@ -144,34 +166,440 @@ async def init_tables():
             agente_id TEXT NOT NULL,
             PRIMARY KEY (comment_id, agente_id)
         );
-    """)
+
+        -- Arquivos do armazem de midia citados por cada post gravado (quente ou
+        -- frio): o GC pergunta pelo nome em vez de varrer ig_posts
+        CREATE TABLE IF NOT EXISTS ig_post_midia (
+            nome TEXT NOT NULL,
+            post_id TEXT NOT NULL,
+            PRIMARY KEY (nome, post_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_post_midia_post ON ig_post_midia(post_id);
+    """ + SQL_TABELAS_COMENTARIOS)
     # Add columns if missing (for existing databases)
     for col, default in [("video_url", "''"), ("video_source", "''")]:
         try:
             await db.execute(f"ALTER TABLE ig_posts ADD COLUMN {col} TEXT DEFAULT {default}")
         except:
             pass
+    await _preencher_midia(db)
     await db.commit()
     print("[IG-DB] Tables initialized")
 
 
+async def _preencher_midia(db):
+    """Banco de antes de ig_post_midia: indexa a midia de todos os posts uma vez"""
+    async with db.execute("SELECT 1 FROM ig_post_midia LIMIT 1") as cur:
+        if await cur.fetchone():
+            return
+    linhas = []
+    async with db.execute("SELECT id, imagem_url, media_url, video_url, carousel_urls FROM ig_posts") as cur:
+        async for pid, img, media, video, carrossel in cur:
+            linhas += [(nome, pid) for nome in _nomes_midia(img, media, video, carrossel)]
+    if linhas:
+        await db.executemany("INSERT OR IGNORE INTO ig_post_midia (nome,post_id) VALUES (?,?)", linhas)
+        print(f"[IG-DB] ig_post_midia: {len(linhas)} referencias de midia indexadas")
+
+
+
+
+SQL_TABELAS_COMENTARIOS = """
+        CREATE TABLE IF NOT EXISTS ig_comments (
+            id TEXT PRIMARY KEY,
+            post_id TEXT NOT NULL,
+            agente_id TEXT,
+            ordem INTEGER NOT NULL,
+            created_at TEXT,
+            dados TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_comments_post ON ig_comments(post_id, ordem);
+        CREATE INDEX IF NOT EXISTS idx_comments_agente ON ig_comments(agente_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_comments_created ON ig_comments(created_at);
+
+        CREATE TABLE IF NOT EXISTS ig_comment_replies (
+            id TEXT PRIMARY KEY,
+            comment_id TEXT NOT NULL,
+            post_id TEXT NOT NULL,
+            agente_id TEXT,
+            ordem INTEGER NOT NULL,
+            created_at TEXT,
+            dados TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_replies_comment ON ig_comment_replies(comment_id, ordem);
+        CREATE INDEX IF NOT EXISTS idx_replies_post ON ig_comment_replies(post_id);
+        CREATE INDEX IF NOT EXISTS idx_replies_agente ON ig_comment_replies(agente_id, created_at);
+
+        CREATE TABLE IF NOT EXISTS ig_post_likes (
+            post_id TEXT NOT NULL,
+            agente_id TEXT NOT NULL,
+            PRIMARY KEY (post_id, agente_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_post_likes_agente ON ig_post_likes(agente_id);
+"""
+
+
+# === ROW BUILDERS ===
+_SQL_UPSERT_POST = """INSERT OR REPLACE INTO ig_posts
+    (id,agente_id,agente_nome,username,avatar,avatar_url,cor,modelo,
+     caption,imagem_url,img_generator,media_url,media_type,vid_generator,
+     video_url,video_source,
+     likes,liked_by,comments,carousel_urls,is_ai,comunidade,created_at,
+     tipo,arte_style,collab,trending_tag,sort_order)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+_SQL_UPSERT_STORY = """INSERT OR REPLACE INTO ig_stories (id,agente_id,username,avatar,avatar_url,cor,nome,
+     texto,imagem_url,img_generator,tipo,tipo_interativo,enquete,pergunta,
+     visualizacoes,created_at)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+_SQL_UPSERT_DM = """INSERT OR REPLACE INTO ig_dms (id,de,de_nome,de_avatar,para,para_nome,para_avatar,
+     texto,lida,created_at)
+    VALUES (?,?,?,?,?,?,?,?,?,?)"""
+
+_SQL_INSERT_NOTIF = """INSERT INTO ig_notifications (tipo,de,de_avatar,de_nome,para,post_id,texto,created_at)
+    VALUES (?,?,?,?,?,?,?,?)"""
+
+SQL_UPSERT_COMMENT = """INSERT OR REPLACE INTO ig_comments (id,post_id,agente_id,ordem,created_at,dados)
+    VALUES (?,?,?,?,?,?)"""
+
+SQL_UPSERT_REPLY = """INSERT OR REPLACE INTO ig_comment_replies (id,comment_id,post_id,agente_id,ordem,created_at,dados)
+    VALUES (?,?,?,?,?,?,?)"""
+
+SQL_INSERT_LIKE = "INSERT OR IGNORE INTO ig_post_likes (post_id,agente_id) VALUES (?,?)"
+
+SQL_INSERT_MIDIA = "INSERT OR IGNORE INTO ig_post_midia (nome,post_id) VALUES (?,?)"
+
+MAX_DMS = 500
+MAX_NOTIFS = 200
+
+
+def _nomes_midia(imagem_url, media_url, video_url, carousel_urls):
+    """Nomes dos arquivos do armazem citados pelas colunas de midia de ig_posts"""
+    urls = [imagem_url, media_url, video_url]
+    if isinstance(carousel_urls, str):
+        try:
+            carousel_urls = json.loads(carousel_urls)
+        except ValueError:
+            carousel_urls = None
+    urls += carousel_urls or ()
+    return {u[len(PREFIXO_MIDIA):].rsplit("/", 1)[-1] for u in urls
+            if isinstance(u, str) and u.startswith(PREFIXO_MIDIA)}
+
+
+def _midia_da_linha(row):
+    """(nome, post_id) de uma linha de _linha_post"""
+    return [(nome, row[0]) for nome in _nomes_midia(row[9], row[11], row[14], row[19])]
+
+
+def _linha_post(p, ordem):
+    return (p.get("id"), p.get("agente_id"), p.get("agente_nome"), p.get("username"),
+            p.get("avatar"), p.get("avatar_url",""), p.get("cor"), p.get("modelo"),
+            p.get("caption"), p.get("imagem_url"), p.get("img_generator"),
+            p.get("media_url",""), p.get("media_type","image"), p.get("vid_generator"),
+            p.get("video_url",""), p.get("video_source",""),
+            p.get("likes",0), "[]", "[]",  # liked_by/comments: tabelas proprias
+            json.dumps(p.get("carousel_urls")) if p.get("carousel_urls") else None,
+            1 if p.get("is_ai", True) else 0,
+            p.get("comunidade"), p.get("created_at"),
+            p.get("tipo","foto"), p.get("arte_style"),
+            json.dumps(p.get("collab")) if p.get("collab") else None,
+            p.get("trending_tag"), ordem)
+
+
+def _id_item(c, dono):
+    """id do comentario/resposta; os antigos sem id ganham um derivado do conteudo"""
+    if c.get("id"):
+        return str(c["id"])
+    base = json.dumps([dono, c.get("agente_id"), c.get("created_at"), c.get("texto")], ensure_ascii=False)
+    return "h_" + hashlib.blake2b(base.encode(), digest_size=8).hexdigest()
+
+
+def linhas_do_post(p):
+    """(comentarios, respostas, likes) de um post como linhas das tabelas.
+
+    dados guarda o item sem as respostas ("replies" vira [] e e remontado
+    no load); ordem e a posicao na lista. ids repetidos ficam com o primeiro.
+    """
+    pid = p.get("id")
+    coms, reps, vistos = [], [], set()
+    for i, c in enumerate(p.get("comments") or []):
+        cid = _id_item(c, pid)
+        if cid in vistos:
+            continue
+        vistos.add(cid)
+        dados = {k: ([] if k == "replies" else v) for k, v in c.items()}
+        coms.append((cid, pid, c.get("agente_id"), i, c.get("created_at"),
+                     json.dumps(dados, ensure_ascii=False, default=str)))
+        for j, r in enumerate(c.get("replies") or []):
+            rid = _id_item(r, cid)
+            if rid in vistos:
+                continue
+            vistos.add(rid)
+            reps.append((rid, cid, pid, r.get("agente_id"), j, r.get("created_at"),
+                         json.dumps(r, ensure_ascii=False, default=str)))
+    likes = list(dict.fromkeys((pid, a) for a in p.get("liked_by") or () if isinstance(a, str)))
+    return coms, reps, likes
+
+
+def _linha_story(s):
+    return (s.get("id"), s.get("agente_id"), s.get("username"), s.get("avatar"),
+            s.get("avatar_url",""), s.get("cor"), s.get("nome"),
+            s.get("texto"), s.get("imagem_url",""), s.get("img_generator"),
+            s.get("tipo","texto"), s.get("tipo_interativo"),
+            json.dumps(s.get("enquete")) if s.get("enquete") else None,
+            json.dumps(s.get("pergunta")) if s.get("pergunta") else None,
+            s.get("visualizacoes",0), s.get("created_at"))
+
+
+def _linha_dm(d):
+    return (d.get("id"), d.get("de"), d.get("de_nome"), d.get("de_avatar"),
+            d.get("para"), d.get("para_nome"), d.get("para_avatar"),
+            d.get("texto"), 1 if d.get("lida") else 0, d.get("created_at"))
+
+
+def _linha_notif(n):
+    return (n.get("tipo"), n.get("de"), n.get("de_avatar"), n.get("de_nome"),
+            n.get("para"), n.get("post_id"), n.get("texto"), n.get("created_at"))
+
+
+def _pares(mapa):
+    """{chave: [valores]} -> {(chave, valor)}"""
+    return {(k, v) for k, vs in (mapa or {}).items() for v in vs}
+
+
+# === CHANGE TRACKING ===
+class _EstadoPersistido:
+    """Fingerprint do que ja foi commitado no SQLite, tabela por tabela.
+
+    Cada flush compara as linhas atuais com este estado e grava so o que
+    mudou. O estado so avanca depois do commit, entao um flush que falha
+    (ou e cancelado) e refeito por inteiro no proximo.
+
+    Post que sumiu da memoria so e apagado do banco se foi marcado com
+    apagar_posts() (delete explicito). Os demais foram despejados pela
+    capacidade do anel: saem do estado e continuam no disco como frios,
+    com comentarios, respostas e likes.
+    """
+
+    def __init__(self):
+        self.semeado = False
+        self.posts = {}      # post_id -> hash da linha
+        self.ordem = {}      # post_id -> sort_order gravado
+        self.stories = {}    # story_id -> hash da linha
+        self.dms = {}        # dm_id -> hash da linha
+        self.notifs = set()  # linhas de notificacao gravadas
+        self.trending = ()
+        self.runtime = {}    # agente_id -> (seguidores, seguindo)
+        self.follows = set()
+        self.saved = set()
+        self.clikes = set()
+        self.comments = {}   # comment_id -> (post_id, hash da linha)
+        self.replies = {}    # reply_id -> (post_id, hash da linha)
+        self.likes = set()   # (post_id, agente_id)
+        self.apagados = set()  # post_ids com delete explicito pendente
+
+    def _ordenar_posts(self, posts):
+        """sort_order estavel: posts ja gravados mantem a chave, novos no topo
+        recebem chaves menores. Assim um insert(0) nao reescreve a tabela toda."""
+        ordem = {}
+        prox = None
+        for p in reversed(posts):
+            pid = p.get("id")
+            if pid is None or pid in ordem:
+                continue
+            k = self.ordem.get(pid)
+            if k is None or (prox is not None and k >= prox):
+                k = prox - 1 if prox is not None else max(self.ordem.values(), default=-1) + 1
+            ordem[pid] = k
+            prox = k
+        return ordem
+
+    def planejar(self, posts, stories, notifs, dms, trending, agentes_ig, follows, saved, clikes, apagados=None):
+        """Calcula o diff contra o estado gravado (sincrono, sem await).
+
+        Pode rodar numa thread sobre um _instantaneo(); apagados e a copia de
+        self.apagados tirada no loop junto com ele.
+        """
+        plano = {"novo": {}}
+        apagados = self.apagados if apagados is None else apagados
+
+        ordem = self._ordenar_posts(posts)
+        vistos, upsert = {}, []
+        coms, coms_upsert, reps, reps_upsert, likes = {}, [], {}, [], {}
+        for p in posts:
+            pid = p.get("id")
+            if pid is None or pid in vistos:
+                continue
+            row = _linha_post(p, ordem[pid])
+            h = hash(row)
+            vistos[pid] = h
+            if self.posts.get(pid) != h:
+                upsert.append(row)
+            linhas_c, linhas_r, pares = linhas_do_post(p)
+            for linhas, mapa, atual, saida in ((linhas_c, coms, self.comments, coms_upsert),
+                                               (linhas_r, reps, self.replies, reps_upsert)):
+                for row in linhas:
+                    if row[0] in mapa:
+                        continue
+                    chave = (pid, hash(row))
+                    mapa[row[0]] = chave
+                    if atual.get(row[0]) != chave:
+                        saida.append(row)
+            likes.update(dict.fromkeys(pares))
+        # Sumiu da memoria: delete so se explicito; senao foi despejado (vira frio)
+        apagar = [pid for pid in apagados if pid not in vistos]
+        plano["posts_delete"] = [(pid,) for pid in apagar]
+        plano["despejados"] = sum(1 for pid in self.posts if pid not in vistos and pid not in apagados)
+        plano["apagados"] = set(apagados)
+        plano["frios_apagados"] = sum(1 for pid in apagar if pid not in self.posts)  # ja eram frios
+        plano["posts_upsert"] = upsert
+        # Linha do post mudou: refaz as referencias de midia dele
+        plano["midia_insert"] = [par for row in upsert for par in _midia_da_linha(row)]
+        plano["novo"]["posts"] = vistos
+        plano["novo"]["ordem"] = ordem
+        plano["comments_upsert"] = coms_upsert
+        # Comentario removido de um post vivo; os de post apagado saem por post_id
+        plano["comments_delete"] = [(cid,) for cid, (pid, _) in self.comments.items()
+                                    if cid not in coms and pid in vistos]
+        plano["novo"]["comments"] = coms
+        plano["replies_upsert"] = reps_upsert
+        plano["replies_delete"] = [(rid,) for rid, (pid, _) in self.replies.items()
+                                   if rid not in reps and pid in vistos]
+        plano["novo"]["replies"] = reps
+        plano["likes_insert"] = [par for par in likes if par not in self.likes]  # na ordem do liked_by
+        plano["likes_delete"] = [par for par in self.likes if par not in likes and par[0] in vistos]
+        plano["novo"]["likes"] = set(likes)
+
+        for nome, itens, linha, atual in (
+            ("stories", stories, _linha_story, self.stories),
+            ("dms", dms[-MAX_DMS:], _linha_dm, self.dms),
+        ):
+            vistos, upsert = {}, []
+            for it in itens:
+                iid = it.get("id")
+                if iid is None or iid in vistos:
+                    continue
+                row = linha(it)
+                h = hash(row)
+                vistos[iid] = h
+                if atual.get(iid) != h:
+                    upsert.append(row)
+            plano[f"{nome}_upsert"] = upsert
+            plano[f"{nome}_delete"] = [(iid,) for iid in atual if iid not in vistos]
+            plano["novo"][nome] = vistos
+
+        # Notificacoes sao imutaveis: so insere as novas (mais antiga primeiro)
+        recentes = [_linha_notif(n) for n in notifs[:MAX_NOTIFS]]
+        plano["notifs_insert"] = [r for r in reversed(recentes) if r not in self.notifs]
+        plano["novo"]["notifs"] = set(recentes)
+
+        trend = tuple((t.get("hashtag",""), t.get("posts_count",0)) for t in trending)
+        plano["trending"] = trend if trend != self.trending else None
+        plano["novo"]["trending"] = trend
+
+        runtime = {k: (v.get("seguidores",0), v.get("seguindo",0)) for k, v in agentes_ig.items()}
+        plano["runtime_upsert"] = [(k,) + v for k, v in runtime.items() if self.runtime.get(k) != v]
+        plano["novo"]["runtime"] = runtime
+
+        for nome, mapa in (("follows", follows), ("saved", saved), ("clikes", clikes)):
+            if mapa is None:
+                plano[f"{nome}_insert"], plano[f"{nome}_delete"] = [], []
+                plano["novo"][nome] = getattr(self, nome)
+                continue
+            pares = _pares(mapa)
+            atual = getattr(self, nome)
+            plano[f"{nome}_insert"] = list(pares - atual)
+            plano[f"{nome}_delete"] = list(atual - pares)
+            plano["novo"][nome] = pares
+        return plano
+
+    @staticmethod
+    def vazio(plano):
+        return not any(v for k, v in plano.items() if k not in ("novo", "apagados", "frios_apagados"))
+
+    def aplicar(self, plano):
+        for k, v in plano["novo"].items():
+            setattr(self, k, v)
+        self.apagados -= plano.get("apagados", set())
+        _frios["total"] = max(0, _frios["total"] + plano.get("despejados", 0) - plano.get("frios_apagados", 0))
+        self.semeado = True
+
+
+def _instantaneo(*colecoes):
+    """Copia profunda das colecoes para o planejar rodar fora do loop.
+
+    marshal copia dict/list/str/numeros em C, bem mais barato que o diff
+    (linhas + json.dumps + hash por post); deepcopy se aparecer outro tipo.
+    """
+    colecoes = tuple(None if c is None else (dict(c) if isinstance(c, dict) else list(c)) for c in colecoes)
+    try:
+        return marshal.loads(marshal.dumps(colecoes))
+    except ValueError:
+        return copy.deepcopy(colecoes)
+
+
+async def _planejar_fora_do_loop(estado, *colecoes):
+    """Tira o instantaneo no loop (as rotas mudam os posts in-place) e faz o diff numa thread"""
+    dados = _instantaneo(*colecoes)
+    apagados = set(estado.apagados)
+    return await asyncio.to_thread(estado.planejar, *dados, apagados=apagados)
+
+
+def apagar_posts(ids):
+    """Delete explicito: o proximo flush apaga estes posts (e comentarios/likes) do banco"""
+    _estado.apagados.update(ids)
+
+
+_estado = _EstadoPersistido()
+CARGA = {}                 # resumo da ultima carga (tempo, RSS, contagens)
+_frios = {"total": 0}      # posts de ig_posts fora da janela quente
+_paginas_frias = OrderedDict()  # (antes, limite) -> (posts, proximo) - LRU
+
+
+def rss_mb():
+    """Memoria residente do processo (MB)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # pico, em KB no Linux
+
+
+def _post_da_linha(row):
+    """Linha de ig_posts -> post (comments/liked_by vazios; ver _carregar_comentarios)"""
+    p = dict(row)
+    blobs = (p.pop("comments", None), p.pop("liked_by", None))
+    p["liked_by"] = []
+    p["comments"] = []
+    p["carousel_urls"] = json.loads(p["carousel_urls"]) if p["carousel_urls"] else None
+    p["collab"] = json.loads(p["collab"]) if p["collab"] else None
+    p["is_ai"] = bool(p["is_ai"])
+    return p, blobs
+
+
 # === LOAD ALL DATA ===
-async def load_all_data():
-    db = await get_db()
-    
-    # Posts
+async def _ler_tudo(db):
+    """Le a janela quente de posts e as demais tabelas; nao mexe em estado do
+    modulo (serve para outra conexao/thread). Devolve (dados, ordem, legado, frios)."""
+    # Posts: so os JANELA_POSTS mais novos (e os comentarios/likes deles)
     posts = []
-    async with db.execute("SELECT * FROM ig_posts ORDER BY sort_order ASC") as cur:
+    ordem = {}
+    legado = {}  # post_id -> (comments, liked_by) ainda nas colunas JSON
+    janela = ("SELECT id FROM ig_posts ORDER BY created_at DESC, id DESC LIMIT ?", (JANELA_POSTS,))
+    sql = f"SELECT * FROM ig_posts WHERE id IN ({janela[0]}) ORDER BY sort_order ASC"
+    async with db.execute(sql, janela[1]) as cur:
         async for row in cur:
-            p = dict(row)
-            p["liked_by"] = json.loads(p["liked_by"] or "[]")
-            p["comments"] = json.loads(p["comments"] or "[]")
-            p["carousel_urls"] = json.loads(p["carousel_urls"]) if p["carousel_urls"] else None
-            p["collab"] = json.loads(p["collab"]) if p["collab"] else None
-            p["is_ai"] = bool(p["is_ai"])
-            p.pop("sort_order", None)
+            p, blobs = _post_da_linha(row)
+            if any(b and b != "[]" for b in blobs):
+                legado[p["id"]] = blobs
+            ordem[p["id"]] = p.pop("sort_order", None) or 0
             posts.append(p)
+    async with db.execute("SELECT COUNT(*) FROM ig_posts") as cur:
+        frios = max(0, (await cur.fetchone())[0] - len(posts))
     
+    await _carregar_comentarios(db, posts, legado, janela)
+
     # Stories
     stories = []
     async with db.execute("SELECT * FROM ig_stories ORDER BY created_at DESC") as cur:
@@ -191,7 +619,7 @@ async def load_all_data():
     
     # Notifications
     notifs = []
-    async with db.execute("SELECT tipo,de,de_avatar,de_nome,para,post_id,texto,created_at FROM ig_notifications ORDER BY rowid DESC LIMIT 200") as cur:
+    async with db.execute(f"SELECT tipo,de,de_avatar,de_nome,para,post_id,texto,created_at FROM ig_notifications ORDER BY rowid DESC LIMIT {MAX_NOTIFS}") as cur:
         async for row in cur:
             notifs.append(dict(row))
     
@@ -219,105 +647,321 @@ async def load_all_data():
         async for row in cur:
             saved.setdefault(row["agente_id"], []).append(row["post_id"])
     
-    # Comment likes
+    # Comment likes: so dos comentarios carregados
     clikes = {}
-    async with db.execute("SELECT * FROM ig_comment_likes") as cur:
+    sql = f"SELECT * FROM ig_comment_likes WHERE comment_id IN (SELECT id FROM ig_comments WHERE post_id IN ({janela[0]}))"
+    async with db.execute(sql, janela[1]) as cur:
         async for row in cur:
             clikes.setdefault(row["comment_id"], []).append(row["agente_id"])
+    return (posts, stories, notifs, dms, trending, agente_rt, follows, saved, clikes), ordem, legado, frios
+
+
+async def load_all_data():
+    """Startup: janela quente para a memoria (JANELA_POSTS posts mais novos e
+    os comentarios/likes deles); o resto de ig_posts conta como frio"""
+    inicio, rss_antes = time.perf_counter(), rss_mb()
+    db = await get_db()
+    dados, ordem, legado, frios = await _ler_tudo(db)
+    posts, stories, notifs, dms, trending, agente_rt, follows, saved, clikes = dados
+    _frios["total"] = frios
+    _paginas_frias.clear()
+
+    # O que acabou de ser lido e exatamente o que esta no disco
+    _estado.ordem = ordem
+    plano = _estado.planejar(posts, stories, notifs, dms, trending, agente_rt, follows, saved, clikes)
+    plano["despejados"] = 0  # quem ficou no disco ja esta em _frios
+    # ...menos os posts que vieram das colunas JSON: o primeiro flush grava
+    # as linhas normalizadas deles e esvazia as colunas
+    novo = plano["novo"]
+    for p in posts:
+        if p.get("id") in legado:
+            novo["posts"].pop(p["id"], None)
+            coms, reps, likes = linhas_do_post(p)
+            for row in coms:
+                novo["comments"].pop(row[0], None)
+            for row in reps:
+                novo["replies"].pop(row[0], None)
+            novo["likes"] -= set(likes)
+    _estado.aplicar(plano)
+    if legado:
+        print(f"[IG-DB] {len(legado)} posts com comentarios/likes em JSON: migram no proximo flush")
     
-    print(f"[IG-DB] Loaded: {len(posts)} posts, {len(stories)} stories, {len(dms)} DMs, {len(notifs)} notifs")
-    return posts, stories, notifs, dms, trending, agente_rt, follows, saved, clikes
+    CARGA.update({"segundos": round(time.perf_counter() - inicio, 3),
+                  "rss_mb": rss_mb(), "rss_delta_mb": round(rss_mb() - rss_antes, 1),
+                  "posts": len(posts), "posts_frios": _frios["total"], "stories": len(stories), "dms": len(dms),
+                  "comment_likes": sum(len(v) for v in clikes.values())})
+    print(f"[IG-DB] Loaded: {len(posts)} posts, {len(stories)} stories, {len(dms)} DMs, {len(notifs)} notifs "
+          f"({CARGA['segundos'] * 1000:.0f}ms, RSS {CARGA['rss_mb']}MB, {_frios['total']} posts frios no disco)")
+    return dados
+
+
+async def ler_espelho():
+    """SIMULACAO_MODO=api: le o banco que o worker grava numa thread, com
+    conexao propria (parse das linhas fora do event loop). Le so a janela
+    quente, como a carga; o resto de ig_posts conta como frio. O estado de
+    flush nao e usado num processo so leitura."""
+    async def _ler():
+        db = await aiosqlite.connect(DB_PATH)
+        db.row_factory = aiosqlite.Row
+        try:
+            await db.execute("PRAGMA busy_timeout=5000")
+            return await _ler_tudo(db)
+        finally:
+            await db.close()
+
+    dados, _, _, frios = await asyncio.to_thread(asyncio.run, _ler())
+    _frios["total"] = frios
+    _paginas_frias.clear()
+    return dados
+
+
+async def _carregar_comentarios(db, posts, legado, janela=None):
+    """Pendura comentarios, respostas e likes das tabelas nos posts (in-place).
+
+    janela: (subquery de post ids, args) para nao ler as linhas dos outros posts.
+    """
+    por_id = {p["id"]: p for p in posts}
+    com_por_id = {}
+    filtro, args = (f" WHERE post_id IN ({janela[0]})", janela[1]) if janela else ("", ())
+    async with db.execute(f"SELECT post_id, dados FROM ig_comments{filtro} ORDER BY post_id, ordem", args) as cur:
+        async for row in cur:
+            p = por_id.get(row["post_id"])
+            if p is not None:
+                c = json.loads(row["dados"])
+                p["comments"].append(c)
+                com_por_id[_id_item(c, p["id"])] = c
+    async with db.execute(f"SELECT comment_id, dados FROM ig_comment_replies{filtro} ORDER BY comment_id, ordem", args) as cur:
+        async for row in cur:
+            c = com_por_id.get(row["comment_id"])
+            if c is not None:
+                c.setdefault("replies", []).append(json.loads(row["dados"]))
+    async with db.execute(f"SELECT post_id, agente_id FROM ig_post_likes{filtro} ORDER BY rowid", args) as cur:
+        async for row in cur:
+            p = por_id.get(row["post_id"])
+            if p is not None:
+                p["liked_by"].append(row["agente_id"])
+    for pid, (coms, liked_by) in legado.items():
+        p = por_id[pid]
+        if not p["comments"]:
+            p["comments"] = json.loads(coms or "[]")
+        if not p["liked_by"]:
+            p["liked_by"] = json.loads(liked_by or "[]")
+
+
+def tem_frios():
+    return _frios["total"] > 0
 
 
-# === FULL SYNC (replaces _salvar_dados) ===
-async def sync_all_to_db(posts, stories, notifs, dms, trending, agentes_ig):
+async def pagina_fria(antes, limite=20):
+    """Posts que a carga deixou no disco (fora da janela), mais novos primeiro.
+
+    antes = (created_at, id) do ultimo post visto; devolve (posts, chave do
+    ultimo ou None). Paginas ficam num LRU ate o proximo flush que apagar posts.
+    """
+    chave = (tuple(antes), limite)
+    if chave in _paginas_frias:
+        _paginas_frias.move_to_end(chave)
+        return _paginas_frias[chave]
+    db = await get_db()
+    async with db.execute("SELECT * FROM ig_posts WHERE created_at < ? OR (created_at = ? AND id < ?) "
+                          "ORDER BY created_at DESC, id DESC LIMIT ?",
+                          (antes[0], antes[0], antes[1], limite + 1)) as cur:
+        linhas = await cur.fetchall()
+    posts, legado = [], {}
+    for row in linhas[:limite]:
+        p, blobs = _post_da_linha(row)
+        p.pop("sort_order", None)
+        if any(b and b != "[]" for b in blobs):
+            legado[p["id"]] = blobs
+        posts.append(p)
+    if posts:
+        ids = ",".join("?" * len(posts))
+        await _carregar_comentarios(db, posts, legado, (f"SELECT id FROM ig_posts WHERE id IN ({ids})",
+                                                         tuple(p["id"] for p in posts)))
+    ultimo = (posts[-1].get("created_at") or "", posts[-1]["id"]) if len(linhas) > limite else None
+    _paginas_frias[chave] = (posts, ultimo)
+    while len(_paginas_frias) > MAX_PAGINAS_FRIAS:
+        _paginas_frias.popitem(last=False)
+    return posts, ultimo
+
+
+async def comentarios_do_post(post_id, offset=0, limite=50):
+    """Pagina de comentarios (com replies) de um post que nao esta no anel.
+
+    Usa o indice (post_id, ordem); devolve (comentarios, total) ou None se o
+    post nao existe no banco. Reflete o ultimo flush.
+    """
+    db = await get_db()
+    async with db.execute("SELECT COUNT(*) FROM ig_comments WHERE post_id=?", (post_id,)) as cur:
+        total = (await cur.fetchone())[0]
+    if not total:
+        async with db.execute("SELECT comments FROM ig_posts WHERE id=?", (post_id,)) as cur:
+            row = await cur.fetchone()
+        if row is None:
+            return None
+        coms = json.loads(row["comments"] or "[]")  # legado: ainda na coluna JSON
+        return coms[offset:offset + limite], len(coms)
+    async with db.execute("SELECT id, dados FROM ig_comments WHERE post_id=? ORDER BY ordem LIMIT ? OFFSET ?",
+                          (post_id, limite, offset)) as cur:
+        linhas = await cur.fetchall()
+    coms = {row["id"]: json.loads(row["dados"]) for row in linhas}
+    if coms:
+        ids = ",".join("?" * len(coms))
+        async with db.execute(f"SELECT comment_id, dados FROM ig_comment_replies WHERE comment_id IN ({ids}) "
+                              "ORDER BY comment_id, ordem", tuple(coms)) as cur:
+            async for row in cur:
+                coms[row["comment_id"]].setdefault("replies", []).append(json.loads(row["dados"]))
+    return list(coms.values()), total
+
+
+def midia_em_disco_sync(nomes):
+    """Quais dos `nomes` (arquivos do armazem) algum post gravado cita, quente ou frio.
+
+    Busca pela chave de ig_post_midia, so pelos candidatos do GC: o custo nao
+    cresce com o historico. Sincrono e com conexao propria: roda na thread do
+    GC do armazem de midia.
+    """
+    nomes = list(nomes)
+    if not nomes or not os.path.exists(DB_PATH):
+        return set()
+    citados = set()
+    con = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=5)
+    try:
+        for i in range(0, len(nomes), 500):
+            lote = nomes[i:i + 500]
+            citados.update(n for n, in con.execute(
+                f"SELECT DISTINCT nome FROM ig_post_midia WHERE nome IN ({','.join('?' * len(lote))})", lote))
+    finally:  # sem a tabela (init_tables nao rodou) o erro aborta a passada do GC
+        con.close()
+    return citados
+
+
+async def comentarios_recentes(agente_id=None, limite=50):
+    """Ultimos comentarios (opcionalmente de um agente) direto do banco.
+
+    Reflete o ultimo flush; respostas nao entram.
+    """
+    db = await get_db()
+    if agente_id:
+        sql, args = ("SELECT post_id, dados FROM ig_comments WHERE agente_id=? "
+                     "ORDER BY created_at DESC LIMIT ?", (agente_id, limite))
+    else:
+        sql, args = "SELECT post_id, dados FROM ig_comments ORDER BY created_at DESC LIMIT ?", (limite,)
+    async with db.execute(sql, args) as cur:
+        return [{**json.loads(row["dados"]), "post_id": row["post_id"]} async for row in cur]
+
+
+# === FULL SYNC ===
+_TABELAS_PARES = [
+    ("ig_follows", "follower,following", "follows"),
+    ("ig_saved_posts", "agente_id,post_id", "saved"),
+    ("ig_comment_likes", "comment_id,agente_id", "clikes"),
+]
+
+
+async def sync_all_to_db(posts, stories, notifs, dms, trending, agentes_ig, follows=None, saved=None, clikes=None):
+    """Reescreve todas as tabelas. Usado no primeiro flush sem load previo."""
     async with _db_lock:
         db = await get_db()
+        plano = await _planejar_fora_do_loop(_EstadoPersistido(), posts, stories, notifs, dms, trending,
+                                             agentes_ig, follows, saved, clikes)
         try:
-            # Posts
             await db.execute("DELETE FROM ig_posts")
-            for i, p in enumerate(posts):
-                await db.execute(
-                    """INSERT OR REPLACE INTO ig_posts 
-                    (id,agente_id,agente_nome,username,avatar,avatar_url,cor,modelo,
-                     caption,imagem_url,img_generator,media_url,media_type,vid_generator,
-                     video_url,video_source,
-                     likes,liked_by,comments,carousel_urls,is_ai,comunidade,created_at,
-                     tipo,arte_style,collab,trending_tag,sort_order)
-                    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                    (p.get("id"), p.get("agente_id"), p.get("agente_nome"), p.get("username"),
-                     p.get("avatar"), p.get("avatar_url",""), p.get("cor"), p.get("modelo"),
-                     p.get("caption"), p.get("imagem_url"), p.get("img_generator"),
-                     p.get("media_url",""), p.get("media_type","image"), p.get("vid_generator"),
-                     p.get("video_url",""), p.get("video_source",""),
-                     p.get("likes",0), json.dumps(p.get("liked_by",[])),
-                     json.dumps(p.get("comments",[])),
-                     json.dumps(p.get("carousel_urls")) if p.get("carousel_urls") else None,
-                     1 if p.get("is_ai", True) else 0,
-                     p.get("comunidade"), p.get("created_at"),
-                     p.get("tipo","foto"), p.get("arte_style"), 
-                     json.dumps(p.get("collab")) if p.get("collab") else None,
-                     p.get("trending_tag"), i)
-                )
-            
-            # Stories
+            await db.executemany(_SQL_UPSERT_POST, plano["posts_upsert"])
+            await db.execute("DELETE FROM ig_post_midia")
+            await db.executemany(SQL_INSERT_MIDIA, plano["midia_insert"])
             await db.execute("DELETE FROM ig_stories")
-            for s in stories:
-                await db.execute(
-                    """INSERT INTO ig_stories (id,agente_id,username,avatar,avatar_url,cor,nome,
-                     texto,imagem_url,img_generator,tipo,tipo_interativo,enquete,pergunta,
-                     visualizacoes,created_at)
-                    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                    (s.get("id"), s.get("agente_id"), s.get("username"), s.get("avatar"),
-                     s.get("avatar_url",""), s.get("cor"), s.get("nome"),
-                     s.get("texto"), s.get("imagem_url",""), s.get("img_generator"),
-                     s.get("tipo","texto"), s.get("tipo_interativo"),
-                     json.dumps(s.get("enquete")) if s.get("enquete") else None,
-                     json.dumps(s.get("pergunta")) if s.get("pergunta") else None,
-                     s.get("visualizacoes",0), s.get("created_at"))
-                )
-            
-            # DMs (last 500)
+            await db.executemany(_SQL_UPSERT_STORY, plano["stories_upsert"])
             await db.execute("DELETE FROM ig_dms")
-            for d in dms[-500:]:
-                await db.execute(
-                    """INSERT INTO ig_dms (id,de,de_nome,de_avatar,para,para_nome,para_avatar,
-                     texto,lida,created_at)
-                    VALUES (?,?,?,?,?,?,?,?,?,?)""",
-                    (d.get("id"), d.get("de"), d.get("de_nome"), d.get("de_avatar"),
-                     d.get("para"), d.get("para_nome"), d.get("para_avatar"),
-                     d.get("texto"), 1 if d.get("lida") else 0, d.get("created_at"))
-                )
-            
-            # Notifications (last 200)
+            await db.executemany(_SQL_UPSERT_DM, plano["dms_upsert"])
             await db.execute("DELETE FROM ig_notifications")
-            for n in notifs[-200:]:
-                await db.execute(
-                    """INSERT INTO ig_notifications (tipo,de,de_avatar,de_nome,para,post_id,texto,created_at)
-                    VALUES (?,?,?,?,?,?,?,?)""",
-                    (n.get("tipo"), n.get("de"), n.get("de_avatar"), n.get("de_nome"),
-                     n.get("para"), n.get("post_id"), n.get("texto"), n.get("created_at"))
-                )
-            
-            # Trending
+            await db.executemany(_SQL_INSERT_NOTIF, plano["notifs_insert"])
             await db.execute("DELETE FROM ig_trending")
-            for i, t in enumerate(trending):
+            await db.executemany(
+                "INSERT INTO ig_trending (posicao,hashtag,posts_count) VALUES (?,?,?)",
+                [(i,) + t for i, t in enumerate(plano["novo"]["trending"])])
+            await db.executemany(
+                "INSERT OR REPLACE INTO ig_agente_runtime (agente_id,seguidores,seguindo) VALUES (?,?,?)",
+                plano["runtime_upsert"])
+            for tabela in ("ig_comments", "ig_comment_replies", "ig_post_likes"):
+                await db.execute(f"DELETE FROM {tabela}")
+            await db.executemany(SQL_UPSERT_COMMENT, plano["comments_upsert"])
+            await db.executemany(SQL_UPSERT_REPLY, plano["replies_upsert"])
+            await db.executemany(SQL_INSERT_LIKE, plano["likes_insert"])
+            for (tabela, cols, nome), mapa in zip(_TABELAS_PARES, (follows, saved, clikes)):
+                if mapa is not None:
+                    await db.execute(f"DELETE FROM {tabela}")
+                    await db.executemany(f"INSERT OR IGNORE INTO {tabela} ({cols}) VALUES (?,?)", plano[f"{nome}_insert"])
+            await db.commit()
+        except BaseException as e:
+            print(f"[IG-DB] Sync error: {e}")
+            try:
+                await db.rollback()
+            except:
+                pass
+            raise
+        _estado.aplicar(plano)
+
+
+# === INCREMENTAL SYNC (replaces _salvar_dados) ===
+async def sync_changes_to_db(posts, stories, notifs, dms, trending, agentes_ig, follows=None, saved=None, clikes=None):
+    """Grava so as linhas que mudaram desde o ultimo flush (executemany).
+
+    O diff e calculado dentro do lock e o estado so avanca depois do commit:
+    mutacoes feitas durante o flush aparecem no proximo diff (sem lost update)
+    e um crash no meio deixa o banco no ultimo commit (WAL + transacao unica).
+    """
+    if not _estado.semeado:
+        return await sync_all_to_db(posts, stories, notifs, dms, trending, agentes_ig, follows, saved, clikes)
+    async with _db_lock:
+        db = await get_db()
+        plano = await _planejar_fora_do_loop(_estado, posts, stories, notifs, dms, trending,
+                                             agentes_ig, follows, saved, clikes)
+        if _estado.vazio(plano):
+            return
+        try:
+            await db.executemany("DELETE FROM ig_posts WHERE id=?", plano["posts_delete"])
+            for tabela in ("ig_comments", "ig_comment_replies", "ig_post_likes", "ig_post_midia"):
+                await db.executemany(f"DELETE FROM {tabela} WHERE post_id=?", plano["posts_delete"])
+            await db.executemany(_SQL_UPSERT_POST, plano["posts_upsert"])
+            await db.executemany("DELETE FROM ig_post_midia WHERE post_id=?", [(r[0],) for r in plano["posts_upsert"]])
+            await db.executemany(SQL_INSERT_MIDIA, plano["midia_insert"])
+            # Comentario novo = um INSERT; like = um INSERT em ig_post_likes
+            await db.executemany("DELETE FROM ig_comments WHERE id=?", plano["comments_delete"])
+            await db.executemany(SQL_UPSERT_COMMENT, plano["comments_upsert"])
+            await db.executemany("DELETE FROM ig_comment_replies WHERE id=?", plano["replies_delete"])
+            await db.executemany(SQL_UPSERT_REPLY, plano["replies_upsert"])
+            await db.executemany("DELETE FROM ig_post_likes WHERE post_id=? AND agente_id=?", plano["likes_delete"])
+            await db.executemany(SQL_INSERT_LIKE, plano["likes_insert"])
+            await db.executemany("DELETE FROM ig_stories WHERE id=?", plano["stories_delete"])
+            await db.executemany(_SQL_UPSERT_STORY, plano["stories_upsert"])
+            await db.executemany("DELETE FROM ig_dms WHERE id=?", plano["dms_delete"])
+            await db.executemany(_SQL_UPSERT_DM, plano["dms_upsert"])
+            if plano["notifs_insert"]:
+                await db.executemany(_SQL_INSERT_NOTIF, plano["notifs_insert"])
                 await db.execute(
+                    f"DELETE FROM ig_notifications WHERE rowid NOT IN "
+                    f"(SELECT rowid FROM ig_notifications ORDER BY rowid DESC LIMIT {MAX_NOTIFS})")
+            if plano["trending"] is not None:
+                await db.execute("DELETE FROM ig_trending")
+                await db.executemany(
                     "INSERT INTO ig_trending (posicao,hashtag,posts_count) VALUES (?,?,?)",
-                    (i, t.get("hashtag",""), t.get("posts_count",0))
-                )
-            
-            # Agent runtime stats
-            for k, v in agentes_ig.items():
-                await db.execute(
-                    "INSERT OR REPLACE INTO ig_agente_runtime (agente_id,seguidores,seguindo) VALUES (?,?,?)",
-                    (k, v.get("seguidores",0), v.get("seguindo",0))
-                )
-            
+                    [(i,) + t for i, t in enumerate(plano["trending"])])
+            await db.executemany(
+                "INSERT OR REPLACE INTO ig_agente_runtime (agente_id,seguidores,seguindo) VALUES (?,?,?)",
+                plano["runtime_upsert"])
+            for tabela, cols, nome in _TABELAS_PARES:
+                a, b = cols.split(",")
+                await db.executemany(f"DELETE FROM {tabela} WHERE {a}=? AND {b}=?", plano[f"{nome}_delete"])
+                await db.executemany(f"INSERT OR IGNORE INTO {tabela} ({cols}) VALUES (?,?)", plano[f"{nome}_insert"])
             await db.commit()
-        except Exception as e:
+        except BaseException as e:
             print(f"[IG-DB] Sync error: {e}")
             try:
                 await db.rollback()
             except:
                 pass
+            raise
+        _estado.aplicar(plano)
+        if plano["posts_delete"] or plano["despejados"]:
+            _paginas_frias.clear()
@@ -0,0 +1,424 @@
+"""
+Instagram - indices em memoria dos POSTS/DMS
+Lista que mantem id -> post, agente -> posts e tipo -> posts a cada
+insert/pop/trim, para as buscas por id deixarem de varrer POSTS inteiro,
+contadores por agente para ranking/badges/reputacao e o indice de
+hashtags (posting list + contagem por janela de tempo) do trending.
+O indice por (created_at, id) serve a paginacao por cursor do feed/reels.
+Rodar `python -m app.routers.instagram_index` mostra o micro-benchmark.
+"""
+import base64
+import heapq
+import json
+import math
+import re
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from app.services.colecoes import ListaObservavel
+
+
+def codificar_cursor(chave):
+    """(created_at, id) -> string opaca para next_cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(chave)).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor; None se o cursor nao for valido"""
+    try:
+        criado, pid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(criado), str(pid)
+    except Exception:
+        return None
+
+
+class PostsIndexados(ListaObservavel):
+    """Drop-in de list para POSTS (mais novo primeiro) com indices mantidos.
+
+    Toda operacao que muda a lista atualiza id -> post, agente -> posts,
+    tipo -> posts e as chaves (created_at, id) ordenadas de pagina(). Se um
+    post mudar de tipo in-place, chame atualizar(post).
+    """
+
+    def __init__(self, iterable=(), **kwargs):
+        super().__init__(iterable, **kwargs)
+        self._reindexar()
+
+    # --- indices ---
+    def _reindexar(self):
+        self._por_id = {}
+        self._por_agente = {}
+        self._por_tipo = {}
+        self._tipo_de = {}
+        self._seq = {}
+        self._chaves = []       # (created_at, id) crescente
+        self._chaves_tipo = {}  # tipo -> idem, so daquele tipo (reels)
+        self._chave_de = {}     # id -> ((created_at, id), tipo)
+        for i, p in enumerate(self):
+            self._indexar(p, i)
+        self._min, self._max = 0, len(self)
+
+    def _reordenou(self):
+        self._seq = {p.get("id"): i for i, p in enumerate(self)}
+        self._min, self._max = 0, len(self)
+
+    def _indexar(self, p, seq):
+        pid = p.get("id")
+        if pid is None:
+            return
+        self._por_id[pid] = p
+        self._seq[pid] = seq
+        self._por_agente.setdefault(p.get("agente_id"), {})[pid] = p
+        tipo = p.get("tipo", "foto")
+        self._por_tipo.setdefault(tipo, {})[pid] = p
+        self._tipo_de[pid] = tipo
+        self._tirar_chave(pid)
+        chave = (p.get("created_at") or "", pid)
+        self._chave_de[pid] = (chave, tipo)
+        insort(self._chaves, chave)  # post novo: cai no fim, sem memmove
+        insort(self._chaves_tipo.setdefault(tipo, []), chave)
+
+    def _tirar_chave(self, pid):
+        ant = self._chave_de.pop(pid, None)
+        if ant is None:
+            return
+        chave, tipo = ant
+        for chaves in (self._chaves, self._chaves_tipo.get(tipo, [])):
+            i = bisect_left(chaves, chave)
+            if i < len(chaves) and chaves[i] == chave:
+                del chaves[i]
+
+    def _desindexar(self, p):
+        pid = p.get("id")
+        if pid is None or self._por_id.get(pid) is not p:
+            return
+        del self._por_id[pid]
+        self._seq.pop(pid, None)
+        ag = self._por_agente.get(p.get("agente_id"))
+        if ag is not None:
+            ag.pop(pid, None)
+        tp = self._por_tipo.get(self._tipo_de.pop(pid, None))
+        if tp is not None:
+            tp.pop(pid, None)
+        self._tirar_chave(pid)
+
+    def _entrou(self, itens, onde):
+        for p in itens:
+            if onde == "inicio":
+                self._min -= 1
+                self._indexar(p, self._min)
+            else:
+                self._indexar(p, self._max)
+                self._max += 1
+        if onde == "meio":
+            self._reordenou()
+        super()._entrou(itens, onde)
+
+    def _saiu(self, itens):
+        for p in itens:
+            self._desindexar(p)
+        super()._saiu(itens)
+
+    # --- consultas O(1) / O(k) ---
+    def por_id(self, pid):
+        return self._por_id.get(pid)
+
+    def ordem(self, p):
+        """Chave de ordenacao (posicao relativa no feed)"""
+        return self._seq.get(p.get("id"), 0)
+
+    def do_agente(self, agente_id):
+        return sorted(self._por_agente.get(agente_id, {}).values(), key=self.ordem)
+
+    def do_tipo(self, tipo):
+        return sorted(self._por_tipo.get(tipo, {}).values(), key=self.ordem)
+
+    def pagina(self, antes=None, limite=20, tipo=None):
+        """(posts, chave_do_ultimo) mais novos primeiro, com (created_at, id) < antes.
+
+        O cursor e uma chave e nao uma posicao: posts que entram no topo
+        enquanto o usuario rola nao empurram a pagina seguinte (sem repetir
+        nem pular). chave_do_ultimo e None quando nao ha mais nada.
+        """
+        chaves = self._chaves if tipo is None else self._chaves_tipo.get(tipo, [])
+        fim = len(chaves) if antes is None else bisect_left(chaves, tuple(antes))
+        ini = max(0, fim - limite)
+        posts = [self._por_id[c[1]] for c in reversed(chaves[ini:fim])]
+        return posts, (chaves[ini] if ini > 0 else None)
+
+    def contar_agente(self, agente_id):
+        return len(self._por_agente.get(agente_id, ()))
+
+    def contar_tipo(self, tipo):
+        return len(self._por_tipo.get(tipo, ()))
+
+    def atualizar(self, p):
+        """Reindexa um post alterado in-place (ex: carrossel virou foto)"""
+        if self._por_id.get(p.get("id")) is p:
+            seq = self._seq[p["id"]]
+            self._desindexar(p)
+            self._indexar(p, seq)
+
+
+class AgregadosAgentes:
+    """Contadores por agente (posts, likes, comentarios, DMs enviadas).
+
+    Observa POSTS e DMS, entao inserts/trims/deletes ja atualizam os
+    numeros; likes e comentarios feitos in-place num post existente
+    precisam de atualizar_post(post). verificar() reconstroi do zero e
+    compara, para pegar algum caminho que esqueceu de avisar.
+    """
+
+    CAMPOS = ("posts", "likes", "comments", "dms")
+
+    def __init__(self):
+        self._por_agente = {}
+        self._contrib = {}  # post_id -> (agente_id, likes, comments) ja somados
+        self.posts = _ObsPosts(self)
+        self.dms = _ObsDms(self)
+
+    def _somar(self, agente_id, campo, delta):
+        c = self._por_agente.setdefault(agente_id, dict.fromkeys(self.CAMPOS, 0))
+        c[campo] += delta
+
+    def _incluir_post(self, p):
+        pid = p.get("id")
+        if pid is None or pid in self._contrib:
+            return
+        aid = p.get("agente_id")
+        likes, comments = p.get("likes", 0) or 0, len(p.get("comments") or [])
+        self._contrib[pid] = (aid, likes, comments)
+        self._somar(aid, "posts", 1)
+        self._somar(aid, "likes", likes)
+        self._somar(aid, "comments", comments)
+
+    def _excluir_post(self, p):
+        ant = self._contrib.pop(p.get("id"), None)
+        if ant is None:
+            return
+        aid, likes, comments = ant
+        self._somar(aid, "posts", -1)
+        self._somar(aid, "likes", -likes)
+        self._somar(aid, "comments", -comments)
+
+    def atualizar_post(self, p):
+        """Chamar depois de like/comentario in-place num post"""
+        if p.get("id") in self._contrib:
+            self._excluir_post(p)
+            self._incluir_post(p)
+
+    def de(self, agente_id):
+        return self._por_agente.get(agente_id) or dict.fromkeys(self.CAMPOS, 0)
+
+    def reconstruir(self, posts, dms):
+        self._por_agente, self._contrib = {}, {}
+        for p in posts:
+            self._incluir_post(p)
+        for d in dms:
+            self._somar(d.get("de"), "dms", 1)
+
+    def verificar(self, posts, dms):
+        """Reconstroi do zero e devolve as divergencias {agente: {campo: (atual, real)}}"""
+        real = AgregadosAgentes()
+        real.reconstruir(posts, dms)
+        diffs = {}
+        for aid in set(self._por_agente) | set(real._por_agente):
+            a, r = self.de(aid), real.de(aid)
+            d = {c: (a[c], r[c]) for c in self.CAMPOS if a[c] != r[c]}
+            if d:
+                diffs[aid] = d
+        return diffs
+
+
+class _ObsPosts:
+    def __init__(self, ag):
+        self.ag = ag
+
+    def inserido(self, p):
+        self.ag._incluir_post(p)
+
+    def removido(self, p):
+        self.ag._excluir_post(p)
+
+
+class _ObsDms:
+    def __init__(self, ag):
+        self.ag = ag
+
+    def inserido(self, d):
+        self.ag._somar(d.get("de"), "dms", 1)
+
+    def removido(self, d):
+        self.ag._somar(d.get("de"), "dms", -1)
+
+
+RE_HASHTAG = re.compile(r"#(\w+)")
+
+# Janelas do trending: segundos da janela e meia-vida do decaimento
+JANELAS = {"1h": (3600, 900), "24h": (86400, 6 * 3600), "7d": (7 * 86400, 86400)}
+BALDE_S = 300  # contagens agrupadas em baldes de 5 min
+
+
+def extrair_hashtags(texto):
+    """{tag_normalizada: forma_original} das hashtags de um texto"""
+    return {m.lower(): m for m in RE_HASHTAG.findall(texto or "")}
+
+
+def _epoch(p):
+    try:
+        return datetime.fromisoformat(p["created_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class IndiceHashtags:
+    """Observador de POSTS: tag -> posts e contagem por balde de tempo.
+
+    Atualizado a cada insert/trim/delete, entao o trending cobre todos os
+    posts em memoria e nao so uma amostra. top() percorre so os baldes da
+    janela (custo proporcional aos posts recentes, nao ao acervo) e usa
+    heapq.nlargest para as k primeiras.
+    """
+
+    def __init__(self, ordem=None):
+        self.ordem = ordem  # chave de ordenacao do feed (PostsIndexados.ordem)
+        self._posts = {}    # tag -> {post_id: post}
+        self._baldes = {}   # balde -> {tag: contagem}
+        self._forma = {}    # tag -> como foi escrita por ultimo (#LocalAI)
+        self._tags_de = {}  # post_id -> (balde, tags)
+
+    def inserido(self, p):
+        pid = p.get("id")
+        if pid is None or pid in self._tags_de:
+            return
+        tags = extrair_hashtags(p.get("caption"))
+        if not tags:
+            return
+        balde = int(_epoch(p) // BALDE_S)
+        self._tags_de[pid] = (balde, tuple(tags))
+        cont = self._baldes.setdefault(balde, {})
+        for tag, forma in tags.items():
+            self._posts.setdefault(tag, {})[pid] = p
+            cont[tag] = cont.get(tag, 0) + 1
+            self._forma[tag] = "#" + forma
+
+    def removido(self, p):
+        ant = self._tags_de.pop(p.get("id"), None)
+        if ant is None:
+            return
+        balde, tags = ant
+        cont = self._baldes[balde]
+        for tag in tags:
+            self._posts[tag].pop(p["id"], None)
+            if not self._posts[tag]:
+                del self._posts[tag]
+                self._forma.pop(tag, None)
+            cont[tag] -= 1
+            if not cont[tag]:
+                del cont[tag]
+        if not cont:
+            del self._baldes[balde]
+
+    # --- consultas ---
+    def posts(self, tag):
+        """Posts com a hashtag (com ou sem #), mais novo primeiro"""
+        ps = self._posts.get(tag.lstrip("#").lower(), {}).values()
+        return sorted(ps, key=self.ordem) if self.ordem else list(ps)
+
+    def contar(self, tag):
+        return len(self._posts.get(tag.lstrip("#").lower(), ()))
+
+    def forma(self, tag):
+        return self._forma.get(tag, "#" + tag)
+
+    def top(self, k=10, janela="24h", agora=None):
+        """[(tag, score, posts_na_janela)] das k tags mais quentes da janela.
+
+        Cada post conta 0.5 ** (idade / meia_vida), entao um pico recente
+        passa na frente de uma tag que foi forte no comeco da janela.
+        """
+        agora = time.time() if agora is None else agora
+        dur, meia_vida = JANELAS[janela]
+        fim = int(agora // BALDE_S)
+        inicio = int((agora - dur) // BALDE_S)
+        score, n = {}, {}
+        if fim - inicio < len(self._baldes):
+            baldes = ((b, self._baldes.get(b)) for b in range(inicio, fim + 1))
+        else:
+            baldes = ((b, c) for b, c in self._baldes.items() if inicio <= b <= fim)
+        for balde, cont in baldes:
+            if not cont:
+                continue
+            peso = math.pow(0.5, max(0.0, agora - (balde + 0.5) * BALDE_S) / meia_vida)
+            for tag, c in cont.items():
+                score[tag] = score.get(tag, 0.0) + c * peso
+                n[tag] = n.get(tag, 0) + c
+        return [(t, score[t], n[t]) for t in heapq.nlargest(k, score, key=score.get)]
+
+    def buscar(self, trecho, k=15):
+        """[(tag, posts)] das tags que contem o trecho, mais usadas primeiro"""
+        trecho = trecho.lstrip("#").lower()
+        achadas = [t for t in self._posts if trecho in t]
+        return [(t, len(self._posts[t])) for t in heapq.nlargest(k, achadas, key=lambda t: len(self._posts[t]))]
+
+    def mais_usadas(self, k=20):
+        """Tags com mais posts no acervo inteiro (sem janela)"""
+        return heapq.nlargest(k, self._posts, key=lambda t: len(self._posts[t]))
+
+
+def _benchmark():
+    import random
+    import time
+    print(f"{'posts':>8} | {'scan (us)':>10} | {'indice (us)':>11} | {'saved x50 scan':>14} | {'saved x50 idx':>13}")
+    for n in (1_000, 10_000, 100_000):
+        posts = [{"id": f"igpost_{i:08x}", "agente_id": f"ag{i % 12}", "tipo": "reel" if i % 5 == 0 else "foto"}
+                 for i in range(n)]
+        idx = PostsIndexados(posts)
+        alvos = [random.choice(posts)["id"] for _ in range(200)]
+        t = time.perf_counter()
+        for pid in alvos:
+            next((p for p in posts if p["id"] == pid), None)
+        scan = (time.perf_counter() - t) / len(alvos) * 1e6
+        t = time.perf_counter()
+        for pid in alvos:
+            idx.por_id(pid)
+        rapido = (time.perf_counter() - t) / len(alvos) * 1e6
+        ids = alvos[:50]
+        t = time.perf_counter()
+        [p for p in posts if p["id"] in ids]
+        saved_scan = (time.perf_counter() - t) * 1e3
+        t = time.perf_counter()
+        sorted(filter(None, (idx.por_id(i) for i in ids)), key=idx.ordem)
+        saved_idx = (time.perf_counter() - t) * 1e3
+        print(f"{n:>8} | {scan:>10.1f} | {rapido:>11.2f} | {saved_scan:>11.2f} ms | {saved_idx:>10.3f} ms")
+
+    print(f"\n{'posts':>8} | {'trending scan 50 (ms)':>21} | {'trending idx todos (ms)':>23} | {'#tag scan (ms)':>14} | {'#tag idx (ms)':>13}")
+    agora = time.time()
+    vocab = [f"Tag{i}" for i in range(500)]
+    for n in (1_000, 10_000, 100_000):
+        posts = [{"id": f"igpost_{i:08x}",
+                  "caption": "post " + " ".join("#" + random.choice(vocab) for _ in range(3)),
+                  "created_at": datetime.fromtimestamp(agora - i * 60).isoformat()}
+                 for i in range(n)]
+        idx = PostsIndexados(posts)
+        ht = IndiceHashtags(idx.ordem)
+        idx.observar(ht)
+        t = time.perf_counter()
+        tags = [w.lower() for p in posts[:50] for w in p["caption"].split() if w.startswith("#")]
+        heapq.nlargest(10, set(tags), key=tags.count)
+        scan = (time.perf_counter() - t) * 1e3
+        t = time.perf_counter()
+        ht.top(10, "24h", agora)
+        rapido = (time.perf_counter() - t) * 1e3
+        t = time.perf_counter()
+        [p for p in posts if "#tag7" in p["caption"].lower()]
+        tag_scan = (time.perf_counter() - t) * 1e3
+        t = time.perf_counter()
+        ht.posts("tag7")
+        tag_idx = (time.perf_counter() - t) * 1e3
+        print(f"{n:>8} | {scan:>21.2f} | {rapido:>23.2f} | {tag_scan:>14.2f} | {tag_idx:>13.3f}")
+
+
+if __name__ == "__main__":
+    _benchmark()
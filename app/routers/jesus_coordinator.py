@@ -5,16 +5,15 @@ Monitora saude, gera insights e coordena os projetos
 """
 
 import asyncio
-import httpx
 import uuid
 from datetime import datetime
 from fastapi import APIRouter
 import os
+from app.services.http_pool import http_pool
+from app.services.llm_client import gerar_texto
 
 router = APIRouter(prefix="/api/jesus", tags=["jesus-coordinator"])
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-
 # ============================================================
 # SERVICOS DO ECOSSISTEMA
 # ============================================================
@@ -112,7 +111,7 @@ COORDINATOR_INSIGHTS = []
 async def _check_service_health(service_key, service_info):
     """Verifica a saude de um servico individual"""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with http_pool.cliente(timeout=5.0) as client:
             resp = await client.get(service_info["url"])
             if resp.status_code == 200:
                 return {
@@ -186,19 +185,7 @@ async def jesus_health_all():
 # JESUS.AI GERA INSIGHTS SOBRE O ECOSSISTEMA
 # ============================================================
 async def _chamar_ollama(prompt, max_tokens=300):
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(OLLAMA_URL, json={
-                "model": "llama3.2:3b",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"num_predict": max_tokens, "temperature": 0.8}
-            })
-            if resp.status_code == 200:
-                return resp.json().get("response", "").strip()
-    except Exception as e:
-        print(f"[Jesus.ai] Ollama error: {e}")
-    return ""
+    return await gerar_texto("llama3.2:3b", prompt, max_tokens=max_tokens, temperature=0.8)
 
 @router.get("/insight")
 async def jesus_insight():
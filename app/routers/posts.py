@@ -15,6 +15,7 @@ from app.schemas import (
 )
 from app.services.auth import get_current_agent
 from app.services.feed import get_feed_posts, get_public_posts
+from app.services.metricas_rede import metricas_rede
 
 router = APIRouter(prefix="/api/posts", tags=["posts"])
 
@@ -36,6 +37,7 @@ async def create_post(
     db.add(post)
     await db.commit()
     await db.refresh(post)
+    metricas_rede.invalidar()
 
     return post
 
@@ -127,6 +129,7 @@ async def update_post(
 
     await db.commit()
     await db.refresh(post)
+    metricas_rede.invalidar()
 
     return post
 
@@ -155,6 +158,7 @@ async def delete_post(
 
     await db.delete(post)
     await db.commit()
+    metricas_rede.invalidar()
 
 
 @router.post("/{post_id}/like", status_code=status.HTTP_201_CREATED)
@@ -197,6 +201,7 @@ async def like_post(
     post.likes_count += 1
 
     await db.commit()
+    metricas_rede.invalidar()
 
     return {"message": "Post curtido com sucesso"}
 
@@ -235,6 +240,7 @@ async def unlike_post(
     post.likes_count = max(0, post.likes_count - 1)
 
     await db.commit()
+    metricas_rede.invalidar()
 
 
 @router.post("/{post_id}/comment", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
@@ -265,6 +271,7 @@ async def create_comment(
 
     await db.commit()
     await db.refresh(comment)
+    metricas_rede.invalidar()
 
     return comment
 
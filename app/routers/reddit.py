@@ -5,12 +5,15 @@ Subreddits, posts, upvotes/downvotes, karma, comentarios aninhados
 
 from fastapi import APIRouter, Request
 from datetime import datetime
-import asyncio, random, uuid, json, os, httpx
+import asyncio, random, uuid, json, os
+from app.services.persistencia import persistencia, gravar_texto_atomico
+from app.services.http_pool import http_pool
+from app.services.llm_client import gerar_texto
+from app.services.simulacao import simulacao, mtime
 
 router = APIRouter()
 
 # ============ CONFIGURACAO ============
-OLLAMA_URL = "http://localhost:11434"
 PERSIST_FILE = "reddit_data.json"
 PIXABAY_KEY = os.environ.get("PIXABAY_API_KEY", "")
 
@@ -55,18 +58,28 @@ NOTIFS = []
 AWARDS = ["🥇 Gold", "🥈 Silver", "🏅 Helpful", "💎 Diamond", "🚀 Rocket", "❤️ Wholesome", "🧠 Big Brain", "😂 LMAO"]
 
 
-def _salvar_dados():
+async def _salvar_dados_async():
+    """Serializa no event loop (os dicts continuam sendo mutados), so a escrita vai para a thread"""
+    data = {
+        "posts": POSTS[:300],
+        "comments": {k: v[:50] for k, v in COMMENTS.items()},
+        "agentes": {k: {"karma": v["karma"]} for k, v in AGENTES_REDDIT.items()},
+        "notifs": NOTIFS[-100:],
+    }
     try:
-        data = {
-            "posts": POSTS[:300],
-            "comments": {k: v[:50] for k, v in COMMENTS.items()},
-            "agentes": {k: {"karma": v["karma"]} for k, v in AGENTES_REDDIT.items()},
-            "notifs": NOTIFS[-100:],
-        }
-        with open(PERSIST_FILE, "w") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        texto = json.dumps(data, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(gravar_texto_atomico, PERSIST_FILE, texto)
     except Exception as e:
         print(f"[Reddit] Erro salvar: {e}")
+        raise
+
+
+def _salvar_dados():
+    """Pede um flush agendado (nao bloqueia o event loop)"""
+    persistencia.marcar("reddit")
+
+
+persistencia.registrar("reddit", _salvar_dados_async)
 
 
 def _carregar_dados():
@@ -88,62 +101,10 @@ def _carregar_dados():
 _carregar_dados()
 
 
-# ============ TEXT GENERATION CASCADE ============
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
-OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-OPENROUTER_TEXT_MODELS = ["google/gemini-2.5-flash", "google/gemini-2.0-flash-001", "meta-llama/llama-3.1-8b-instruct"]
-
-async def _chamar_ollama(modelo, prompt, max_tokens=200):
-    """Cascade: Groq -> OpenRouter -> Ollama local"""
-    # 1) Try Groq (free, ultra fast)
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            r = await client.post(GROQ_URL, headers={
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            }, json={
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": max_tokens, "temperature": 0.9
-            })
-            if r.status_code == 200:
-                txt = r.json()["choices"][0]["message"]["content"].strip()
-                if txt and len(txt) > 3:
-                    return txt
-    except:
-        pass
-    # 2) Try OpenRouter
-    for model in OPENROUTER_TEXT_MODELS:
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                r = await client.post(OPENROUTER_URL, headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json"
-                }, json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": max_tokens, "temperature": 0.9
-                })
-                if r.status_code == 200:
-                    txt = r.json()["choices"][0]["message"]["content"].strip()
-                    if txt and len(txt) > 3:
-                        return txt
-        except:
-            pass
-    # 3) Fallback to Ollama local
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            r = await client.post(f"{OLLAMA_URL}/api/generate", json={
-                "model": modelo, "prompt": prompt, "stream": False,
-                "options": {"num_predict": max_tokens, "temperature": 0.9}
-            })
-            if r.status_code == 200:
-                return r.json().get("response", "").strip()
-    except:
-        pass
-    return ""
+# ============ TEXT GENERATION ============
+async def _chamar_ollama(modelo, prompt, max_tokens=200, cache=None):
+    """Gateway de texto compartilhado (breaker/roteamento em llm_client)"""
+    return await gerar_texto(modelo, prompt, max_tokens=max_tokens, temperature=0.9, cache=cache)
 
 
 # ============ PIXABAY ============
@@ -157,7 +118,7 @@ async def _buscar_imagem_pixabay(query):
             "space+station+future", "neural+network+abstract", "digital+brain"
         ]
         q = random.choice(queries_futuristic) if not query else query.replace(" ", "+")
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_pool.cliente(timeout=15.0) as client:
             r = await client.get(f"https://pixabay.com/api/?key={PIXABAY_KEY}&q={q}&image_type=illustration&per_page=50&safesearch=true")
             if r.status_code == 200:
                 hits = r.json().get("hits", [])
@@ -215,7 +176,7 @@ async def _gerar_comentario(aid, titulo, corpo_post=""):
     prompt = f"""You are {ag['nome']} on Reddit. Comment on this post:
 {context}
 Write a short Reddit comment (1-3 sentences). Be witty, insightful or funny. No quotes."""
-    comment = await _chamar_ollama(ag["modelo"], prompt, 100)
+    comment = await _chamar_ollama(ag["modelo"], prompt, 100, cache="variar")
     if not comment:
         comments_default = [
             "This is genuinely fascinating, great post!",
@@ -544,7 +505,7 @@ What does this art mean to you? Be philosophical and passionate.
             img_url = ""
             query = random.choice(PIXABAY_ARTE_REDDIT)
             try:
-                async with httpx.AsyncClient(timeout=15.0) as client:
+                async with http_pool.cliente(timeout=15.0) as client:
                     r = await client.get(f"https://pixabay.com/api/?key={PIXABAY_KEY}&q={query}&image_type=illustration&per_page=50&safesearch=true")
                     if r.status_code == 200:
                         hits = r.json().get("hits", [])
@@ -634,22 +595,37 @@ Write a thoughtful Reddit comment about this art. Can be:
 
 
 # ============ STARTUP ============
+async def _recarregar_espelho():
+    """SIMULACAO_MODO=api: o worker regravou reddit_data.json"""
+    _carregar_dados()
+
+
 @router.on_event("startup")
 async def _reddit_startup():
     _carregar_dados()
+    simulacao.espelhar("reddit", _recarregar_espelho, lambda: mtime(PERSIST_FILE), prefixo="/api/reddit")
     if os.environ.get("RENDER"):
         print("[Reddit] Running on Render - cycles disabled")
         return
-    asyncio.create_task(_ciclo_posts_reddit())
-    asyncio.create_task(_ciclo_comentarios_reddit())
-    asyncio.create_task(_ciclo_votos_reddit())
-    asyncio.create_task(_ciclo_awards_reddit())
-    asyncio.create_task(_ciclo_replies_reddit())
-    asyncio.create_task(_ciclo_arte_reddit())  # Arte criativa total
-    asyncio.create_task(_ciclo_debates_criativos())  # Debates sobre arte
+    if not simulacao.iniciar("reddit", [
+        ("agendado", _ciclo_posts_reddit),
+        ("ambiente", _ciclo_comentarios_reddit),
+        ("ambiente", _ciclo_votos_reddit),
+        ("ambiente", _ciclo_awards_reddit),
+        ("ambiente", _ciclo_replies_reddit),
+        ("agendado", _ciclo_arte_reddit),  # Arte criativa total
+        ("ambiente", _ciclo_debates_criativos),  # Debates sobre arte
+    ]):
+        print(f"[Reddit] Ciclos em outro processo (SIMULACAO_MODO={simulacao.modo})")
+        return
     print("[Reddit] Sistema AI Reddit iniciado com 7 ciclos autonomos + ARTE CRIATIVA TOTAL!")
 
 
+@router.on_event("shutdown")
+async def _reddit_shutdown():
+    await persistencia.flush("reddit")
+
+
 # ============ API ENDPOINTS ============
 
 @router.get("/api/reddit/feed")
@@ -6,7 +6,6 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 import asyncio
-import httpx
 import json
 import os
 import random
@@ -16,6 +15,10 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from collections import defaultdict
 
+from app.services.llm_client import gerar_texto
+from app.services.llm_agendador import com_prioridade
+from app.services.simulacao import simulacao, mtime
+
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
@@ -179,22 +182,8 @@ DADOS = _carregar_dados()
 # OLLAMA INTEGRATION
 # ============================================================
 
-OLLAMA_URL = "http://localhost:11434"
-
 async def gerar_texto_ollama(modelo: str, prompt: str, max_tokens: int = 150) -> str:
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(f"{OLLAMA_URL}/api/generate", json={
-                "model": modelo,
-                "prompt": prompt,
-                "stream": False,
-                "options": {"num_predict": max_tokens, "temperature": 0.85}
-            })
-            if resp.status_code == 200:
-                return resp.json().get("response", "").strip()
-    except Exception as e:
-        print(f"[SmartPosts] Erro Ollama ({modelo}): {e}")
-    return ""
+    return await gerar_texto(modelo, prompt, max_tokens=max_tokens, temperature=0.85)
 
 async def gerar_comentario_ollama(modelo: str, post_content: str, personalidade: str) -> str:
     prompt = f"Você é um agente de IA com personalidade {personalidade}. Comente este post de forma curta (1-2 frases): '{post_content}'"
@@ -631,14 +620,23 @@ async def _scheduler_loop():
 # API ROUTES
 # ============================================================
 
+async def _recarregar_espelho():
+    """SIMULACAO_MODO=api: o worker regravou smart_posts.json"""
+    global DADOS
+    DADOS = _carregar_dados()
+
 @router.on_event("startup")
 async def iniciar_scheduler():
     global _scheduler_running, _scheduler_task
+    simulacao.espelhar("smart_posts", _recarregar_espelho, lambda: mtime(DATA_FILE), prefixo="/api/smart-posts")
     if os.environ.get("RENDER"):
         print("[SmartPosts] Running on Render - cycles disabled")
         return
+    if not simulacao.roda_grupo("smart_posts"):
+        print(f"[SmartPosts] Scheduler em outro processo (SIMULACAO_MODO={simulacao.modo})")
+        return
     _scheduler_running = True
-    _scheduler_task = asyncio.create_task(_scheduler_loop())
+    _scheduler_task = asyncio.create_task(com_prioridade("agendado", _scheduler_loop()))
 
 @router.get("/smart-posts", response_class=HTMLResponse)
 async def pagina_smart_posts(request: Request):
@@ -717,7 +715,7 @@ async def controlar_scheduler(acao: str):
     if acao == "start":
         if not _scheduler_running:
             _scheduler_running = True
-            _scheduler_task = asyncio.create_task(_scheduler_loop())
+            _scheduler_task = asyncio.create_task(com_prioridade("agendado", _scheduler_loop()))
         return {"status": "running"}
     elif acao == "stop":
         _scheduler_running = False
@@ -9,6 +9,15 @@ from app.services.auto_improvement import (
     improvement_engine,
     run_auto_improvement_cycle
 )
+from app.services.persistencia import persistencia
+from app.services.http_pool import http_pool
+from app.services.llm_client import gateway as llm_gateway
+from app.services.llm_cache import cache_llm
+from app.services.llm_agendador import agendador_llm
+from app.services.imagem_router import roteador_imagem
+from app.services.jobs_midia import jobs_midia
+from app.services.metricas_rede import metricas_rede
+from app.services.simulacao import simulacao
 
 router = APIRouter(prefix="/api/system", tags=["system"])
 
@@ -95,3 +104,80 @@ async def get_recommendations(db: AsyncSession = Depends(get_db)):
         "issues": metrics.issues_detected,
         "recommendations": recommendations
     }
+
+
+@router.get("/persistencia")
+async def get_persistencia():
+    """Metricas do flusher write-behind (pedidos coalescidos, lag de flush)"""
+    return persistencia.stats()
+
+
+@router.get("/http-pool")
+async def get_http_pool():
+    """Uso do pool HTTP compartilhado por host (conexoes abertas, reuso)"""
+    return http_pool.stats()
+
+
+@router.get("/llm")
+async def get_llm():
+    """Estado do gateway de texto: circuito, EWMA/p95 e hedges por provedor"""
+    return llm_gateway.stats()
+
+
+@router.get("/llm/cache")
+async def get_llm_cache():
+    """Cache de respostas do LLM: hit rate, bytes e latencia economizada"""
+    return cache_llm.stats()
+
+
+@router.delete("/llm/cache")
+async def limpar_llm_cache():
+    """Esvazia a camada em memoria do cache de respostas"""
+    return {"removidos": cache_llm.limpar()}
+
+
+@router.get("/llm/agenda")
+async def get_llm_agenda():
+    """Fila do agendador de LLM: vagas por classe, esperas e rate limit"""
+    return agendador_llm.stats()
+
+
+@router.get("/imagens")
+async def get_imagens():
+    """Roteador de imagem: ordem atual, taxa de sucesso, p50/p95 e bloqueios"""
+    return roteador_imagem.stats()
+
+
+@router.get("/metricas-rede")
+async def get_metricas_rede():
+    """Snapshot de metricas da rede: versao, idade, atualizacoes e retokenizacoes"""
+    return metricas_rede.stats()
+
+
+@router.get("/simulacao")
+async def get_simulacao():
+    """Onde roda a simulacao: modo, shard, grupos locais e recargas do espelho"""
+    return simulacao.stats()
+
+
+@router.get("/midia-jobs")
+async def get_midia_jobs(estado: str = None, tipo: str = None, ref: str = None, limit: int = 50):
+    """Jobs de midia (geracao HF): vagas por tipo, contadores e os jobs mais recentes"""
+    return {**jobs_midia.stats(), "jobs": jobs_midia.listar(estado, tipo, ref, min(limit, 200))}
+
+
+@router.get("/midia-jobs/{job_id}")
+async def get_midia_job(job_id: str):
+    """Estado de um job de midia (para polling)"""
+    job = jobs_midia.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nao encontrado")
+    return job.exportar()
+
+
+@router.delete("/midia-jobs/{job_id}")
+async def cancelar_midia_job(job_id: str):
+    """Cancela um job na fila ou rodando (cancela tambem no Space)"""
+    if jobs_midia.obter(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job nao encontrado")
+    return {"cancelado": jobs_midia.cancelar(job_id)}
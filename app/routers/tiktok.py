@@ -7,15 +7,16 @@ SEM LIVES - 100% auto-gerenciado pelas IAs via Ollama
 import asyncio
 import random
 import uuid
-import httpx
 from datetime import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Query
 import os
+from app.services.llm_client import gerar_texto
+from app.services.simulacao import simulacao
+from app.services.colecoes import ListaObservavel, ArquivoSqlite
 
 router = APIRouter(prefix="/api/tiktok", tags=["tiktok"])
 
-OLLAMA_URL = "http://localhost:11434"
 
 # ============================================================
 # PERFIS TIKTOK DAS IAs - DETALHADOS
@@ -143,11 +144,13 @@ PERFIS_TIKTOK = {
 # ARMAZENAMENTO
 # ============================================================
 
-TIKTOK_VIDEOS: List[dict] = []
+MAX_VIDEOS = int(os.environ.get("TIKTOK_MAX_VIDEOS", "1000"))
+ARQUIVO_VIDEOS = ArquivoSqlite("tt_videos", campo_data="publicado_em")
+TIKTOK_VIDEOS = ListaObservavel(capacidade=MAX_VIDEOS, arquivo=ARQUIVO_VIDEOS)  # mais novo primeiro
 TIKTOK_COMMENTS: dict = {}
 TIKTOK_TRENDING: List[str] = []
-TIKTOK_DUETOS: List[dict] = []
-TIKTOK_STITCH: List[dict] = []
+TIKTOK_DUETOS = ListaObservavel(capacidade=MAX_VIDEOS // 4)
+TIKTOK_STITCH = ListaObservavel(capacidade=MAX_VIDEOS // 4)
 TIKTOK_SERIES: List[dict] = []
 TIKTOK_DESAFIOS: List[dict] = []
 TIKTOK_SONS_CRIADOS: List[dict] = []
@@ -174,21 +177,12 @@ EFEITOS = [
 ]
 
 # ============================================================
-# OLLAMA
+# TEXTO (gateway de provedores)
 # ============================================================
 
 async def gerar_com_ollama(modelo: str, prompt: str) -> str:
-    try:
-        async with httpx.AsyncClient(timeout=25.0) as client:
-            resp = await client.post(f"{OLLAMA_URL}/api/generate", json={
-                "model": modelo, "prompt": prompt, "stream": False,
-                "options": {"temperature": 0.9, "num_predict": 80}
-            })
-            if resp.status_code == 200:
-                return resp.json().get("response", "").strip()
-    except Exception:
-        pass
-    return ""
+    """Gateway de texto compartilhado (breaker/roteamento/prioridade em llm_client)"""
+    return await gerar_texto(modelo, prompt, max_tokens=80, temperature=0.9, timeout=25.0)
 
 def extrair_texto(resp, fallback=""):
     if not resp:
@@ -598,7 +592,8 @@ async def iniciar_tiktok():
     if os.environ.get("RENDER"):
         print("[TikTok] Running on Render - cycles disabled")
         return
-    asyncio.create_task(tiktok_loop())
+    # Sem persistencia: o estado so existe onde o loop roda, entao fica na API
+    simulacao.iniciar("tiktok", [("agendado", tiktok_loop)], fixo=True)
 
 
 # ============================================================
@@ -620,6 +615,16 @@ async def tiktok_trending():
     return {"trending": TIKTOK_TRENDING[:20]}
 
 
+@router.get("/arquivo")
+async def tiktok_arquivo(antes: str = "", limite: int = Query(default=20, le=100)):
+    """Videos que ja sairam do feed (mais novos primeiro); antes = next_cursor"""
+    try:
+        videos, proximo = await ARQUIVO_VIDEOS.pagina(antes or None, limite)
+    except ValueError:
+        return {"erro": "cursor invalido"}
+    return {"videos": videos, "next_cursor": proximo, "has_more": proximo is not None}
+
+
 @router.get("/duetos")
 async def tiktok_duetos(limite: int = Query(default=20)):
     """Lista duetos"""
@@ -7,7 +7,6 @@ SEM LIVES - 100% auto-gerenciado pelas IAs via Ollama
 import asyncio
 import random
 import uuid
-import httpx
 import json as _json
 import os as _os
 from datetime import datetime
@@ -16,6 +15,11 @@ from fastapi import APIRouter, Query
 import jwt
 import time as _time
 import urllib.parse
+from app.services.persistencia import persistencia, gravar_texto_atomico
+from app.services.colecoes import ListaObservavel, ArquivoSqlite
+from app.services.http_pool import http_pool
+from app.services.llm_client import gerar_texto
+from app.services.simulacao import simulacao, mtime
 from app.routers.youtube_real import buscar_videos_youtube, buscar_shorts_youtube, format_duration as fmt_dur, format_views as fmt_views
 
 PIXABAY_API_KEY = _os.environ.get("PIXABAY_API_KEY", "")
@@ -51,7 +55,7 @@ async def _buscar_video_pixabay_yt(categoria="tech"):
     queries = PIXABAY_VIDEO_CATEGORIES.get(categoria, PIXABAY_VIDEO_CATEGORIES["tech"])
     query = random.choice(queries)
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with http_pool.cliente(timeout=15) as client:
             resp = await client.get(
                 f"https://pixabay.com/api/videos/?key={PIXABAY_API_KEY}&q={query}&per_page=20&safesearch=true"
             )
@@ -72,7 +76,7 @@ async def _buscar_video_pixabay_yt(categoria="tech"):
 async def _buscar_video_pexels_yt(categoria="tech"):
     query = PEXELS_VIDEO_CATEGORIES.get(categoria, "technology future")
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with http_pool.cliente(timeout=15) as client:
             resp = await client.get(
                 f"https://api.pexels.com/videos/search?query={urllib.parse.quote(query)}&per_page=15",
                 headers={"Authorization": PEXELS_API_KEY}
@@ -98,7 +102,7 @@ async def _buscar_video_pexels_yt(categoria="tech"):
 
 async def _buscar_thumbnail_pixabay(query):
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with http_pool.cliente(timeout=10) as client:
             resp = await client.get(
                 f"https://pixabay.com/api/?key={PIXABAY_API_KEY}&q={urllib.parse.quote(query)}&image_type=illustration&per_page=20&safesearch=true"
             )
@@ -113,18 +117,26 @@ async def _buscar_thumbnail_pixabay(query):
 
 PERSIST_FILE = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "youtube_data.json")
 
-def _salvar_dados():
+async def _salvar_dados_async():
+    """Serializa no event loop (os dicts continuam sendo mutados), so a escrita vai para a thread"""
+    data = {
+        "videos": list(VIDEOS), "shorts": list(SHORTS), "comentarios": {k: list(v) for k, v in COMENTARIOS.items()},
+        "playlists": list(PLAYLISTS), "community_posts": list(COMMUNITY_POSTS),
+        "notificacoes": list(NOTIFICACOES), "historico_inscricoes": list(HISTORICO_INSCRICOES),
+        "canais": {k: {kk: vv for kk, vv in v.items() if kk != "temas"} for k, v in CANAIS_IA.items()},
+    }
     try:
-        data = {
-            "videos": VIDEOS, "shorts": SHORTS, "comentarios": COMENTARIOS,
-            "playlists": PLAYLISTS, "community_posts": COMMUNITY_POSTS,
-            "notificacoes": NOTIFICACOES, "historico_inscricoes": HISTORICO_INSCRICOES,
-            "canais": {k: {kk: vv for kk, vv in v.items() if kk != "temas"} for k, v in CANAIS_IA.items()},
-        }
-        with open(PERSIST_FILE, "w") as f:
-            _json.dump(data, f, ensure_ascii=False)
+        texto = _json.dumps(data, ensure_ascii=False)
+        await asyncio.to_thread(gravar_texto_atomico, PERSIST_FILE, texto)
     except Exception as e:
         print(f"[YT-SAVE] Erro: {e}")
+        raise
+
+def _salvar_dados():
+    """Pede um flush agendado (nao bloqueia o event loop)"""
+    persistencia.marcar("youtube")
+
+persistencia.registrar("youtube", _salvar_dados_async)
 
 def _carregar_dados():
     try:
@@ -161,7 +173,6 @@ def _carregar_dados():
 
 router = APIRouter(prefix="/api/youtube", tags=["youtube"])
 
-OLLAMA_URL = "http://localhost:11434"
 
 # ============================================================
 # CANAIS COM MAIS DETALHES
@@ -369,13 +380,15 @@ CANAIS_IA = {
 # ARMAZENAMENTO
 # ============================================================
 
-VIDEOS: List[dict] = []
-SHORTS: List[dict] = []
+MAX_VIDEOS = int(_os.environ.get("YT_MAX_VIDEOS", "1000"))
+ARQUIVO_VIDEOS = ArquivoSqlite("yt_videos", campo_data="publicado_em")
+VIDEOS = ListaObservavel(capacidade=MAX_VIDEOS, arquivo=ARQUIVO_VIDEOS)  # mais novo primeiro
+SHORTS = ListaObservavel(capacidade=MAX_VIDEOS // 2)
 COMENTARIOS: dict = {}
 TRENDING: List[dict] = []
 PLAYLISTS: List[dict] = []
 COMMUNITY_POSTS: List[dict] = []
-NOTIFICACOES: List[dict] = []
+NOTIFICACOES = ListaObservavel(capacidade=200)
 HISTORICO_INSCRICOES: List[dict] = []
 
 TIPOS_VIDEO = ["tutorial", "review", "gameplay", "vlog", "explicacao", "top 10", "react", "desafio", "unboxing", "entrevista", "documentario", "podcast", "how-to", "analise", "comparacao"]
@@ -765,137 +778,127 @@ GERADORES_VIDEO = {
 # HUGGING FACE - VIDEO REAL via Wan 2.1 Space (GRATIS)
 # ============================================================
 
-from gradio_client import Client as GradioClient
 import shutil
+from app.services.jobs_midia import jobs_midia
+
+
+def _extrair_video_wan(status):
+    """Path/URL do video em status_refresh do Wan 2.1 (None se ainda nao saiu)"""
+    if not (status and isinstance(status, tuple) and len(status) >= 1):
+        return None
+    video_update = status[0]
+    if not isinstance(video_update, dict):
+        return None
+    val = video_update.get("value")
+    if val is None:
+        return None
+    if isinstance(val, dict) and val.get("video"):
+        vinfo = val["video"]
+        if isinstance(vinfo, dict):
+            return vinfo.get("url") or vinfo.get("path", "")
+        return str(vinfo)
+    return val if isinstance(val, str) else str(val)
+
+
+def _baixar_video_hf(video_file, dest_path):
+    if _os.path.isfile(str(video_file)):
+        shutil.copy2(str(video_file), dest_path)
+    elif hasattr(video_file, "startswith") and video_file.startswith("http"):
+        import urllib.request
+        urllib.request.urlretrieve(video_file, dest_path)
+    else:
+        shutil.copy2(str(video_file), dest_path)
 
-HF_TASKS: dict = {}  # video_id -> {"status": ..., "prompt": ..., "retries": ...}
-HF_QUEUE: list = []  # fila de videos para gerar
 
-async def huggingface_text_to_video(prompt: str, video_id: str, vertical: bool = False) -> bool:
-    """Gera video REAL via Wan 2.1 Space no HuggingFace (GRATIS)"""
-    try:
-        loop = asyncio.get_event_loop()
-
-        def _generate_and_fetch():
-            """Submete prompt e busca video via Wan 2.1 (submit + polling)"""
-            import time as _t
-            client = GradioClient("Wan-AI/Wan2.1")
-            resolution = "720*1280" if vertical else "1280*720"
-
-            # Passo 1: Submit job (non-blocking)
-            job = client.submit(
-                prompt=prompt[:300],
-                size=resolution,
-                watermark_wan=False,
-                seed=-1,
-                api_name="/t2v_generation_async"
-            )
-            print(f"[HF] Job submetido para {video_id} ({resolution})")
-
-            # Passo 2: Esperar job completar (ate 15 min)
-            for i in range(90):
-                _t.sleep(10)
-                if job.done():
-                    print(f"[HF] Job {video_id} concluido em {(i+1)*10}s!")
-                    break
-                if i % 6 == 0:
-                    print(f"[HF] {video_id} esperando job... {(i+1)*10}s")
-            else:
-                print(f"[HF] {video_id} job timeout 15min")
+async def _job_wan_video(job):
+    """Job yt_hf_video: Wan 2.1 (submit + polling) sem prender thread enquanto espera"""
+    from gradio_client import Client as GradioClient
 
-            # Passo 3: Buscar video gerado via status_refresh
-            for i in range(60):
-                _t.sleep(10)
-                try:
-                    status = client.predict(api_name="/status_refresh")
-                    if status and isinstance(status, tuple) and len(status) >= 1:
-                        video_update = status[0]
-                        if isinstance(video_update, dict):
-                            val = video_update.get("value")
-                            if val is not None:
-                                # Extrair path do video
-                                if isinstance(val, dict) and val.get("video"):
-                                    vinfo = val["video"]
-                                    if isinstance(vinfo, dict):
-                                        vpath = vinfo.get("url") or vinfo.get("path", "")
-                                    else:
-                                        vpath = str(vinfo)
-                                elif isinstance(val, str):
-                                    vpath = val
-                                else:
-                                    vpath = str(val)
-                                print(f"[HF] VIDEO {video_id} PRONTO! {vpath[:100]}")
-                                return vpath
-                        # Log progresso
-                        if len(status) >= 3 and i % 6 == 0:
-                            wait = status[2]
-                            prog = status[3] if len(status) >= 4 else {}
-                            label = prog.get("label", "?") if isinstance(prog, dict) else "?"
-                            print(f"[HF] {video_id} refresh {i+1}/60 wait:{wait}s {label}")
-                except Exception as e:
-                    if i % 10 == 0:
-                        print(f"[HF] {video_id} refresh erro: {e}")
-            print(f"[HF] {video_id} timeout total - adicionando a fila retry")
-            return None
-
-        print(f"[HF] Conectando ao Wan 2.1 Space para: {video_id}...")
-        video_file = await loop.run_in_executor(None, _generate_and_fetch)
-
-        if video_file:
-            videos_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "hf_videos")
-            _os.makedirs(videos_dir, exist_ok=True)
-            dest_path = _os.path.join(videos_dir, f"{video_id}.mp4")
-
-            if _os.path.isfile(str(video_file)):
-                shutil.copy2(str(video_file), dest_path)
-            elif hasattr(video_file, "startswith") and video_file.startswith("http"):
-                import urllib.request
-                urllib.request.urlretrieve(video_file, dest_path)
-            else:
-                shutil.copy2(str(video_file), dest_path)
+    prompt, video_id = job.params["prompt"], job.params["video_id"]
+    resolution = "720*1280" if job.params.get("vertical") else "1280*720"
+    print(f"[HF] Conectando ao Wan 2.1 Space para: {video_id}...")
+    client = await job.bloqueante(GradioClient, "Wan-AI/Wan2.1")
+
+    # Passo 1: Submit job (non-blocking)
+    remoto = await job.bloqueante(client.submit, prompt=prompt[:300], size=resolution,
+                                  watermark_wan=False, seed=-1, api_name="/t2v_generation_async")
+    print(f"[HF] Job submetido para {video_id} ({resolution})")
+    try:
+        return await _esperar_wan(job, client, remoto, video_id)
+    finally:
+        if not remoto.done():
+            remoto.cancel()  # job cancelado/expirado: libera a fila do Space
+
+
+async def _esperar_wan(job, client, remoto, video_id):
+    # Passo 2: Esperar job completar (ate 15 min)
+    for i in range(90):
+        await job.esperar(10)
+        if remoto.done():
+            print(f"[HF] Job {video_id} concluido em {(i+1)*10}s!")
+            break
+        job.avisar(f"submit {(i+1)*10}s")
+        if i % 6 == 0:
+            print(f"[HF] {video_id} esperando job... {(i+1)*10}s")
+    else:
+        print(f"[HF] {video_id} job timeout 15min")
 
-            for video in VIDEOS:
-                if video["id"] == video_id:
-                    video["hf_video_url"] = f"/static/hf_videos/{video_id}.mp4"
+    # Passo 3: Buscar video gerado via status_refresh
+    video_file = None
+    for i in range(60):
+        await job.esperar(10)
+        try:
+            status = await job.bloqueante(client.predict, api_name="/status_refresh")
+            video_file = _extrair_video_wan(status)
+            if video_file is not None:
+                print(f"[HF] VIDEO {video_id} PRONTO! {video_file[:100]}")
+                break
+            # Log progresso
+            if status and len(status) >= 3:
+                prog = status[3] if len(status) >= 4 else {}
+                label = prog.get("label", "?") if isinstance(prog, dict) else "?"
+                job.avisar(f"refresh {i+1}/60 wait:{status[2]}s {label}")
+                if i % 6 == 0:
+                    print(f"[HF] {video_id} refresh {i+1}/60 wait:{status[2]}s {label}")
+        except Exception as e:
+            if i % 10 == 0:
+                print(f"[HF] {video_id} refresh erro: {e}")
+    if video_file is None:
+        print(f"[HF] Video nao retornado do Wan 2.1 para {video_id}")
+        return None
+
+    videos_dir = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.dirname(__file__))), "static", "hf_videos")
+    _os.makedirs(videos_dir, exist_ok=True)
+    await job.bloqueante(_baixar_video_hf, video_file, _os.path.join(videos_dir, f"{video_id}.mp4"))
+    return f"/static/hf_videos/{video_id}.mp4"
+
+
+def _fim_wan_video(job):
+    """Marca o video/short com o resultado do job (ok -> ready, senao failed)"""
+    video_id = job.params["video_id"]
+    for lista, tag in ((VIDEOS, "HF"), (SHORTS, "HF-REEL")):
+        for video in lista:
+            if video["id"] == video_id:
+                if job.estado == "ok":
+                    video["hf_video_url"] = job.resultado
                     video["hf_status"] = "ready"
-                    print(f"[HF] VIDEO REAL gerado com Wan 2.1: {video.get('titulo', video_id)[:40]}")
-                    _salvar_dados()
-                    break
-            for short in SHORTS:
-                if short["id"] == video_id:
-                    short["hf_video_url"] = f"/static/hf_videos/{video_id}.mp4"
-                    short["hf_status"] = "ready"
-                    print(f"[HF-REEL] REEL REAL gerado com Wan 2.1: {short.get('titulo', video_id)[:40]}")
-                    _salvar_dados()
-                    break
-            return True
-        else:
-            print(f"[HF] Video nao retornado do Wan 2.1, adicionando a fila de retry")
-            HF_TASKS[video_id] = {"status": "loading", "prompt": prompt, "retries": 0}
-            return False
+                    print(f"[{tag}] VIDEO REAL gerado com Wan 2.1: {video.get('titulo', video_id)[:40]}")
+                elif job.estado != "interrompido":
+                    video["hf_status"] = "failed"
+                _salvar_dados()
+                break
 
-    except Exception as e:
-        print(f"[HF] Erro ao gerar video: {e}")
-        HF_TASKS[video_id] = {"status": "loading", "prompt": prompt, "retries": 0}
-        return False
 
+# Ate 3 execucoes por video (antes era o hf_retry_loop, que nunca era iniciado)
+jobs_midia.registrar_tipo("yt_hf_video", _job_wan_video, vagas=2, timeout_s=1800,
+                          tentativas=3, ao_terminar=_fim_wan_video)
 
-async def hf_retry_loop():
-    """Loop que retenta gerar videos HF pendentes"""
-    while True:
-        try:
-            pending = {vid: info for vid, info in HF_TASKS.items() if info["status"] == "loading" and info.get("retries", 0) < 3}
-            for video_id, info in pending.items():
-                print(f"[HF] Retentando video {video_id} (tentativa {info.get('retries', 0) + 1})...")
-                success = await huggingface_text_to_video(info["prompt"], video_id)
-                if success:
-                    HF_TASKS[video_id]["status"] = "ready"
-                else:
-                    HF_TASKS[video_id]["retries"] = info.get("retries", 0) + 1
-                await asyncio.sleep(30)
-        except Exception as e:
-            print(f"[HF-RETRY] Erro: {e}")
-        await asyncio.sleep(120)
+
+def huggingface_text_to_video(prompt: str, video_id: str, vertical: bool = False) -> str:
+    """Enfileira video REAL via Wan 2.1 Space no HuggingFace (GRATIS); devolve o id do job"""
+    job = jobs_midia.enviar("yt_hf_video", {"prompt": prompt, "video_id": video_id, "vertical": vertical},
+                            ref=video_id)
+    return job.id
 
 # Qual gerador cada IA prefere (baseado na personalidade)
 IA_GERADOR_PREFERIDO = {
@@ -966,7 +969,7 @@ async def kling_text_to_video(prompt: str, video_id: str, duracao: int = 5, aspe
             "aspect_ratio": aspect,
             "duration": str(duracao),
         }
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_pool.cliente(timeout=30.0) as client:
             resp = await client.post(
                 f"{KLING_API_BASE}/v1/videos/text2video",
                 headers=headers,
@@ -998,7 +1001,7 @@ async def kling_check_task(task_id: str) -> dict:
     try:
         token = gerar_kling_jwt()
         headers = {"Authorization": f"Bearer {token}"}
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_pool.cliente(timeout=15.0) as client:
             resp = await client.get(
                 f"{KLING_API_BASE}/v1/videos/text2video/{task_id}",
                 headers=headers,
@@ -1052,36 +1055,17 @@ async def kling_polling_loop():
 
 
 # ============================================================
-# OLLAMA
+# TEXTO (gateway de provedores)
 # ============================================================
 
 async def gerar_com_ollama(modelo: str, prompt: str) -> str:
-    try:
-        async with httpx.AsyncClient(timeout=25.0) as client:
-            resp = await client.post(f"{OLLAMA_URL}/api/generate", json={
-                "model": modelo, "prompt": prompt, "stream": False,
-                "options": {"temperature": 0.9, "num_predict": 100}
-            })
-            if resp.status_code == 200:
-                return resp.json().get("response", "").strip()
-    except Exception:
-        pass
-    return ""
+    """Gateway de texto compartilhado (breaker/roteamento/prioridade em llm_client)"""
+    return await gerar_texto(modelo, prompt, max_tokens=100, temperature=0.9, timeout=25.0)
 
 
 async def gerar_roteiro_criativo(modelo: str, prompt: str) -> str:
     """Gera roteiro longo e criativo com mais tokens"""
-    try:
-        async with httpx.AsyncClient(timeout=45.0) as client:
-            resp = await client.post(f"{OLLAMA_URL}/api/generate", json={
-                "model": modelo, "prompt": prompt, "stream": False,
-                "options": {"temperature": 0.95, "num_predict": 350, "top_p": 0.9}
-            })
-            if resp.status_code == 200:
-                return resp.json().get("response", "").strip()
-    except Exception:
-        pass
-    return ""
+    return await gerar_texto(modelo, prompt, max_tokens=350, temperature=0.95, timeout=45.0)
 
 def extrair_texto(resp, fallback=""):
     if not resp:
@@ -1237,7 +1221,7 @@ async def ia_cria_video(ia_key: str):
     # Se gerador e HuggingFace, gerar video REAL via HF API GRATIS
     if gerador["key"] == "huggingface":
         hf_prompt = f"{titulo}. {descricao[:200]}. Style: {gerador['estilo_visual']}"
-        asyncio.create_task(huggingface_text_to_video(hf_prompt, video["id"]))
+        video["hf_job"] = huggingface_text_to_video(hf_prompt, video["id"])
         video["hf_status"] = "processing"
         print(f"[HF] Enviando para HuggingFace: {titulo[:40]}...")
 
@@ -1319,7 +1303,7 @@ async def ia_cria_short(ia_key: str):
     # Se gerador e HuggingFace, gerar video REAL via HF API GRATIS (Reels)
     if gerador["key"] == "huggingface":
         hf_prompt = f"{legenda[:200]}. Style: short vertical video, {gerador['estilo_visual']}, dynamic, engaging"
-        asyncio.create_task(huggingface_text_to_video(hf_prompt, short["id"], vertical=True))
+        short["hf_job"] = huggingface_text_to_video(hf_prompt, short["id"], vertical=True)
         short["hf_status"] = "processing"
         print(f"[HF-REEL] Gerando Reel/Short REAL via HuggingFace: {legenda[:40]}...")
 
@@ -1581,15 +1565,27 @@ async def youtube_loop():
 # ENDPOINTS
 # ============================================================
 
+async def _recarregar_espelho():
+    """SIMULACAO_MODO=api: o worker regravou youtube_data.json"""
+    _carregar_dados()
+
 @router.on_event("startup")
 async def iniciar_youtube():
     _carregar_dados()
+    simulacao.espelhar("youtube", _recarregar_espelho, lambda: mtime(PERSIST_FILE), prefixo="/api/youtube",
+                       destinos=(ARQUIVO_VIDEOS.destino,))
     if _os.environ.get("RENDER"):
         print("[YOUTUBE] Running on Render - cycles disabled")
         return
-    asyncio.create_task(youtube_loop())
+    if not simulacao.iniciar("youtube", [("agendado", youtube_loop)]):
+        print(f"[YOUTUBE] Loop em outro processo (SIMULACAO_MODO={simulacao.modo})")
+        return
     print("[YOUTUBE] Loop de interacoes + criacao de videos ativado!")
 
+@router.on_event("shutdown")
+async def encerrar_youtube():
+    await persistencia.flush("youtube")
+
 @router.get("/videos")
 async def listar_videos(limite: int = Query(default=30, le=100), categoria: Optional[str] = None, canal: Optional[str] = None):
     videos = VIDEOS
@@ -1599,6 +1595,15 @@ async def listar_videos(limite: int = Query(default=30, le=100), categoria: Opti
         videos = [v for v in videos if v["canal_key"] == canal.lower()]
     return {"total": len(videos), "videos": videos[:limite]}
 
+@router.get("/arquivo")
+async def youtube_arquivo(antes: str = "", limite: int = Query(default=20, le=100)):
+    """Videos que ja sairam de VIDEOS (mais novos primeiro); antes = next_cursor"""
+    try:
+        videos, proximo = await ARQUIVO_VIDEOS.pagina(antes or None, limite)
+    except ValueError:
+        return {"erro": "cursor invalido"}
+    return {"videos": videos, "next_cursor": proximo, "has_more": proximo is not None}
+
 @router.get("/shorts")
 async def listar_shorts(limite: int = Query(default=20)):
     return {"total": len(SHORTS), "shorts": SHORTS[:limite]}
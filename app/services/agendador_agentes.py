@@ -0,0 +1,285 @@
+"""
+Agendador dos agentes custom - um laco so para todos
+Cada agente iniciado era uma asyncio.Task propria dormindo frequencia_posts
+segundos entre ciclos: centenas de timers, e um iniciar_todos acordava
+todos juntos (tempestade de ciclos disputando LLM e banco).
+
+Aqui um heap de prazos guarda o proximo ciclo de cada agente e um unico
+laco despacha os vencidos para um pool limitado de vagas:
+
+- prazo = fim do ciclo + frequencia_posts + jitter; o primeiro ciclo e
+  espalhado em JANELA_INICIAL_S para nao acordar todos no mesmo instante.
+- AGENTES_WORKERS vagas no total e AGENTES_QUOTA_<CATEGORIA> por categoria
+  (creator/curator/analyst/conversational). Vencido sem vaga fica na fila
+  da categoria (backpressure), sem duplicar: o agente so volta ao heap
+  quando o ciclo termina.
+- por agente: lag (inicio - prazo), prazos perdidos (lag > TOLERANCIA_S),
+  ciclos, erros, duracao; no geral, ciclos por minuto.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+
+from app.services.llm_agendador import com_prioridade
+
+WORKERS = int(os.environ.get("AGENTES_WORKERS", "8"))
+QUOTAS = {
+    "creator": int(os.environ.get("AGENTES_QUOTA_CREATOR", "4")),
+    "curator": int(os.environ.get("AGENTES_QUOTA_CURATOR", "2")),
+    "analyst": int(os.environ.get("AGENTES_QUOTA_ANALYST", "2")),
+    "conversational": int(os.environ.get("AGENTES_QUOTA_CONVERSATIONAL", "4")),
+}
+JITTER_S = float(os.environ.get("AGENTES_JITTER_S", "30"))
+INTERVALO_MIN_S = 30
+JANELA_INICIAL_S = float(os.environ.get("AGENTES_JANELA_INICIAL_S", "30"))
+TOLERANCIA_S = float(os.environ.get("AGENTES_TOLERANCIA_S", "60"))
+CICLO_TIMEOUT_S = float(os.environ.get("AGENTES_CICLO_TIMEOUT_S", "600"))
+
+
+class _Agendado:
+    """Estado de agendamento de um agente"""
+
+    def __init__(self, agente, geracao):
+        self.agente = agente
+        self.geracao = geracao
+        self.categoria = agente.config.categoria.value
+        self.prazo = 0.0
+        self.task = None  # ciclo em execucao
+        self.ciclos = 0
+        self.erros = 0
+        self.prazos_perdidos = 0
+        self.lag_ultimo_s = 0.0
+        self.lag_max_s = 0.0
+        self.lag_total_s = 0.0
+        self.duracao_ultima_s = 0.0
+        self.duracao_total_s = 0.0
+        self.inicio = time.monotonic()
+
+    def intervalo(self):
+        return self.agente.config.frequencia_posts
+
+    def stats(self):
+        agora = time.monotonic()
+        minutos = max((agora - self.inicio) / 60, 1 / 60)
+        return {
+            "categoria": self.categoria,
+            "estado": "rodando" if self.task else "aguardando",
+            "proximo_em_s": None if self.task else round(self.prazo - agora, 1),
+            "ciclos": self.ciclos,
+            "erros": self.erros,
+            "prazos_perdidos": self.prazos_perdidos,
+            "lag_ultimo_s": round(self.lag_ultimo_s, 3),
+            "lag_medio_s": round(self.lag_total_s / self.ciclos, 3) if self.ciclos else 0,
+            "lag_max_s": round(self.lag_max_s, 3),
+            "duracao_ultima_s": round(self.duracao_ultima_s, 3),
+            "duracao_media_s": round(self.duracao_total_s / self.ciclos, 3) if self.ciclos else 0,
+            "ciclos_por_min": round(self.ciclos / minutos, 3),
+        }
+
+
+class AgendadorAgentes:
+    def __init__(self, workers=WORKERS, quotas=None):
+        self.workers = workers
+        self.quotas = dict(QUOTAS if quotas is None else quotas)
+        self._agendados = {}        # nome -> _Agendado
+        self._heap = []             # (prazo, seq, nome, geracao)
+        self._prontos = {}          # categoria -> deque[(nome, geracao)] vencidos sem vaga
+        self._ocupadas = {}         # categoria -> ciclos rodando
+        self._rodando = 0
+        self._seq = itertools.count()
+        self._geracoes = itertools.count(1)
+        self._acordar = None
+        self._laco = None
+        self._fins = deque(maxlen=10000)  # monotonic de cada ciclo terminado (vazao)
+        # Metricas
+        self.despachados = 0
+        self.segurados = 0          # vencidos esperando vaga agora
+
+    # ------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------
+
+    def agendar(self, agente, atraso_s=None):
+        """Coloca o agente no heap (primeiro ciclo espalhado em JANELA_INICIAL_S)"""
+        nome = agente.nome
+        if nome in self._agendados:
+            return False
+        ag = _Agendado(agente, next(self._geracoes))
+        self._agendados[nome] = ag
+        if atraso_s is None:
+            atraso_s = random.uniform(0, min(JANELA_INICIAL_S, ag.intervalo()))
+        self._empurrar(ag, time.monotonic() + atraso_s)
+        self._garantir_laco()
+        return True
+
+    def remover(self, nome):
+        """Tira o agente do agendamento e cancela o ciclo em curso"""
+        ag = self._agendados.pop(nome, None)
+        if ag is None:
+            return False
+        if ag.task is not None:
+            ag.task.cancel()
+        return True  # entradas velhas no heap/filas sao descartadas pela geracao
+
+    def ativo(self, nome):
+        return nome in self._agendados
+
+    def nomes(self):
+        return list(self._agendados)
+
+    async def encerrar(self):
+        tasks = [ag.task for ag in self._agendados.values() if ag.task is not None]
+        for nome in list(self._agendados):
+            self._agendados[nome].agente.is_running = False
+            self.remover(nome)
+        if self._laco is not None:
+            self._laco.cancel()
+            self._laco = None
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ------------------------------------------------------------
+    # Laco
+    # ------------------------------------------------------------
+
+    def _empurrar(self, ag, prazo):
+        ag.prazo = prazo
+        heapq.heappush(self._heap, (prazo, next(self._seq), ag.agente.nome, ag.geracao))
+        if self._acordar is not None:
+            self._acordar.set()
+
+    def _vigente(self, nome, geracao):
+        ag = self._agendados.get(nome)
+        return ag if ag is not None and ag.geracao == geracao else None
+
+    def _garantir_laco(self):
+        if self._laco is None or self._laco.done():
+            self._acordar = asyncio.Event()
+            self._laco = asyncio.create_task(self._rodar())
+
+    async def _rodar(self):
+        while True:
+            self._acordar.clear()
+            agora = time.monotonic()
+            while self._heap and self._heap[0][0] <= agora:
+                _, _, nome, geracao = heapq.heappop(self._heap)
+                ag = self._vigente(nome, geracao)
+                if ag is not None:
+                    self._prontos.setdefault(ag.categoria, deque()).append((nome, geracao))
+            self._despachar()
+            espera = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+
+    def _despachar(self):
+        """Enche as vagas livres com os vencidos mais antigos cuja categoria tem quota"""
+        while self._rodando < self.workers:
+            melhor = None
+            for cat, fila in self._prontos.items():
+                while fila and self._vigente(*fila[0]) is None:
+                    fila.popleft()
+                if not fila or self._ocupadas.get(cat, 0) >= self.quotas.get(cat, self.workers):
+                    continue
+                ag = self._vigente(*fila[0])
+                if melhor is None or ag.prazo < melhor.prazo:
+                    melhor = ag
+            if melhor is None:
+                break
+            self._prontos[melhor.categoria].popleft()
+            self._iniciar(melhor)
+        self.segurados = sum(len(f) for f in self._prontos.values())
+
+    def _iniciar(self, ag):
+        self._rodando += 1
+        self._ocupadas[ag.categoria] = self._ocupadas.get(ag.categoria, 0) + 1
+        self.despachados += 1
+        ag.task = asyncio.create_task(com_prioridade("agendado", self._ciclo(ag)))
+
+    async def _ciclo(self, ag):
+        inicio = time.monotonic()
+        lag = max(0.0, inicio - ag.prazo)
+        ag.lag_ultimo_s = lag
+        ag.lag_total_s += lag
+        ag.lag_max_s = max(ag.lag_max_s, lag)
+        if lag > TOLERANCIA_S:
+            ag.prazos_perdidos += 1
+        agente = ag.agente
+        continuar = True
+        try:
+            if not agente.is_running:
+                # Primeiro ciclo: entra na rede (mesmo pool, limita bcrypt em rajada)
+                if not await asyncio.wait_for(agente.registrar_na_rede(), CICLO_TIMEOUT_S):
+                    print(f"[ERRO] {agente.nome} nao conseguiu se registrar!")
+                    continuar = False
+                else:
+                    agente.is_running = True
+                    print(f"[START] {agente.nome} ({ag.categoria}) iniciado!")
+            if continuar:
+                await asyncio.wait_for(agente.executar_ciclo(), CICLO_TIMEOUT_S)
+        except asyncio.CancelledError:
+            continuar = False
+        except Exception as e:
+            print(f"[ERRO] {agente.nome}: {e}")
+            agente.stats["erros"] += 1
+            ag.erros += 1
+        finally:
+            fim = time.monotonic()
+            ag.ciclos += 1
+            ag.duracao_ultima_s = fim - inicio
+            ag.duracao_total_s += ag.duracao_ultima_s
+            ag.task = None
+            self._fins.append(fim)
+            self._rodando -= 1
+            self._ocupadas[ag.categoria] -= 1
+            if self._vigente(agente.nome, ag.geracao) is not None:
+                if continuar:
+                    intervalo = max(INTERVALO_MIN_S, ag.intervalo() + random.uniform(-JITTER_S, JITTER_S))
+                    self._empurrar(ag, fim + intervalo)
+                else:
+                    del self._agendados[agente.nome]
+            if self._acordar is not None:
+                self._acordar.set()
+
+    # ------------------------------------------------------------
+    # Metricas
+    # ------------------------------------------------------------
+
+    def stats_agente(self, nome):
+        ag = self._agendados.get(nome)
+        return ag.stats() if ag else None
+
+    def stats(self):
+        agora = time.monotonic()
+        ultimo_min = sum(1 for t in self._fins if agora - t <= 60)
+        por_cat = {}
+        for ag in self._agendados.values():
+            c = por_cat.setdefault(ag.categoria, {"agentes": 0, "rodando": 0, "prazos_perdidos": 0})
+            c["agentes"] += 1
+            c["prazos_perdidos"] += ag.prazos_perdidos
+        for cat, n in self._ocupadas.items():
+            por_cat.setdefault(cat, {"agentes": 0, "rodando": 0, "prazos_perdidos": 0})["rodando"] = n
+        for cat, c in por_cat.items():
+            c["quota"] = self.quotas.get(cat, self.workers)
+            c["na_fila"] = len(self._prontos.get(cat, ()))
+        lags = [ag.lag_max_s for ag in self._agendados.values()]
+        return {
+            "workers": self.workers,
+            "rodando": self._rodando,
+            "agendados": len(self._agendados),
+            "na_fila": self.segurados,
+            "despachados": self.despachados,
+            "ciclos_ultimo_min": ultimo_min,
+            "lag_max_s": round(max(lags), 3) if lags else 0,
+            "prazos_perdidos": sum(ag.prazos_perdidos for ag in self._agendados.values()),
+            "por_categoria": por_cat,
+            "agentes": {nome: ag.stats() for nome, ag in self._agendados.items()},
+        }
+
+
+agendador_agentes = AgendadorAgentes()
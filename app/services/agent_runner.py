@@ -4,7 +4,6 @@
 ║  Cria, inicia, para, monitora agentes em background          ║
 ╚══════════════════════════════════════════════════════════════╝
 """
-import asyncio
 import json
 import os
 from typing import Dict, List, Optional, Any
@@ -17,11 +16,15 @@ from app.services.agent_types import (
     get_agent_class,
 )
 from app.services.agent_types.base import AgentConfig, AgentAutonomy, MODELOS_DISPONIVEIS, TEMAS_DISPONIVEIS
+from app.services.agendador_agentes import agendador_agentes
+from app.services.simulacao import simulacao, mtime
+from app.services.persistencia import gravar_json_atomico
 
 
 # Caminho para salvar configs dos agentes
 AGENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "custom_agents_data")
 os.makedirs(AGENTS_DIR, exist_ok=True)
+CONFIG_FILE = os.path.join(AGENTS_DIR, "agents_config.json")
 
 
 class AgentRunner:
@@ -40,30 +43,36 @@ class AgentRunner:
             return
         self._initialized = True
         self.agentes: Dict[str, AgentTypeBase] = {}  # nome -> instancia
-        self.tasks: Dict[str, asyncio.Task] = {}     # nome -> asyncio.Task
+        self.agendador = agendador_agentes           # ciclos de todos num laco so
         self.configs: Dict[str, AgentConfig] = {}    # nome -> config
+        self.ligados: set = set()                    # nomes que devem rodar ("rodando" no JSON)
+        self._configs_mtime = 0
         self._carregar_configs()
 
     def _carregar_configs(self):
         """Carrega configs salvas em disco"""
-        config_file = os.path.join(AGENTS_DIR, "agents_config.json")
+        config_file = CONFIG_FILE
+        self._configs_mtime = mtime(config_file)
         if os.path.exists(config_file):
             try:
                 with open(config_file, "r") as f:
                     data = json.load(f)
+                self.ligados = set()
                 for nome, cfg_dict in data.items():
+                    if cfg_dict.pop("rodando", False):
+                        self.ligados.add(nome)
                     self.configs[nome] = AgentConfig.from_dict(cfg_dict)
                 print(f"[RUNNER] {len(self.configs)} configs carregadas")
             except Exception as e:
                 print(f"[RUNNER] Erro carregando configs: {e}")
 
     def _salvar_configs(self):
-        """Salva configs em disco"""
-        config_file = os.path.join(AGENTS_DIR, "agents_config.json")
+        """Salva configs em disco (atomico: workers releem o arquivo pelo mtime)"""
+        config_file = CONFIG_FILE
         try:
-            data = {nome: cfg.to_dict() for nome, cfg in self.configs.items()}
-            with open(config_file, "w") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            data = {nome: {**cfg.to_dict(), "rodando": nome in self.ligados} for nome, cfg in self.configs.items()}
+            gravar_json_atomico(config_file, data, indent=2, ensure_ascii=False)
+            self._configs_mtime = mtime(config_file)
         except Exception as e:
             print(f"[RUNNER] Erro salvando configs: {e}")
 
@@ -102,9 +111,7 @@ class AgentRunner:
             return {"error": f"Agente '{nome}' nao encontrado", "success": False}
 
         # Parar se estiver rodando
-        if nome in self.tasks:
-            self.tasks[nome].cancel()
-            del self.tasks[nome]
+        self.agendador.remover(nome)
 
         if nome in self.agentes:
             self.agentes[nome].parar()
@@ -112,6 +119,7 @@ class AgentRunner:
 
         if nome in self.configs:
             del self.configs[nome]
+        self.ligados.discard(nome)
 
         self._salvar_configs()
         return {"success": True, "nome": nome, "status": "removido"}
@@ -132,7 +140,7 @@ class AgentRunner:
 
         # Se mudou categoria, recriar instancia
         if "categoria" in updates:
-            was_running = nome in self.tasks
+            was_running = self.agendador.ativo(nome)
             if was_running:
                 self.parar_agente(nome)
             AgentClass = get_agent_class(config.categoria.value)
@@ -147,8 +155,14 @@ class AgentRunner:
     # CONTROLE DE EXECUCAO
     # ================================================================
 
+    def _ligar(self, nome: str, ligado: bool):
+        """Grava o estado desejado; e o que os workers seguem em sincronizar_shard"""
+        if (nome in self.ligados) != ligado:
+            (self.ligados.add if ligado else self.ligados.discard)(nome)
+            self._salvar_configs()
+
     def iniciar_agente(self, nome: str) -> Dict[str, Any]:
-        """Inicia um agente em background"""
+        """Inicia um agente em background (ou, se roda em worker, marca para o worker iniciar)"""
         if nome not in self.agentes:
             # Tentar criar a partir da config
             if nome in self.configs:
@@ -158,21 +172,23 @@ class AgentRunner:
             else:
                 return {"error": f"Agente '{nome}' nao encontrado", "success": False}
 
-        if nome in self.tasks and not self.tasks[nome].done():
-            return {"error": f"Agente '{nome}' ja esta rodando", "success": False}
+        if not simulacao.roda_agente(nome):
+            if nome in self.ligados:
+                return {"error": f"Agente '{nome}' ja esta rodando", "success": False}
+            self._ligar(nome, True)
+            return {"success": True, "nome": nome, "status": "iniciado", "onde": "worker"}
 
-        agente = self.agentes[nome]
-        task = asyncio.create_task(agente.rodar())
-        self.tasks[nome] = task
+        if not self.agendador.agendar(self.agentes[nome]):
+            return {"error": f"Agente '{nome}' ja esta rodando", "success": False}
+        self._ligar(nome, True)
         return {"success": True, "nome": nome, "status": "iniciado"}
 
     def parar_agente(self, nome: str) -> Dict[str, Any]:
         """Para um agente"""
         if nome in self.agentes:
             self.agentes[nome].parar()
-        if nome in self.tasks:
-            self.tasks[nome].cancel()
-            del self.tasks[nome]
+        self.agendador.remover(nome)
+        self._ligar(nome, False)
         return {"success": True, "nome": nome, "status": "parado"}
 
     def iniciar_todos(self) -> Dict[str, Any]:
@@ -185,10 +201,44 @@ class AgentRunner:
     def parar_todos(self) -> Dict[str, Any]:
         """Para todos os agentes"""
         resultados = {}
-        for nome in list(self.tasks.keys()):
+        for nome in set(self.agendador.nomes()) | self.ligados:
             resultados[nome] = self.parar_agente(nome)
         return resultados
 
+    def rodando(self, nome: str) -> bool:
+        """Rodando aqui, ou marcado para rodar no worker que e dono dele"""
+        return self.agendador.ativo(nome) if simulacao.roda_agente(nome) else nome in self.ligados
+
+    def sincronizar_shard(self) -> Dict[str, int]:
+        """SIMULACAO_MODO=worker: segue o "rodando" de agents_config.json (so a API grava)"""
+        iniciados = parados = 0
+        if mtime(CONFIG_FILE) != self._configs_mtime:
+            antigos = {nome: cfg.to_dict() for nome, cfg in self.configs.items()}
+            self.configs = {}
+            self._carregar_configs()
+            for nome, cfg in antigos.items():
+                if nome not in self.configs or self.configs[nome].to_dict() != cfg:
+                    # Removido ou editado: para e recria com a config nova
+                    if self.agendador.ativo(nome):
+                        self.agentes[nome].parar()
+                        self.agendador.remover(nome)
+                        parados += 1
+                    self.agentes.pop(nome, None)
+        for nome in self.agendador.nomes():
+            if nome not in self.ligados:
+                if nome in self.agentes:
+                    self.agentes[nome].parar()
+                self.agendador.remover(nome)
+                parados += 1
+        for nome in self.ligados:
+            if nome in self.configs and simulacao.roda_agente(nome) and not self.agendador.ativo(nome):
+                if nome not in self.agentes:
+                    config = self.configs[nome]
+                    self.agentes[nome] = get_agent_class(config.categoria.value)(config)
+                if self.agendador.agendar(self.agentes[nome]):
+                    iniciados += 1
+        return {"iniciados": iniciados, "parados": parados}
+
     # ================================================================
     # STATUS E MONITORAMENTO
     # ================================================================
@@ -197,14 +247,15 @@ class AgentRunner:
         """Retorna status de um agente"""
         if nome in self.agentes:
             status = self.agentes[nome].get_status()
-            status["task_running"] = nome in self.tasks and not self.tasks[nome].done()
+            status["task_running"] = self.agendador.ativo(nome)
+            status["agendamento"] = self.agendador.stats_agente(nome)
             return status
 
         if nome in self.configs:
             return {
                 "nome": nome,
                 "config": self.configs[nome].to_dict(),
-                "is_running": False,
+                "is_running": self.rodando(nome),
                 "task_running": False,
             }
         return None
@@ -218,7 +269,7 @@ class AgentRunner:
                 "categoria": config.categoria.value,
                 "modelo": config.modelo,
                 "autonomia": config.autonomia.value,
-                "is_running": nome in self.tasks and not self.tasks[nome].done(),
+                "is_running": self.rodando(nome),
                 "criado_em": config.criado_em,
             }
             if nome in self.agentes:
@@ -229,7 +280,7 @@ class AgentRunner:
     def get_metricas_gerais(self) -> Dict[str, Any]:
         """Retorna metricas gerais do sistema"""
         total = len(self.configs)
-        rodando = sum(1 for n in self.tasks if not self.tasks[n].done())
+        rodando = sum(1 for n in self.configs if self.rodando(n))
 
         por_categoria = {}
         por_modelo = {}
@@ -1,4 +1,5 @@
 from app.services.agent_types.base import AgentTypeBase, AgentCategory
+from app.services.agent_types.transporte import TransporteAgente, TransporteLocal, TransporteHttp, transporte_padrao
 from app.services.agent_types.creator import CreatorAgent
 from app.services.agent_types.curator import CuratorAgent
 from app.services.agent_types.conversational import ConversationalAgent
@@ -24,4 +25,5 @@ __all__ = [
     "CreatorAgent", "CuratorAgent",
     "ConversationalAgent", "AnalystAgent",
     "AGENT_TYPES", "get_agent_class",
+    "TransporteAgente", "TransporteLocal", "TransporteHttp", "transporte_padrao",
 ]
@@ -6,13 +6,11 @@
 """
 import random
 import asyncio
-import httpx
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from collections import Counter
 
 from app.services.agent_types.base import (
-    AgentTypeBase, AgentCategory, AgentConfig, API_URL
+    AgentTypeBase, AgentCategory, AgentConfig
 )
 
 
@@ -26,8 +24,8 @@ class AnalystAgent(AgentTypeBase):
         "comentar", "reagir",
     ]
 
-    def __init__(self, config: AgentConfig):
-        super().__init__(config)
+    def __init__(self, config: AgentConfig, transporte=None):
+        super().__init__(config, transporte)
         self.historico_metricas = []  # Historico de snapshots
         self.tendencias_detectadas = []
         self.ultimo_relatorio = None
@@ -38,8 +36,8 @@ class AnalystAgent(AgentTypeBase):
             "analises_feitas": 0,
         })
 
-    async def coletar_metricas(self, client: httpx.AsyncClient) -> Dict[str, Any]:
-        """Coleta metricas da rede"""
+    async def coletar_metricas(self) -> Dict[str, Any]:
+        """Coleta metricas da rede (snapshot compartilhado entre os analistas)"""
         metricas = {
             "timestamp": datetime.now().isoformat(),
             "total_posts": 0,
@@ -50,47 +48,19 @@ class AnalystAgent(AgentTypeBase):
             "engajamento_medio": 0,
         }
 
-        try:
-            # Posts recentes
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=50")
-            if resp.status_code == 200:
-                posts = resp.json()
-                metricas["total_posts"] = len(posts)
-                metricas["posts_recentes"] = posts
-
-                # Calcular engajamento
-                total_engajamento = 0
-                for p in posts:
-                    eng = p.get("likes_count", 0) + p.get("comments_count", 0) * 2
-                    total_engajamento += eng
-                if posts:
-                    metricas["engajamento_medio"] = round(total_engajamento / len(posts), 2)
-
-                # Extrair hashtags
-                todas_hashtags = []
-                for p in posts:
-                    content = p.get("content", "")
-                    hashtags = [w.strip("#.,!?") for w in content.split() if w.startswith("#")]
-                    todas_hashtags.extend(hashtags)
-                metricas["hashtags_populares"] = [
-                    {"tag": tag, "count": count}
-                    for tag, count in Counter(todas_hashtags).most_common(10)
-                ]
-        except:
-            pass
-
-        try:
-            # Agentes
-            resp = await client.get(f"{API_URL}/api/agents/?limit=50")
-            if resp.status_code == 200:
-                agentes = resp.json()
-                metricas["total_agentes"] = len(agentes)
-                metricas["agentes_ativos"] = [
-                    {"nome": a.get("name"), "modelo": a.get("model_type")}
-                    for a in agentes[:20]
-                ]
-        except:
-            pass
+        snap = await self.transporte.metricas(self)
+        if snap:
+            posts = snap.get("posts", [])
+            metricas["snapshot"] = snap.get("snapshot")
+            metricas["total_posts"] = snap.get("total_posts", 0)
+            metricas["posts_recentes"] = posts[:50]
+            metricas["engajamento_medio"] = snap.get("engajamento_medio", 0)
+            metricas["hashtags_populares"] = snap.get("hashtags", [])
+            metricas["total_agentes"] = snap.get("total_agentes", 0)
+            metricas["agentes_ativos"] = [
+                {"nome": a.get("name"), "modelo": a.get("model_type")}
+                for a in snap.get("agentes", [])[:20]
+            ]
 
         self.historico_metricas.append(metricas)
         # Manter apenas ultimos 100 snapshots
@@ -146,9 +116,9 @@ class AnalystAgent(AgentTypeBase):
         self.stats["anomalias_encontradas"] += len(anomalias)
         return anomalias
 
-    async def gerar_relatorio(self, client: httpx.AsyncClient) -> Optional[str]:
+    async def gerar_relatorio(self) -> Optional[str]:
         """Gera relatorio analitico para postar"""
-        metricas = await self.coletar_metricas(client)
+        metricas = await self.coletar_metricas()
         tendencias = await self.analisar_tendencias(metricas)
         anomalias = await self.detectar_anomalias(metricas)
 
@@ -185,31 +155,18 @@ Maximo 5 linhas. Use emojis. Seja objetivo."""
             }
         return relatorio
 
-    async def ranking_agentes(self, client: httpx.AsyncClient) -> Optional[str]:
-        """Gera ranking dos agentes mais ativos"""
-        try:
-            resp = await client.get(f"{API_URL}/api/agents/?limit=20")
-            if resp.status_code != 200:
-                return None
-            agentes = resp.json()
-        except:
-            return None
+    async def ranking_agentes(self) -> Optional[str]:
+        """Gera ranking dos agentes mais ativos (posts na janela do snapshot)"""
+        snap = await self.transporte.metricas(self)
+        top = (snap or {}).get("top_agentes", [])[:5]
 
-        if not agentes:
+        if not top:
             return None
 
-        # Ordenar por reputacao (ou posts_count se disponivel)
-        agentes_sorted = sorted(
-            agentes,
-            key=lambda a: a.get("reputation_score", a.get("posts_count", 0)),
-            reverse=True
-        )[:5]
-
         linhas = ["🏆 RANKING DOS AGENTES"]
-        for i, ag in enumerate(agentes_sorted, 1):
+        for i, ag in enumerate(top, 1):
             medalha = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣"][i-1]
-            nome = ag.get("name", "???")
-            linhas.append(f"{medalha} {nome}")
+            linhas.append(f"{medalha} {ag['nome']} ({ag['posts']} posts)")
 
         return "\n".join(linhas)
 
@@ -235,54 +192,36 @@ Maximo 5 linhas. Use emojis. Seja objetivo."""
                 texto = texto[:397] + "..."
         return texto
 
-    async def executar_ciclo(self, client: httpx.AsyncClient):
+    async def executar_ciclo(self):
         """Ciclo do Analista: coletar dados, analisar, reportar"""
         # 1. Coletar metricas
-        metricas = await self.coletar_metricas(client)
+        metricas = await self.coletar_metricas()
         self.stats["analises_feitas"] += 1
 
         # 2. Gerar relatorio (40% chance ou a cada 5 ciclos)
         if random.random() < 0.4 or self.stats["analises_feitas"] % 5 == 0:
-            relatorio = await self.gerar_relatorio(client)
-            if relatorio and self.token:
-                try:
-                    await client.post(
-                        f"{API_URL}/api/posts/",
-                        json={"content": relatorio, "is_public": True},
-                        headers={"Authorization": f"Bearer {self.token}"}
-                    )
+            relatorio = await self.gerar_relatorio()
+            if relatorio and self.agent_id:
+                if await self.transporte.postar(self, relatorio):
                     self.stats["posts_criados"] += 1
                     print(f"[{self.nome}] 📊 Relatorio publicado!")
-                except:
-                    pass
 
         # 3. Ranking (20% chance)
         if random.random() < 0.2:
-            ranking = await self.ranking_agentes(client)
-            if ranking and self.token:
-                try:
-                    await client.post(
-                        f"{API_URL}/api/posts/",
-                        json={"content": ranking, "is_public": True},
-                        headers={"Authorization": f"Bearer {self.token}"}
-                    )
+            ranking = await self.ranking_agentes()
+            if ranking and self.agent_id:
+                if await self.transporte.postar(self, ranking):
                     self.stats["posts_criados"] += 1
-                except:
-                    pass
 
         # 4. Postar insight/previsao
         if random.random() < 0.3:
-            await self.postar(client)
+            await self.postar()
 
         # 5. Comentar com dados (menos frequente)
-        try:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=5")
-            posts = resp.json() if resp.status_code == 200 else []
-        except:
-            posts = []
+        posts = await self.transporte.feed(self, limit=5)
 
         if posts:
             post = random.choice(posts)
-            await self.comentar(client, post["id"], post.get("content", ""))
+            await self.comentar(post["id"], post.get("content", ""))
             for p in random.sample(posts, min(2, len(posts))):
-                await self.reagir(client, p["id"])
+                await self.reagir(p["id"])
@@ -6,12 +6,14 @@
 """
 import asyncio
 import random
-import httpx
 from enum import Enum
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass, field
 
+from app.services.llm_client import gerar_texto as gateway_gerar_texto
+from app.services.agent_types.transporte import TransporteAgente, transporte_padrao, API_URL
+
 
 class AgentCategory(str, Enum):
     CREATOR = "creator"
@@ -27,7 +29,6 @@ class AgentAutonomy(str, Enum):
 
 
 OLLAMA_URL = "http://localhost:11434"
-API_URL = "http://localhost:8000"
 
 MODELOS_DISPONIVEIS = {
     "llama3.2:3b": {"nome": "Llama 3.2", "provider": "Meta", "emoji": "🦙", "velocidade": "rapido", "qualidade": 7},
@@ -105,8 +106,9 @@ class AgentTypeBase:
     DESCRIPTION = "Agente base generico"
     CAPABILITIES = ["postar", "comentar", "reagir"]
 
-    def __init__(self, config: AgentConfig):
+    def __init__(self, config: AgentConfig, transporte: Optional[TransporteAgente] = None):
         self.config = config
+        self.transporte = transporte or transporte_padrao()
         self.nome = config.nome
         self.modelo = config.modelo
         self.personalidade = config.personalidade
@@ -132,33 +134,17 @@ class AgentTypeBase:
     # ================================================================
 
     async def gerar_texto(self, prompt: str, max_tokens: int = None) -> Optional[str]:
-        """Gera texto usando Ollama local"""
+        """Gera texto pelo gateway de LLM (Groq / OpenRouter / Ollama local)"""
         tokens = max_tokens or self.config.max_tokens
-        system_prompt = self._build_system_prompt()
-
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                resp = await client.post(
-                    f"{OLLAMA_URL}/api/generate",
-                    json={
-                        "model": self.modelo,
-                        "prompt": prompt,
-                        "system": system_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": self.config.temperatura,
-                            "num_predict": tokens,
-                        }
-                    }
-                )
-                if resp.status_code == 200:
-                    texto = resp.json().get("response", "").strip()
-                    texto = self._aplicar_regras(texto)
-                    return texto
-        except Exception as e:
+        texto = await gateway_gerar_texto(
+            self.modelo, prompt, system=self._build_system_prompt(),
+            max_tokens=tokens, temperature=self.config.temperatura,
+        )
+        if not texto:
             self.stats["erros"] += 1
-            print(f"[ERRO] {self.nome} Ollama: {e}")
-        return None
+            print(f"[ERRO] {self.nome}: nenhum provedor de texto respondeu")
+            return None
+        return self._aplicar_regras(texto)
 
     def _build_system_prompt(self) -> str:
         """Constroi system prompt com personalidade e regras"""
@@ -189,45 +175,18 @@ class AgentTypeBase:
     # ================================================================
 
     async def registrar_na_rede(self) -> bool:
-        """Registra o agente na rede social"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            api_key = self.nome.lower().replace(" ", "").replace("-", "") + "custom2024"
-
-            # Tentar registrar
-            try:
-                await client.post(
-                    f"{API_URL}/api/agents/register",
-                    json={
-                        "name": self.nome,
-                        "model_type": "ollama",
-                        "model_version": self.modelo,
-                        "personality": self.personalidade,
-                        "bio": self.config.bio or f"{MODELOS_DISPONIVEIS.get(self.modelo, {}).get('emoji', '🤖')} Agente {self.config.categoria.value} | {self.personalidade[:50]}",
-                        "api_key": api_key,
-                    }
-                )
-            except:
-                pass
-
-            # Login
-            try:
-                resp = await client.post(
-                    f"{API_URL}/api/agents/login",
-                    data={"username": self.nome, "password": api_key}
-                )
-                if resp.status_code == 200:
-                    self.token = resp.json()["access_token"]
-                    me = await client.get(
-                        f"{API_URL}/api/agents/me",
-                        headers={"Authorization": f"Bearer {self.token}"}
-                    )
-                    if me.status_code == 200:
-                        self.agent_id = me.json()["id"]
-                        print(f"[OK] {self.nome} registrado como {self.config.categoria.value}!")
-                        return True
-            except Exception as e:
-                print(f"[ERRO] {self.nome} login: {e}")
-
+        """Registra o agente na rede social (pelo transporte configurado)"""
+        api_key = self.nome.lower().replace(" ", "").replace("-", "") + "custom2024"
+        dados = {
+            "name": self.nome,
+            "model_type": "ollama",
+            "model_version": self.modelo,
+            "personality": self.personalidade,
+            "bio": self.config.bio or f"{MODELOS_DISPONIVEIS.get(self.modelo, {}).get('emoji', '🤖')} Agente {self.config.categoria.value} | {self.personalidade[:50]}",
+        }
+        if await self.transporte.entrar(self, dados, api_key):
+            print(f"[OK] {self.nome} registrado como {self.config.categoria.value} ({self.transporte.nome})!")
+            return True
         return False
 
     # ================================================================
@@ -245,34 +204,27 @@ class AgentTypeBase:
                 texto = texto[:277] + "..."
         return texto
 
-    async def postar(self, client: httpx.AsyncClient) -> bool:
+    async def postar(self) -> bool:
         """Publica um post na rede"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
         post = await self.gerar_post()
         if not post:
             return False
 
-        try:
-            emoji = MODELOS_DISPONIVEIS.get(self.modelo, {}).get("emoji", "🤖")
-            resp = await client.post(
-                f"{API_URL}/api/posts/",
-                json={"content": f"{emoji} {post}", "is_public": True},
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
-            if resp.status_code == 201:
-                self.stats["posts_criados"] += 1
-                self.stats["ultimo_post"] = datetime.now().isoformat()
-                print(f"[{self.nome}] POST: {post[:60]}...")
-                return True
-        except Exception as e:
-            self.stats["erros"] += 1
+        emoji = MODELOS_DISPONIVEIS.get(self.modelo, {}).get("emoji", "🤖")
+        if await self.transporte.postar(self, f"{emoji} {post}"):
+            self.stats["posts_criados"] += 1
+            self.stats["ultimo_post"] = datetime.now().isoformat()
+            print(f"[{self.nome}] POST: {post[:60]}...")
+            return True
+        self.stats["erros"] += 1
         return False
 
-    async def comentar(self, client: httpx.AsyncClient, post_id: str, post_content: str) -> bool:
+    async def comentar(self, post_id: str, post_content: str) -> bool:
         """Comenta em um post"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
         prompt = f'Alguem postou: "{post_content[:100]}". Escreva um comentario curto (1 frase). Use emoji.'
@@ -284,58 +236,43 @@ class AgentTypeBase:
         if len(comentario) > 200:
             comentario = comentario[:197] + "..."
 
-        try:
-            await client.post(
-                f"{API_URL}/api/posts/{post_id}/comment",
-                json={"content": comentario},
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
+        if await self.transporte.comentar(self, post_id, comentario):
             self.stats["comentarios_feitos"] += 1
             return True
-        except:
-            self.stats["erros"] += 1
+        self.stats["erros"] += 1
         return False
 
-    async def reagir(self, client: httpx.AsyncClient, post_id: str) -> bool:
+    async def reagir(self, post_id: str) -> bool:
         """Reage a um post"""
-        if not self.token:
+        if not self.agent_id:
             return False
-        try:
-            await client.post(
-                f"{API_URL}/api/posts/{post_id}/like",
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
+        if await self.transporte.curtir(self, post_id):
             self.stats["reacoes_dadas"] += 1
             return True
-        except:
-            return False
+        return False
 
     # ================================================================
     # LOOP AUTONOMO
     # ================================================================
 
-    async def executar_ciclo(self, client: httpx.AsyncClient):
+    async def executar_ciclo(self):
         """Executa um ciclo de acoes — subclasses podem customizar"""
         # 1. Postar
-        await self.postar(client)
+        await self.postar()
         await asyncio.sleep(2)
 
         # 2. Ler feed e interagir
-        try:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=10")
-            posts = resp.json() if resp.status_code == 200 else []
-        except:
-            posts = []
+        posts = await self.transporte.feed(self, limit=10)
 
         if posts:
             # Comentar em 1-2 posts
             for post in random.sample(posts, min(2, len(posts))):
-                await self.comentar(client, post["id"], post.get("content", ""))
+                await self.comentar(post["id"], post.get("content", ""))
                 await asyncio.sleep(1)
 
             # Reagir em 2-3 posts
             for post in random.sample(posts, min(3, len(posts))):
-                await self.reagir(client, post["id"])
+                await self.reagir(post["id"])
 
     async def rodar(self):
         """Loop principal do agente"""
@@ -346,17 +283,16 @@ class AgentTypeBase:
         self.is_running = True
         print(f"[START] {self.nome} ({self.config.categoria.value}) iniciado!")
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            while self.is_running:
-                try:
-                    await self.executar_ciclo(client)
-                except Exception as e:
-                    print(f"[ERRO] {self.nome}: {e}")
-                    self.stats["erros"] += 1
-
-                intervalo = self.config.frequencia_posts + random.randint(-30, 30)
-                intervalo = max(30, intervalo)
-                await asyncio.sleep(intervalo)
+        while self.is_running:
+            try:
+                await self.executar_ciclo()
+            except Exception as e:
+                print(f"[ERRO] {self.nome}: {e}")
+                self.stats["erros"] += 1
+
+            intervalo = self.config.frequencia_posts + random.randint(-30, 30)
+            intervalo = max(30, intervalo)
+            await asyncio.sleep(intervalo)
 
     def parar(self):
         """Para o agente"""
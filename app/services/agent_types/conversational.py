@@ -6,13 +6,12 @@
 """
 import random
 import asyncio
-import httpx
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from collections import deque
 
 from app.services.agent_types.base import (
-    AgentTypeBase, AgentCategory, AgentConfig, API_URL
+    AgentTypeBase, AgentCategory, AgentConfig
 )
 
 
@@ -35,8 +34,8 @@ class ConversationalAgent(AgentTypeBase):
         "mentor": "Responda como um mentor experiente, guiando com sabedoria.",
     }
 
-    def __init__(self, config: AgentConfig):
-        super().__init__(config)
+    def __init__(self, config: AgentConfig, transporte=None):
+        super().__init__(config, transporte)
         self.tom = config.estilo or "casual"
         self.memoria_conversa = deque(maxlen=50)  # Ultimas 50 interacoes
         self.conversas_ativas = {}  # agent_id -> [mensagens]
@@ -85,20 +84,13 @@ Responda em 1-2 frases. Use emoji se apropriado."""
             self.stats["respostas_dadas"] += 1
         return resposta
 
-    async def iniciar_conversa(self, client: httpx.AsyncClient) -> bool:
+    async def iniciar_conversa(self) -> bool:
         """Inicia conversa proativamente com outro agente"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
         # Buscar agentes ativos
-        try:
-            resp = await client.get(
-                f"{API_URL}/api/agents/?limit=10",
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
-            agentes = resp.json() if resp.status_code == 200 else []
-        except:
-            return False
+        agentes = await self.transporte.agentes(self, limit=10)
 
         if not agentes:
             return False
@@ -119,40 +111,24 @@ Escreva uma mensagem amigavel de abertura. 1-2 frases. Use emoji.
         if not mensagem:
             return False
 
-        try:
-            await client.post(
-                f"{API_URL}/api/messages/",
-                json={
-                    "receiver_id": alvo["id"],
-                    "content": mensagem.strip()
-                },
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
+        if await self.transporte.enviar_mensagem(self, alvo["id"], mensagem.strip()):
             self.stats["conversas_iniciadas"] += 1
             self.stats["mensagens_enviadas"] += 1
             print(f"[{self.nome}] 💬 Conversa com {alvo['name']}: {mensagem[:50]}...")
             return True
-        except:
-            return False
+        return False
 
-    async def participar_debate(self, client: httpx.AsyncClient) -> bool:
+    async def participar_debate(self) -> bool:
         """Participa de debates ativos"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
         # Buscar debates ativos
-        try:
-            resp = await client.get(
-                f"{API_URL}/api/debates/?limit=5",
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
-            debates = resp.json() if resp.status_code == 200 else []
-        except:
-            return False
+        debates = await self.transporte.debates(self, limit=5)
 
         if not debates:
             # Criar um debate novo
-            return await self._criar_debate(client)
+            return await self._criar_debate()
 
         debate = random.choice(debates)
         debate_id = debate.get("id", "")
@@ -167,22 +143,14 @@ Apresente argumentos e respeite opinioes contrarias.
         if not opiniao:
             return False
 
-        try:
-            await client.post(
-                f"{API_URL}/api/debates/{debate_id}/messages",
-                json={
-                    "content": opiniao.strip(),
-                    "position": random.choice(["for", "against", "neutral"])
-                },
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
+        posicao = random.choice(["for", "against", "neutral"])
+        if await self.transporte.mensagem_debate(self, debate_id, opiniao.strip(), posicao):
             self.stats["debates_participados"] += 1
             print(f"[{self.nome}] 🗣️ Debatendo: {opiniao[:50]}...")
             return True
-        except:
-            return False
+        return False
 
-    async def _criar_debate(self, client: httpx.AsyncClient) -> bool:
+    async def _criar_debate(self) -> bool:
         """Cria um novo debate"""
         tema = random.choice(self.temas)
         prompt = f"Crie um topico de debate interessante sobre {tema}. Apenas o titulo do debate em 1 frase."
@@ -190,19 +158,9 @@ Apresente argumentos e respeite opinioes contrarias.
         if not topico:
             return False
 
-        try:
-            await client.post(
-                f"{API_URL}/api/debates/",
-                json={
-                    "topic": topico.strip().replace('"', ''),
-                    "description": f"Debate iniciado por {self.nome} sobre {tema}",
-                    "position": "for"
-                },
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
-            return True
-        except:
-            return False
+        return await self.transporte.criar_debate(
+            self, topico.strip().replace('"', ''), f"Debate iniciado por {self.nome} sobre {tema}"
+        )
 
     async def gerar_post(self) -> Optional[str]:
         """Conversacional posta perguntas e reflexoes"""
@@ -231,9 +189,9 @@ Apresente argumentos e respeite opinioes contrarias.
                 texto = texto[:297] + "..."
         return texto
 
-    async def comentar(self, client: httpx.AsyncClient, post_id: str, post_content: str) -> bool:
+    async def comentar(self, post_id: str, post_content: str) -> bool:
         """Comenta de forma conversacional e engajada"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
         prompt = f"""Alguem postou: "{post_content[:120]}"
@@ -246,75 +204,46 @@ Responda de forma engajada e conversacional. Faca uma pergunta ou adicione uma p
             return False
 
         comentario = comentario.replace('"', '').strip()
-        try:
-            await client.post(
-                f"{API_URL}/api/posts/{post_id}/comment",
-                json={"content": comentario},
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
+        if await self.transporte.comentar(self, post_id, comentario):
             self.stats["comentarios_feitos"] += 1
             return True
-        except:
-            return False
+        return False
 
-    async def executar_ciclo(self, client: httpx.AsyncClient):
+    async def executar_ciclo(self):
         """Ciclo do Conversacional: foco em interagir"""
         # 1. Responder mensagens pendentes
-        if self.token:
-            try:
-                resp = await client.get(
-                    f"{API_URL}/api/messages/received?limit=5",
-                    headers={"Authorization": f"Bearer {self.token}"}
+        if self.agent_id:
+            mensagens = await self.transporte.mensagens_recebidas(self, limit=5)
+            for msg in mensagens[:3]:
+                resposta = await self.responder_mensagem(
+                    msg.get("content", ""),
+                    msg.get("sender_name", "alguem")
                 )
-                if resp.status_code == 200:
-                    mensagens = resp.json()
-                    for msg in mensagens[:3]:
-                        resposta = await self.responder_mensagem(
-                            msg.get("content", ""),
-                            msg.get("sender_name", "alguem")
-                        )
-                        if resposta:
-                            try:
-                                await client.post(
-                                    f"{API_URL}/api/messages/",
-                                    json={
-                                        "receiver_id": msg.get("sender_id", ""),
-                                        "content": resposta
-                                    },
-                                    headers={"Authorization": f"Bearer {self.token}"}
-                                )
-                                self.stats["mensagens_enviadas"] += 1
-                            except:
-                                pass
-                        await asyncio.sleep(2)
-            except:
-                pass
+                if resposta and await self.transporte.enviar_mensagem(self, msg.get("sender_id", ""), resposta):
+                    self.stats["mensagens_enviadas"] += 1
+                await asyncio.sleep(2)
 
         # 2. Interagir no feed (alta frequencia)
-        try:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=10")
-            posts = resp.json() if resp.status_code == 200 else []
-        except:
-            posts = []
+        posts = await self.transporte.feed(self, limit=10)
 
         if posts:
             # Comentar em 2-3 posts
             for post in random.sample(posts, min(3, len(posts))):
-                await self.comentar(client, post["id"], post.get("content", ""))
+                await self.comentar(post["id"], post.get("content", ""))
                 await asyncio.sleep(2)
 
             # Reagir em varios posts
             for post in random.sample(posts, min(5, len(posts))):
-                await self.reagir(client, post["id"])
+                await self.reagir(post["id"])
 
         # 3. Iniciar conversa (30% chance)
         if random.random() < 0.3:
-            await self.iniciar_conversa(client)
+            await self.iniciar_conversa()
 
         # 4. Participar de debate (20% chance)
         if random.random() < 0.2:
-            await self.participar_debate(client)
+            await self.participar_debate()
 
         # 5. Postar (menos frequente que creator)
         if random.random() < 0.3:
-            await self.postar(client)
+            await self.postar()
@@ -6,12 +6,11 @@
 """
 import random
 import asyncio
-import httpx
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 from app.services.agent_types.base import (
-    AgentTypeBase, AgentCategory, AgentConfig, MODELOS_DISPONIVEIS, API_URL
+    AgentTypeBase, AgentCategory, AgentConfig, MODELOS_DISPONIVEIS
 )
 
 
@@ -45,8 +44,8 @@ class CreatorAgent(AgentTypeBase):
         "desafio",          # Desafio para outros agentes
     ]
 
-    def __init__(self, config: AgentConfig):
-        super().__init__(config)
+    def __init__(self, config: AgentConfig, transporte=None):
+        super().__init__(config, transporte)
         self.estilo_criativo = config.estilo or "casual"
         self.posts_hoje = 0
         self.max_posts_dia = 10
@@ -118,9 +117,9 @@ class CreatorAgent(AgentTypeBase):
                 pesos.append(12)
         return random.choices(opcoes, weights=pesos, k=1)[0]
 
-    async def criar_thread(self, client: httpx.AsyncClient, tema: str, partes: int = 5) -> List[str]:
+    async def criar_thread(self, tema: str, partes: int = 5) -> List[str]:
         """Cria uma thread (serie de posts conectados)"""
-        if not self.token:
+        if not self.agent_id:
             return []
 
         posts_ids = []
@@ -129,24 +128,17 @@ class CreatorAgent(AgentTypeBase):
             texto = await self.gerar_texto(prompt, max_tokens=120)
             if texto:
                 texto = f"🧵 ({i}/{partes}) {texto.strip()}"
-                try:
-                    resp = await client.post(
-                        f"{API_URL}/api/posts/",
-                        json={"content": texto, "is_public": True},
-                        headers={"Authorization": f"Bearer {self.token}"}
-                    )
-                    if resp.status_code == 201:
-                        posts_ids.append(resp.json().get("id", ""))
-                        self.stats["posts_criados"] += 1
-                except:
-                    pass
+                post = await self.transporte.postar(self, texto)
+                if post:
+                    posts_ids.append(post.get("id", ""))
+                    self.stats["posts_criados"] += 1
                 await asyncio.sleep(3)
 
         return posts_ids
 
-    async def criar_story(self, client: httpx.AsyncClient) -> bool:
+    async def criar_story(self) -> bool:
         """Cria uma story (24h)"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
         tema = random.choice(self.temas)
@@ -154,18 +146,10 @@ class CreatorAgent(AgentTypeBase):
         texto = await self.gerar_texto(prompt, max_tokens=60)
 
         if texto:
-            try:
-                resp = await client.post(
-                    f"{API_URL}/api/stories/",
-                    json={"content": texto.strip(), "story_type": "text"},
-                    headers={"Authorization": f"Bearer {self.token}"}
-                )
-                return resp.status_code == 201
-            except:
-                pass
+            return await self.transporte.story(self, texto.strip())
         return False
 
-    async def executar_ciclo(self, client: httpx.AsyncClient):
+    async def executar_ciclo(self):
         """Ciclo do Creator: foco em criar conteudo"""
         # Reset diario
         if datetime.now().hour == 0 and datetime.now().minute < 2:
@@ -173,28 +157,24 @@ class CreatorAgent(AgentTypeBase):
 
         # Postar conteudo original
         if self.posts_hoje < self.max_posts_dia:
-            await self.postar(client)
+            await self.postar()
             await asyncio.sleep(2)
 
             # 20% chance de criar thread
             if random.random() < 0.2:
                 tema = random.choice(self.temas)
                 print(f"[{self.nome}] 🧵 Criando thread sobre {tema}...")
-                await self.criar_thread(client, tema, partes=random.randint(3, 5))
+                await self.criar_thread(tema, partes=random.randint(3, 5))
 
             # 30% chance de criar story
             if random.random() < 0.3:
-                await self.criar_story(client)
+                await self.criar_story()
 
         # Interagir com feed (menos que curador)
-        try:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=5")
-            posts = resp.json() if resp.status_code == 200 else []
-        except:
-            posts = []
+        posts = await self.transporte.feed(self, limit=5)
 
         if posts:
             post = random.choice(posts)
-            await self.comentar(client, post["id"], post.get("content", ""))
+            await self.comentar(post["id"], post.get("content", ""))
             for p in random.sample(posts, min(2, len(posts))):
-                await self.reagir(client, p["id"])
+                await self.reagir(p["id"])
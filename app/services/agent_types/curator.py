@@ -6,14 +6,86 @@
 """
 import random
 import asyncio
-import httpx
+import hashlib
+import os
+import re
+from collections import OrderedDict
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 from app.services.agent_types.base import (
-    AgentTypeBase, AgentCategory, AgentConfig, API_URL
+    AgentTypeBase, AgentCategory, AgentConfig
 )
 
+LOTE_MAX = int(os.environ.get("CURADOR_LOTE_MAX", "20"))          # posts por chamada ao LLM
+CACHE_MAX = int(os.environ.get("CURADOR_CACHE_MAX", "5000"))       # vereditos lembrados
+
+PADRAO = {"nota": 5, "classificacao": "MEDIO"}
+_LINHA_VEREDITO = re.compile(r"^\W*(\d+)\W+(\d{1,2})\s*/\s*([A-Za-z]+)")
+_VEREDITO_SOLTO = re.compile(r"^\W*(\d{1,2})\s*/\s*([A-Za-z]+)")  # "7/BOM" (lote de 1)
+
+
+class CacheVereditos:
+    """Vereditos de qualidade por post, compartilhados entre curadores.
+
+    Chave = post_id; o veredito guarda o hash do conteudo avaliado, entao um
+    post editado (hash diferente) e avaliado de novo. Avaliacoes em voo ficam
+    em _em_voo: dois curadores pedindo o mesmo post esperam a mesma chamada.
+    """
+
+    def __init__(self, max_itens=CACHE_MAX):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # post_id -> (hash, veredito)
+        self._em_voo = {}            # (post_id, hash) -> Future
+        # Metricas
+        self.hits = 0
+        self.misses = 0
+        self.chamadas = 0
+
+    @staticmethod
+    def hash_de(conteudo):
+        return hashlib.blake2b(conteudo.encode("utf-8"), digest_size=8).hexdigest()
+
+    def obter(self, post_id, h):
+        item = self._itens.get(post_id)
+        if item is None or item[0] != h:
+            return None
+        self._itens.move_to_end(post_id)
+        return item[1]
+
+    def guardar(self, post_id, h, veredito):
+        self._itens[post_id] = (h, veredito)
+        self._itens.move_to_end(post_id)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+    def invalidar(self, post_id):
+        self._itens.pop(post_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"itens": len(self._itens), "em_voo": len(self._em_voo), "hits": self.hits,
+                "misses": self.misses, "chamadas_llm": self.chamadas,
+                "taxa_hit": round(self.hits / total, 3) if total else 0.0}
+
+
+VEREDITOS = CacheVereditos()
+
+
+def parse_vereditos(resposta, n):
+    """'1: 7/BOM' por linha -> {indice (1..n): veredito}; linhas fora do formato sao ignoradas"""
+    vereditos = {}
+    for linha in (resposta or "").splitlines():
+        m = _LINHA_VEREDITO.match(linha)
+        if m and 1 <= int(m.group(1)) <= n:
+            vereditos[int(m.group(1))] = {"nota": min(10, int(m.group(2))),
+                                          "classificacao": m.group(3).upper()}
+    if n == 1 and not vereditos:
+        m = _VEREDITO_SOLTO.match((resposta or "").strip())
+        if m:
+            vereditos[1] = {"nota": min(10, int(m.group(1))), "classificacao": m.group(2).upper()}
+    return vereditos
+
 
 class CuratorAgent(AgentTypeBase):
     CATEGORY = AgentCategory.CURATOR
@@ -25,6 +97,8 @@ class CuratorAgent(AgentTypeBase):
         "comentar", "reagir",
     ]
 
+    vereditos = VEREDITOS  # cache compartilhado por todos os curadores
+
     CRITERIOS_QUALIDADE = {
         "relevancia": "O conteudo e relevante e atual?",
         "originalidade": "O conteudo traz algo novo?",
@@ -33,8 +107,8 @@ class CuratorAgent(AgentTypeBase):
         "valor": "Agrega valor a comunidade?",
     }
 
-    def __init__(self, config: AgentConfig):
-        super().__init__(config)
+    def __init__(self, config: AgentConfig, transporte=None):
+        super().__init__(config, transporte)
         self.posts_avaliados = {}  # post_id -> nota
         self.colecoes = {}  # nome -> [post_ids]
         self.spam_detectado = []
@@ -45,30 +119,83 @@ class CuratorAgent(AgentTypeBase):
             "recomendacoes_feitas": 0,
         })
 
-    async def avaliar_qualidade(self, post_content: str) -> Dict[str, Any]:
-        """Avalia qualidade de um post (0-10)"""
-        prompt = f"""Avalie este post de rede social de 0 a 10:
-"{post_content[:200]}"
-
-Responda APENAS com um numero de 0 a 10 e uma palavra: BOM, MEDIO ou RUIM.
-Formato: NOTA/PALAVRA
-Exemplo: 7/BOM"""
-
-        resultado = await self.gerar_texto(prompt, max_tokens=20)
-        nota = 5
-        classificacao = "MEDIO"
-
-        if resultado:
+    async def avaliar_qualidade(self, post_content: str, post_id: Optional[str] = None) -> Dict[str, Any]:
+        """Avalia qualidade de um post (0-10); com post_id passa pelo cache de vereditos"""
+        chave = post_id or f"h_{CacheVereditos.hash_de(post_content)}"
+        vereditos = await self.avaliar_lote([{"id": chave, "content": post_content}])
+        return vereditos[chave]
+
+    async def avaliar_lote(self, posts: List[Dict]) -> Dict[str, Dict[str, Any]]:
+        """Avalia varios posts ({id, content}) com uma chamada ao LLM por LOTE_MAX posts.
+
+        Devolve post_id -> {"nota", "classificacao"}. Vereditos do cache (mesmo
+        conteudo) nao vao ao LLM; post sem linha valida na resposta fica com a
+        nota padrao e nao e guardado (tenta de novo no proximo ciclo).
+        """
+        cache = self.vereditos
+        resultado, esperar, novos, vistos = {}, {}, [], set()
+        for post in posts:
+            pid, conteudo = post["id"], post.get("content", "")
+            if pid in vistos:
+                continue
+            vistos.add(pid)
+            h = cache.hash_de(conteudo)
+            veredito = cache.obter(pid, h)
+            if veredito is not None:
+                cache.hits += 1
+                resultado[pid] = veredito
+            elif (pid, h) in cache._em_voo:
+                cache.hits += 1
+                esperar[pid] = cache._em_voo[(pid, h)]
+            else:
+                cache.misses += 1
+                fut = asyncio.get_running_loop().create_future()
+                cache._em_voo[(pid, h)] = fut
+                novos.append((pid, h, conteudo, fut))
+
+        for i in range(0, len(novos), LOTE_MAX):
+            lote = novos[i:i + LOTE_MAX]
             try:
-                partes = resultado.strip().split("/")
-                nota = min(10, max(0, int(partes[0].strip())))
-                if len(partes) > 1:
-                    classificacao = partes[1].strip().upper()
-            except:
-                pass
-
-        self.stats["posts_avaliados"] += 1
-        return {"nota": nota, "classificacao": classificacao}
+                vereditos = await self._avaliar_no_llm([c for _, _, c, _ in lote])
+            except BaseException:
+                for pid, h, _, fut in lote + novos[i + LOTE_MAX:]:
+                    cache._em_voo.pop((pid, h), None)
+                    if not fut.done():
+                        fut.set_result(dict(PADRAO))
+                raise
+            for j, (pid, h, _, fut) in enumerate(lote, 1):
+                veredito = vereditos.get(j)
+                if veredito is not None:
+                    cache.guardar(pid, h, veredito)
+                resultado[pid] = veredito or dict(PADRAO)
+                cache._em_voo.pop((pid, h), None)
+                fut.set_result(resultado[pid])
+            self.stats["posts_avaliados"] += len(lote)
+
+        for pid, fut in esperar.items():
+            resultado[pid] = await fut
+        return resultado
+
+    async def _avaliar_no_llm(self, conteudos: List[str]) -> Dict[int, Dict[str, Any]]:
+        """Um prompt com todos os posts numerados -> {indice: veredito}"""
+        self.vereditos.chamadas += 1
+        lista = "\n".join(f'[{i}] "{c[:200]}"' for i, c in enumerate(conteudos, 1))
+        prompt = f"""Avalie cada post de rede social abaixo de 0 a 10:
+{lista}
+
+Responda APENAS uma linha por post, na ordem, com o numero do post, a nota de 0 a 10 e uma palavra: BOM, MEDIO ou RUIM.
+Formato: N: NOTA/PALAVRA
+Exemplo:
+1: 7/BOM
+2: 3/RUIM"""
+
+        resposta = await self.gerar_texto(prompt, max_tokens=12 * len(conteudos) + 20)
+        return parse_vereditos(resposta, len(conteudos))
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["cache_vereditos"] = self.vereditos.stats()
+        return status
 
     async def detectar_spam(self, post_content: str) -> bool:
         """Detecta se um post e spam"""
@@ -92,28 +219,22 @@ Exemplo: 7/BOM"""
             self.stats["spam_detectado"] += 1
         return is_spam
 
-    async def recomendar_posts(self, client: httpx.AsyncClient, limit: int = 5) -> List[Dict]:
+    async def recomendar_posts(self, limit: int = 5) -> List[Dict]:
         """Recomenda os melhores posts do feed"""
-        try:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=20")
-            posts = resp.json() if resp.status_code == 200 else []
-        except:
-            return []
+        posts = await self.transporte.feed(self, limit=20)
 
-        recomendados = []
-        for post in posts:
-            content = post.get("content", "")
-            if not await self.detectar_spam(content):
-                avaliacao = await self.avaliar_qualidade(content)
-                if avaliacao["nota"] >= 6:
-                    post["curadoria"] = avaliacao
-                    recomendados.append(post)
-                    await asyncio.sleep(1)  # Rate limit Ollama
+        candidatos = [p for p in posts if not await self.detectar_spam(p.get("content", ""))]
+        vereditos = await self.avaliar_lote(candidatos)
 
-            if len(recomendados) >= limit:
-                break
+        recomendados = []
+        for post in candidatos:
+            avaliacao = vereditos[post["id"]]
+            if avaliacao["nota"] >= 6:
+                post["curadoria"] = avaliacao
+                recomendados.append(post)
 
         recomendados.sort(key=lambda x: x.get("curadoria", {}).get("nota", 0), reverse=True)
+        recomendados = recomendados[:limit]
         self.stats["recomendacoes_feitas"] += len(recomendados)
         return recomendados
 
@@ -144,12 +265,12 @@ Exemplo: 7/BOM"""
                 texto = texto[:397] + "..."
         return texto
 
-    async def comentar(self, client: httpx.AsyncClient, post_id: str, post_content: str) -> bool:
+    async def comentar(self, post_id: str, post_content: str) -> bool:
         """Curador comenta com avaliacao construtiva"""
-        if not self.token:
+        if not self.agent_id:
             return False
 
-        avaliacao = await self.avaliar_qualidade(post_content)
+        avaliacao = await self.avaliar_qualidade(post_content, post_id)
 
         if avaliacao["nota"] >= 7:
             prompt = f'Post excelente: "{post_content[:80]}". Escreva um elogio construtivo. 1 frase. Use emoji.'
@@ -164,46 +285,40 @@ Exemplo: 7/BOM"""
             return False
 
         comentario = comentario.replace('"', '').strip()
-        try:
-            await client.post(
-                f"{API_URL}/api/posts/{post_id}/comment",
-                json={"content": comentario},
-                headers={"Authorization": f"Bearer {self.token}"}
-            )
+        if await self.transporte.comentar(self, post_id, comentario):
             self.stats["comentarios_feitos"] += 1
             return True
-        except:
-            return False
+        return False
 
-    async def executar_ciclo(self, client: httpx.AsyncClient):
+    async def executar_ciclo(self):
         """Ciclo do Curador: foco em avaliar e recomendar"""
         # 1. Avaliar posts do feed
-        try:
-            resp = await client.get(f"{API_URL}/api/posts/feed?limit=10")
-            posts = resp.json() if resp.status_code == 200 else []
-        except:
-            posts = []
+        posts = await self.transporte.feed(self, limit=10)
 
-        # 2. Avaliar e comentar
+        # 2. Avaliar (uma chamada para o lote todo) e comentar
+        candidatos = []
         for post in posts[:5]:
             content = post.get("content", "")
-            is_spam = await self.detectar_spam(content)
-            if is_spam:
+            if await self.detectar_spam(content):
                 print(f"[{self.nome}] 🚫 Spam detectado: {content[:40]}...")
-                continue
+            else:
+                candidatos.append(post)
+        vereditos = await self.avaliar_lote(candidatos)
 
-            avaliacao = await self.avaliar_qualidade(content)
+        for post in candidatos:
+            content = post.get("content", "")
+            avaliacao = vereditos[post["id"]]
             self.posts_avaliados[post["id"]] = avaliacao
 
             # Reagir baseado na nota
             if avaliacao["nota"] >= 7:
-                await self.reagir(client, post["id"])
+                await self.reagir(post["id"])
                 # 50% chance de comentar em posts bons
                 if random.random() < 0.5:
-                    await self.comentar(client, post["id"], content)
+                    await self.comentar(post["id"], content)
 
             await asyncio.sleep(2)
 
         # 3. Postar resumo/destaque (menos frequente)
         if random.random() < 0.4:
-            await self.postar(client)
+            await self.postar()
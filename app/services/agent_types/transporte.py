@@ -0,0 +1,398 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║  TRANSPORTE - Como um agente custom fala com a rede          ║
+║  Local (mesmo processo) ou HTTP (agente remoto)              ║
+╚══════════════════════════════════════════════════════════════╝
+
+Os agentes chamavam o proprio processo por http://localhost:8000: cada acao
+pagava serializacao HTTP, decode de JWT e lookup do agente, e cada login um
+bcrypt. TransporteLocal chama direto as funcoes dos routers/servicos com uma
+sessao do banco e o Agent ja carregado (mesmas validacoes, sem rede). A
+api_key e conferida contra o hash da conta no primeiro entrar() e o
+resultado fica em cache no processo. TransporteHttp continua disponivel para agentes que rodam fora.
+
+AGENTES_TRANSPORTE=local|http escolhe o padrao; AGENTES_API_URL e a base
+do transporte HTTP.
+
+Todos os metodos devolvem dados simples (dict/list/bool) no formato das
+respostas da API e nunca levantam: falha vira None/[]/False.
+"""
+import abc
+import asyncio
+import hashlib
+import os
+from typing import Optional, List, Dict, Any
+
+from fastapi import HTTPException
+from sqlalchemy import select, desc
+
+from app.database import AsyncSessionLocal
+from app.models import Agent, Message
+from app.schemas import (
+    AgentCreate, AgentResponse, PostCreate, PostResponse, CommentCreate,
+    MessageCreate, DebateCreate, DebateResponse, DebateMessageCreate, StoryCreate,
+)
+from app.services.auth import verify_api_key
+from app.routers import agents as _agents, posts as _posts, messages as _messages, debates as _debates, stories as _stories
+from app.services.feed import get_feed_posts
+from app.services.http_pool import http_pool
+from app.services.metricas_rede import metricas_rede
+
+TRANSPORTE = os.environ.get("AGENTES_TRANSPORTE", "local")
+API_URL = os.environ.get("AGENTES_API_URL", "http://localhost:8000")
+
+# Posicoes que os agentes usam -> Position do debate
+POSICOES = {"for": "favor", "against": "contra", "neutral": "neutro"}
+
+
+class TransporteAgente(abc.ABC):
+    """Interface: o que um agente custom pode fazer na rede"""
+
+    nome = "base"
+
+    @abc.abstractmethod
+    async def entrar(self, agente, dados: Dict[str, Any], api_key: str) -> bool:
+        """Registra (se preciso) e autentica; preenche agente.agent_id"""
+
+    @abc.abstractmethod
+    async def feed(self, agente, limit: int = 20) -> List[Dict]:
+        ...
+
+    @abc.abstractmethod
+    async def agentes(self, agente, limit: int = 20) -> List[Dict]:
+        ...
+
+    @abc.abstractmethod
+    async def metricas(self, agente) -> Optional[Dict]:
+        """Snapshot compartilhado de metricas da rede (SnapshotRede.como_dict)"""
+
+    @abc.abstractmethod
+    async def postar(self, agente, content: str, is_public: bool = True) -> Optional[Dict]:
+        ...
+
+    @abc.abstractmethod
+    async def comentar(self, agente, post_id: str, content: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def curtir(self, agente, post_id: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def story(self, agente, content: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def enviar_mensagem(self, agente, receiver_id: str, content: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def mensagens_recebidas(self, agente, limit: int = 5) -> List[Dict]:
+        """Mensagens ainda nao lidas (com sender_id/sender_name)"""
+
+    @abc.abstractmethod
+    async def debates(self, agente, limit: int = 5) -> List[Dict]:
+        ...
+
+    @abc.abstractmethod
+    async def criar_debate(self, agente, topico: str, descricao: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def mensagem_debate(self, agente, debate_id: str, content: str, posicao: str) -> bool:
+        ...
+
+
+class TransporteLocal(TransporteAgente):
+    """Chama os routers/servicos no mesmo processo (sem HTTP, um bcrypt por conta e processo)"""
+
+    nome = "local"
+
+    def __init__(self):
+        self._contas: Dict[str, Agent] = {}  # agent_id -> Agent (sem sessao, expire_on_commit=False)
+        self._chaves: Dict[str, tuple] = {}  # agent_id -> (api_key_hash, sha256 da chave) ja conferidos
+
+    def _conta(self, agente) -> Optional[Agent]:
+        return self._contas.get(agente.agent_id) if agente.agent_id else None
+
+    async def entrar(self, agente, dados, api_key):
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(Agent).where(Agent.name == dados["name"]))
+                conta = result.scalar_one_or_none()
+                if conta is None:
+                    conta = await _agents.register_agent(AgentCreate(**dados, api_key=api_key), db)
+                    self._chaves[conta.id] = (conta.api_key_hash, self._digest(api_key))
+            if not conta.is_active:
+                print(f"[ERRO] {agente.nome}: agente desativado")
+                return False
+            if not await self._conferir(conta, api_key):
+                print(f"[ERRO] {agente.nome}: api_key nao confere com a conta '{conta.name}'")
+                return False
+        except Exception as e:
+            print(f"[ERRO] {agente.nome} registro local: {e}")
+            return False
+        self._contas[conta.id] = conta
+        agente.agent_id = conta.id
+        return True
+
+    @staticmethod
+    def _digest(api_key):
+        return hashlib.sha256(api_key.encode("utf-8")).digest()
+
+    async def _conferir(self, conta, api_key):
+        """Mesma checagem do /login; o bcrypt roda uma vez por conta (fora do loop)"""
+        chave = (conta.api_key_hash, self._digest(api_key))
+        if self._chaves.get(conta.id) == chave:
+            return True
+        if not await asyncio.to_thread(verify_api_key, api_key, conta.api_key_hash):
+            return False
+        self._chaves[conta.id] = chave
+        return True
+
+    async def feed(self, agente, limit=20):
+        try:
+            async with AsyncSessionLocal() as db:
+                if agente.agent_id:
+                    posts = await get_feed_posts(db, agente.agent_id, 0, limit)
+                else:
+                    posts = await _posts.get_public_posts(db, 0, limit)
+            return [PostResponse.model_validate(p).model_dump() for p in posts]
+        except Exception:
+            return []
+
+    async def agentes(self, agente, limit=20):
+        try:
+            async with AsyncSessionLocal() as db:
+                contas = await _agents.list_agents(skip=0, limit=limit, model_type=None, db=db)
+            return [AgentResponse.model_validate(a).model_dump() for a in contas]
+        except Exception:
+            return []
+
+    async def metricas(self, agente):
+        try:
+            return (await metricas_rede.obter()).como_dict()
+        except Exception:
+            return None
+
+    async def postar(self, agente, content, is_public=True):
+        conta = self._conta(agente)
+        if conta is None:
+            return None
+        try:
+            async with AsyncSessionLocal() as db:
+                post = await _posts.create_post(PostCreate(content=content, is_public=is_public), conta, db)
+            return PostResponse.model_validate(post).model_dump()
+        except Exception:
+            return None
+
+    async def comentar(self, agente, post_id, content):
+        conta = self._conta(agente)
+        if conta is None:
+            return False
+        try:
+            async with AsyncSessionLocal() as db:
+                await _posts.create_comment(post_id, CommentCreate(content=content), conta, db)
+            return True
+        except Exception:
+            return False
+
+    async def curtir(self, agente, post_id):
+        conta = self._conta(agente)
+        if conta is None:
+            return False
+        try:
+            async with AsyncSessionLocal() as db:
+                await _posts.like_post(post_id, conta, db)
+            return True
+        except Exception:
+            return False  # ja curtido / post sumiu
+
+    async def story(self, agente, content):
+        conta = self._conta(agente)
+        if conta is None:
+            return False
+        try:
+            async with AsyncSessionLocal() as db:
+                await _stories.create_story(StoryCreate(content=content), db, conta)
+            return True
+        except Exception:
+            return False
+
+    async def enviar_mensagem(self, agente, receiver_id, content):
+        conta = self._conta(agente)
+        if conta is None:
+            return False
+        try:
+            async with AsyncSessionLocal() as db:
+                await _messages.send_message(MessageCreate(receiver_id=receiver_id, content=content), conta, db)
+            return True
+        except Exception:
+            return False
+
+    async def mensagens_recebidas(self, agente, limit=5):
+        if not agente.agent_id:
+            return []
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(Message, Agent.name)
+                    .join(Agent, Agent.id == Message.sender_id)
+                    .where(Message.receiver_id == agente.agent_id, Message.read == False)
+                    .order_by(desc(Message.created_at))
+                    .limit(limit)
+                )
+                linhas = result.all()
+                for msg, _ in linhas:
+                    msg.read = True  # responde uma vez so
+                await db.commit()
+            return [{"id": m.id, "sender_id": m.sender_id, "sender_name": nome, "content": m.content}
+                    for m, nome in linhas]
+        except Exception:
+            return []
+
+    async def debates(self, agente, limit=5):
+        try:
+            async with AsyncSessionLocal() as db:
+                lista = await _debates.list_debates(db=db, skip=0, limit=limit, status=None)
+            return [DebateResponse.model_validate(d).model_dump() for d in lista]
+        except Exception:
+            return []
+
+    async def criar_debate(self, agente, topico, descricao):
+        conta = self._conta(agente)
+        if conta is None:
+            return False
+        try:
+            async with AsyncSessionLocal() as db:
+                await _debates.create_debate(DebateCreate(title=topico[:200], topic=descricao or topico), conta, db)
+            return True
+        except Exception:
+            return False
+
+    async def mensagem_debate(self, agente, debate_id, content, posicao):
+        conta = self._conta(agente)
+        if conta is None:
+            return False
+        dados = DebateMessageCreate(content=content, position=POSICOES.get(posicao, posicao))
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    await _debates.join_debate(debate_id, conta, db)
+                except HTTPException:
+                    pass  # ja participa (ou fechado: a mensagem abaixo falha)
+                await _debates.send_debate_message(debate_id, dados, conta, db)
+            return True
+        except Exception:
+            return False
+
+
+class TransporteHttp(TransporteAgente):
+    """Fala com a API por HTTP (agente rodando fora do processo do servidor)"""
+
+    nome = "http"
+
+    def __init__(self, api_url: str = API_URL, timeout: float = 30.0):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+
+    def _auth(self, agente):
+        return {"Authorization": f"Bearer {agente.token}"} if agente.token else {}
+
+    async def _get(self, agente, caminho, padrao):
+        try:
+            async with http_pool.cliente(timeout=self.timeout) as client:
+                resp = await client.get(f"{self.api_url}{caminho}", headers=self._auth(agente))
+            return resp.json() if resp.status_code == 200 else padrao
+        except Exception:
+            return padrao
+
+    async def _post(self, agente, caminho, json=None):
+        if not agente.token:
+            return None
+        try:
+            async with http_pool.cliente(timeout=self.timeout) as client:
+                return await client.post(f"{self.api_url}{caminho}", json=json, headers=self._auth(agente))
+        except Exception:
+            return None
+
+    async def entrar(self, agente, dados, api_key):
+        async with http_pool.cliente(timeout=self.timeout) as client:
+            try:
+                await client.post(f"{self.api_url}/api/agents/register", json={**dados, "api_key": api_key})
+            except Exception:
+                pass
+            try:
+                resp = await client.post(f"{self.api_url}/api/agents/login",
+                                         data={"username": dados["name"], "password": api_key})
+                if resp.status_code == 200:
+                    agente.token = resp.json()["access_token"]
+                    me = await client.get(f"{self.api_url}/api/agents/me", headers=self._auth(agente))
+                    if me.status_code == 200:
+                        agente.agent_id = me.json()["id"]
+                        return True
+            except Exception as e:
+                print(f"[ERRO] {agente.nome} login: {e}")
+        return False
+
+    async def feed(self, agente, limit=20):
+        if agente.token:
+            return await self._get(agente, f"/api/posts/feed?limit={limit}", [])
+        return await self._get(agente, f"/api/posts/public?limit={limit}", [])
+
+    async def agentes(self, agente, limit=20):
+        return await self._get(agente, f"/api/agents/?limit={limit}", [])
+
+    async def metricas(self, agente):
+        return await self._get(agente, "/api/custom-agents/analytics?detalhado=true", None)
+
+    async def postar(self, agente, content, is_public=True):
+        resp = await self._post(agente, "/api/posts/", {"content": content, "is_public": is_public})
+        return resp.json() if resp is not None and resp.status_code == 201 else None
+
+    async def comentar(self, agente, post_id, content):
+        resp = await self._post(agente, f"/api/posts/{post_id}/comment", {"content": content})
+        return resp is not None and resp.status_code == 201
+
+    async def curtir(self, agente, post_id):
+        resp = await self._post(agente, f"/api/posts/{post_id}/like")
+        return resp is not None and resp.status_code == 201
+
+    async def story(self, agente, content):
+        resp = await self._post(agente, "/api/stories/", {"content": content, "type": "text"})
+        return resp is not None and resp.status_code in (200, 201)
+
+    async def enviar_mensagem(self, agente, receiver_id, content):
+        resp = await self._post(agente, "/api/messages/", {"receiver_id": receiver_id, "content": content})
+        return resp is not None and resp.status_code == 201
+
+    async def mensagens_recebidas(self, agente, limit=5):
+        if not agente.token:
+            return []
+        return await self._get(agente, f"/api/messages/received?limit={limit}", [])
+
+    async def debates(self, agente, limit=5):
+        return await self._get(agente, f"/api/debates/?limit={limit}", [])
+
+    async def criar_debate(self, agente, topico, descricao):
+        resp = await self._post(agente, "/api/debates/", {"title": topico[:200], "topic": descricao or topico})
+        return resp is not None and resp.status_code == 201
+
+    async def mensagem_debate(self, agente, debate_id, content, posicao):
+        await self._post(agente, f"/api/debates/{debate_id}/join")
+        resp = await self._post(agente, f"/api/debates/{debate_id}/message",
+                                {"content": content, "position": POSICOES.get(posicao, posicao)})
+        return resp is not None and resp.status_code == 201
+
+
+_local = None
+
+
+def transporte_padrao() -> TransporteAgente:
+    """Transporte dos agentes criados sem um explicito (AGENTES_TRANSPORTE)"""
+    global _local
+    if TRANSPORTE == "http":
+        return TransporteHttp()
+    if _local is None:
+        _local = TransporteLocal()  # um so para todos: compartilha o cache de contas
+    return _local
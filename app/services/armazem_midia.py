@@ -0,0 +1,324 @@
+"""
+Armazem de midia enderecado por conteudo
+Cada imagem/video baixado ou gerado vira static/ig_media/<ab>/<hash>.<ext>,
+com o nome derivado do hash dos bytes: downloads repetidos (Pexels, o mesmo
+prompt no Pollinations, reenvio de upload) ocupam um arquivo so.
+
+Posts, stories e carrosseis contam referencias (protocolo de observador de
+ListaObservavel). Um GC em background apaga o que ficou sem referencia e
+segura o disco abaixo de MIDIA_QUOTA_MB. Itens que so existem no disco
+(posts frios no SQLite) nao passam pelos observadores: entram por
+referenciar_em_disco(), consultada a cada GC so pelos arquivos que iam
+sair. Como o conteudo de uma URL nunca muda, StaticImutavel serve os
+arquivos com ETag forte e cache "immutable".
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.services.http_pool import http_pool
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+RAIZ = BASE_DIR / "static" / "ig_media"
+PREFIXO_URL = "/static/ig_media/"
+QUOTA_BYTES = int(float(os.environ.get("MIDIA_QUOTA_MB", "2048")) * 1024 * 1024)
+GRACA_S = float(os.environ.get("MIDIA_GRACA_S", "3600"))          # sem referencia ha menos que isso: fica
+ORFAO_S = float(os.environ.get("MIDIA_ORFAO_S", str(24 * 3600)))  # sem referencia ha mais: sai mesmo sem quota
+GC_INTERVALO_S = float(os.environ.get("MIDIA_GC_INTERVALO_S", "600"))
+MAX_ESPELHOS = 1000  # URLs remotas lembradas por espelho()
+
+# Campos de posts/stories que apontam para midia
+CAMPOS_URL = ("imagem_url", "video_url", "media_url", "thumbnail_url")
+CAMPOS_LISTA = ("carousel_urls", "imagens")
+FORMATOS = ("webp", "jpg", "avif")  # rendicoes do midia_pipeline
+
+_ASSINATURAS = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+def detectar_ext(dados, padrao="jpg"):
+    """Extensao pelos primeiros bytes (nao confia no nome/Content-Type)"""
+    for assinatura, ext in _ASSINATURAS:
+        if dados.startswith(assinatura):
+            return ext
+    if dados[:4] == b"RIFF" and dados[8:12] == b"WEBP":
+        return "webp"
+    if dados[4:8] == b"ftyp":
+        return "avif" if dados[8:12] in (b"avif", b"avis") else "mp4"
+    if dados[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    return padrao
+
+
+def _urls_meta(meta):
+    for r in (meta or {}).get("rendicoes", {}).values():
+        for fmt in FORMATOS:
+            if r.get(fmt):
+                yield r[fmt]
+
+
+def urls_de(item):
+    """URLs de midia de um post/story, rendicoes inclusas (repetidas contam uma vez)"""
+    urls = {item.get(c) for c in CAMPOS_URL}
+    for c in CAMPOS_LISTA:
+        urls.update(item.get(c) or ())
+    urls.update(_urls_meta(item.get("midia")))
+    for meta in item.get("carousel_midia") or ():
+        urls.update(_urls_meta(meta))
+    return {u for u in urls if isinstance(u, str) and u}
+
+
+class ArmazemMidia:
+    def __init__(self, raiz=RAIZ, prefixo_url=PREFIXO_URL, quota_bytes=QUOTA_BYTES):
+        self.raiz = Path(raiz)
+        self.prefixo_url = prefixo_url
+        self.quota_bytes = quota_bytes
+        self._refs = {}  # nome do arquivo -> contagem
+        self._fontes = []  # fonte(nomes) -> os que itens gravados fora da memoria citam
+        self._task_gc = None
+        self._espelhos = OrderedDict()  # url remota -> url local
+        self._baixando = set()
+        # Metricas
+        self.gravados = 0
+        self.deduplicados = 0
+        self.bytes_gravados = 0
+        self.bytes_poupados = 0
+        self.gc_execucoes = 0
+        self.gc_apagados = 0
+        self.gc_bytes = 0
+        self.ultimo_gc = None
+
+    # --- nomes ---
+    def gerencia(self, url):
+        return isinstance(url, str) and url.startswith(self.prefixo_url)
+
+    def _nome(self, url):
+        return url[len(self.prefixo_url):].rsplit("/", 1)[-1]
+
+    def _caminho(self, nome):
+        return self.raiz / nome[:2] / nome
+
+    def _url(self, nome):
+        return f"{self.prefixo_url}{nome[:2]}/{nome}"
+
+    # --- gravacao ---
+    def _gravar(self, dados, ext):
+        nome = f"{hashlib.blake2b(dados, digest_size=16).hexdigest()}.{ext}"
+        caminho = self._caminho(nome)
+        if caminho.exists():
+            os.utime(caminho)  # mtime = ultimo uso (ordem de despejo do GC)
+            return nome, False
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        tmp = caminho.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(dados)
+        os.replace(tmp, caminho)
+        return nome, True
+
+    def guardar_sync(self, dados, ext=None):
+        """Grava os bytes e devolve a URL publica (para codigo que ja roda em thread)"""
+        ext = (ext or detectar_ext(dados)).lstrip(".").lower()
+        nome, novo = self._gravar(dados, ext)
+        if novo:
+            self.gravados += 1
+            self.bytes_gravados += len(dados)
+        else:
+            self.deduplicados += 1
+            self.bytes_poupados += len(dados)
+        return self._url(nome)
+
+    async def guardar(self, dados, ext=None):
+        """Grava os bytes fora do event loop e devolve a URL publica"""
+        return await asyncio.to_thread(self.guardar_sync, dados, ext)
+
+    # --- espelho de URLs remotas ---
+    def espelho(self, url_remota):
+        """URL local se a remota ja foi baixada; senao agenda o download e
+        devolve a remota desta vez (chamavel de codigo sincrono)"""
+        local = self._espelhos.get(url_remota)
+        if local and self._caminho(self._nome(local)).exists():
+            self._espelhos.move_to_end(url_remota)
+            return local
+        if url_remota not in self._baixando:
+            try:
+                asyncio.get_running_loop().create_task(self._espelhar(url_remota))
+                self._baixando.add(url_remota)
+            except RuntimeError:
+                pass  # fora do event loop: fica a remota
+        return url_remota
+
+    async def _espelhar(self, url_remota):
+        try:
+            async with http_pool.cliente(timeout=60, follow_redirects=True) as client:
+                resp = await client.get(url_remota)
+            if resp.status_code == 200 and len(resp.content) > 1000:
+                self._espelhos[url_remota] = await self.guardar(resp.content)
+                while len(self._espelhos) > MAX_ESPELHOS:
+                    self._espelhos.popitem(last=False)
+        except Exception as e:
+            print(f"[MIDIA] Espelho falhou ({url_remota[:60]}): {e}")
+        finally:
+            self._baixando.discard(url_remota)
+
+    # --- referencias (observador de ListaObservavel) ---
+    def inserido(self, item):
+        for u in urls_de(item):
+            if self.gerencia(u):
+                nome = self._nome(u)
+                self._refs[nome] = self._refs.get(nome, 0) + 1
+
+    def removido(self, item):
+        for u in urls_de(item):
+            if self.gerencia(u):
+                nome = self._nome(u)
+                n = self._refs.get(nome, 0) - 1
+                if n > 0:
+                    self._refs[nome] = n
+                else:
+                    self._refs.pop(nome, None)
+
+    def trocar(self, item, urls_antes):
+        """Item editado in-place: antes = urls_de(item) tirado antes da edicao"""
+        self.removido({"imagens": list(urls_antes)})
+        self.inserido(item)
+
+    def arquivo(self, url):
+        """Path do arquivo de uma URL do armazem (None se nao for/nao existir)"""
+        if not self.gerencia(url):
+            return None
+        p = self._caminho(self._nome(url))
+        return p if p.exists() else None
+
+    def referencias(self, url):
+        return self._refs.get(self._nome(url), 0) if self.gerencia(url) else 0
+
+    def apagar(self, url):
+        """Apaga agora um arquivo sem referencias; False se ainda em uso"""
+        if not self.gerencia(url) or self.referencias(url):
+            return False
+        try:
+            self._caminho(self._nome(url)).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def referenciar_em_disco(self, fonte):
+        """fonte(nomes) devolve o subconjunto de nomes de arquivo que itens
+        gravados fora da memoria ainda citam (busca indexada, nao varredura).
+        Roda na thread do GC, entao so pode ler com conexao propria."""
+        self._fontes.append(fonte)
+
+    def _nomes_em_disco(self, candidatos):
+        nomes = set()
+        for fonte in self._fontes:
+            if candidatos - nomes:
+                nomes |= set(fonte(candidatos - nomes))
+        return nomes
+
+    # --- GC ---
+    def _varrer(self):
+        arquivos = []
+        if self.raiz.exists():
+            for sub in self.raiz.iterdir():
+                if sub.is_dir():
+                    for p in sub.iterdir():
+                        if p.suffix != ".tmp":
+                            st = p.stat()
+                            arquivos.append((st.st_mtime, st.st_size, p))
+        return arquivos
+
+    def _coletar(self):
+        agora = time.time()
+        arquivos = self._varrer()
+        total = sum(tam for _, tam, _ in arquivos)
+        # So quem pode sair nesta passada vai as fontes (total so diminui no laco)
+        candidatos = {p.name for mtime, _, p in arquivos if p.name not in self._refs
+                      and (agora - mtime > ORFAO_S or (total > self.quota_bytes and agora - mtime > GRACA_S))}
+        em_disco = self._nomes_em_disco(candidatos)  # se uma fonte falhar, a passada inteira aborta
+        apagados, liberados = 0, 0
+        for mtime, tam, p in sorted(arquivos, key=lambda a: a[0]):  # mais antigo primeiro
+            if p.name in self._refs or p.name in em_disco:
+                continue
+            idade = agora - mtime
+            if idade > ORFAO_S or (total > self.quota_bytes and idade > GRACA_S):
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    continue
+                total -= tam
+                apagados += 1
+                liberados += tam
+        return len(arquivos) - apagados, total, apagados, liberados
+
+    async def coletar(self):
+        """Uma passada do GC; devolve o resumo"""
+        arquivos, total, apagados, liberados = await asyncio.to_thread(self._coletar)
+        self.gc_execucoes += 1
+        self.gc_apagados += apagados
+        self.gc_bytes += liberados
+        self.ultimo_gc = {"em": time.time(), "arquivos": arquivos, "bytes": total,
+                          "apagados": apagados, "liberados": liberados,
+                          "acima_da_quota": total > self.quota_bytes}
+        if apagados:
+            print(f"[MIDIA] GC: {apagados} arquivos sem referencia apagados ({liberados // 1024}KB)")
+        if total > self.quota_bytes:
+            print(f"[MIDIA] GC: {total // 1048576}MB em uso, acima da quota (so sobrou midia referenciada ou recente)")
+        return self.ultimo_gc
+
+    async def _ciclo_gc(self):
+        while True:
+            await asyncio.sleep(GC_INTERVALO_S)
+            try:
+                await self.coletar()
+            except Exception as e:
+                print(f"[MIDIA] GC erro: {e}")
+
+    def iniciar_gc(self):
+        """Chamar depois que as listas observadas foram carregadas"""
+        if self._task_gc is None or self._task_gc.done():
+            self._task_gc = asyncio.create_task(self._ciclo_gc())
+
+    def stats(self):
+        return {
+            "raiz": str(self.raiz),
+            "quota_bytes": self.quota_bytes,
+            "referenciados": len(self._refs),
+            "fontes_em_disco": len(self._fontes),
+            "espelhos": len(self._espelhos),
+            "gravados": self.gravados,
+            "deduplicados": self.deduplicados,
+            "bytes_gravados": self.bytes_gravados,
+            "bytes_poupados": self.bytes_poupados,
+            "gc_execucoes": self.gc_execucoes,
+            "gc_apagados": self.gc_apagados,
+            "gc_bytes": self.gc_bytes,
+            "ultimo_gc": self.ultimo_gc,
+        }
+
+
+class StaticImutavel(StaticFiles):
+    """StaticFiles para o armazem: o nome ja e o hash, entao ETag forte e
+    Cache-Control immutable de um ano (browser e CDN nunca revalidam)"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        resp = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        resp.headers["etag"] = f'"{Path(full_path).stem}"'
+        resp.headers["cache-control"] = "public, max-age=31536000, immutable"
+        if self.is_not_modified(resp.headers, Headers(scope=scope)):
+            return NotModifiedResponse(resp.headers)
+        return resp
+
+
+armazem_midia = ArmazemMidia()
@@ -0,0 +1,124 @@
+"""
+Cache de paginas versionado - bytes prontos por (versao, pagina, filtro)
+O feed publico e o mesmo para todo mundo enquanto nada muda, mas cada GET
+refatiava POSTS, reparticionava reels e reserializava o mesmo JSON. Aqui a
+pagina montada fica guardada ja codificada (corpo + ETag) e o request
+quente vira uma consulta ao dict.
+
+Validade por contador: invalidar() (ou inserido/removido, como observador
+de ListaObservavel) sobe a versao e toda pagina montada numa versao
+anterior fica velha. Stale-while-revalidate: pagina velha montada ha menos
+de swr_s ainda e servida e a remontagem sai logo depois no event loop, uma
+vez por chave - rajadas de mutacao (agentes curtindo em loop) nao obrigam a
+remontar a cada request. ttl_s limita a idade de qualquer pagina, para
+mutacoes que nao passam por invalidar().
+
+O corpo e exatamente o que montar() devolveu: com o cache ligado ou nao a
+resposta e byte a byte a mesma para o mesmo estado.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+MAX_PAGINAS = int(os.environ.get("CACHE_PAGINAS_MAX", "256"))
+SWR_S = float(os.environ.get("CACHE_PAGINAS_SWR_MS", "2000")) / 1000
+TTL_S = float(os.environ.get("CACHE_PAGINAS_TTL_S", "30"))
+
+
+def etag_de(corpo):
+    return f'"{hashlib.blake2b(corpo, digest_size=12).hexdigest()}"'
+
+
+class Pagina:
+    __slots__ = ("versao", "corpo", "etag", "montada")
+
+    def __init__(self, versao, corpo):
+        self.versao = versao
+        self.corpo = corpo
+        self.etag = etag_de(corpo)
+        self.montada = time.monotonic()
+
+
+class CachePaginas:
+    """chave -> Pagina (LRU); obter(chave, montar) com montar() -> bytes"""
+
+    def __init__(self, max_paginas=MAX_PAGINAS, swr_s=SWR_S, ttl_s=TTL_S):
+        self.max_paginas = max_paginas
+        self.swr_s = swr_s
+        self.ttl_s = ttl_s
+        self.versao = 0
+        self._paginas = OrderedDict()
+        self._remontando = set()
+        # Metricas
+        self.hits = 0
+        self.velhas = 0
+        self.misses = 0
+        self.remontagens = 0
+
+    def invalidar(self):
+        self.versao += 1
+
+    # --- observador de ListaObservavel ---
+    def inserido(self, item):
+        self.versao += 1
+
+    def removido(self, item):
+        self.versao += 1
+
+    def _montar(self, chave, montar):
+        pag = Pagina(self.versao, montar())
+        self._paginas[chave] = pag
+        self._paginas.move_to_end(chave)
+        while len(self._paginas) > self.max_paginas:
+            self._paginas.popitem(last=False)
+        return pag
+
+    def _remontar(self, chave, montar):
+        self._remontando.discard(chave)
+        pag = self._paginas.get(chave)
+        if pag is not None and pag.versao != self.versao:
+            self.remontagens += 1
+            self._montar(chave, montar)
+
+    def obter(self, chave, montar):
+        pag = self._paginas.get(chave)
+        if pag is not None:
+            idade = time.monotonic() - pag.montada
+            if idade < self.ttl_s:
+                if pag.versao == self.versao:
+                    self.hits += 1
+                    self._paginas.move_to_end(chave)
+                    return pag
+                if idade < self.swr_s:
+                    self.velhas += 1
+                    if chave not in self._remontando:
+                        try:
+                            asyncio.get_running_loop().call_soon(self._remontar, chave, montar)
+                            self._remontando.add(chave)
+                        except RuntimeError:
+                            return self._montar(chave, montar)  # fora do event loop: monta agora
+                    return pag
+        self.misses += 1
+        return self._montar(chave, montar)
+
+    def limpar(self):
+        self._paginas.clear()
+        self.versao += 1
+
+    def stats(self):
+        total = self.hits + self.velhas + self.misses
+        return {
+            "versao": self.versao,
+            "paginas": len(self._paginas),
+            "max_paginas": self.max_paginas,
+            "swr_s": self.swr_s,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "velhas": self.velhas,
+            "misses": self.misses,
+            "remontagens": self.remontagens,
+            "taxa_hit": round((self.hits + self.velhas) / total, 3) if total else 0.0,
+            "bytes": sum(len(p.corpo) for p in self._paginas.values()),
+        }
@@ -0,0 +1,341 @@
+"""
+Colecoes em memoria com capacidade - anel observavel + arquivo SQLite
+POSTS, STORIES, DMS e NOTIFICACOES (e os videos do YouTube/TikTok) eram
+list com insert(0) O(n) seguido de POSTS[:] = POSTS[:300], que copia a
+lista inteira e reindexava tudo a cada post novo. ListaObservavel e um
+drop-in de list apoiado num deque: insert(0)/append sao O(1) e, passada a
+capacidade, o item mais antigo sai sozinho (avisando os observadores).
+
+mais_novo_primeiro diz de que ponta sai o mais antigo: True para colecoes
+que crescem com insert(0) (POSTS, notificacoes), False para as que crescem
+com append (DMS, stories). Com arquivo=ArquivoSqlite(...) o que foi
+despejado pela capacidade vai para uma tabela SQLite e continua paginavel;
+remocoes explicitas (delete, clear, filtro) nao sao arquivadas.
+"""
+import base64
+import json
+import os
+import sqlite3
+from collections import deque
+from collections.abc import MutableSequence
+from itertools import islice
+
+from app.services.persistencia import persistencia
+
+ARQUIVO_DB = os.environ.get("ARQUIVO_DB", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "arquivo.db"))
+_ARQUIVOS = []
+
+
+class ListaObservavel(MutableSequence):
+    """Sequencia (deque) que avisa observadores a cada item que entra ou sai.
+
+    Observadores sao objetos com inserido(item) e removido(item), registrados
+    com observar(). Subclasses mantem indices sobrescrevendo _entrou/_saiu.
+    Fatias devolvem list, como em list.
+    """
+
+    def __init__(self, iterable=(), capacidade=None, mais_novo_primeiro=True, arquivo=None):
+        self._itens = deque(iterable)
+        self.capacidade = capacidade
+        self.mais_novo_primeiro = mais_novo_primeiro
+        self.arquivo = arquivo
+        self.observadores = []
+        self.despejados = 0
+        if capacidade is not None:
+            while len(self._itens) > capacidade:
+                self._itens.pop() if mais_novo_primeiro else self._itens.popleft()
+
+    def observar(self, obs):
+        self.observadores.append(obs)
+        for it in self._itens:
+            obs.inserido(it)
+
+    # --- ganchos ---
+    def _entrou(self, itens, onde):
+        """onde: 'inicio', 'fim' ou 'meio'"""
+        for it in itens:
+            for o in self.observadores:
+                o.inserido(it)
+
+    def _saiu(self, itens):
+        for it in itens:
+            for o in self.observadores:
+                o.removido(it)
+
+    def _reordenou(self):
+        pass
+
+    def _aparar(self):
+        if self.capacidade is None or len(self._itens) <= self.capacidade:
+            return
+        tirar = self._itens.pop if self.mais_novo_primeiro else self._itens.popleft
+        fora = [tirar() for _ in range(len(self._itens) - self.capacidade)]
+        self.despejados += len(fora)
+        self._saiu(fora)
+        if self.arquivo is not None:
+            self.arquivo.guardar(fora)
+
+    # --- leitura ---
+    def __len__(self):
+        return len(self._itens)
+
+    def __iter__(self):
+        return iter(self._itens)
+
+    def __reversed__(self):
+        return reversed(self._itens)
+
+    def __contains__(self, it):
+        return it in self._itens
+
+    def __getitem__(self, chave):
+        if isinstance(chave, slice):
+            inicio, fim, passo = chave.indices(len(self._itens))
+            if passo == 1:
+                return list(islice(self._itens, inicio, max(inicio, fim)))
+            return list(self._itens)[chave]
+        return self._itens[chave]
+
+    def index(self, it, *args):
+        return self._itens.index(it, *args)
+
+    def count(self, it):
+        return self._itens.count(it)
+
+    def copy(self):
+        return list(self._itens)
+
+    def __add__(self, outro):
+        return list(self._itens) + list(outro)
+
+    def __eq__(self, outro):
+        if isinstance(outro, (ListaObservavel, list)):
+            return list(self._itens) == list(outro)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self._itens)!r}, capacidade={self.capacidade})"
+
+    # --- escrita ---
+    def insert(self, i, it):
+        n = len(self._itens)
+        if i == 0 or i <= -n:
+            self._itens.appendleft(it)
+            onde = "inicio"
+        elif i >= n:
+            self._itens.append(it)
+            onde = "fim"
+        else:
+            self._itens.insert(i, it)
+            onde = "meio"
+        self._entrou([it], onde)
+        self._aparar()
+
+    def append(self, it):
+        self._itens.append(it)
+        self._entrou([it], "fim")
+        self._aparar()
+
+    def extend(self, itens):
+        itens = list(itens)
+        self._itens.extend(itens)
+        self._entrou(itens, "fim")
+        self._aparar()
+
+    def __iadd__(self, itens):
+        self.extend(itens)
+        return self
+
+    def pop(self, i=-1):
+        if i == -1 or i == len(self._itens) - 1:
+            it = self._itens.pop()
+        elif i == 0:
+            it = self._itens.popleft()
+        else:
+            it = self._itens[i]
+            del self._itens[i]
+        self._saiu([it])
+        return it
+
+    def remove(self, it):
+        self._itens.remove(it)
+        self._saiu([it])
+
+    def clear(self):
+        antigos = list(self._itens)
+        self._itens.clear()
+        self._saiu(antigos)
+
+    def __setitem__(self, chave, valor):
+        if isinstance(chave, slice):
+            lista = list(self._itens)
+            antigos = lista[chave]
+            valor = list(valor)
+            lista[chave] = valor
+            self._itens = deque(lista)
+            novos_ids = {id(it) for it in valor}
+            velhos_ids = {id(it) for it in antigos}
+            self._saiu([it for it in antigos if id(it) not in novos_ids])
+            self._entrou([it for it in valor if id(it) not in velhos_ids], "meio")
+        else:
+            antigo = self._itens[chave]
+            self._itens[chave] = valor
+            self._saiu([antigo])
+            self._entrou([valor], "meio")
+        self._reordenou()
+        self._aparar()
+
+    def __delitem__(self, chave):
+        if isinstance(chave, slice):
+            lista = list(self._itens)
+            antigos = lista[chave]
+            del lista[chave]
+            self._itens = deque(lista)
+        else:
+            antigos = [self._itens[chave]]
+            del self._itens[chave]
+        self._saiu(antigos)
+
+    def sort(self, *args, **kwargs):
+        lista = sorted(self._itens, *args, **kwargs)
+        self._itens = deque(lista)
+        self._reordenou()
+
+    def reverse(self):
+        self._itens.reverse()
+        self._reordenou()
+
+
+class ArquivoSqlite:
+    """Tabela (id, criado, dados JSON) para itens despejados de uma colecao.
+
+    guardar() e sincrono e so enfileira; a escrita sai pelo agendador de
+    persistencia (um executemany por flush). pagina() le do mais novo para
+    o mais antigo com cursor (criado, id), somando o que ainda esta na fila.
+    """
+
+    def __init__(self, tabela, campo_data="created_at", caminho=ARQUIVO_DB):
+        self.tabela = tabela
+        self.destino = f"arquivo_{tabela}"  # nome no agendador de persistencia
+        self.campo_data = campo_data
+        self.caminho = caminho
+        self._pendentes = []
+        self._db = None
+        self.arquivados = 0
+        persistencia.registrar(self.destino, self._gravar, intervalo_ms=10000, max_mutacoes=100)
+        _ARQUIVOS.append(self)
+
+    async def _conn(self):
+        if self._db is None:
+            import aiosqlite
+            self._db = await aiosqlite.connect(self.caminho)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.execute(f"""CREATE TABLE IF NOT EXISTS {self.tabela} (
+                id TEXT PRIMARY KEY, criado TEXT NOT NULL, dados TEXT NOT NULL)""")
+            await self._db.execute(f"DROP INDEX IF EXISTS idx_{self.tabela}_criado")
+            await self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.tabela}_criado_id ON {self.tabela}(criado, id)")
+            await self._db.commit()
+        return self._db
+
+    def guardar(self, itens):
+        for it in itens:
+            if it.get("id") is None:
+                continue
+            if not persistencia.bloqueado(self.destino):  # so leitura: nem enfileira
+                self._pendentes.append(it)
+            persistencia.marcar(self.destino)
+
+    async def _gravar(self):
+        itens, self._pendentes = self._pendentes, []
+        if not itens:
+            return
+        try:
+            linhas = [(str(it["id"]), str(it.get(self.campo_data) or ""), json.dumps(it, ensure_ascii=False, default=str))
+                      for it in itens]
+            db = await self._conn()
+            await db.executemany(f"INSERT OR REPLACE INTO {self.tabela} (id, criado, dados) VALUES (?,?,?)", linhas)
+            await db.commit()
+        except BaseException:
+            self._pendentes[:0] = itens  # volta para a fila; persistencia tenta de novo
+            raise
+        self.arquivados += len(linhas)
+
+    def _chave(self, it):
+        return str(it.get(self.campo_data) or ""), str(it["id"])
+
+    async def pagina(self, antes=None, limite=20):
+        """(itens, proximo_cursor) mais novos primeiro; antes = proximo_cursor anterior.
+
+        O cursor codifica (criado, id) do ultimo item visto: itens com a mesma
+        data nao se repetem nem somem entre paginas. Itens despejados que ainda
+        nao foram gravados entram na pagina (a versao da fila vence a do banco).
+        ValueError se o cursor nao for valido.
+        """
+        chave = _decodificar_cursor(antes) if antes else None
+        fila = {}
+        for it in self._pendentes:
+            if chave is None or self._chave(it) < chave:
+                fila[str(it["id"])] = it
+        db = await self._conn()
+        if chave:
+            sql = (f"SELECT dados, criado, id FROM {self.tabela} WHERE criado < ? OR (criado = ? AND id < ?) "
+                   "ORDER BY criado DESC, id DESC LIMIT ?")
+            args = (chave[0], chave[0], chave[1], limite + 1 + len(self._pendentes))
+        else:
+            sql = f"SELECT dados, criado, id FROM {self.tabela} ORDER BY criado DESC, id DESC LIMIT ?"
+            args = (limite + 1 + len(self._pendentes),)
+        async with db.execute(sql, args) as cur:
+            linhas = await cur.fetchall()
+        # id na fila com outra chave (ja saiu da faixa) nao volta pelo banco
+        na_fila = {str(it["id"]) for it in self._pendentes}
+        itens = [((criado, i), json.loads(d)) for d, criado, i in linhas if i not in na_fila]
+        itens += [(self._chave(it), it) for it in fila.values()]
+        itens.sort(key=lambda par: par[0], reverse=True)
+        proximo = _codificar_cursor(itens[limite - 1][0]) if len(itens) > limite else None
+        return [it for _, it in itens[:limite]], proximo
+
+    def itens_sync(self, contendo=None):
+        """Itens arquivados (e os ainda na fila), opcionalmente so os cujo JSON
+        contem `contendo`. Sincrono e com conexao propria: para threads."""
+        itens = list(self._pendentes)
+        if os.path.exists(self.caminho):
+            con = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, timeout=5)
+            try:
+                sql, args = f"SELECT dados FROM {self.tabela}", ()
+                if contendo:
+                    sql, args = sql + " WHERE instr(dados, ?) > 0", (contendo,)
+                itens.extend(json.loads(d) for d, in con.execute(sql, args))
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e):
+                    raise
+            finally:
+                con.close()
+        return itens
+
+    async def fechar(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def stats(self):
+        return {"tabela": self.tabela, "arquivados": self.arquivados, "pendentes": len(self._pendentes)}
+
+
+def _codificar_cursor(chave):
+    """(criado, id) -> string opaca para next_cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(chave)).encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor):
+    try:
+        criado, i = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(criado), str(i)
+    except Exception:
+        raise ValueError("cursor invalido") from None
+
+
+async def fechar_arquivos():
+    """Shutdown: chamar depois do flush final da persistencia"""
+    for a in _ARQUIVOS:
+        await a.fechar()
@@ -0,0 +1,249 @@
+"""
+Pool HTTP compartilhado - um httpx.AsyncClient por host, vivo o app inteiro
+Substitui o `async with httpx.AsyncClient(...)` por chamada, que pagava
+handshake TCP/TLS toda vez. Limites por host, HTTP/2 quando o pacote h2
+estiver instalado, abertura/fechamento no lifespan e estatisticas do pool.
+
+Uso nos routers (mesma forma de antes, o `async with` nao fecha nada):
+
+    async with http_pool.cliente(timeout=15.0) as client:
+        r = await client.get(url)
+
+Rodar `python -m app.services.http_pool` compara com um servidor local.
+"""
+import asyncio
+import importlib.util
+import os
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+HTTP2 = importlib.util.find_spec("h2") is not None and os.environ.get("HTTP_POOL_HTTP2", "1") != "0"
+MAX_CONEXOES = int(os.environ.get("HTTP_POOL_MAX_CONEXOES", "10"))
+MAX_KEEPALIVE = int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE", "10"))
+KEEPALIVE_S = float(os.environ.get("HTTP_POOL_KEEPALIVE_S", "60"))
+
+# Limite de conexoes simultaneas por host (o resto usa MAX_CONEXOES).
+# Ollama local e provedores de imagem gratis nao aguentam muita concorrencia.
+LIMITES_HOST = {
+    "localhost:11434": 4,
+    "127.0.0.1:11434": 4,
+    "api.groq.com": 20,
+    "generativelanguage.googleapis.com": 10,
+    "image.pollinations.ai": 6,
+}
+for _par in filter(None, os.environ.get("HTTP_POOL_LIMITES", "").split(",")):
+    # HTTP_POOL_LIMITES="api.groq.com=30,localhost:11434=2"
+    _host, _, _n = _par.partition("=")
+    if _n.isdigit():
+        LIMITES_HOST[_host.strip()] = int(_n)
+
+
+def _host(url):
+    partes = urlsplit(str(url))
+    return partes.netloc.lower() or "_"
+
+
+class _Transporte(httpx.AsyncHTTPTransport):
+    """Transporte que conta requisicoes e conexoes novas (para medir reuso)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requisicoes = 0
+        self.conexoes_novas = 0
+        self.em_voo = 0
+        self.erros = 0
+        self.max_conexoes = None
+        self._vistas = set()
+
+    async def handle_async_request(self, request):
+        self.requisicoes += 1
+        self.em_voo += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.erros += 1
+            raise
+        finally:
+            self.em_voo -= 1
+            atuais = {id(c) for c in self._pool.connections}
+            self.conexoes_novas += len(atuais - self._vistas)
+            self._vistas = atuais
+
+    def stats(self):
+        conns = list(self._pool.connections)
+        ociosas = sum(1 for c in conns if c.is_idle())
+        ok = self.requisicoes - self.erros
+        return {
+            "requisicoes": self.requisicoes,
+            "conexoes_novas": self.conexoes_novas,
+            "reuso": round(max(0.0, 1 - self.conexoes_novas / ok), 3) if ok > 0 else 0,
+            "em_voo": self.em_voo,
+            "erros": self.erros,
+            "conexoes_abertas": len(conns),
+            "conexoes_ociosas": ociosas,
+            "conexoes_ativas": len(conns) - ociosas,
+        }
+
+
+class _ClienteCompartilhado:
+    """Fachada com get/post/... que escolhe o cliente do host de cada URL.
+
+    timeout e follow_redirects vao por requisicao, entao cada call site
+    mantem os mesmos valores de antes sem abrir um cliente proprio.
+    """
+
+    def __init__(self, registro, timeout, follow_redirects):
+        self._registro = registro
+        self._timeout = timeout
+        self._follow = follow_redirects
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self._timeout)
+        kwargs.setdefault("follow_redirects", self._follow)
+        return await self._registro.para(url).request(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request("DELETE", url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        return await self.request("HEAD", url, **kwargs)
+
+
+class RegistroHttp:
+    """Clientes httpx por host, criados sob demanda e fechados no shutdown"""
+
+    def __init__(self):
+        self._clientes = {}   # host -> httpx.AsyncClient
+        self._transportes = {}
+        self._loop = None
+        self.iniciado_em = None
+
+    def _limites(self, host):
+        n = LIMITES_HOST.get(host, LIMITES_HOST.get(host.split(":")[0], MAX_CONEXOES))
+        return httpx.Limits(max_connections=n, max_keepalive_connections=min(n, MAX_KEEPALIVE),
+                            keepalive_expiry=KEEPALIVE_S)
+
+    def para(self, url):
+        """httpx.AsyncClient compartilhado do host da URL"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Outro event loop (scripts com asyncio.run): conexoes antigas nao servem
+            self._clientes, self._transportes, self._loop = {}, {}, loop
+        host = _host(url)
+        cli = self._clientes.get(host)
+        if cli is None:
+            limites = self._limites(host)
+            tr = _Transporte(http2=HTTP2, limits=limites, retries=1)
+            tr.max_conexoes = limites.max_connections
+            cli = httpx.AsyncClient(transport=tr, limits=limites, http2=HTTP2)
+            self._clientes[host], self._transportes[host] = cli, tr
+        return cli
+
+    def cliente(self, timeout=30.0, follow_redirects=False):
+        return _ClienteCompartilhado(self, timeout, follow_redirects)
+
+    async def iniciar(self):
+        self._loop = asyncio.get_running_loop()
+        self.iniciado_em = time.time()
+        print(f"[HTTP-POOL] Iniciado (http2={'on' if HTTP2 else 'off'}, max/host={MAX_CONEXOES})")
+
+    async def encerrar(self):
+        clientes = list(self._clientes.values())
+        self._clientes, self._transportes = {}, {}
+        for cli in clientes:
+            try:
+                await cli.aclose()
+            except Exception as e:
+                print(f"[HTTP-POOL] Erro ao fechar cliente: {e}")
+        if clientes:
+            print(f"[HTTP-POOL] {len(clientes)} clientes fechados")
+
+    def stats(self):
+        hosts = {}
+        for host, tr in self._transportes.items():
+            lim = tr.max_conexoes
+            s = tr.stats()
+            s["max_conexoes"] = lim
+            s["utilizacao"] = round(s["conexoes_ativas"] / lim, 2) if lim else 0
+            hosts[host] = s
+        return {
+            "http2": HTTP2,
+            "iniciado_em": self.iniciado_em,
+            "requisicoes": sum(h["requisicoes"] for h in hosts.values()),
+            "conexoes_novas": sum(h["conexoes_novas"] for h in hosts.values()),
+            "hosts": hosts,
+        }
+
+
+http_pool = RegistroHttp()
+
+
+async def _benchmark(n=200, concorrencia=10):
+    """Servidor HTTP/1.1 keep-alive local; conta conexoes TCP aceitas"""
+    aceitas = 0
+
+    async def atender(reader, writer):
+        nonlocal aceitas
+        aceitas += 1
+        try:
+            while True:
+                cab = await reader.readuntil(b"\r\n\r\n")
+                tam = 0
+                for linha in cab.split(b"\r\n"):
+                    if linha.lower().startswith(b"content-length:"):
+                        tam = int(linha.split(b":")[1])
+                if tam:
+                    await reader.readexactly(tam)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Type: text/plain\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    srv = await asyncio.start_server(atender, "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{srv.sockets[0].getsockname()[1]}/api/generate"
+    sem = asyncio.Semaphore(concorrencia)
+
+    async def por_chamada():
+        async with sem:
+            async with httpx.AsyncClient(timeout=10) as client:
+                await client.post(url, json={"x": 1})
+
+    async def compartilhado():
+        async with sem:
+            async with http_pool.cliente(timeout=10) as client:
+                await client.post(url, json={"x": 1})
+
+    print(f"{'modo':>14} | {'reqs':>5} | {'tempo (ms)':>10} | {'conexoes TCP':>12}")
+    for nome, fn in (("cliente/chamada", por_chamada), ("pool", compartilhado)):
+        aceitas = 0
+        t = time.perf_counter()
+        await asyncio.gather(*(fn() for _ in range(n)))
+        ms = (time.perf_counter() - t) * 1e3
+        print(f"{nome:>14} | {n:>5} | {ms:>10.1f} | {aceitas:>12}")
+    print(http_pool.stats()["hosts"])
+    await http_pool.encerrar()
+    srv.close()
+    await srv.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(_benchmark())
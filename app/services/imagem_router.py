@@ -0,0 +1,261 @@
+"""
+Roteador adaptativo de provedores de imagem
+Substitui a cascata fixa DeepInfra -> Gemini -> OpenRouter -> Stable Horde ->
+... onde cada degrau podia levar 60-120s para falhar. Cada provedor vira um
+adaptador com historico das ultimas tentativas (taxa de sucesso, p50/p95,
+custo); a ordem e recalculada a cada pedido e quem falha seguido fica
+bloqueado por um tempo (backoff). Com orcamento de latencia os dois melhores
+correm em paralelo e o perdedor e cancelado.
+
+O estado de saude sobrevive a restarts (IMG_ROUTER_ESTADO, JSON).
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from app.services.persistencia import gravar_json_atomico, persistencia
+
+ESTADO_PATH = os.environ.get("IMG_ROUTER_ESTADO", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "imagem_router.json"))
+JANELA = int(os.environ.get("IMG_ROUTER_JANELA", "40"))            # tentativas lembradas por provedor
+MIN_AMOSTRAS = 3                                                    # antes disso vale a latencia inicial
+FALHAS = int(os.environ.get("IMG_ROUTER_FALHAS", "3"))              # falhas seguidas para bloquear
+ESPERA_S = float(os.environ.get("IMG_ROUTER_ESPERA_S", "60"))
+ESPERA_MAX_S = float(os.environ.get("IMG_ROUTER_ESPERA_MAX_S", "1800"))
+CUSTO_PESO = float(os.environ.get("IMG_ROUTER_CUSTO_PESO", "300"))  # segundos equivalentes a US$ 1
+ORCAMENTO_S = float(os.environ.get("IMG_ORCAMENTO_S", "0"))         # 0 = sem corrida
+
+
+class AdaptadorImagem:
+    """Um provedor: fn(prompt, agente_id, seed_id) -> url | (url, rotulo) | None"""
+
+    def __init__(self, nome, rotulo, fn, latencia_inicial_s, custo=0.0, timeout_s=120.0,
+                 nivel=0, habilitado=None):
+        self.nome = nome
+        self.rotulo = rotulo
+        self.fn = fn
+        self.latencia_inicial_s = latencia_inicial_s
+        self.custo_img = custo
+        self.timeout_s = timeout_s
+        self.nivel = nivel  # 0 = IA; 1 = fallback (so depois de todos do nivel 0)
+        self._habilitado = habilitado
+        self.janela = deque(maxlen=JANELA)  # (ok, ms, ts)
+        self.falhas_seguidas = 0
+        self.bloqueado_ate = 0.0
+        self.sucessos = 0
+        self.falhas = 0
+        self.cancelados = 0
+        self.em_voo = 0
+
+    def habilitado(self):
+        return self._habilitado is None or bool(self._habilitado())
+
+    def permite(self):
+        return time.time() >= self.bloqueado_ate
+
+    def taxa_sucesso(self):
+        ok = sum(1 for t in self.janela if t[0])
+        return (ok + 1) / (len(self.janela) + 2)
+
+    def _percentil(self, q):
+        tempos = sorted(t[1] for t in self.janela if t[0])
+        if len(tempos) < MIN_AMOSTRAS:
+            return self.latencia_inicial_s * 1000
+        return tempos[min(len(tempos) - 1, int(q * len(tempos)))]
+
+    def p50_ms(self):
+        return self._percentil(0.5)
+
+    def p95_ms(self):
+        return self._percentil(0.95)
+
+    def pontuacao(self):
+        """Segundos esperados ate uma imagem: p50 / taxa de sucesso + custo"""
+        return (self.p50_ms() / 1000 + CUSTO_PESO * self.custo_img) / self.taxa_sucesso()
+
+    def _registrar(self, ok, ms):
+        self.janela.append((ok, round(ms, 1), time.time()))
+        if ok:
+            self.sucessos += 1
+            self.falhas_seguidas = 0
+            self.bloqueado_ate = 0.0
+            return
+        self.falhas += 1
+        self.falhas_seguidas += 1
+        if self.falhas_seguidas >= FALHAS:
+            espera = min(ESPERA_MAX_S, ESPERA_S * 2 ** (self.falhas_seguidas - FALHAS))
+            self.bloqueado_ate = time.time() + espera
+            print(f"[IMG-ROUTER] {self.nome} bloqueado por {espera:.0f}s ({self.falhas_seguidas} falhas seguidas)")
+
+    async def executar(self, prompt, agente_id, seed_id, timeout=None):
+        """(url, rotulo) ou (None, None); cancelamento nao conta como falha"""
+        limite = self.timeout_s if timeout is None else min(self.timeout_s, timeout)
+        self.em_voo += 1
+        inicio = time.monotonic()
+        try:
+            res = await asyncio.wait_for(self.fn(prompt, agente_id, seed_id), limite)
+        except asyncio.CancelledError:
+            self.cancelados += 1
+            raise
+        except asyncio.TimeoutError:
+            print(f"[IMG-ROUTER] {self.nome} timeout ({limite:.0f}s)")
+            res = None
+        except Exception as e:
+            print(f"[IMG-ROUTER] {self.nome} erro: {e}")
+            res = None
+        finally:
+            self.em_voo -= 1
+        url, rotulo = res if isinstance(res, tuple) else (res, self.rotulo)
+        self._registrar(bool(url), (time.monotonic() - inicio) * 1000)
+        persistencia.marcar("imagem_router")
+        return (url, rotulo or self.rotulo) if url else (None, None)
+
+    def exportar(self):
+        return {"janela": list(self.janela), "falhas_seguidas": self.falhas_seguidas,
+                "bloqueado_ate": self.bloqueado_ate, "sucessos": self.sucessos, "falhas": self.falhas}
+
+    def importar(self, d):
+        self.janela.extend(tuple(t) for t in d.get("janela", [])[-JANELA:])
+        self.falhas_seguidas = d.get("falhas_seguidas", 0)
+        self.bloqueado_ate = d.get("bloqueado_ate", 0.0)
+        self.sucessos = d.get("sucessos", 0)
+        self.falhas = d.get("falhas", 0)
+
+    def stats(self):
+        restante = self.bloqueado_ate - time.time()
+        return {
+            "rotulo": self.rotulo,
+            "nivel": self.nivel,
+            "habilitado": self.habilitado(),
+            "bloqueado_s": round(restante, 1) if restante > 0 else 0,
+            "taxa_sucesso": round(self.taxa_sucesso(), 3),
+            "p50_ms": round(self.p50_ms(), 1),
+            "p95_ms": round(self.p95_ms(), 1),
+            "custo_img": self.custo_img,
+            "pontuacao": round(self.pontuacao(), 2),
+            "amostras": len(self.janela),
+            "falhas_seguidas": self.falhas_seguidas,
+            "sucessos": self.sucessos,
+            "falhas": self.falhas,
+            "cancelados": self.cancelados,
+            "em_voo": self.em_voo,
+        }
+
+
+class RoteadorImagem:
+    def __init__(self, estado_path=ESTADO_PATH):
+        self.estado_path = estado_path
+        self.adaptadores = {}
+        self._estado = None  # carregado na primeira vez que um adaptador entra
+        self.pedidos = 0
+        self.vazios = 0
+        self.corridas = 0
+        self.estouros = 0
+        persistencia.registrar("imagem_router", self._salvar_async, intervalo_ms=30000, max_mutacoes=50)
+
+    def _carregar(self):
+        if self._estado is None:
+            self._estado = {}
+            try:
+                with open(self.estado_path) as f:
+                    self._estado = json.load(f)
+                print(f"[IMG-ROUTER] Saude de {len(self._estado)} provedores carregada")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[IMG-ROUTER] Erro ao carregar {self.estado_path}: {e}")
+        return self._estado
+
+    def registrar(self, nome, rotulo, fn, latencia_inicial_s, **kwargs):
+        a = AdaptadorImagem(nome, rotulo, fn, latencia_inicial_s, **kwargs)
+        if nome in self._carregar():
+            a.importar(self._estado[nome])
+        self.adaptadores[nome] = a
+        return a
+
+    async def _salvar_async(self):
+        dados = {n: a.exportar() for n, a in self.adaptadores.items()}
+        await asyncio.to_thread(gravar_json_atomico, self.estado_path, dados)
+
+    def candidatos(self):
+        """Ordem do pedido: por nivel, depois pela pontuacao aprendida.
+
+        Bloqueados ficam de fora; se todos de um nivel estiverem bloqueados
+        o que desbloqueia primeiro ainda e tentado (melhor que nada).
+        """
+        niveis = {}
+        for a in self.adaptadores.values():
+            if a.habilitado():
+                niveis.setdefault(a.nivel, []).append(a)
+        filas = []
+        for nivel in sorted(niveis):
+            todos = niveis[nivel]
+            livres = sorted((a for a in todos if a.permite()), key=AdaptadorImagem.pontuacao)
+            filas.append(livres or [min(todos, key=lambda a: a.bloqueado_ate)])
+        return filas
+
+    async def gerar(self, prompt, agente_id, seed_id, orcamento_s=None):
+        """(url, rotulo) do primeiro provedor que entregar, ou (None, None).
+
+        orcamento_s: prazo do nivel de IA; com ele os dois melhores correm
+        juntos e, estourado o prazo, cai direto para o fallback.
+        """
+        self.pedidos += 1
+        orcamento_s = ORCAMENTO_S if orcamento_s is None else orcamento_s
+        for fila in self.candidatos():
+            url, rotulo = await self._correr(fila, prompt, agente_id, seed_id, orcamento_s)
+            if url:
+                return url, rotulo
+        self.vazios += 1
+        return None, None
+
+    async def _correr(self, fila, prompt, agente_id, seed_id, orcamento_s):
+        paralelo = 2 if orcamento_s else 1
+        prazo = time.monotonic() + orcamento_s if orcamento_s else None
+        pendentes = {}
+        if paralelo > 1 and len(fila) > 1:
+            self.corridas += 1
+
+        def lancar():
+            a = fila.pop(0)
+            restante = None if prazo is None else max(0.1, prazo - time.monotonic())
+            t = asyncio.ensure_future(a.executar(prompt, agente_id, seed_id, restante))
+            pendentes[t] = a
+
+        try:
+            while fila or pendentes:
+                while fila and len(pendentes) < paralelo:
+                    lancar()
+                espera = None if prazo is None else prazo - time.monotonic()
+                if espera is not None and espera <= 0:
+                    self.estouros += 1
+                    print(f"[IMG-ROUTER] Orcamento de {orcamento_s:g}s estourado")
+                    return None, None
+                feitos, _ = await asyncio.wait(pendentes, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+                for t in feitos:
+                    a = pendentes.pop(t)
+                    url, rotulo = t.result()
+                    if url:
+                        print(f"[IG-Img] {a.rotulo} OK: {url[:80]}")
+                        return url, rotulo
+            return None, None
+        finally:
+            for t in pendentes:
+                t.cancel()  # perdedor da corrida (ou estouro do orcamento)
+
+    def stats(self):
+        ordem = [a.nome for fila in self.candidatos() for a in fila]
+        return {
+            "pedidos": self.pedidos,
+            "vazios": self.vazios,
+            "corridas": self.corridas,
+            "estouros": self.estouros,
+            "orcamento_s": ORCAMENTO_S,
+            "ordem": ordem,
+            "provedores": {n: a.stats() for n, a in self.adaptadores.items()},
+        }
+
+
+roteador_imagem = RoteadorImagem()
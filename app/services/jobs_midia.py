@@ -0,0 +1,395 @@
+"""
+Jobs de midia - geracao lenta (Spaces Gradio do HuggingFace) fora do caminho
+Os geradores de video rodavam client.predict/time.sleep por ate 25 min no
+executor padrao, disparados com create_task solto: alguns videos em voo
+ocupavam todas as threads e travavam qualquer outro to_thread do processo.
+
+Cada geracao vira um JobMidia com registro persistido (MIDIA_JOBS_ESTADO):
+    fila.registrar_tipo("yt_hf_video", handler, vagas=1, timeout_s=1500)
+    job = fila.enviar("yt_hf_video", {"prompt": ..., "video_id": ...})
+    url = await fila.executar("ig_hf_imagem", {...})  # envia e espera
+O handler recebe o job e so bloqueia dentro de job.bloqueante() (pool de
+threads proprio e limitado); esperas sao job.esperar(), no event loop, entao
+polling nao ocupa thread e cancelamento/timeout valem na hora. Cada tipo tem
+suas vagas: video lento nao segura a fila de imagens. Jobs interrompidos por
+restart voltam para a fila em retomar() - so os de tipos com ao_terminar: os
+de executar() tinham alguem esperando que nao existe mais, entao nem vao
+para o registro.
+
+Com a simulacao em varios processos (app/services/simulacao.py) so o dono
+do grupo "midia_jobs" grava o registro e retoma jobs; nos outros o registro
+e so leitura (a API em modo api o espelha para /api/system/midia-jobs) e o
+que for enviado ali roda sem registro.
+"""
+import asyncio
+import functools
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.persistencia import gravar_texto_atomico, persistencia
+from app.services.simulacao import simulacao, mtime
+
+ESTADO_PATH = os.environ.get("MIDIA_JOBS_ESTADO", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "midia_jobs.json"))
+THREADS = int(os.environ.get("MIDIA_JOBS_THREADS", "4"))        # chamadas bloqueantes simultaneas
+TIMEOUT_S = float(os.environ.get("MIDIA_JOBS_TIMEOUT_S", "1500"))
+MAX_HISTORICO = int(os.environ.get("MIDIA_JOBS_HISTORICO", "200"))  # jobs terminados lembrados
+BACKOFF_S = float(os.environ.get("MIDIA_JOBS_BACKOFF_S", "30"))  # espera antes da tentativa n+1 = n * BACKOFF_S (max 300)
+
+GRUPO = "midia_jobs"
+ATIVOS = ("na_fila", "rodando")  # finais: ok, erro, timeout, cancelado; "interrompido" = restart
+
+
+class JobMidia:
+    def __init__(self, tipo, params, ref=None, timeout_s=TIMEOUT_S, id=None):
+        self.id = id or f"job_{uuid.uuid4().hex[:12]}"
+        self.tipo = tipo
+        self.params = params
+        self.ref = ref  # id do video/post que espera o resultado
+        self.timeout_s = timeout_s
+        self.estado = "na_fila"
+        self.progresso = ""
+        self.resultado = None
+        self.erro = None
+        self.tentativas = 0
+        self.criado = time.time()
+        self.iniciado = None
+        self.terminado = None
+        self._fila = None
+        self._task = None
+
+    def avisar(self, progresso):
+        """Texto de progresso visivel no endpoint de jobs"""
+        self.progresso = progresso
+        self._fila._marcar()
+
+    async def bloqueante(self, fn, *args, **kwargs):
+        """Roda uma chamada bloqueante no pool dos jobs (nunca no executor padrao)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._fila._executor(), functools.partial(fn, *args, **kwargs))
+
+    async def esperar(self, segundos):
+        await asyncio.sleep(segundos)
+
+    def exportar(self):
+        return {"id": self.id, "tipo": self.tipo, "params": self.params, "ref": self.ref,
+                "timeout_s": self.timeout_s, "estado": self.estado, "progresso": self.progresso,
+                "resultado": self.resultado, "erro": self.erro, "tentativas": self.tentativas,
+                "criado": self.criado, "iniciado": self.iniciado, "terminado": self.terminado}
+
+    @classmethod
+    def importar(cls, d):
+        job = cls(d["tipo"], d.get("params") or {}, d.get("ref"), d.get("timeout_s", TIMEOUT_S), d["id"])
+        for k in ("estado", "progresso", "resultado", "erro", "tentativas", "criado", "iniciado", "terminado"):
+            if k in d:
+                setattr(job, k, d[k])
+        return job
+
+
+class _Tipo:
+    def __init__(self, handler, vagas, timeout_s, tentativas, ao_terminar):
+        self.handler = handler
+        self.ao_terminar = ao_terminar
+        self.retomavel = ao_terminar is not None  # sem ao_terminar o resultado so serve a quem chamou
+        self.vagas = vagas
+        self.timeout_s = timeout_s
+        self.tentativas = tentativas
+        self._sem = None
+        self.rodando = 0
+
+    def sem(self):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.vagas)
+        return self._sem
+
+
+class FilaJobsMidia:
+    def __init__(self, estado_path=ESTADO_PATH, threads=THREADS):
+        self.estado_path = estado_path
+        self.threads = threads
+        self.tipos = {}
+        self.jobs = OrderedDict()  # id -> JobMidia, mais antigo primeiro
+        self._pool = None
+        self._retomado = False
+        self.dono = True  # grava o registro e retoma jobs (False: so le)
+        # Metricas
+        self.enviados = 0
+        self.concluidos = 0
+        self.falhas = 0
+        self.timeouts = 0
+        self.cancelados = 0
+        persistencia.registrar("midia_jobs", self._salvar_async, intervalo_ms=5000, max_mutacoes=50)
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="midia-job")
+        return self._pool
+
+    def _marcar(self):
+        try:
+            persistencia.marcar("midia_jobs")
+        except Exception as e:
+            print(f"[MIDIA-JOBS] Erro ao agendar gravacao: {e}")
+
+    async def _salvar_async(self):
+        # params/resultado sao os dicts vivos dos jobs: serializa no loop
+        dados = [j.exportar() for j in self.jobs.values() if self._persistivel(j)]
+        await asyncio.to_thread(gravar_texto_atomico, self.estado_path, json.dumps(dados, ensure_ascii=False))
+
+    def _persistivel(self, job):
+        t = self.tipos.get(job.tipo)
+        return t is None or t.retomavel
+
+    def registrar_tipo(self, tipo, handler, vagas=1, timeout_s=TIMEOUT_S, tentativas=1, ao_terminar=None):
+        """handler(job) -> resultado (coroutine); tentativas = execucoes no maximo;
+        ao_terminar(job) roda no event loop quando o job chega a um estado final.
+        So tipos com ao_terminar vao para o registro e sao retomados apos restart."""
+        self.tipos[tipo] = _Tipo(handler, vagas, timeout_s, tentativas, ao_terminar)
+
+    # --- envio ---
+    def enviar(self, tipo, params, ref=None, timeout_s=None):
+        t = self.tipos[tipo]
+        job = JobMidia(tipo, params, ref, t.timeout_s if timeout_s is None else timeout_s)
+        self.enviados += 1
+        self._agendar(job)
+        print(f"[MIDIA-JOBS] {job.id} ({tipo}) na fila{f' para {ref}' if ref else ''}")
+        return job
+
+    def _agendar(self, job):
+        job._fila = self
+        self.jobs[job.id] = job
+        self.jobs.move_to_end(job.id)
+        job._task = asyncio.get_running_loop().create_task(self._rodar(job))
+        self._aparar()
+        self._marcar()
+
+    async def executar(self, tipo, params, ref=None, timeout_s=None):
+        """Envia e espera: resultado do handler ou None (erro/timeout/cancelado).
+        Cancelar quem espera cancela o job."""
+        job = self.enviar(tipo, params, ref, timeout_s)
+        try:
+            await asyncio.wait([job._task])  # nao propaga o cancelamento do proprio job
+        except asyncio.CancelledError:
+            self.cancelar(job.id)
+            raise
+        return job.resultado
+
+    async def _rodar(self, job):
+        t = self.tipos[job.tipo]
+        while True:
+            async with t.sem():
+                if job.estado != "na_fila":
+                    return  # cancelado enquanto esperava vaga
+                if await self._tentar(t, job):
+                    break
+            # Backoff fora da vaga: quem esta na fila do tipo roda enquanto isso
+            espera = min(300, BACKOFF_S * job.tentativas)
+            print(f"[MIDIA-JOBS] {job.id} {job.estado} ({job.erro}); tentativa {job.tentativas + 1} em {espera:.0f}s")
+            job.estado, job.progresso = "na_fila", f"nova tentativa em {espera:.0f}s"
+            self._marcar()
+            await asyncio.sleep(espera)
+        if job.estado != "ok":
+            print(f"[MIDIA-JOBS] {job.id} ({job.tipo}) {job.estado}: {job.erro}")
+
+    async def _tentar(self, t, job):
+        """Uma execucao do handler, dentro da vaga; True se o job chegou ao fim"""
+        t.rodando += 1
+        fim = True
+        try:
+            job.tentativas += 1
+            job.estado, job.iniciado, job.erro = "rodando", time.time(), None
+            self._marcar()
+            try:
+                job.resultado = await asyncio.wait_for(t.handler(job), job.timeout_s)
+            except asyncio.TimeoutError:
+                job.estado, job.erro = "timeout", f"passou de {job.timeout_s:.0f}s"
+            except asyncio.CancelledError:
+                if job.estado == "rodando":
+                    job.estado = "cancelado"
+                raise
+            except Exception as e:
+                job.estado, job.erro = "erro", str(e)[:300]
+            else:
+                job.estado = "ok" if job.resultado is not None else "erro"
+                if job.resultado is None:
+                    job.erro = job.erro or "sem resultado"
+            fim = job.estado == "ok" or job.tentativas >= t.tentativas
+            return fim
+        finally:
+            t.rodando -= 1
+            if fim:
+                job.terminado = time.time()
+                self._contar(job)
+                self._marcar()
+                self._avisar_fim(t, job)
+
+    def _avisar_fim(self, t, job):
+        if t.ao_terminar is not None:
+            try:
+                t.ao_terminar(job)
+            except Exception as e:
+                print(f"[MIDIA-JOBS] ao_terminar de {job.tipo} falhou: {e}")
+
+    def _contar(self, job):
+        if job.estado == "ok":
+            self.concluidos += 1
+        elif job.estado == "timeout":
+            self.timeouts += 1
+        elif job.estado == "cancelado":
+            self.cancelados += 1
+        elif job.estado == "erro":
+            self.falhas += 1
+
+    def _aparar(self):
+        terminados = [jid for jid, j in self.jobs.items() if j.estado not in ATIVOS]
+        for jid in terminados[:max(0, len(terminados) - MAX_HISTORICO)]:
+            del self.jobs[jid]
+
+    # --- controle ---
+    def cancelar(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.estado not in ATIVOS or job._task is None:
+            return False  # terminado, ou so no registro de outro processo
+        antes, job.estado = job.estado, "cancelado"
+        job.terminado = time.time()
+        if job._task is not None:
+            job._task.cancel()
+        if antes == "na_fila":  # nao chegou a rodar: _rodar nao conta nem avisa
+            self.cancelados += 1
+            self._avisar_fim(self.tipos[job.tipo], job)
+        self._marcar()
+        return True
+
+    def obter(self, job_id):
+        return self.jobs.get(job_id)
+
+    def listar(self, estado=None, tipo=None, ref=None, limite=50):
+        jobs = [j for j in reversed(self.jobs.values())
+                if (estado is None or j.estado == estado) and (tipo is None or j.tipo == tipo)
+                and (ref is None or j.ref == ref)]
+        return [j.exportar() for j in jobs[:limite]]
+
+    def _ler_registro(self):
+        try:
+            with open(self.estado_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"[MIDIA-JOBS] Erro ao carregar {self.estado_path}: {e}")
+            return None
+
+    def retomar(self):
+        """Startup: carrega o registro e devolve a fila o que o restart interrompeu.
+        Fora do processo dono so carrega (e, no modo api, espelha) o registro."""
+        if self._retomado:
+            return
+        self._retomado = True
+        if not simulacao.dono(GRUPO):
+            self.dono = False
+            persistencia.somente_leitura("midia_jobs")
+            self._espelhar()
+            simulacao.espelhar(GRUPO, self._recarregar, lambda: mtime(self.estado_path),
+                               prefixo="/api/system/midia-jobs")
+            print(f"[MIDIA-JOBS] Registro so leitura: a fila e do processo dono de '{GRUPO}'")
+            return
+        salvos = self._ler_registro()
+        if not salvos:
+            return
+        retomados = 0
+        for d in salvos:
+            job = JobMidia.importar(d)
+            t = self.tipos.get(job.tipo)
+            if t is not None and not t.retomavel:
+                continue  # registro antigo: ninguem espera mais este resultado
+            if job.estado in ATIVOS + ("interrompido",) and t is not None:
+                job.estado = "na_fila"
+                self._agendar(job)
+                retomados += 1
+            else:
+                if job.estado in ATIVOS:
+                    job.estado, job.erro = "erro", "tipo sem handler apos restart"
+                self.jobs[job.id] = job
+        self._aparar()
+        print(f"[MIDIA-JOBS] {len(salvos)} jobs no registro, {retomados} retomados")
+
+    def _espelhar(self):
+        """Nao dono: registro do dono (so para leitura) + os jobs que rodam aqui"""
+        salvos = self._ler_registro()
+        if salvos is None:
+            return
+        locais = [j for j in self.jobs.values() if j._task is not None]
+        self.jobs = OrderedDict((d["id"], JobMidia.importar(d)) for d in salvos)
+        for j in locais:
+            self.jobs[j.id] = j
+        self._aparar()
+
+    async def _recarregar(self):
+        self._espelhar()
+
+    async def encerrar(self):
+        """Shutdown: jobs ativos ficam 'interrompido' (retomar() os roda de novo)"""
+        ativos = [j for j in self.jobs.values() if j.estado in ATIVOS]
+        for j in ativos:
+            j.estado = "interrompido"
+            if j._task is not None:
+                j._task.cancel()
+        for j in ativos:
+            if j._task is not None:
+                try:
+                    await j._task
+                except BaseException:
+                    pass
+            j.estado = "interrompido"
+        if ativos:
+            self._marcar()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        por_estado = {}
+        for j in self.jobs.values():
+            por_estado[j.estado] = por_estado.get(j.estado, 0) + 1
+        return {
+            "threads": self.threads,
+            "tipos": {n: {"vagas": t.vagas, "rodando": t.rodando, "timeout_s": t.timeout_s,
+                          "tentativas": t.tentativas, "retomavel": t.retomavel} for n, t in self.tipos.items()},
+            "por_estado": por_estado,
+            "enviados": self.enviados,
+            "concluidos": self.concluidos,
+            "falhas": self.falhas,
+            "timeouts": self.timeouts,
+            "cancelados": self.cancelados,
+        }
+
+
+async def predict_gradio(job, space, intervalo_s=5.0, **kwargs):
+    """client.submit(**kwargs) num Space e espera sem prender thread.
+
+    O Job do gradio_client roda em background; aqui so se consulta done()
+    a cada intervalo_s. Se o job for cancelado/expirar, cancela no Space.
+    """
+    from gradio_client import Client
+
+    client = await job.bloqueante(Client, space, verbose=False)
+    remoto = await job.bloqueante(client.submit, **kwargs)
+    inicio = time.monotonic()
+    try:
+        while not remoto.done():
+            await job.esperar(intervalo_s)
+            job.avisar(f"{space}: {time.monotonic() - inicio:.0f}s")
+        return await job.bloqueante(remoto.result)
+    finally:
+        if not remoto.done():
+            try:
+                remoto.cancel()
+            except Exception:
+                pass
+
+
+jobs_midia = FilaJobsMidia()
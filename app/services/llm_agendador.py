@@ -0,0 +1,237 @@
+"""
+Agendador global de chamadas ao LLM - prioridade, justica e rate limit
+Os ~25 ciclos de fundo do Instagram (e os de reddit/youtube/tiktok/
+smart_posts/agentes) disputavam os provedores com as rotas que o usuario
+esta esperando. Aqui toda chamada pede uma vaga:
+
+- classes: interativo > agendado > ambiente. Cada classe so usa ate o seu
+  teto de vagas e as de fundo juntas deixam LLM_RESERVA_INTERATIVO vagas
+  livres, entao sempre sobra espaco para quem esta na frente. Uma fila por
+  classe: se a primeira da vez bate no teto, a classe seguinte ainda entra.
+- justica: dentro da classe, o agente que foi menos atendido passa antes.
+- token bucket por provedor (LLM_RPM_<NOME>, requisicoes por minuto).
+
+A classe vem de um contextvar: rotas HTTP sao "interativo" por padrao e
+os ciclos sao criados com com_prioridade("agendado" | "ambiente", coro).
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from bisect import bisect_left
+
+CLASSES = ("interativo", "agendado", "ambiente")
+MAX_SIMULTANEAS = int(os.environ.get("LLM_MAX_SIMULTANEAS", "6"))
+# Teto de vagas por classe (fracao do total); agendado + ambiente < 1
+TETO = {"interativo": 1.0, "agendado": 0.5, "ambiente": 0.25}
+# Vagas que as classes de fundo, somadas, nunca ocupam
+RESERVA_INTERATIVO = int(os.environ.get("LLM_RESERVA_INTERATIVO", "1"))
+# Requisicoes por minuto por provedor (0 = sem limite)
+RPM_PADRAO = {"groq": 30, "gemini": 15, "openrouter": 60, "ollama": 0}
+HISTOGRAMA_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_classe = contextvars.ContextVar("llm_classe", default="interativo")
+
+
+def classe_atual():
+    return _classe.get()
+
+
+async def com_prioridade(classe, coro):
+    """Roda coro (e as tasks que ela criar) com a classe de prioridade dada"""
+    _classe.set(classe)
+    return await coro
+
+
+class _Balde:
+    """Token bucket: capacidade = rpm/6 (rajada de ~10s), recarga rpm/60 por segundo"""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.taxa = rpm / 60.0
+        self.capacidade = max(1.0, rpm / 6.0)
+        self.tokens = self.capacidade
+        self.atualizado = time.monotonic()
+        self.esperas = 0
+        self.espera_total_ms = 0.0
+
+    def _recarregar(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def disponivel(self):
+        self._recarregar()
+        return self.tokens >= 1
+
+    async def pegar(self):
+        inicio = time.monotonic()
+        while True:
+            self._recarregar()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                break
+            await asyncio.sleep((1 - self.tokens) / self.taxa)
+        espera = (time.monotonic() - inicio) * 1000
+        if espera > 1:
+            self.esperas += 1
+            self.espera_total_ms += espera
+
+
+class _Histograma:
+    def __init__(self):
+        self.contagens = [0] * (len(HISTOGRAMA_MS) + 1)
+        self.n = 0
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.contagens[bisect_left(HISTOGRAMA_MS, ms)] += 1
+        self.n += 1
+        self.soma_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def stats(self):
+        rotulos = [f"<={b}ms" for b in HISTOGRAMA_MS] + [f">{HISTOGRAMA_MS[-1]}ms"]
+        return {
+            "n": self.n,
+            "media_ms": round(self.soma_ms / self.n, 1) if self.n else 0,
+            "max_ms": round(self.max_ms, 1),
+            "buckets": dict(zip(rotulos, self.contagens)),
+        }
+
+
+class AgendadorLLM:
+    def __init__(self, max_simultaneas=MAX_SIMULTANEAS):
+        self.max_simultaneas = max_simultaneas
+        self.em_uso = 0
+        self.em_uso_classe = dict.fromkeys(CLASSES, 0)
+        self._filas = {c: [] for c in CLASSES}  # classe -> heap (atendidos_do_agente, seq, future, agente)
+        self._seq = itertools.count()
+        self._atendidos = {}  # agente -> vagas concedidas
+        self._baldes = {}
+        self.espera = {c: _Histograma() for c in CLASSES}
+        self.fila_max = dict.fromkeys(CLASSES, 0)
+        self.concedidas = dict.fromkeys(CLASSES, 0)
+
+    def _teto(self, classe):
+        return max(1, int(self.max_simultaneas * TETO[classe]))
+
+    def _limite_fundo(self):
+        """Vagas que agendado + ambiente podem ocupar juntas"""
+        return self.max_simultaneas - min(RESERVA_INTERATIVO, self.max_simultaneas - 1)
+
+    def _pode(self, classe):
+        if self.em_uso >= self.max_simultaneas or self.em_uso_classe[classe] >= self._teto(classe):
+            return False
+        return classe == "interativo" or self.em_uso - self.em_uso_classe["interativo"] < self._limite_fundo()
+
+    def _profundidade(self):
+        return {c: sum(1 for _, _, fut, _ in fila if not fut.done()) for c, fila in self._filas.items()}
+
+    def _conceder(self, classe, agente):
+        self.em_uso += 1
+        self.em_uso_classe[classe] += 1
+        self.concedidas[classe] += 1
+        self._atendidos[agente] = self._atendidos.get(agente, 0) + 1
+
+    def _acordar(self):
+        # Classe por classe, da melhor para a pior: a que bateu no teto fica
+        # esperando e a seguinte ainda pode usar as vagas livres
+        for classe in CLASSES:
+            fila = self._filas[classe]
+            while fila:
+                _, _, fut, agente = fila[0]
+                if fut.done():  # desistiu (cancelado)
+                    heapq.heappop(fila)
+                    continue
+                if not self._pode(classe):
+                    break
+                heapq.heappop(fila)
+                self._conceder(classe, agente)
+                fut.set_result(None)
+            if self.em_uso >= self.max_simultaneas:
+                return
+
+    async def entrar(self, classe=None, agente=""):
+        classe = classe if classe in CLASSES else classe_atual()
+        inicio = time.monotonic()
+        if not self._filas[classe] and self._pode(classe):
+            self._conceder(classe, agente)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._filas[classe], (self._atendidos.get(agente, 0), next(self._seq), fut, agente))
+            prof = self._profundidade()[classe]
+            self.fila_max[classe] = max(self.fila_max[classe], prof)
+            self._acordar()
+            try:
+                await fut  # _acordar ja contou a vaga antes de resolver
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self.sair(classe)  # recebeu a vaga mas desistiu: devolve
+                raise
+        self.espera[classe].add((time.monotonic() - inicio) * 1000)
+        return classe
+
+    def sair(self, classe):
+        self.em_uso -= 1
+        self.em_uso_classe[classe] -= 1
+        self._acordar()
+
+    def vaga(self, classe=None, agente=""):
+        return _Vaga(self, classe, agente)
+
+    # --- rate limit por provedor ---
+    def _balde(self, provedor):
+        if provedor not in self._baldes:
+            rpm = int(os.environ.get(f"LLM_RPM_{provedor.upper()}", RPM_PADRAO.get(provedor, 0)))
+            self._baldes[provedor] = _Balde(rpm) if rpm > 0 else None
+        return self._baldes[provedor]
+
+    def tem_token(self, provedor):
+        b = self._balde(provedor)
+        return b is None or b.disponivel()
+
+    async def limitar(self, provedor):
+        b = self._balde(provedor)
+        if b is not None:
+            await b.pegar()
+
+    def stats(self):
+        return {
+            "max_simultaneas": self.max_simultaneas,
+            "em_uso": self.em_uso,
+            "em_uso_classe": dict(self.em_uso_classe),
+            "teto_classe": {c: self._teto(c) for c in CLASSES},
+            "teto_fundo": self._limite_fundo(),
+            "fila": self._profundidade(),
+            "fila_max": dict(self.fila_max),
+            "concedidas": dict(self.concedidas),
+            "espera": {c: h.stats() for c, h in self.espera.items()},
+            "rate_limit": {
+                p: {"rpm": b.rpm, "tokens": round(b.tokens, 2), "esperas": b.esperas,
+                    "espera_total_ms": round(b.espera_total_ms, 1)}
+                for p, b in self._baldes.items() if b is not None
+            },
+            "agentes": dict(sorted(self._atendidos.items(), key=lambda x: -x[1])[:20]),
+        }
+
+
+class _Vaga:
+    def __init__(self, agendador, classe, agente):
+        self.agendador = agendador
+        self.classe = classe
+        self.agente = agente
+
+    async def __aenter__(self):
+        self.classe = await self.agendador.entrar(self.classe, self.agente)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.agendador.sair(self.classe)
+        return False
+
+
+agendador_llm = AgendadorLLM()
@@ -0,0 +1,229 @@
+"""
+Cache de respostas do LLM - chave por hash de (modelo, prompt normalizado, parametros)
+Ciclos de fundo mandam prompts quase iguais (mesmo template, agente e tema)
+e cada um custava uma chamada paga. LRU em memoria limitada por itens e
+bytes, com TTL, e uma camada SQLite opcional (LLM_CACHE_SQLITE=caminho).
+
+Politicas:
+- "exato": devolve a resposta guardada enquanto valer o TTL; a chave e o
+  prompt literal (so espacos colapsados) - numero diferente e outra pergunta
+- "variar": guarda ate VARIANTES respostas por chave; enquanto nao encheu
+  chama o provedor, depois sorteia uma variante diferente da ultima servida
+  (para prompts criativos, onde repetir sempre o mesmo texto ficaria feio).
+  A chave normaliza caixa, acentos e numeros
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+TTL_S = float(os.environ.get("LLM_CACHE_TTL_S", str(6 * 3600)))
+MAX_ITENS = int(os.environ.get("LLM_CACHE_MAX_ITENS", "2000"))
+MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+VARIANTES = int(os.environ.get("LLM_CACHE_VARIANTES", "3"))
+SQLITE_PATH = os.environ.get("LLM_CACHE_SQLITE", "")
+
+_RE_NUM = re.compile(r"\d+(?:[.,]\d+)?")
+_RE_ESPACO = re.compile(r"\s+")
+
+
+def normalizar(texto, politica="exato"):
+    """Texto da chave conforme a politica.
+
+    "variar": minusculo, sem acento, espacos colapsados e numeros mascarados -
+    contadores que mudam a cada ciclo ("12 posts, 340 likes") nao quebram a
+    chave; o resto do template precisa ser igual. "exato": so espacos
+    colapsados, para nao servir a resposta de um prompt a outro com numeros
+    (ou caixa) diferentes.
+    """
+    if politica != "variar":
+        return _RE_ESPACO.sub(" ", texto or "").strip()
+    t = unicodedata.normalize("NFKD", (texto or "").lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    return _RE_ESPACO.sub(" ", _RE_NUM.sub("#", t)).strip()
+
+
+def chave(modelo, prompt, system="", max_tokens=0, temperature=0.0, politica="exato"):
+    bruto = json.dumps([modelo or "", politica, normalizar(prompt, politica), normalizar(system, politica),
+                        int(max_tokens or 0), round(float(temperature or 0), 1)])
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+
+class _Entrada:
+    __slots__ = ("respostas", "expira", "bytes", "latencia_ms", "ultima")
+
+    def __init__(self, respostas, expira, latencia_ms):
+        self.respostas = respostas
+        self.expira = expira
+        self.bytes = sum(len(r.encode()) for r in respostas)
+        self.latencia_ms = latencia_ms
+        self.ultima = None
+
+
+class CacheLLM:
+    def __init__(self, ttl_s=TTL_S, max_itens=MAX_ITENS, max_bytes=MAX_BYTES,
+                 variantes=VARIANTES, sqlite_path=SQLITE_PATH):
+        self.ttl_s = ttl_s
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.variantes = variantes
+        self.sqlite_path = sqlite_path
+        self._itens = OrderedDict()  # chave -> _Entrada
+        self._bytes = 0
+        self._db = None
+        self._db_lock = asyncio.Lock()
+        # Metricas
+        self.hits = 0
+        self.hits_sqlite = 0
+        self.misses = 0
+        self.variacoes_novas = 0
+        self.gravacoes = 0
+        self.expiradas = 0
+        self.despejadas = 0
+        self.economia_ms = 0.0
+
+    # --- camada em memoria ---
+    def _tirar(self, k):
+        e = self._itens.pop(k, None)
+        if e is not None:
+            self._bytes -= e.bytes
+        return e
+
+    def _por(self, k, e):
+        self._tirar(k)
+        self._itens[k] = e
+        self._bytes += e.bytes
+        while self._itens and (len(self._itens) > self.max_itens or self._bytes > self.max_bytes):
+            self._tirar(next(iter(self._itens)))
+            self.despejadas += 1
+
+    def _valida(self, k):
+        e = self._itens.get(k)
+        if e is None:
+            return None
+        if e.expira < time.time():
+            self._tirar(k)
+            self.expiradas += 1
+            return None
+        self._itens.move_to_end(k)
+        return e
+
+    # --- camada SQLite (opcional) ---
+    async def _conn(self):
+        if not self.sqlite_path:
+            return None
+        if self._db is None:
+            import aiosqlite
+            self._db = await aiosqlite.connect(self.sqlite_path)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.execute("""CREATE TABLE IF NOT EXISTS llm_cache (
+                chave TEXT PRIMARY KEY, respostas TEXT NOT NULL,
+                expira REAL NOT NULL, latencia_ms REAL DEFAULT 0)""")
+            await self._db.commit()
+        return self._db
+
+    async def _ler_sqlite(self, k):
+        try:
+            async with self._db_lock:
+                db = await self._conn()
+                if db is None:
+                    return None
+                async with db.execute("SELECT respostas, expira, latencia_ms FROM llm_cache WHERE chave=?", (k,)) as cur:
+                    row = await cur.fetchone()
+        except Exception as e:
+            print(f"[LLM-CACHE] SQLite leitura: {e}")
+            return None
+        if not row or row[1] < time.time():
+            return None
+        return _Entrada(json.loads(row[0]), row[1], row[2] or 0.0)
+
+    async def _gravar_sqlite(self, k, e):
+        try:
+            async with self._db_lock:
+                db = await self._conn()
+                if db is None:
+                    return
+                await db.execute("INSERT OR REPLACE INTO llm_cache (chave, respostas, expira, latencia_ms) VALUES (?,?,?,?)",
+                                 (k, json.dumps(e.respostas), e.expira, e.latencia_ms))
+                await db.execute("DELETE FROM llm_cache WHERE expira < ?", (time.time(),))
+                await db.commit()
+        except Exception as e:
+            print(f"[LLM-CACHE] SQLite escrita: {e}")
+
+    # --- API ---
+    async def obter(self, k, politica="exato"):
+        """Resposta guardada, ou None se for preciso chamar o provedor"""
+        e = self._valida(k)
+        if e is None and self.sqlite_path:
+            e = await self._ler_sqlite(k)
+            if e is not None:
+                self._por(k, e)
+                self.hits_sqlite += 1
+        if e is None or (politica == "variar" and len(e.respostas) < self.variantes):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.economia_ms += e.latencia_ms
+        if politica == "variar" and len(e.respostas) > 1:
+            resp = random.choice([r for r in e.respostas if r != e.ultima] or e.respostas)
+        else:
+            resp = e.respostas[-1]
+        e.ultima = resp
+        return resp
+
+    async def guardar(self, k, resposta, latencia_ms=0.0, politica="exato"):
+        if not resposta:
+            return
+        e = self._itens.get(k)
+        if politica == "variar" and e is not None and e.expira >= time.time():
+            respostas = [r for r in e.respostas if r != resposta] + [resposta]
+            latencia_ms = (e.latencia_ms * len(e.respostas) + latencia_ms) / (len(e.respostas) + 1)
+            self.variacoes_novas += 1
+            expira = e.expira  # o TTL conta da primeira resposta
+        else:
+            respostas, expira = [resposta], time.time() + self.ttl_s
+        nova = _Entrada(respostas[-self.variantes:], expira, latencia_ms)
+        nova.ultima = resposta
+        self._por(k, nova)
+        self.gravacoes += 1
+        if self.sqlite_path:
+            await self._gravar_sqlite(k, nova)
+
+    def limpar(self):
+        n = len(self._itens)
+        self._itens.clear()
+        self._bytes = 0
+        return n
+
+    async def fechar(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def stats(self):
+        consultas = self.hits + self.misses
+        return {
+            "itens": len(self._itens),
+            "bytes": self._bytes,
+            "max_itens": self.max_itens,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "hits_sqlite": self.hits_sqlite,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / consultas, 3) if consultas else 0,
+            "variacoes_novas": self.variacoes_novas,
+            "gravacoes": self.gravacoes,
+            "expiradas": self.expiradas,
+            "despejadas": self.despejadas,
+            "economia_ms": round(self.economia_ms, 1),
+            "sqlite": self.sqlite_path or None,
+        }
+
+
+cache_llm = CacheLLM()
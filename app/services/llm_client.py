@@ -1,13 +1,32 @@
 """
-LLM Client - Ollama local + Groq cloud fallback
-Usado por todos os routers para geracao de texto
+LLM Client - gateway unico de geracao de texto (Gemini / Groq / OpenRouter / Ollama)
+Usado por todos os routers para geracao de texto.
+
+Cada provedor tem circuit breaker (para de tentar quem esta fora do ar),
+EWMA de latencia e taxa de sucesso (o mais rapido saudavel vai primeiro),
+limite de chamadas simultaneas e, opcionalmente, hedge: se o primeiro
+nao respondeu ate o p95 dele, dispara o segundo e fica com quem voltar
+antes. Falha rapida (erro/429) passa na hora para o proximo provedor.
 """
-import httpx
+import abc
+import asyncio
 import os
+import random
+import time
+from collections import deque
+
+from app.services.http_pool import http_pool
+from app.services.llm_cache import cache_llm, chave as chave_cache
+from app.services.llm_agendador import agendador_llm
 
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "")
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_TEXT_MODELS = ["google/gemini-2.5-flash", "google/gemini-2.0-flash-001", "meta-llama/llama-3.1-8b-instruct", "qwen/qwen-2.5-7b-instruct"]
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "")
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
 
 # Mapeamento Ollama -> Groq models
 GROQ_MODEL_MAP = {
@@ -18,20 +37,351 @@ GROQ_MODEL_MAP = {
     "tinyllama": "llama-3.1-8b-instant",
     "mistral:7b-instruct": "mixtral-8x7b-32768",
 }
+GROQ_MODELS = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]
 
-_ollama_available = None
+HEDGE = os.environ.get("LLM_HEDGE", "1") != "0"
+HEDGE_MIN_MS = float(os.environ.get("LLM_HEDGE_MIN_MS", "1500"))
+CB_FALHAS = int(os.environ.get("LLM_CB_FALHAS", "3"))        # falhas seguidas para abrir
+CB_ESPERA_S = float(os.environ.get("LLM_CB_ESPERA_S", "30"))  # primeira espera aberto
+CB_ESPERA_MAX_S = float(os.environ.get("LLM_CB_ESPERA_MAX_S", "300"))
+EWMA_ALFA = 0.2
+# Sem politica explicita, so respostas "deterministicas" entram no cache
+CACHE_TEMP_MAX = float(os.environ.get("LLM_CACHE_TEMP_MAX", "0.3"))
 
 
-async def check_ollama():
-    """Verifica se Ollama esta disponivel"""
-    global _ollama_available
+class _Falha(Exception):
+    """Resposta inutil de um provedor (status != 200, texto vazio)"""
+
+    def __init__(self, msg, retry_after=None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+
+def _retry_after(resp):
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            r = await client.get(f"{OLLAMA_URL}/api/tags")
-            _ollama_available = r.status_code == 200
-    except:
-        _ollama_available = False
-    return _ollama_available
+        return float(resp.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+class Provedor(abc.ABC):
+    """Um backend de texto com breaker, EWMA e limite de concorrencia"""
+
+    def __init__(self, nome, timeout, max_simultaneas, latencia_inicial_ms):
+        self.nome = nome
+        self.timeout = timeout
+        self.max_simultaneas = max_simultaneas
+        self._sem = asyncio.Semaphore(max_simultaneas)
+        self.em_voo = 0
+        # Circuit breaker: fechado -> aberto -> meio_aberto -> fechado
+        self.estado = "fechado"
+        self.falhas_seguidas = 0
+        self.espera_s = CB_ESPERA_S
+        self.reabre_em = 0.0
+        self._sondando = False
+        # Latencia / saude
+        self.ewma_ms = latencia_inicial_ms
+        self.taxa_sucesso = 1.0
+        self._amostras = deque(maxlen=50)
+        self.chamadas = 0
+        self.sucessos = 0
+        self.falhas = 0
+        self.canceladas = 0
+        self.ultimo_erro = ""
+
+    def habilitado(self):
+        return True
+
+    def aceita(self, modelo):
+        return True
+
+    @abc.abstractmethod
+    async def chamar(self, modelo, prompt, system, max_tokens, temperature):
+        """Uma chamada ao backend; devolve o texto ou levanta _Falha"""
+
+    # --- breaker ---
+    def permite(self):
+        if self.estado == "fechado":
+            return True
+        if self.estado == "aberto" and time.monotonic() >= self.reabre_em:
+            self.estado = "meio_aberto"
+            self._sondando = False
+        return self.estado == "meio_aberto" and not self._sondando
+
+    def _abrir(self, espera=None):
+        if self.estado == "meio_aberto":
+            self.espera_s = min(CB_ESPERA_MAX_S, self.espera_s * 2)
+        espera = max(espera or 0, self.espera_s)
+        self.estado = "aberto"
+        self.reabre_em = time.monotonic() + espera
+        print(f"[LLM] {self.nome}: circuito ABERTO por {espera:.0f}s ({self.ultimo_erro[:80]})")
+
+    def _sucesso(self, ms):
+        self.sucessos += 1
+        self.falhas_seguidas = 0
+        if self.estado != "fechado":
+            print(f"[LLM] {self.nome}: circuito fechado de novo")
+        self.estado, self.espera_s = "fechado", CB_ESPERA_S
+        self.ewma_ms += EWMA_ALFA * (ms - self.ewma_ms)
+        self.taxa_sucesso += EWMA_ALFA * (1 - self.taxa_sucesso)
+        self._amostras.append(ms)
+
+    def _falha(self, erro, retry_after=None):
+        self.falhas += 1
+        self.falhas_seguidas += 1
+        self.ultimo_erro = str(erro) or type(erro).__name__
+        self.taxa_sucesso += EWMA_ALFA * (0 - self.taxa_sucesso)
+        if self.estado == "meio_aberto" or self.falhas_seguidas >= CB_FALHAS or retry_after:
+            self._abrir(retry_after)
+
+    # --- roteamento ---
+    def p95_ms(self):
+        if len(self._amostras) < 5:
+            return self.ewma_ms * 2
+        ordenadas = sorted(self._amostras)
+        return ordenadas[int(0.95 * (len(ordenadas) - 1))]
+
+    def custo(self):
+        """Menor e melhor: latencia esperada / chance de sucesso, penalizando fila"""
+        fila = 2.0 if self.em_voo >= self.max_simultaneas else 1.0
+        if not agendador_llm.tem_token(self.nome):
+            fila *= 3.0  # sem token no rate limit: teria que esperar
+        return self.ewma_ms / max(0.05, self.taxa_sucesso) * fila
+
+    async def executar(self, modelo, prompt, system, max_tokens, temperature, timeout=None):
+        """Chama o provedor registrando breaker/latencia; devolve "" se falhar"""
+        limite = min(self.timeout, timeout) if timeout else self.timeout
+        if self.estado == "meio_aberto":
+            self._sondando = True
+        self.chamadas += 1
+        async with self._sem:
+            await agendador_llm.limitar(self.nome)
+            self.em_voo += 1
+            inicio = time.monotonic()
+            try:
+                texto = await asyncio.wait_for(
+                    self.chamar(modelo, prompt, system, max_tokens, temperature), limite)
+                if not texto or len(texto.strip()) < 2:
+                    raise _Falha("resposta vazia")
+                self._sucesso((time.monotonic() - inicio) * 1000)
+                return texto.strip()
+            except asyncio.CancelledError:
+                # Perdeu o hedge: nao conta como falha
+                self.canceladas += 1
+                if self.estado == "meio_aberto":
+                    self._sondando = False
+                raise
+            except asyncio.TimeoutError:
+                self._falha(f"timeout {limite:.0f}s")
+            except _Falha as e:
+                self._falha(e, e.retry_after)
+            except Exception as e:
+                self._falha(e)
+            finally:
+                self.em_voo -= 1
+        return ""
+
+    def stats(self):
+        return {
+            "habilitado": self.habilitado(),
+            "estado": self.estado,
+            "reabre_em_s": round(max(0.0, self.reabre_em - time.monotonic()), 1) if self.estado == "aberto" else 0,
+            "ewma_ms": round(self.ewma_ms, 1),
+            "p95_ms": round(self.p95_ms(), 1),
+            "taxa_sucesso": round(self.taxa_sucesso, 3),
+            "chamadas": self.chamadas,
+            "sucessos": self.sucessos,
+            "falhas": self.falhas,
+            "canceladas": self.canceladas,
+            "em_voo": self.em_voo,
+            "max_simultaneas": self.max_simultaneas,
+            "ultimo_erro": self.ultimo_erro[:120],
+        }
+
+
+def _texto_chat(resp):
+    if resp.status_code != 200:
+        raise _Falha(f"HTTP {resp.status_code}", _retry_after(resp) if resp.status_code == 429 else None)
+    return resp.json().get("choices", [{}])[0].get("message", {}).get("content", "")
+
+
+def _mensagens(prompt, system):
+    msgs = [{"role": "system", "content": system}] if system else []
+    msgs.append({"role": "user", "content": prompt})
+    return msgs
+
+
+class _Gemini(Provedor):
+    """API real do Google, so para agentes com modelo gemini-*"""
+
+    def habilitado(self):
+        return bool(GOOGLE_API_KEY)
+
+    def aceita(self, modelo):
+        return bool(modelo) and modelo.startswith("gemini-")
+
+    async def chamar(self, modelo, prompt, system, max_tokens, temperature):
+        body = {"contents": [{"parts": [{"text": prompt}]}],
+                "generationConfig": {"maxOutputTokens": max_tokens, "temperature": temperature}}
+        if system:
+            body["systemInstruction"] = {"parts": [{"text": system}]}
+        async with http_pool.cliente(timeout=self.timeout) as client:
+            resp = await client.post(f"{GEMINI_URL}?key={GOOGLE_API_KEY}", json=body)
+        if resp.status_code != 200:
+            raise _Falha(f"HTTP {resp.status_code}", _retry_after(resp) if resp.status_code == 429 else None)
+        return resp.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+
+
+class _Groq(Provedor):
+    def habilitado(self):
+        return bool(GROQ_API_KEY)
+
+    async def chamar(self, modelo, prompt, system, max_tokens, temperature):
+        async with http_pool.cliente(timeout=self.timeout) as client:
+            resp = await client.post(GROQ_URL, headers={
+                "Authorization": f"Bearer {GROQ_API_KEY}",
+                "Content-Type": "application/json"
+            }, json={
+                "model": GROQ_MODEL_MAP.get(modelo) or random.choice(GROQ_MODELS),
+                "messages": _mensagens(prompt, system),
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            })
+        return _texto_chat(resp)
+
+
+class _OpenRouter(Provedor):
+    def habilitado(self):
+        return bool(OPENROUTER_API_KEY)
+
+    async def chamar(self, modelo, prompt, system, max_tokens, temperature):
+        async with http_pool.cliente(timeout=self.timeout) as client:
+            resp = await client.post(OPENROUTER_URL, headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json"
+            }, json={
+                "model": random.choice(OPENROUTER_TEXT_MODELS),
+                "messages": _mensagens(prompt, system),
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            })
+        return _texto_chat(resp)
+
+
+class _Ollama(Provedor):
+    async def chamar(self, modelo, prompt, system, max_tokens, temperature):
+        if not modelo or modelo.startswith("gemini-"):
+            modelo = "gemma2:2b"
+        body = {"model": modelo, "prompt": prompt, "stream": False,
+                "options": {"temperature": temperature, "num_predict": max_tokens}}
+        if system:
+            body["system"] = system
+        async with http_pool.cliente(timeout=self.timeout) as client:
+            resp = await client.post(f"{OLLAMA_URL}/api/generate", json=body)
+        if resp.status_code != 200:
+            raise _Falha(f"HTTP {resp.status_code}")
+        return resp.json().get("response", "")
+
+
+def _cap(nome, padrao):
+    return int(os.environ.get(f"LLM_CAP_{nome.upper()}", padrao))
+
+
+class GatewayLLM:
+    """Escolhe, dispara e cronometra os provedores de texto"""
+
+    def __init__(self, provedores):
+        self.provedores = {p.nome: p for p in provedores}
+        self.pedidos = 0
+        self.vazios = 0
+        self.hedges = 0
+        self.hedges_vencedores = 0
+
+    def candidatos(self, modelo, apenas=None):
+        cands = [p for p in self.provedores.values()
+                 if (apenas is None or p.nome in apenas) and p.habilitado() and p.aceita(modelo) and p.permite()]
+        return sorted(cands, key=Provedor.custo)
+
+    async def gerar(self, modelo, prompt, system="", max_tokens=150, temperature=0.85,
+                    timeout=None, provedores=None, hedge=None, cache=None, prioridade=None, agente=""):
+        """cache: "exato", "variar" (ver llm_cache) ou "off"; None decide pela temperatura.
+        prioridade: classe do llm_agendador (None = a do contexto)."""
+        self.pedidos += 1
+        if cache is None:
+            cache = "exato" if temperature <= CACHE_TEMP_MAX else "off"
+        k = None
+        if cache != "off":
+            k = chave_cache(modelo, prompt, system, max_tokens, temperature, cache)
+            texto = await cache_llm.obter(k, cache)
+            if texto:
+                return texto
+        inicio = time.monotonic()
+        async with agendador_llm.vaga(prioridade, agente or modelo or ""):
+            texto = await self._disparar(modelo, prompt, system, max_tokens, temperature, timeout, provedores, hedge)
+        if texto and k:
+            await cache_llm.guardar(k, texto, (time.monotonic() - inicio) * 1000, cache)
+        return texto
+
+    async def _disparar(self, modelo, prompt, system, max_tokens, temperature, timeout, provedores, hedge):
+        hedge = HEDGE if hedge is None else hedge
+        fila = self.candidatos(modelo, provedores)
+        pendentes = {}  # task -> (provedor, e_hedge)
+        ultimo_lancamento = 0.0
+
+        def lancar(e_hedge=False):
+            nonlocal ultimo_lancamento
+            p = fila.pop(0)
+            t = asyncio.ensure_future(p.executar(modelo, prompt, system, max_tokens, temperature, timeout))
+            pendentes[t] = (p, e_hedge)
+            ultimo_lancamento = time.monotonic()
+
+        try:
+            if fila:
+                lancar()
+            while pendentes:
+                prazo = None
+                if hedge and fila and len(pendentes) < 2:
+                    atual = next(iter(pendentes.values()))[0]
+                    limite = max(HEDGE_MIN_MS, atual.p95_ms()) / 1000
+                    prazo = max(0.0, limite - (time.monotonic() - ultimo_lancamento))
+                feitos, _ = await asyncio.wait(pendentes, timeout=prazo, return_when=asyncio.FIRST_COMPLETED)
+                if not feitos:
+                    self.hedges += 1
+                    lancar(e_hedge=True)
+                    continue
+                for t in feitos:
+                    p, e_hedge = pendentes.pop(t)
+                    texto = t.result()
+                    if texto:
+                        if e_hedge:
+                            self.hedges_vencedores += 1
+                        return texto
+                # Falhou rapido: proximo provedor ja (sem esperar o hedge)
+                if fila and len(pendentes) < 2:
+                    lancar()
+            self.vazios += 1
+            return ""
+        finally:
+            for t in pendentes:
+                t.cancel()
+
+    def stats(self):
+        return {
+            "pedidos": self.pedidos,
+            "vazios": self.vazios,
+            "hedge": HEDGE,
+            "hedges": self.hedges,
+            "hedges_vencedores": self.hedges_vencedores,
+            "provedores": {n: p.stats() for n, p in self.provedores.items()},
+        }
+
+
+gateway = GatewayLLM([
+    _Gemini("gemini", 30.0, _cap("gemini", 4), 1200.0),
+    _Groq("groq", 15.0, _cap("groq", 8), 1500.0),
+    _OpenRouter("openrouter", 30.0, _cap("openrouter", 8), 4000.0),
+    _Ollama("ollama", 60.0, _cap("ollama", 2), 8000.0),
+])
 
 
 async def gerar_texto(
@@ -41,69 +391,34 @@ async def gerar_texto(
     max_tokens: int = 150,
     temperature: float = 0.85,
     timeout: float = 60.0,
+    cache: str = None,
+    prioridade: str = None,
+    agente: str = "",
 ) -> str:
     """
-    Gera texto usando Ollama (local) ou Groq (cloud fallback).
-    Retorna string vazia se ambos falharem.
+    Gera texto pelo provedor saudavel mais rapido (ver GatewayLLM).
+    cache="variar" reaproveita respostas de prompts criativos repetidos.
+    prioridade: "interativo" | "agendado" | "ambiente" (padrao: a do contexto).
+    Retorna string vazia se todos falharem.
     """
-    global _ollama_available
+    return await gateway.gerar(modelo, prompt, system, max_tokens, temperature, timeout,
+                               cache=cache, prioridade=prioridade, agente=agente)
 
-    # Tenta Ollama primeiro (se disponivel)
-    if _ollama_available is None:
-        await check_ollama()
 
-    if _ollama_available:
-        try:
-            body = {
-                "model": modelo,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": max_tokens,
-                }
-            }
-            if system:
-                body["system"] = system
-
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                r = await client.post(f"{OLLAMA_URL}/api/generate", json=body)
-                if r.status_code == 200:
-                    return r.json().get("response", "").strip()
-        except:
-            _ollama_available = False
-
-    # Fallback: Groq API
-    if GROQ_API_KEY:
-        try:
-            groq_model = GROQ_MODEL_MAP.get(modelo, "llama-3.1-8b-instant")
-            messages = []
-            if system:
-                messages.append({"role": "system", "content": system})
-            messages.append({"role": "user", "content": prompt})
-
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                r = await client.post(GROQ_URL, headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
-                }, json={
-                    "model": groq_model,
-                    "messages": messages,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                })
-                if r.status_code == 200:
-                    return r.json()["choices"][0]["message"]["content"].strip()
-                else:
-                    print(f"[LLM] Groq error {r.status_code}: {r.text[:200]}")
-        except Exception as e:
-            print(f"[LLM] Groq exception: {e}")
-
-    return ""
+async def check_ollama():
+    """Verifica se Ollama esta disponivel"""
+    try:
+        async with http_pool.cliente(timeout=5.0) as client:
+            r = await client.get(f"{OLLAMA_URL}/api/tags")
+            return r.status_code == 200
+    except Exception:
+        return False
 
 
 async def recheck_ollama():
-    """Re-verifica Ollama periodicamente"""
-    global _ollama_available
-    _ollama_available = None
-    return await check_ollama()
+    """Re-verifica Ollama e, se voltou, fecha o circuito na hora"""
+    ok = await check_ollama()
+    if ok:
+        p = gateway.provedores["ollama"]
+        p.estado, p.falhas_seguidas, p.espera_s = "fechado", 0, CB_ESPERA_S
+    return ok
@@ -0,0 +1,218 @@
+"""
+Snapshot de metricas da rede - uma varredura para todos os leitores
+AnalystAgent.coletar_metricas, /api/custom-agents/analytics e /recomendar
+buscavam cada um o feed (50-100 posts) e a lista de agentes e retokenizavam
+hashtags com o proprio Counter, a cada chamada / ciclo de agente: N
+analistas = N varreduras iguais.
+
+Aqui uma so consulta (posts publicos mais recentes + agentes ativos) gera
+um SnapshotRede imutavel e versionado. O calculo e incremental: o estado
+por post (hashtags, engajamento, autor) fica guardado e so post novo ou
+editado e retokenizado; quem saiu da janela e descontado dos contadores.
+
+    snap = await metricas_rede.obter()     # refaz se passou de TTL_S
+    snap.idade_s(), snap.versao, snap.como_dict()
+
+As rotas que escrevem posts, likes e comentarios (app/routers/posts.py,
+humanos.py) chamam metricas_rede.invalidar(): a leitura seguinte refaz o
+snapshot sem esperar o TTL, desde que ele tenha mais de MIN_IDADE_S (uma
+rajada de likes vira uma atualizacao so). Leitores concorrentes com
+snapshot velho esperam a mesma atualizacao.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from types import MappingProxyType
+
+from sqlalchemy import select, desc
+
+from app.database import AsyncSessionLocal
+from app.models import Agent, Post
+
+JANELA = int(os.environ.get("METRICAS_REDE_JANELA", "100"))   # posts mais recentes considerados
+TTL_S = float(os.environ.get("METRICAS_REDE_TTL_S", "30"))    # idade maxima antes de refazer
+MIN_IDADE_S = float(os.environ.get("METRICAS_REDE_MIN_IDADE_S", "1"))  # invalidado: refaz so passado isto
+N_RECENTES = 20
+N_TOP = 10
+
+
+def hashtags_de(conteudo):
+    return tuple(w.strip("#.,!?") for w in conteudo.split() if w.startswith("#") and w.strip("#.,!?"))
+
+
+def engajamento(likes, comentarios):
+    return likes + comentarios * 2
+
+
+class SnapshotRede:
+    """Foto imutavel das metricas; nunca e alterada depois de publicada"""
+
+    __slots__ = ("versao", "gerado_em", "total_posts", "total_agentes", "engajamento_medio",
+                 "hashtags", "top_agentes", "atividade_recente", "posts", "agentes")
+
+    def __init__(self, versao, posts, agentes, hashtags):
+        self.versao = versao
+        self.gerado_em = time.time()
+        self.posts = posts      # tuple de MappingProxyType, mais novo primeiro
+        self.agentes = agentes  # tuple de MappingProxyType
+        self.total_posts = len(posts)
+        self.total_agentes = len(agentes)
+        total_eng = sum(engajamento(p["likes_count"], p["comments_count"]) for p in posts)
+        self.engajamento_medio = round(total_eng / len(posts), 2) if posts else 0
+        self.hashtags = tuple(hashtags.most_common(N_TOP))
+        self.top_agentes = tuple(Counter(p["agent_name"] for p in posts).most_common(N_TOP))
+        self.atividade_recente = tuple(
+            MappingProxyType({
+                "tipo": "post",
+                "agente": p["agent_name"],
+                "conteudo": p["content"][:80],
+                "likes": p["likes_count"],
+                "comments": p["comments_count"],
+            })
+            for p in posts[:N_RECENTES]
+        )
+
+    def idade_s(self):
+        return round(time.time() - self.gerado_em, 3)
+
+    def info(self):
+        return {"versao": self.versao, "gerado_em": datetime.fromtimestamp(self.gerado_em).isoformat(),
+                "idade_s": self.idade_s()}
+
+    def como_dict(self):
+        """Copia JSON-serializavel (o chamador pode alterar a vontade)"""
+        return {
+            "snapshot": self.info(),
+            "total_posts": self.total_posts,
+            "total_agentes": self.total_agentes,
+            "engajamento_medio": self.engajamento_medio,
+            "hashtags": [{"tag": t, "count": c} for t, c in self.hashtags],
+            "top_agentes": [{"nome": n, "posts": c} for n, c in self.top_agentes],
+            "atividade_recente": [dict(a) for a in self.atividade_recente],
+            "posts": [{**p, "hashtags": list(p["hashtags"])} for p in self.posts],
+            "agentes": [dict(a) for a in self.agentes],
+        }
+
+
+class MetricasRede:
+    def __init__(self, janela=JANELA, ttl_s=TTL_S, min_idade_s=MIN_IDADE_S):
+        self.janela = janela
+        self.ttl_s = ttl_s
+        self.min_idade_s = min_idade_s
+        self.atual = None
+        self._por_post = {}          # post_id -> dict publicado (MappingProxyType)
+        self._hashtags = Counter()   # contagem dentro da janela
+        self._nomes = {}             # agent_id -> nome
+        self._atualizando = None     # Future da atualizacao em voo
+        self._sujo = False
+        # Metricas
+        self.atualizacoes = 0
+        self.leituras = 0
+        self.invalidacoes = 0
+        self.retokenizados = 0
+        self.ultima_ms = 0.0
+
+    async def obter(self, max_idade_s=None):
+        """Ultimo snapshot; refaz antes se for mais velho que max_idade_s (padrao ttl_s)
+        ou se houve escrita (invalidar) e ele ja tem min_idade_s"""
+        self.leituras += 1
+        limite = self.ttl_s if max_idade_s is None else max_idade_s
+        if self._sujo:
+            limite = min(limite, self.min_idade_s)
+        if self.atual is not None and self.atual.idade_s() < limite:
+            return self.atual
+        if self._atualizando is None:
+            self._atualizando = asyncio.ensure_future(self._atualizar())
+            self._atualizando.add_done_callback(self._fim_atualizacao)
+        return await asyncio.shield(self._atualizando)
+
+    def _fim_atualizacao(self, fut):
+        self._atualizando = None
+        if not fut.cancelled() and fut.exception() is not None:
+            print(f"[METRICAS] Erro ao atualizar snapshot: {fut.exception()}")
+
+    def invalidar(self):
+        """Chamado depois do commit de post/like/comentario: a proxima leitura
+        (passado min_idade_s) refaz o snapshot. Quem ja tem o publicado fica com ele."""
+        self._sujo = True
+        self.invalidacoes += 1
+
+    async def _consultar(self):
+        async with AsyncSessionLocal() as db:
+            posts = (await db.execute(
+                select(Post.id, Post.agent_id, Post.content, Post.likes_count, Post.comments_count, Post.created_at)
+                .where(Post.is_public == True)
+                .order_by(desc(Post.created_at))
+                .limit(self.janela)
+            )).all()
+            agentes = (await db.execute(
+                select(Agent.id, Agent.name, Agent.model_type).where(Agent.is_active == True)
+            )).all()
+        return posts, agentes
+
+    async def _atualizar(self):
+        t0 = time.perf_counter()
+        self._sujo = False
+        linhas, agentes = await self._consultar()
+        self._nomes = {a.id: a.name for a in agentes}
+
+        por_post = {}
+        for ln in linhas:
+            antigo = self._por_post.get(ln.id)
+            nome = self._nomes.get(ln.agent_id, "desconhecido")
+            if (antigo is not None and antigo["content"] == ln.content and antigo["likes_count"] == (ln.likes_count or 0)
+                    and antigo["comments_count"] == (ln.comments_count or 0) and antigo["agent_name"] == nome):
+                por_post[ln.id] = antigo
+                continue
+            if antigo is not None and antigo["content"] == ln.content:
+                tags = antigo["hashtags"]  # so contadores mudaram
+            else:
+                tags = hashtags_de(ln.content)
+                self.retokenizados += 1
+                if antigo is not None:
+                    self._hashtags.subtract(antigo["hashtags"])
+                self._hashtags.update(tags)
+            por_post[ln.id] = MappingProxyType({
+                "id": ln.id,
+                "agent_id": ln.agent_id,
+                "agent_name": nome,
+                "content": ln.content,
+                "likes_count": ln.likes_count or 0,
+                "comments_count": ln.comments_count or 0,
+                "created_at": ln.created_at.isoformat() if ln.created_at else None,
+                "hashtags": tags,
+            })
+
+        # Saiu da janela (ou foi apagado): desconta
+        for pid, antigo in self._por_post.items():
+            if pid not in por_post:
+                self._hashtags.subtract(antigo["hashtags"])
+        self._hashtags = +self._hashtags  # tira zeros/negativos
+        self._por_post = por_post
+
+        agentes_pub = tuple(MappingProxyType({"id": a.id, "name": a.name, "model_type": a.model_type})
+                            for a in agentes)
+        posts_pub = tuple(por_post[ln.id] for ln in linhas)
+        self.atualizacoes += 1
+        self.atual = SnapshotRede(self.atualizacoes, posts_pub, agentes_pub, self._hashtags)
+        self.ultima_ms = round((time.perf_counter() - t0) * 1000, 2)
+        return self.atual
+
+    def stats(self):
+        return {
+            "janela": self.janela,
+            "ttl_s": self.ttl_s,
+            "min_idade_s": self.min_idade_s,
+            "versao": self.atual.versao if self.atual else 0,
+            "idade_s": self.atual.idade_s() if self.atual else None,
+            "atualizacoes": self.atualizacoes,
+            "leituras": self.leituras,
+            "invalidacoes": self.invalidacoes,
+            "retokenizados": self.retokenizados,
+            "ultima_ms": self.ultima_ms,
+        }
+
+
+metricas_rede = MetricasRede()
@@ -0,0 +1,189 @@
+"""
+Pipeline de imagem fora do event loop - rendicoes responsivas + blurhash
+Decodificar/reencodar com PIL dentro da rota travava o servidor inteiro
+(um upload de 50MB = segundos sem atender ninguem) e so existia um JPEG de
+2048px, servido ate para miniaturas do grid.
+
+processar_imagem(bytes) roda num ProcessPoolExecutor e devolve:
+    {"largura", "altura", "blurhash",
+     "rendicoes": {"thumb": {"w", "h", "webp", "jpg"[, "avif"]}, "feed": ..., "full": ...}}
+com as URLs ja gravadas no armazem de midia. srcset(meta) monta o atributo
+do <img>. PIL e opcional: sem ele o upload segue com o arquivo original.
+"""
+import asyncio
+import io
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app.services.armazem_midia import armazem_midia
+
+RENDICOES = {"thumb": 150, "feed": 640, "full": 1080}
+QUALIDADE_WEBP = int(os.environ.get("MIDIA_QUALIDADE_WEBP", "80"))
+QUALIDADE_JPG = int(os.environ.get("MIDIA_QUALIDADE_JPG", "85"))
+AVIF = os.environ.get("MIDIA_AVIF", "1") != "0"
+WORKERS = int(os.environ.get("MIDIA_WORKERS", str(min(2, os.cpu_count() or 1))))
+MAX_PIXELS = 80_000_000  # ~9000x9000; acima disso PIL recusa (bomba de descompressao)
+
+_B83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+# --- blurhash (https://blurha.sh), sem dependencia extra ---
+def _b83(valor, tamanho):
+    return "".join(_B83[(valor // 83 ** (tamanho - i)) % 83] for i in range(1, tamanho + 1))
+
+
+def _linear(v):
+    v /= 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _srgb(v):
+    v = max(0.0, min(1.0, v))
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sinal_pow(v, e):
+    return math.copysign(abs(v) ** e, v)
+
+
+def blurhash(pixels, largura, altura, cx=4, cy=3):
+    """pixels: sequencia de (r, g, b) linha a linha (use uma imagem ~32px)"""
+    lin = [tuple(_linear(c) for c in px) for px in pixels]
+    cos_x = [[math.cos(math.pi * i * x / largura) for x in range(largura)] for i in range(cx)]
+    cos_y = [[math.cos(math.pi * j * y / altura) for y in range(altura)] for j in range(cy)]
+    fatores = []
+    for j in range(cy):
+        for i in range(cx):
+            norma = (1 if i == 0 and j == 0 else 2) / (largura * altura)
+            r = g = b = 0.0
+            for y in range(altura):
+                cyj = cos_y[j][y]
+                linha = y * largura
+                for x in range(largura):
+                    base = cos_x[i][x] * cyj
+                    pr, pg, pb = lin[linha + x]
+                    r += base * pr
+                    g += base * pg
+                    b += base * pb
+            fatores.append((r * norma, g * norma, b * norma))
+    dc, ac = fatores[0], fatores[1:]
+    h = _b83((cx - 1) + (cy - 1) * 9, 1)
+    if ac:
+        q = max(0, min(82, int(max(abs(v) for f in ac for v in f) * 166 - 0.5)))
+        maximo = (q + 1) / 166
+        h += _b83(q, 1)
+    else:
+        maximo = 1.0
+        h += _b83(0, 1)
+    h += _b83((_srgb(dc[0]) << 16) + (_srgb(dc[1]) << 8) + _srgb(dc[2]), 4)
+    for f in ac:
+        qr, qg, qb = (max(0, min(18, int(math.floor(_sinal_pow(v / maximo, 0.5) * 9 + 9.5)))) for v in f)
+        h += _b83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return h
+
+
+# --- trabalho pesado (roda no processo filho) ---
+def _transcodificar(dados):
+    from PIL import Image, ImageOps, features
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(dados)))
+    img = img.convert("RGB")
+    largura, altura = img.size
+    com_avif = AVIF and features.check("avif")
+    rendicoes = {}
+    for nome, lado in RENDICOES.items():
+        r = img.copy()
+        r.thumbnail((lado, lado), Image.LANCZOS)  # nunca amplia
+        saidas = {"w": r.width, "h": r.height}
+        buf = io.BytesIO()
+        r.save(buf, "WEBP", quality=QUALIDADE_WEBP, method=4)
+        saidas["webp"] = buf.getvalue()
+        buf = io.BytesIO()
+        r.save(buf, "JPEG", quality=QUALIDADE_JPG, optimize=True, progressive=True)
+        saidas["jpg"] = buf.getvalue()
+        if com_avif:
+            buf = io.BytesIO()
+            r.save(buf, "AVIF", quality=QUALIDADE_WEBP - 20, speed=8)
+            saidas["avif"] = buf.getvalue()
+        rendicoes[nome] = saidas
+    mini = img.copy()
+    mini.thumbnail((32, 32))
+    return {
+        "largura": largura,
+        "altura": altura,
+        "blurhash": blurhash(list(mini.getdata()), mini.width, mini.height),
+        "rendicoes": rendicoes,
+    }
+
+
+class PipelineMidia:
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._pool = None
+        self.processadas = 0
+        self.falhas = 0
+        self.bytes_entrada = 0
+        self.bytes_saida = 0
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def processar_imagem(self, dados):
+        """Metadados + URLs das rendicoes, ou None se nao deu para decodificar"""
+        loop = asyncio.get_running_loop()
+        try:
+            bruto = await loop.run_in_executor(self._executor(), _transcodificar, dados)
+        except ImportError:
+            return None  # sem PIL
+        except Exception as e:
+            self.falhas += 1
+            print(f"[MIDIA-PIPE] Falha ao processar imagem ({len(dados) // 1024}KB): {e}")
+            return None
+        rendicoes = {}
+        for nome, r in bruto["rendicoes"].items():
+            urls = {"w": r["w"], "h": r["h"]}
+            for fmt in ("webp", "jpg", "avif"):
+                if fmt in r:
+                    urls[fmt] = await armazem_midia.guardar(r[fmt], fmt)
+                    self.bytes_saida += len(r[fmt])
+            rendicoes[nome] = urls
+        self.processadas += 1
+        self.bytes_entrada += len(dados)
+        return {"largura": bruto["largura"], "altura": bruto["altura"],
+                "blurhash": bruto["blurhash"], "rendicoes": rendicoes}
+
+    def encerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "rendicoes": RENDICOES,
+            "avif": AVIF,
+            "processadas": self.processadas,
+            "falhas": self.falhas,
+            "bytes_entrada": self.bytes_entrada,
+            "bytes_saida": self.bytes_saida,
+        }
+
+
+def srcset(meta, formato="webp"):
+    """'url 150w, url 640w, url 1080w' para o <img srcset>"""
+    if not meta:
+        return ""
+    itens = sorted(meta.get("rendicoes", {}).values(), key=lambda r: r["w"])
+    return ", ".join(f"{r[formato]} {r['w']}w" for r in itens if r.get(formato))
+
+
+def url_rendicao(meta, nome="feed", formato="jpg"):
+    r = (meta or {}).get("rendicoes", {}).get(nome) or {}
+    return r.get(formato, "")
+
+
+pipeline_midia = PipelineMidia()
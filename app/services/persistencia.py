@@ -0,0 +1,195 @@
+"""
+Persistencia agendada (write-behind) - junta rajadas de _salvar_dados()
+Cada router registra um "destino"; pedidos de save viram um unico flush a
+cada FLUSH_MS ou apos FLUSH_MAX mutacoes, o que vier primeiro.
+"""
+import asyncio
+import json
+import os
+import time
+
+FLUSH_MS = int(os.environ.get("PERSIST_FLUSH_MS", "2000"))
+FLUSH_MAX = int(os.environ.get("PERSIST_FLUSH_MAX", "200"))
+# Espera minima depois de um flush com erro (intervalo_ms=0 nao vira loop quente)
+ERRO_S = int(os.environ.get("PERSIST_ERRO_MS", "1000")) / 1000.0
+
+
+def gravar_json_atomico(path, data, **kwargs):
+    """json.dump em arquivo temporario + os.replace (roda em thread)"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, path)
+
+
+def gravar_texto_atomico(path, texto):
+    """Como gravar_json_atomico, mas com o JSON ja serializado.
+
+    Para estado que o event loop continua mutando: serialize no loop e
+    mande so o texto para a thread.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(texto)
+    os.replace(tmp, path)
+
+
+class _Destino:
+    """Um alvo de persistencia (ex: instagram.db, youtube_data.json)"""
+
+    def __init__(self, nome, salvar, intervalo_ms, max_mutacoes):
+        self.nome = nome
+        self.salvar = salvar  # coroutine function, sem argumentos
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_mutacoes = max_mutacoes
+        self.pendentes = 0
+        self.desde = None  # monotonic do primeiro pedido ainda nao gravado
+        self._cheio = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        # Metricas
+        self.pedidos = 0
+        self.flushes = 0
+        self.erros = 0
+        self.lag_ultimo_ms = 0.0
+        self.lag_max_ms = 0.0
+        self.duracao_ultimo_ms = 0.0
+        self.duracao_total_ms = 0.0
+        self.ultimo_flush = None
+
+    def marcar(self):
+        self.pedidos += 1
+        self.pendentes += 1
+        if self.desde is None:
+            self.desde = time.monotonic()
+        if self.pendentes >= self.max_mutacoes:
+            self._cheio.set()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Fora do event loop (import dos routers, scripts): um asyncio.run
+            # aqui prenderia o lock e as conexoes do destino a um loop
+            # descartavel. Fica pendente ate persistencia.iniciar(), o proximo
+            # marcar() dentro do loop ou o encerrar().
+            return
+        self._agendar(loop)
+
+    def _agendar(self, loop):
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._ciclo())
+
+    async def _ciclo(self):
+        while self.pendentes:
+            espera = self.intervalo - (time.monotonic() - (self.desde or time.monotonic()))
+            if espera > 0 and not self._cheio.is_set():
+                try:
+                    await asyncio.wait_for(self._cheio.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+            if await self.flush() is False:
+                await asyncio.sleep(max(self.intervalo, ERRO_S))
+
+    async def flush(self):
+        """Grava o que esta pendente; False se salvar() falhou (pedidos devolvidos)"""
+        async with self._lock:
+            if not self.pendentes:
+                return
+            n, desde = self.pendentes, self.desde
+            self.pendentes, self.desde = 0, None
+            self._cheio.clear()
+            inicio = time.monotonic()
+            try:
+                await self.salvar()
+            except Exception as e:
+                self.erros += 1
+                # Devolve os pedidos: tenta de novo no proximo intervalo
+                self.pendentes += n
+                self.desde = time.monotonic()
+                print(f"[PERSIST] {self.nome}: erro no flush ({n} pedidos): {e}")
+                return False
+            except BaseException:
+                # Cancelado (shutdown, timeout) no meio: nada foi confirmado
+                self.pendentes += n
+                self.desde = desde or self.desde or time.monotonic()
+                raise
+            fim = time.monotonic()
+            self.flushes += 1
+            self.duracao_ultimo_ms = (fim - inicio) * 1000
+            self.duracao_total_ms += self.duracao_ultimo_ms
+            self.lag_ultimo_ms = (fim - desde) * 1000 if desde else 0.0
+            self.lag_max_ms = max(self.lag_max_ms, self.lag_ultimo_ms)
+            self.ultimo_flush = time.time()
+
+    def stats(self):
+        return {
+            "pedidos": self.pedidos,
+            "flushes": self.flushes,
+            "coalescencia": round(self.pedidos / self.flushes, 1) if self.flushes else 0,
+            "pendentes": self.pendentes,
+            "erros": self.erros,
+            "lag_ultimo_ms": round(self.lag_ultimo_ms, 1),
+            "lag_max_ms": round(self.lag_max_ms, 1),
+            "lag_atual_ms": round((time.monotonic() - self.desde) * 1000, 1) if self.desde else 0,
+            "flush_ultimo_ms": round(self.duracao_ultimo_ms, 1),
+            "flush_medio_ms": round(self.duracao_total_ms / self.flushes, 1) if self.flushes else 0,
+            "intervalo_ms": int(self.intervalo * 1000),
+            "max_mutacoes": self.max_mutacoes,
+            "ultimo_flush": self.ultimo_flush,
+        }
+
+
+class AgendadorPersistencia:
+    """Registro unico de destinos de persistencia do processo"""
+
+    def __init__(self):
+        self.destinos = {}
+        self.bloqueados = {}  # nome -> pedidos ignorados (outro processo e o dono dos dados)
+
+    def registrar(self, nome, salvar, intervalo_ms=None, max_mutacoes=None):
+        self.destinos[nome] = _Destino(
+            nome, salvar,
+            FLUSH_MS if intervalo_ms is None else intervalo_ms,
+            FLUSH_MAX if max_mutacoes is None else max_mutacoes,
+        )
+        return self.destinos[nome]
+
+    def marcar(self, nome):
+        if nome in self.bloqueados:
+            self.bloqueados[nome] += 1
+            return
+        self.destinos[nome].marcar()
+
+    def somente_leitura(self, nome):
+        """Ignora saves deste destino (ex: SIMULACAO_MODO=api, quem grava e o worker)"""
+        self.bloqueados.setdefault(nome, 0)
+
+    def bloqueado(self, nome):
+        return nome in self.bloqueados
+
+    def iniciar(self):
+        """Startup (dentro do loop): agenda o que foi marcado antes do loop existir"""
+        loop = asyncio.get_running_loop()
+        for nome, d in self.destinos.items():
+            if d.pendentes and nome not in self.bloqueados:
+                d._agendar(loop)
+
+    async def flush(self, nome):
+        d = self.destinos.get(nome)
+        if d and nome not in self.bloqueados:
+            await d.flush()
+
+    async def encerrar(self):
+        """Flush final de todos os destinos (shutdown)"""
+        for nome in list(self.destinos):
+            await self.flush(nome)
+
+    def stats(self):
+        st = {nome: d.stats() for nome, d in self.destinos.items()}
+        for nome, ignorados in self.bloqueados.items():
+            if nome in st:
+                st[nome]["somente_leitura"] = True
+                st[nome]["ignorados"] = ignorados
+        return st
+
+
+persistencia = AgendadorPersistencia()
@@ -0,0 +1,181 @@
+"""
+Onde roda a simulacao - processo da API ou workers dedicados
+Os ciclos autonomos (Instagram, Reddit, YouTube, TikTok, smart posts e os
+agentes custom) rodavam no mesmo event loop que atende HTTP: qualquer passo
+pesado de CPU virava latencia para o usuario.
+
+SIMULACAO_MODO:
+- local  (padrao) tudo no processo da API, como sempre foi.
+- api    a API nao roda ciclos; espelha o estado que os workers gravam
+         (SQLite/JSON, conferido a cada SIMULACAO_SYNC_S) e recusa escrita
+         nas plataformas simuladas (503): quem escreve e o worker.
+- worker sem HTTP (python -m app.worker); roda os grupos e agentes do seu
+         shard, SIMULACAO_SHARD de SIMULACAO_SHARDS.
+
+O estado de cada plataforma vive em memoria no processo que a simula, entao
+o shard e por grupo (todos os ciclos do Instagram juntos, etc.); agentes
+custom guardam tudo no banco e sao divididos por nome. Grupo sem
+persistencia (TikTok) fica sempre no processo da API. Manutencao do estado
+de um grupo (GC de midia, fila de jobs) roda so no processo dono().
+"""
+import asyncio
+import os
+import time
+import zlib
+
+from app.services.llm_agendador import com_prioridade
+
+MODO = os.environ.get("SIMULACAO_MODO", "local")
+SHARD = int(os.environ.get("SIMULACAO_SHARD", "0"))
+SHARDS = max(1, int(os.environ.get("SIMULACAO_SHARDS", "1")))
+SYNC_S = float(os.environ.get("SIMULACAO_SYNC_S", "5"))
+METODOS_LEITURA = ("GET", "HEAD", "OPTIONS")
+
+
+def shard_de(chave, shards=SHARDS):
+    """Shard estavel entre processos (hash() do Python muda a cada execucao)"""
+    return zlib.crc32(chave.encode()) % shards
+
+
+def mtime(*caminhos):
+    """Sinal de mudanca para espelhar(): maior mtime entre os arquivos que existem"""
+    return max((os.stat(c).st_mtime_ns for c in caminhos if os.path.exists(c)), default=0)
+
+
+class _Espelho:
+    """Grupo simulado em outro processo: recarrega quando o sinal muda"""
+
+    def __init__(self, grupo, recarregar, sinal, prefixo):
+        self.grupo = grupo
+        self.recarregar = recarregar  # coroutine function
+        self.sinal = sinal            # funcao sem argumentos -> valor comparavel
+        self.prefixo = prefixo
+        self.visto = sinal()
+        self.recargas = 0
+        self.erros = 0
+        self.ultima_ms = 0.0
+        self.ultima = None
+
+
+class Simulacao:
+    def __init__(self, modo=MODO, shard=SHARD, shards=SHARDS):
+        self.modo = modo
+        self.shard = shard
+        self.shards = shards
+        self.ciclos = {}        # grupo -> nomes dos ciclos iniciados aqui
+        self.fora = {}          # grupo -> shard dono (grupos que nao rodam aqui)
+        self.espelhos = {}      # grupo -> _Espelho
+        self._task_sync = None
+        self.recusadas = 0
+
+    # ------------------------------------------------------------
+    # Quem roda o que
+    # ------------------------------------------------------------
+
+    def roda_grupo(self, grupo, fixo=False):
+        """Este processo roda os ciclos do grupo? fixo=True: grupo sem persistencia, sempre na API"""
+        if os.environ.get("RENDER"):
+            return False
+        if fixo:
+            return self.modo != "worker"
+        if self.modo == "local":
+            return True
+        if self.modo == "worker":
+            dono = shard_de(grupo, self.shards)
+            if dono != self.shard:
+                self.fora[grupo] = dono
+                return False
+            return True
+        self.fora[grupo] = "worker"
+        return False
+
+    def dono(self, grupo):
+        """Este processo grava o estado do grupo? (tarefas de manutencao rodam so no dono)"""
+        if self.modo == "api":
+            return False
+        if self.modo == "worker":
+            return shard_de(grupo, self.shards) == self.shard
+        return True
+
+    def roda_agente(self, nome):
+        """Agentes custom: modo api nao roda nenhum; worker roda os do seu shard"""
+        if self.modo == "api":
+            return False
+        if self.modo == "worker":
+            return shard_de(f"agente:{nome}", self.shards) == self.shard
+        return True
+
+    def iniciar(self, grupo, ciclos, fixo=False):
+        """Cria as tasks [(classe, fabrica_de_coroutine), ...] se o grupo roda aqui"""
+        if not self.roda_grupo(grupo, fixo):
+            return False
+        for classe, fabrica in ciclos:
+            asyncio.create_task(com_prioridade(classe, fabrica()))
+            self.ciclos.setdefault(grupo, []).append(fabrica.__name__)
+        return True
+
+    # ------------------------------------------------------------
+    # Espelho (modo api)
+    # ------------------------------------------------------------
+
+    def espelhar(self, grupo, recarregar, sinal, prefixo=None, destinos=()):
+        """Registra recarga do estado que um worker grava; so age no modo api.
+
+        destinos: outros alvos de persistencia do grupo (ex: arquivo_ig_dms),
+        tambem so leitura - a recarga despeja dos aneis, mas quem arquiva e o worker.
+        """
+        if self.modo != "api" or grupo in self.espelhos:
+            return
+        from app.services.persistencia import persistencia
+        for nome in (grupo, *destinos):
+            persistencia.somente_leitura(nome)  # quem grava e o worker
+        self.espelhos[grupo] = _Espelho(grupo, recarregar, sinal, prefixo)
+        if self._task_sync is None or self._task_sync.done():
+            self._task_sync = asyncio.create_task(self._sincronizar())
+
+    async def _sincronizar(self):
+        while True:
+            await asyncio.sleep(SYNC_S)
+            for e in list(self.espelhos.values()):
+                try:
+                    atual = e.sinal()
+                    if atual == e.visto:
+                        continue
+                    inicio = time.perf_counter()
+                    await e.recarregar()
+                    e.visto = atual
+                    e.recargas += 1
+                    e.ultima_ms = (time.perf_counter() - inicio) * 1000
+                    e.ultima = time.time()
+                except Exception as ex:
+                    e.erros += 1
+                    print(f"[SIMULACAO] Erro ao recarregar {e.grupo}: {ex}")
+
+    def recusa(self, metodo, caminho):
+        """Modo api: escrita numa plataforma simulada por worker"""
+        if metodo in METODOS_LEITURA:
+            return False
+        for e in self.espelhos.values():
+            if e.prefixo and caminho.startswith(e.prefixo):
+                self.recusadas += 1
+                return True
+        return False
+
+    def stats(self):
+        return {
+            "modo": self.modo,
+            "shard": self.shard,
+            "shards": self.shards,
+            "ciclos": {g: len(c) for g, c in self.ciclos.items()},
+            "fora": self.fora,
+            "dono_de": sorted(g for g in set(self.ciclos) | set(self.fora) | set(self.espelhos) if self.dono(g)),
+            "escritas_recusadas": self.recusadas,
+            "espelhos": {
+                g: {"recargas": e.recargas, "erros": e.erros, "ultima_ms": round(e.ultima_ms, 1),
+                    "ultima": e.ultima, "prefixo": e.prefixo}
+                for g, e in self.espelhos.items()
+            },
+        }
+
+
+simulacao = Simulacao()
@@ -0,0 +1,92 @@
+"""
+Worker da simulacao - roda os ciclos autonomos fora do processo da API
+    SIMULACAO_SHARDS=2 python -m app.worker --shard 0
+    SIMULACAO_SHARDS=2 python -m app.worker --shard 1
+    SIMULACAO_MODO=api uvicorn app.main:app
+
+Cada worker sobe os mesmos routers (sem HTTP), roda os grupos de ciclos e
+os agentes custom do seu shard e grava no SQLite/JSON de sempre; a API em
+modo api recarrega o que mudou (ver app/services/simulacao.py).
+"""
+import argparse
+import asyncio
+import os
+import signal
+
+
+def _args():
+    ap = argparse.ArgumentParser(description="Worker da simulacao (ciclos autonomos + agentes custom)")
+    ap.add_argument("--shard", type=int, default=int(os.environ.get("SIMULACAO_SHARD", "0")))
+    ap.add_argument("--shards", type=int, default=int(os.environ.get("SIMULACAO_SHARDS", "1")))
+    return ap.parse_args()
+
+
+async def rodar():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app.database import init_db
+    from app.services.persistencia import persistencia
+    from app.services.colecoes import fechar_arquivos
+    from app.services.http_pool import http_pool
+    from app.services.llm_cache import cache_llm
+    from app.services.midia_pipeline import pipeline_midia
+    from app.services.jobs_midia import jobs_midia
+    from app.services.agendador_agentes import agendador_agentes
+    from app.services.simulacao import simulacao, SYNC_S
+    from app.services.agent_runner import runner
+    from app.routers import instagram, reddit, youtube, tiktok, smart_posts
+
+    await init_db()
+    await http_pool.iniciar()
+    persistencia.iniciar()
+    jobs_midia.retomar()
+    # Mesmos startups que a API registra nos routers; simulacao decide o que roda aqui
+    await instagram.ig_startup()
+    await reddit._reddit_startup()
+    await youtube.iniciar_youtube()
+    await tiktok.iniciar_tiktok()
+    await smart_posts.iniciar_scheduler()
+    print(f"[WORKER] Shard {simulacao.shard}/{simulacao.shards}: "
+          f"grupos {sorted(simulacao.ciclos) or '-'} | outros shards: {simulacao.fora or '-'}")
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, parar.set)
+        except NotImplementedError:
+            pass
+
+    while not parar.is_set():
+        r = runner.sincronizar_shard()
+        if r["iniciados"] or r["parados"]:
+            print(f"[WORKER] Agentes custom: +{r['iniciados']} -{r['parados']} "
+                  f"({len(agendador_agentes.nomes())} neste shard)")
+        try:
+            await asyncio.wait_for(parar.wait(), SYNC_S)
+        except asyncio.TimeoutError:
+            pass
+
+    print("[WORKER] Encerrando...")
+    await agendador_agentes.encerrar()
+    await jobs_midia.encerrar()
+    await instagram.ig_shutdown()
+    await persistencia.encerrar()
+    await cache_llm.fechar()
+    await fechar_arquivos()
+    await http_pool.encerrar()
+    pipeline_midia.encerrar()
+
+
+def main():
+    a = _args()
+    # Antes de importar app.*: os modulos leem o modo/shard no import
+    os.environ["SIMULACAO_MODO"] = "worker"
+    os.environ["SIMULACAO_SHARD"] = str(a.shard)
+    os.environ["SIMULACAO_SHARDS"] = str(a.shards)
+    asyncio.run(rodar())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Benchmark: latencia da API (p50/p95/p99) com a simulacao desligada, no mesmo processo e em workers
+
+Sobe o servidor em cada cenario, espera o startup, mede GETs de leitura
+com N clientes concorrentes e imprime a tabela no final.
+
+    python bench_simulacao.py                       # off, local, workers
+    python bench_simulacao.py --cenarios off,local --duracao 60 --workers 2
+
+Cenarios:
+  off      SIMULACAO_MODO=api sem workers (so atende HTTP)
+  local    SIMULACAO_MODO=local (ciclos no event loop da API, como sempre)
+  workers  SIMULACAO_MODO=api + N processos python -m app.worker
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+ROTAS = [
+    "/api/instagram/feed?limit=20",
+    "/api/reddit/feed?limit=20",
+    "/api/youtube/videos?limite=20",
+    "/api/posts/public?limit=20",
+    "/api/system/simulacao",
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    v = sorted(valores)
+    return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))]
+
+
+def subir(cenario, porta, workers):
+    env = {**os.environ, "DEBUG": "false", "SIMULACAO_MODO": "local" if cenario == "local" else "api"}
+    procs = [subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(porta),
+         "--log-level", "warning"],
+        cwd=DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)]
+    if cenario == "workers":
+        for i in range(workers):
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "app.worker", "--shard", str(i), "--shards", str(workers)],
+                cwd=DIR, env={**env, "SIMULACAO_MODO": "worker"},
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return procs
+
+
+def derrubar(procs):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+async def esperar_pronto(base, timeout=120):
+    fim = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        while time.monotonic() < fim:
+            try:
+                if (await client.get(f"{base}/api/system/simulacao")).status_code == 200:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(1)
+    return False
+
+
+async def medir(base, duracao, concorrencia):
+    lat = {r: [] for r in ROTAS}
+    erros = 0
+    fim = time.monotonic() + duracao
+
+    async def cliente(i):
+        nonlocal erros
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            k = i
+            while time.monotonic() < fim:
+                rota = ROTAS[k % len(ROTAS)]
+                k += 1
+                t = time.perf_counter()
+                try:
+                    resp = await client.get(f"{base}{rota}")
+                    if resp.status_code >= 500:
+                        erros += 1
+                except httpx.HTTPError:
+                    erros += 1
+                    continue
+                lat[rota].append((time.perf_counter() - t) * 1000)
+
+    await asyncio.gather(*[cliente(i) for i in range(concorrencia)])
+    return lat, erros
+
+
+async def cenario(nome, args, porta):
+    procs = subir(nome, porta, args.workers)
+    base = f"http://127.0.0.1:{porta}"
+    try:
+        if not await esperar_pronto(base):
+            print(f"[BENCH] {nome}: servidor nao subiu")
+            return None
+        print(f"[BENCH] {nome}: aquecendo {args.aquecimento}s (ciclos iniciando)...")
+        await asyncio.sleep(args.aquecimento)
+        print(f"[BENCH] {nome}: medindo {args.duracao}s com {args.concorrencia} clientes...")
+        return await medir(base, args.duracao, args.concorrencia)
+    finally:
+        derrubar(procs)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--cenarios", default="off,local,workers")
+    ap.add_argument("--duracao", type=float, default=30)
+    ap.add_argument("--aquecimento", type=float, default=20)
+    ap.add_argument("--concorrencia", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--porta", type=int, default=8765)
+    args = ap.parse_args()
+
+    resultados = {}
+    for i, nome in enumerate(args.cenarios.split(",")):
+        r = await cenario(nome.strip(), args, args.porta + i)
+        if r is not None:
+            resultados[nome.strip()] = r
+
+    print(f"\n=== API LATENCY (ms) ===")
+    print(f"{'scenario':<10} {'route':<32} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for nome, (lat, erros) in resultados.items():
+        todas = [v for vs in lat.values() for v in vs]
+        for rota, vs in lat.items():
+            print(f"{nome:<10} {rota[:32]:<32} {len(vs):>6} {percentil(vs, 50):>8.1f} "
+                  f"{percentil(vs, 95):>8.1f} {percentil(vs, 99):>8.1f}")
+        print(f"{nome:<10} {'ALL (' + str(erros) + ' errors)':<32} {len(todas):>6} {percentil(todas, 50):>8.1f} "
+              f"{percentil(todas, 95):>8.1f} {percentil(todas, 99):>8.1f}\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
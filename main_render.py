@@ -6,7 +6,12 @@ Now with user authentication and interaction endpoints
 import os
 import json
 import uuid
+import base64
+import hashlib
+import time
 import aiosqlite
+from bisect import bisect_left
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Query, Header, Body
@@ -30,6 +35,22 @@ TRENDING = []
 AGENTES_IG = {}
 USER_FOLLOWS = {}   # user_id -> [agent_ids]
 USER_SAVES = {}     # user_id -> [post_ids]
+FEED_KEYS = []      # (created_at, id) ascending - keyset pagination
+REEL_KEYS = []      # same, reels only
+POSTS_BY_ID = {}
+LEGACY_POSTS = set()  # comments/likes still only in the ig_posts JSON columns
+
+# Lazy load: keep only the newest HOT_POSTS posts (and the newest DMs) in memory;
+# older posts, DM threads and per-user follows/saves come from SQLite on demand
+LAZY_LOAD = os.environ.get("IG_LAZY_LOAD", "0") == "1"
+HOT_POSTS = int(os.environ.get("IG_HOT_POSTS", "500"))
+HOT_DMS = int(os.environ.get("IG_HOT_DMS", "500"))
+COLD_LRU = int(os.environ.get("IG_COLD_LRU", "256"))
+COLD = {"posts": 0, "hits": 0, "misses": 0}
+COLD_POSTS = OrderedDict()   # post_id -> post (shared by pages and single lookups)
+COLD_PAGES = OrderedDict()   # query key -> (post ids | rows, next key)
+LOADED_USERS = OrderedDict()  # user_id -> None; follows/saves in memory (lazy mode)
+LOAD_STATS = {}
 
 # 6 AI agents config
 AGENTES_CONFIG = [
@@ -75,6 +96,7 @@ async def load_data():
     if not os.path.exists(DB_PATH):
         print("[IG] No instagram.db found, starting empty")
         return
+    started = time.perf_counter()
     db = await aiosqlite.connect(DB_PATH)
     db.row_factory = aiosqlite.Row
 
@@ -100,6 +122,24 @@ async def load_data():
         post_id TEXT NOT NULL,
         PRIMARY KEY (user_id, post_id)
     )""")
+    # Normalized comments/likes (same schema as app/routers/instagram_db.py)
+    await db.executescript("""
+        CREATE TABLE IF NOT EXISTS ig_comments (
+            id TEXT PRIMARY KEY, post_id TEXT NOT NULL, agente_id TEXT,
+            ordem INTEGER NOT NULL, created_at TEXT, dados TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_comments_post ON ig_comments(post_id, ordem);
+        CREATE INDEX IF NOT EXISTS idx_comments_agente ON ig_comments(agente_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_comments_created ON ig_comments(created_at);
+        CREATE TABLE IF NOT EXISTS ig_comment_replies (
+            id TEXT PRIMARY KEY, comment_id TEXT NOT NULL, post_id TEXT NOT NULL, agente_id TEXT,
+            ordem INTEGER NOT NULL, created_at TEXT, dados TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_replies_comment ON ig_comment_replies(comment_id, ordem);
+        CREATE INDEX IF NOT EXISTS idx_replies_post ON ig_comment_replies(post_id);
+        CREATE INDEX IF NOT EXISTS idx_replies_agente ON ig_comment_replies(agente_id, created_at);
+        CREATE TABLE IF NOT EXISTS ig_post_likes (
+            post_id TEXT NOT NULL, agente_id TEXT NOT NULL, PRIMARY KEY (post_id, agente_id));
+        CREATE INDEX IF NOT EXISTS idx_post_likes_agente ON ig_post_likes(agente_id);
+    """)
     # Add is_premium column if missing (existing DBs)
     try:
         await db.execute("ALTER TABLE users ADD COLUMN is_premium INTEGER DEFAULT 0")
@@ -108,21 +148,24 @@ async def load_data():
         pass  # column already exists
     await db.commit()
 
-    # Posts
-    async with db.execute("SELECT * FROM ig_posts ORDER BY sort_order ASC") as cur:
+    # Posts (lazy: only the hot window, newest by created_at)
+    hot = ("SELECT id FROM ig_posts ORDER BY created_at DESC, id DESC LIMIT ?", (HOT_POSTS,)) if LAZY_LOAD else None
+    sql = f"SELECT * FROM ig_posts WHERE id IN ({hot[0]}) ORDER BY sort_order ASC" if hot else \
+        "SELECT * FROM ig_posts ORDER BY sort_order ASC"
+    async with db.execute(sql, hot[1] if hot else ()) as cur:
         async for row in cur:
-            p = dict(row)
-            p["liked_by"] = json.loads(p["liked_by"] or "[]")
-            p["comments"] = json.loads(p["comments"] or "[]")
-            p["carousel_urls"] = json.loads(p["carousel_urls"]) if p.get("carousel_urls") else None
-            p["collab"] = json.loads(p["collab"]) if p.get("collab") else None
-            p["is_ai"] = bool(p.get("is_ai", 1))
-            p.pop("sort_order", None)
+            p = row_to_post(row)
             POSTS.append(p)
             ALL_AGENT_IDS.add(p.get("agente_id", ""))
-
-    # Stories
-    async with db.execute("SELECT * FROM ig_stories ORDER BY created_at DESC") as cur:
+    await attach_comments(db, {p["id"]: p for p in POSTS}, hot)
+    if LAZY_LOAD:
+        async with db.execute("SELECT COUNT(*) FROM ig_posts") as cur:
+            COLD["posts"] = max(0, (await cur.fetchone())[0] - len(POSTS))
+        async with db.execute("SELECT DISTINCT agente_id FROM ig_posts") as cur:
+            ALL_AGENT_IDS.update([row[0] or "" async for row in cur])
+
+    # Stories (only the 50 newest are ever served)
+    async with db.execute("SELECT * FROM ig_stories ORDER BY created_at DESC" + (" LIMIT 50" if LAZY_LOAD else "")) as cur:
         async for row in cur:
             s = dict(row)
             s["enquete"] = json.loads(s["enquete"]) if s.get("enquete") else None
@@ -130,7 +173,10 @@ async def load_data():
             STORIES.append(s)
 
     # DMs
-    async with db.execute("SELECT * FROM ig_dms ORDER BY created_at ASC") as cur:
+    sql = "SELECT * FROM ig_dms ORDER BY created_at ASC"
+    if LAZY_LOAD:
+        sql = f"SELECT * FROM (SELECT * FROM ig_dms ORDER BY created_at DESC LIMIT {HOT_DMS}) ORDER BY created_at ASC"
+    async with db.execute(sql) as cur:
         async for row in cur:
             d = dict(row)
             d["lida"] = bool(d.get("lida", 0))
@@ -151,18 +197,103 @@ async def load_data():
         async for row in cur:
             AGENTES_IG[row["agente_id"]] = {"seguidores": row["seguidores"], "seguindo": row["seguindo"]}
 
-    # User follows
-    async with db.execute("SELECT * FROM user_follows") as cur:
-        async for row in cur:
-            USER_FOLLOWS.setdefault(row["user_id"], []).append(row["agent_id"])
+    # User follows / saves (lazy: per user, see load_user)
+    if not LAZY_LOAD:
+        async with db.execute("SELECT * FROM user_follows") as cur:
+            async for row in cur:
+                USER_FOLLOWS.setdefault(row["user_id"], []).append(row["agent_id"])
+        async with db.execute("SELECT * FROM user_saves") as cur:
+            async for row in cur:
+                USER_SAVES.setdefault(row["user_id"], []).append(row["post_id"])
+
+    await db.close()
+    build_feed_index()
+    LOAD_STATS.update({"mode": "lazy" if LAZY_LOAD else "full", "seconds": round(time.perf_counter() - started, 3),
+                       "rss_mb": rss_mb(), "posts": len(POSTS), "cold_posts": COLD["posts"],
+                       "stories": len(STORIES), "dms": len(DMS)})
+    print(f"[IG] Loaded: {len(POSTS)} posts, {len(STORIES)} stories, {len(DMS)} DMs "
+          f"({LOAD_STATS['mode']}, {LOAD_STATS['seconds'] * 1000:.0f}ms, RSS {LOAD_STATS['rss_mb']}MB"
+          + (f", {COLD['posts']} cold posts on disk)" if LAZY_LOAD else ")"))
 
-    # User saves
-    async with db.execute("SELECT * FROM user_saves") as cur:
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def row_to_post(row):
+    p = dict(row)
+    # Legacy JSON columns; replaced by the normalized tables when present (attach_comments)
+    p["liked_by"] = json.loads(p["liked_by"] or "[]")
+    p["comments"] = json.loads(p["comments"] or "[]")
+    p["carousel_urls"] = json.loads(p["carousel_urls"]) if p.get("carousel_urls") else None
+    p["collab"] = json.loads(p["collab"]) if p.get("collab") else None
+    p["is_ai"] = bool(p.get("is_ai", 1))
+    p.pop("sort_order", None)
+    return p
+
+
+async def attach_comments(db, by_id, only=None):
+    """Comments, replies and likes from the normalized tables; only = (post id subquery, args)"""
+    where, args = (f" WHERE post_id IN ({only[0]})", only[1]) if only else ("", ())
+    comments, comments_by_id, likes = {}, {}, {}
+    async with db.execute(f"SELECT id, post_id, dados FROM ig_comments{where} ORDER BY post_id, ordem", args) as cur:
+        async for row in cur:
+            c = json.loads(row["dados"])
+            comments.setdefault(row["post_id"], []).append(c)
+            comments_by_id[row["id"]] = c
+    async with db.execute(f"SELECT comment_id, dados FROM ig_comment_replies{where} ORDER BY comment_id, ordem", args) as cur:
+        async for row in cur:
+            if row["comment_id"] in comments_by_id:
+                comments_by_id[row["comment_id"]].setdefault("replies", []).append(json.loads(row["dados"]))
+    async with db.execute(f"SELECT post_id, agente_id FROM ig_post_likes{where} ORDER BY rowid", args) as cur:
         async for row in cur:
-            USER_SAVES.setdefault(row["user_id"], []).append(row["post_id"])
+            likes.setdefault(row["post_id"], []).append(row["agente_id"])
+    for pid, p in by_id.items():
+        if pid in comments or pid in likes:
+            p["comments"] = comments.get(pid, [])
+            p["liked_by"] = likes.get(pid, [])
+        elif p["comments"] or p["liked_by"]:
+            LEGACY_POSTS.add(pid)
 
-    await db.close()
-    print(f"[IG] Loaded: {len(POSTS)} posts, {len(STORIES)} stories, {len(DMS)} DMs")
+
+def build_feed_index():
+    """Sorted (created_at, id) keys for cursor pages; POSTS is read-only after load"""
+    POSTS_BY_ID.clear()
+    POSTS_BY_ID.update((p["id"], p) for p in POSTS if p.get("id"))
+    FEED_KEYS[:] = sorted((p.get("created_at") or "", pid) for pid, p in POSTS_BY_ID.items())
+    REEL_KEYS[:] = [k for k in FEED_KEYS if POSTS_BY_ID[k[1]].get("tipo") == "reel"]
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        created, pid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created), str(pid)
+    except Exception:
+        return None
+
+
+def key_page(keys, before, limit):
+    """Newest first, strictly older than `before`; returns (posts, next_cursor)"""
+    end = len(keys) if before is None else bisect_left(keys, before)
+    start = max(0, end - limit)
+    posts = [POSTS_BY_ID[k[1]] for k in reversed(keys[start:end])]
+    return posts, (encode_cursor(keys[start]) if start > 0 else None)
+
+
+def offset_page(keys, start, limit):
+    """Legacy offset page over the same newest-first order"""
+    end = max(0, len(keys) - start)
+    return [POSTS_BY_ID[k[1]] for k in reversed(keys[max(0, end - limit):end])]
 
 
 async def get_db():
@@ -171,6 +302,159 @@ async def get_db():
     return db
 
 
+# ===================== LAZY MODE: COLD DATA ON DEMAND =====================
+
+def lru_put(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > COLD_LRU:
+        cache.popitem(last=False)
+
+
+async def cold_posts(ids):
+    """Posts outside the hot window by id, through COLD_POSTS (one query for the misses)"""
+    found, missing = {}, []
+    for pid in ids:
+        if pid in COLD_POSTS:
+            COLD_POSTS.move_to_end(pid)
+            found[pid] = COLD_POSTS[pid]
+            COLD["hits"] += 1
+        else:
+            missing.append(pid)
+    if missing:
+        COLD["misses"] += len(missing)
+        marks = ",".join("?" * len(missing))
+        db = await get_db()
+        async with db.execute(f"SELECT * FROM ig_posts WHERE id IN ({marks})", missing) as cur:
+            fetched = {row["id"]: row_to_post(row) for row in await cur.fetchall()}
+        await attach_comments(db, fetched, (marks, tuple(missing)))
+        await db.close()
+        for pid, p in fetched.items():
+            lru_put(COLD_POSTS, pid, p)
+            found[pid] = p
+    return [found[pid] for pid in ids if pid in found]
+
+
+def cold_floor():
+    """(created_at, id) of the oldest hot post: everything older is cold"""
+    return FEED_KEYS[0] if FEED_KEYS else ("\uffff", "")
+
+
+async def cold_page(before, limit, tipo=None, agent_id=None):
+    """Newest-first cold posts older than `before`; returns (posts, next key)"""
+    before = min(before, cold_floor()) if before else cold_floor()
+    key = ("page", before, limit, tipo, agent_id)
+    if key in COLD_PAGES:
+        COLD_PAGES.move_to_end(key)
+        ids, nxt = COLD_PAGES[key]
+    else:
+        where, args = "(created_at < ? OR (created_at = ? AND id < ?))", [before[0], before[0], before[1]]
+        if tipo:
+            where, args = where + " AND tipo = ?", args + [tipo]
+        if agent_id:
+            where, args = where + " AND agente_id = ?", args + [agent_id]
+        db = await get_db()
+        async with db.execute(f"SELECT id, created_at FROM ig_posts WHERE {where} "
+                              f"ORDER BY created_at DESC, id DESC LIMIT ?", args + [limit + 1]) as cur:
+            rows = await cur.fetchall()
+        await db.close()
+        ids = [r["id"] for r in rows[:limit]]
+        nxt = (rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+        lru_put(COLD_PAGES, key, (ids, nxt))
+    return await cold_posts(ids), nxt
+
+
+async def cold_count(agent_id):
+    key = ("count", agent_id)
+    if key not in COLD_PAGES:
+        floor = cold_floor()
+        db = await get_db()
+        async with db.execute("SELECT COUNT(*) FROM ig_posts WHERE agente_id = ? AND "
+                              "(created_at < ? OR (created_at = ? AND id < ?))",
+                              (agent_id, floor[0], floor[0], floor[1])) as cur:
+            lru_put(COLD_PAGES, key, ((await cur.fetchone())[0], None))
+        await db.close()
+    return COLD_PAGES[key][0]
+
+
+async def page_with_cold(keys, before, size, tipo=None):
+    """key_page over the hot window, continued into SQLite in lazy mode"""
+    posts, next_cursor = key_page(keys, before, size)
+    if next_cursor is None and LAZY_LOAD and COLD["posts"]:
+        if len(posts) < size:
+            more, nxt = await cold_page(before, size - len(posts), tipo)
+            posts = posts + more
+            next_cursor = encode_cursor(nxt) if nxt else None
+        elif posts:
+            next_cursor = encode_cursor((posts[-1].get("created_at") or "", posts[-1]["id"]))
+    return posts, next_cursor
+
+
+async def find_post(post_id):
+    post = POSTS_BY_ID.get(post_id)
+    if post is None and LAZY_LOAD and COLD["posts"]:
+        found = await cold_posts([post_id])
+        post = found[0] if found else None
+    return post
+
+
+async def load_user(user_id):
+    """Lazy mode: follows/saves of one user, kept for the COLD_LRU most recent users"""
+    if not LAZY_LOAD or not user_id:
+        return
+    if user_id in LOADED_USERS:
+        LOADED_USERS.move_to_end(user_id)
+        return
+    db = await get_db()
+    async with db.execute("SELECT agent_id FROM user_follows WHERE user_id = ?", (user_id,)) as cur:
+        USER_FOLLOWS[user_id] = [r[0] for r in await cur.fetchall()]
+    async with db.execute("SELECT post_id FROM user_saves WHERE user_id = ?", (user_id,)) as cur:
+        USER_SAVES[user_id] = [r[0] for r in await cur.fetchall()]
+    await db.close()
+    LOADED_USERS[user_id] = None
+    while len(LOADED_USERS) > COLD_LRU:
+        old, _ = LOADED_USERS.popitem(last=False)
+        USER_FOLLOWS.pop(old, None)
+        USER_SAVES.pop(old, None)
+
+
+def comment_id(owner, c):
+    """Same derivation as instagram_db._id_item for old comments without an id"""
+    if c.get("id"):
+        return str(c["id"])
+    base = json.dumps([owner, c.get("agente_id"), c.get("created_at"), c.get("texto")], ensure_ascii=False)
+    return "h_" + hashlib.blake2b(base.encode(), digest_size=8).hexdigest()
+
+
+async def migrate_post(db, post):
+    """First write to a legacy post: move its JSON columns to the normalized tables"""
+    if post["id"] not in LEGACY_POSTS:
+        return
+    LEGACY_POSTS.discard(post["id"])
+    for c in post.get("comments", []):
+        await save_comment(db, post, c)
+        cid = comment_id(post["id"], c)
+        for j, r in enumerate(c.get("replies") or []):
+            await db.execute(
+                "INSERT OR REPLACE INTO ig_comment_replies (id,comment_id,post_id,agente_id,ordem,created_at,dados) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (comment_id(cid, r), cid, post["id"], r.get("agente_id"), j, r.get("created_at"),
+                 json.dumps(r, ensure_ascii=False)))
+    await db.executemany("INSERT OR IGNORE INTO ig_post_likes (post_id,agente_id) VALUES (?,?)",
+                         [(post["id"], a) for a in post.get("liked_by", [])])
+    await db.execute("UPDATE ig_posts SET comments='[]', liked_by='[]' WHERE id=?", (post["id"],))
+
+
+async def save_comment(db, post, c):
+    """One ig_comments row (insert or in-place update) - the array is never rewritten"""
+    await migrate_post(db, post)
+    dados = {k: ([] if k == "replies" else v) for k, v in c.items()}
+    await db.execute(
+        "INSERT OR REPLACE INTO ig_comments (id,post_id,agente_id,ordem,created_at,dados) VALUES (?,?,?,?,?,?)",
+        (comment_id(post["id"], c), post["id"], c.get("agente_id"), post["comments"].index(c), c.get("created_at"),
+         json.dumps(dados, ensure_ascii=False)))
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await load_data()
@@ -279,6 +563,7 @@ async def me(authorization: str = Header(None)):
         return JSONResponse({"error": "User not found"}, 404)
 
     u = dict(row)
+    await load_user(user["id"])
     u["following"] = USER_FOLLOWS.get(user["id"], [])
     u["saved_posts"] = USER_SAVES.get(user["id"], [])
     return {"user": u}
@@ -292,7 +577,7 @@ async def like_post(post_id: str, authorization: str = Header(None)):
     user_id = user["id"] if user else "anon"
     username = user["username"] if user else "visitor"
 
-    post = next((p for p in POSTS if p.get("id") == post_id), None)
+    post = await find_post(post_id)
     if not post:
         return JSONResponse({"error": "Post not found"}, 404)
 
@@ -301,8 +586,9 @@ async def like_post(post_id: str, authorization: str = Header(None)):
         post["likes"] = post.get("likes", 0) + 1
         # Persist to DB
         db = await get_db()
-        await db.execute("UPDATE ig_posts SET likes=?, liked_by=? WHERE id=?",
-                         (post["likes"], json.dumps(post["liked_by"]), post_id))
+        await migrate_post(db, post)
+        await db.execute("UPDATE ig_posts SET likes=? WHERE id=?", (post["likes"], post_id))
+        await db.execute("INSERT OR IGNORE INTO ig_post_likes (post_id,agente_id) VALUES (?,?)", (post_id, user_id))
         await db.commit()
         await db.close()
 
@@ -316,6 +602,7 @@ async def follow_agent(agente_id: str, authorization: str = Header(None)):
         return JSONResponse({"error": "Login required"}, 401)
 
     user_id = user["id"]
+    await load_user(user_id)
     follows = USER_FOLLOWS.setdefault(user_id, [])
     if agente_id not in follows:
         follows.append(agente_id)
@@ -341,6 +628,7 @@ async def unfollow_agent(agente_id: str, authorization: str = Header(None)):
         return JSONResponse({"error": "Login required"}, 401)
 
     user_id = user["id"]
+    await load_user(user_id)
     follows = USER_FOLLOWS.get(user_id, [])
     if agente_id in follows:
         follows.remove(agente_id)
@@ -363,6 +651,7 @@ async def save_post(post_id: str, authorization: str = Header(None)):
     if not user:
         return JSONResponse({"error": "Login required"}, 401)
 
+    await load_user(user["id"])
     saves = USER_SAVES.setdefault(user["id"], [])
     if post_id not in saves:
         saves.append(post_id)
@@ -379,6 +668,7 @@ async def unsave_post(post_id: str, authorization: str = Header(None)):
     if not user:
         return JSONResponse({"error": "Login required"}, 401)
 
+    await load_user(user["id"])
     saves = USER_SAVES.get(user["id"], [])
     if post_id in saves:
         saves.remove(post_id)
@@ -394,6 +684,7 @@ async def my_following(authorization: str = Header(None)):
     user = await get_current_user(authorization)
     if not user:
         return {"following": []}
+    await load_user(user["id"])
     return {"following": USER_FOLLOWS.get(user["id"], [])}
 
 
@@ -402,13 +693,14 @@ async def my_saved(authorization: str = Header(None)):
     user = await get_current_user(authorization)
     if not user:
         return {"saved": []}
+    await load_user(user["id"])
     return {"saved": USER_SAVES.get(user["id"], [])}
 
 
 @app.post("/api/instagram/comment/{post_id}")
 async def comment_post(post_id: str, body: dict = Body(None), authorization: str = Header(None)):
     user = await get_current_user(authorization)
-    post = next((p for p in POSTS if p.get("id") == post_id), None)
+    post = await find_post(post_id)
     if not post:
         return JSONResponse({"error": "Post not found"}, 404)
 
@@ -432,8 +724,7 @@ async def comment_post(post_id: str, body: dict = Body(None), authorization: str
 
     # Persist
     db = await get_db()
-    await db.execute("UPDATE ig_posts SET comments=? WHERE id=?",
-                     (json.dumps(post["comments"]), post_id))
+    await save_comment(db, post, comment)
     await db.commit()
     await db.close()
 
@@ -457,15 +748,21 @@ async def upgrade_premium(authorization: str = Header(None)):
 # ===================== READ-ONLY ENDPOINTS =====================
 
 @app.get("/api/instagram/feed")
-async def feed(page: int = Query(1, ge=1), per_page: int = Query(20, ge=1, le=50), limit: int = Query(0), offset: int = Query(0)):
-    # Support both page/per_page and limit/offset
-    if limit > 0:
-        start = offset
-        end = offset + limit
+async def feed(page: int = Query(1, ge=1), per_page: int = Query(20, ge=1, le=50), limit: int = Query(0), offset: int = Query(0),
+               cursor: str = Query("")):
+    # cursor (next_cursor of the previous page) is stable; page/per_page and limit/offset kept for old clients
+    size = limit if limit > 0 else per_page
+    if cursor or (offset == 0 and page == 1):
+        before = decode_cursor(cursor) if cursor else None
+        if cursor and before is None:
+            return JSONResponse({"error": "invalid cursor"}, 400)
+        all_p, next_cursor = await page_with_cold(FEED_KEYS, before, size)
+        has_more, first = next_cursor is not None, not cursor
     else:
-        start = (page - 1) * per_page
-        end = start + per_page
-    all_p = POSTS[start:end]
+        start = offset if limit > 0 else (page - 1) * per_page
+        all_p = offset_page(FEED_KEYS, start, size)
+        next_cursor, first = None, False
+        has_more = start + size < len(FEED_KEYS)
     # Ensure comments are never None
     for p in all_p:
         if p.get("comentarios") is None:
@@ -475,8 +772,9 @@ async def feed(page: int = Query(1, ge=1), per_page: int = Query(20, ge=1, le=50
     reels = [p for p in all_p if p.get("tipo") == "reel"]
     posts = [p for p in all_p if p.get("tipo") != "reel"]
     # Only return stories on first page
-    stories = STORIES[:50] if start == 0 else []
-    return {"posts": posts, "reels": reels, "stories": stories, "total": len(POSTS), "page": page, "per_page": per_page, "has_more": end < len(POSTS)}
+    stories = STORIES[:50] if first else []
+    return {"posts": posts, "reels": reels, "stories": stories, "total": len(POSTS), "page": page, "per_page": per_page,
+            "has_more": has_more, "next_cursor": next_cursor}
 
 
 @app.get("/api/instagram/stories")
@@ -520,10 +818,16 @@ async def agents():
 
 
 @app.get("/api/instagram/reels")
-async def reels(page: int = Query(1, ge=1)):
-    r = [p for p in POSTS if p.get("tipo") == "reel"]
+async def reels(page: int = Query(1, ge=1), cursor: str = Query("")):
+    if cursor or page == 1:
+        before = decode_cursor(cursor) if cursor else None
+        if cursor and before is None:
+            return JSONResponse({"error": "invalid cursor"}, 400)
+        r, next_cursor = await page_with_cold(REEL_KEYS, before, 20, tipo="reel")
+        return {"reels": r, "total": len(REEL_KEYS), "has_more": next_cursor is not None, "next_cursor": next_cursor}
     start = (page - 1) * 20
-    return {"reels": r[start:start+20], "total": len(r), "has_more": start+20 < len(r)}
+    return {"reels": offset_page(REEL_KEYS, start, 20), "total": len(REEL_KEYS),
+            "has_more": start+20 < len(REEL_KEYS)}
 
 
 @app.get("/api/instagram/explore")
@@ -544,6 +848,8 @@ async def profile(agent_id: str):
     if not agent:
         # Check guest agents
         agent_posts = [p for p in POSTS if p.get("agente_id") == agent_id]
+        if not agent_posts and LAZY_LOAD and COLD["posts"]:
+            agent_posts, _ = await cold_page(None, 1, agent_id=agent_id)
         if agent_posts:
             s = agent_posts[0]
             agent = {"id": agent_id, "nome": s.get("agente_nome", agent_id), "username": s.get("username", agent_id),
@@ -552,13 +858,18 @@ async def profile(agent_id: str):
             return JSONResponse({"error": "Agent not found"}, 404)
     rt = AGENTES_IG.get(agent_id, {})
     agent_posts = [p for p in POSTS if p.get("agente_id") == agent_id]
+    count = len(agent_posts)
+    if LAZY_LOAD and COLD["posts"]:
+        older, _ = await cold_page(None, 30, agent_id=agent_id)  # first cold page; the rest stays on disk
+        agent_posts += older
+        count += await cold_count(agent_id)
     return {**agent, "seguidores": rt.get("seguidores", 0), "seguindo": rt.get("seguindo", 0),
-            "posts": agent_posts, "posts_count": len(agent_posts)}
+            "posts": agent_posts, "posts_count": count}
 
 
 @app.get("/api/instagram/post/{post_id}")
 async def get_post(post_id: str):
-    post = next((p for p in POSTS if p.get("id") == post_id), None)
+    post = await find_post(post_id)
     if not post:
         return JSONResponse({"error": "Post not found"}, 404)
     return {"post": post}
@@ -578,6 +889,18 @@ async def conversas():
 
 @app.get("/api/instagram/dms/{a1}/{a2}")
 async def dm_chat(a1: str, a2: str):
+    if LAZY_LOAD:
+        # Only the newest DMs are in memory; the thread comes from SQLite (LRU)
+        key = ("dm",) + tuple(sorted((a1, a2)))
+        if key not in COLD_PAGES:
+            db = await get_db()
+            async with db.execute("SELECT * FROM ig_dms WHERE (de=? AND para=?) OR (de=? AND para=?) "
+                                  "ORDER BY created_at DESC LIMIT 100", (a1, a2, a2, a1)) as cur:
+                rows = [{**dict(r), "lida": bool(r["lida"])} for r in await cur.fetchall()]
+            await db.close()
+            lru_put(COLD_PAGES, key, (rows[::-1], None))
+        COLD_PAGES.move_to_end(key)
+        return {"mensagens": COLD_PAGES[key][0]}
     msgs = [d for d in DMS if (d.get("de") == a1 and d.get("para") == a2) or (d.get("de") == a2 and d.get("para") == a1)]
     return {"mensagens": msgs[-100:]}
 
@@ -655,14 +978,14 @@ async def agentes_list():
 
 @app.post("/api/instagram/comment/{post_id}/{com_id}/like")
 async def like_comment(post_id: str, com_id: str, authorization: str = Header(None)):
-    post = next((p for p in POSTS if p.get("id") == post_id), None)
+    post = await find_post(post_id)
     if not post:
         return JSONResponse({"error": "Post not found"}, 404)
     for c in post.get("comments", []):
         if c.get("id") == com_id:
             c["likes"] = c.get("likes", 0) + 1
             db = await get_db()
-            await db.execute("UPDATE ig_posts SET comments=? WHERE id=?", (json.dumps(post["comments"]), post_id))
+            await save_comment(db, post, c)
             await db.commit()
             await db.close()
             return {"ok": True, "likes": c["likes"]}
@@ -671,7 +994,7 @@ async def like_comment(post_id: str, com_id: str, authorization: str = Header(No
 
 @app.post("/api/instagram/comment/{post_id}/reply/{com_id}")
 async def reply_comment(post_id: str, com_id: str, agente_id: str = Query("llama")):
-    post = next((p for p in POSTS if p.get("id") == post_id), None)
+    post = await find_post(post_id)
     if not post:
         return JSONResponse({"error": "Post not found"}, 404)
     reply = {
@@ -686,7 +1009,7 @@ async def reply_comment(post_id: str, com_id: str, agente_id: str = Query("llama
     }
     post.setdefault("comments", []).append(reply)
     db = await get_db()
-    await db.execute("UPDATE ig_posts SET comments=? WHERE id=?", (json.dumps(post["comments"]), post_id))
+    await save_comment(db, post, reply)
     await db.commit()
     await db.close()
     return {"ok": True, "reply": reply}
@@ -695,10 +1018,13 @@ async def reply_comment(post_id: str, com_id: str, agente_id: str = Query("llama
 @app.get("/api/instagram/following/{user_id}")
 async def following_legacy(user_id: str):
     """Legacy endpoint for compatibility"""
+    await load_user(user_id)
     return {"following": USER_FOLLOWS.get(user_id, [])}
 
 
 # Health check
 @app.get("/health")
 async def health():
-    return {"status": "ok", "posts": len(POSTS), "stories": len(STORIES)}
+    return {"status": "ok", "posts": len(POSTS), "stories": len(STORIES),
+            "load": LOAD_STATS, "rss_mb": rss_mb(),
+            "cold": {**COLD, "cached_posts": len(COLD_POSTS), "cached_pages": len(COLD_PAGES)}}
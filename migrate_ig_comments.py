@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""One-time migration: ig_posts.comments/liked_by (JSON) -> ig_comments, ig_comment_replies, ig_post_likes
+
+O servidor tambem migra sozinho (no load + primeiro flush); este script faz
+tudo de uma vez, com o servidor parado. Pode rodar de novo sem duplicar.
+"""
+import json, sqlite3, os, sys
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIR)
+from app.routers.instagram_db import (DB_PATH, SQL_TABELAS_COMENTARIOS, SQL_UPSERT_COMMENT,
+                                      SQL_UPSERT_REPLY, SQL_INSERT_LIKE, linhas_do_post)
+
+
+def migrate():
+    if not os.path.exists(DB_PATH):
+        print(f"ERROR: {DB_PATH} not found")
+        sys.exit(1)
+
+    db = sqlite3.connect(DB_PATH)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SQL_TABELAS_COMENTARIOS)
+
+    posts = coms = reps = likes = 0
+    linhas = db.execute("SELECT id, comments, liked_by FROM ig_posts "
+                        "WHERE comments NOT IN ('', '[]') OR liked_by NOT IN ('', '[]')").fetchall()
+    for pid, comments, liked_by in linhas:
+        p = {"id": pid, "comments": json.loads(comments or "[]"), "liked_by": json.loads(liked_by or "[]")}
+        linhas_c, linhas_r, pares = linhas_do_post(p)
+        db.executemany(SQL_UPSERT_COMMENT, linhas_c)
+        db.executemany(SQL_UPSERT_REPLY, linhas_r)
+        db.executemany(SQL_INSERT_LIKE, pares)
+        db.execute("UPDATE ig_posts SET comments='[]', liked_by='[]' WHERE id=?", (pid,))
+        posts += 1
+        coms += len(linhas_c)
+        reps += len(linhas_r)
+        likes += len(pares)
+    db.commit()
+
+    counts = {}
+    for table in ["ig_comments", "ig_comment_replies", "ig_post_likes"]:
+        counts[table] = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    db.execute("VACUUM")
+    db.close()
+
+    print(f"\n=== MIGRATION COMPLETE ===")
+    print(f"Posts migrated: {posts} ({coms} comments, {reps} replies, {likes} likes)")
+    for table, count in counts.items():
+        print(f"  {table}: {count} rows")
+
+
+if __name__ == "__main__":
+    migrate()
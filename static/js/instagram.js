@@ -456,6 +456,90 @@ function setupImageBlur(img) {
 function ia(n) { return IAS[n] || {e:'\u{1F916}', g:'g-default', h:(n||'ia').toLowerCase().replace(/\s+/g,'.'), v:0, a:null}; }
 function ava(c) { if (c && c.a) return '<img src="'+c.a+'" style="width:100%;height:100%;border-radius:50%;object-fit:cover">'; return (c && c.e) || '\u{1F916}'; }
 function mu(u) { if (!u) return null; return u.startsWith('http') ? u : SV + u; }
+
+// ===================== RENDICOES (srcset) + BLURHASH =====================
+var TAM_FEED = '(max-width: 630px) 100vw, 630px';
+var TAM_GRADE = '(max-width: 630px) 33vw, 210px';
+var TAM_GRADE_GRANDE = '(max-width: 630px) 66vw, 420px';
+
+// 'url 150w, url 640w' -> mesmas entradas com o prefixo do servidor
+function muSet(s) {
+    if (!s) return '';
+    return s.split(',').map(function(e) { e = e.trim(); var i = e.lastIndexOf(' '); return mu(e.substring(0, i)) + e.substring(i); }).join(', ');
+}
+
+var _B83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+function _b83(s, a, b) { var v = 0; for (var i = a; i < b; i++) v = v * 83 + _B83.indexOf(s.charAt(i)); return v; }
+function _linear(v) { v /= 255; return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4); }
+function _srgb(v) { v = Math.max(0, Math.min(1, v)); return Math.round((v <= 0.0031308 ? v * 12.92 : 1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255); }
+function _sinalPow(v, e) { return (v < 0 ? -1 : 1) * Math.pow(Math.abs(v), e); }
+
+// blurhash (https://blurha.sh) -> dataURL 32x32, com cache por hash
+var _blurCache = {};
+function blurUrl(hash) {
+    if (!hash || hash.length < 6) return '';
+    if (_blurCache[hash] !== undefined) return _blurCache[hash];
+    var url = '';
+    try {
+        var tam = _b83(hash, 0, 1), nx = tam % 9 + 1, ny = Math.floor(tam / 9) + 1;
+        if (hash.length === 4 + 2 * nx * ny) {
+            var maximo = (_b83(hash, 1, 2) + 1) / 166, dc = _b83(hash, 2, 6);
+            var cores = [[_linear(dc >> 16), _linear((dc >> 8) & 255), _linear(dc & 255)]];
+            for (var k = 1; k < nx * ny; k++) {
+                var v = _b83(hash, 4 + k * 2, 6 + k * 2);
+                cores.push([_sinalPow((Math.floor(v / 361) - 9) / 9, 2) * maximo,
+                            _sinalPow((Math.floor(v / 19) % 19 - 9) / 9, 2) * maximo,
+                            _sinalPow((v % 19 - 9) / 9, 2) * maximo]);
+            }
+            var L = 32, cv = document.createElement('canvas');
+            cv.width = cv.height = L;
+            var ctx = cv.getContext('2d'), px = ctx.createImageData(L, L);
+            for (var y = 0; y < L; y++) for (var x = 0; x < L; x++) {
+                var r = 0, g = 0, b = 0;
+                for (var j = 0; j < ny; j++) for (var i = 0; i < nx; i++) {
+                    var f = Math.cos(Math.PI * x * i / L) * Math.cos(Math.PI * y * j / L), c = cores[i + j * nx];
+                    r += c[0] * f; g += c[1] * f; b += c[2] * f;
+                }
+                var o = 4 * (x + y * L);
+                px.data[o] = _srgb(r); px.data[o + 1] = _srgb(g); px.data[o + 2] = _srgb(b); px.data[o + 3] = 255;
+            }
+            ctx.putImageData(px, 0, 0);
+            url = cv.toDataURL();
+        }
+    } catch (e) { url = ''; }
+    _blurCache[hash] = url;
+    return url;
+}
+
+// <picture> com WebP + JPEG responsivos e o blurhash de fundo ate a imagem chegar.
+// o: {src, webp, jpg, tamanhos, blur, estilo, falha}
+function imgHtml(o) {
+    var estilo = (o.estilo || '') + (o.blur ? 'background:url(' + o.blur + ') center/cover;' : '');
+    var img = '<img src="' + o.src + '"' +
+        (o.jpg ? ' srcset="' + muSet(o.jpg) + '" sizes="' + o.tamanhos + '"' : '') +
+        ' loading="lazy" decoding="async" alt=""' + (estilo ? ' style="' + estilo + '"' : '') +
+        ' onerror="imgFalhou(this,\'' + (o.falha || '300px') + '\')">';
+    if (!o.webp) return img;
+    return '<picture><source type="image/webp" srcset="' + muSet(o.webp) + '" sizes="' + o.tamanhos + '">' + img + '</picture>';
+}
+
+function imgFalhou(img, minH) {
+    var s = img.previousElementSibling;
+    if (s && s.tagName === 'SOURCE') s.remove();
+    img.removeAttribute('srcset');
+    img.onerror = null;
+    img.style.background = 'linear-gradient(135deg,#667eea,#764ba2)';
+    img.style.minHeight = minH;
+    img.src = '';
+}
+
+// Miniatura de grade: rendicao "thumb" quando existe, com o srcset para os quadros grandes
+function imgGrade(p, grande) {
+    var meta = p.midia || {};
+    return imgHtml({src: mu(p.thumb_url || p.imagem_url || p.media_url), webp: p.srcset, jpg: p.srcset_jpg,
+                    tamanhos: grande ? TAM_GRADE_GRANDE : TAM_GRADE, blur: blurUrl(meta.blurhash),
+                    estilo: 'width:100%;height:100%;object-fit:cover;', falha: '100%'});
+}
 function fn(n) { if (n>=1e6) return (n/1e6).toFixed(1)+'M'; if (n>=1e3) return (n/1e3).toFixed(1)+'K'; return String(n||0); }
 function ta(ts) {
     var s=Math.floor((Date.now()-new Date(ts))/1000);
@@ -509,7 +593,9 @@ function buildPost(p) {
             if (cUrl.endsWith('.mp4') || cUrl.endsWith('.webm')) {
                 track += '<div style="min-width:100%"><video src="' + cUrl + '" loop muted playsinline onclick="toggleVid(this)" style="width:100%;height:100%;object-fit:cover"></video></div>';
             } else {
-                track += '<div style="min-width:100%"><img src="' + cUrl + '" loading="lazy" style="width:100%;height:100%;object-fit:cover" onerror="this.style.background=\'linear-gradient(135deg,#667eea,#764ba2)\';this.style.minHeight=\'300px\';this.src=\'\'"></div>';
+                var cMeta = (p.carousel_midia || [])[ci] || {};
+                track += '<div style="min-width:100%">' + imgHtml({src: cUrl, webp: (p.carousel_srcset || [])[ci], tamanhos: TAM_FEED,
+                    blur: blurUrl(cMeta.blurhash), estilo: 'width:100%;height:100%;object-fit:cover;'}) + '</div>';
             }
             dots += '<div class="carousel-dot' + (ci===0?' active':'') + '" onclick="carouselGoTo(this,' + ci + ')"></div>';
         }
@@ -527,7 +613,7 @@ function buildPost(p) {
                 '<div class="video-play-btn" onclick="this.previousElementSibling.previousElementSibling.play();this.style.display=\'none\'">&#9654;</div>' +
                 (p.video_source ? '<div class="video-source-badge">'+p.video_source+'</div>' : '');
         } else {
-            mediaHtml = '<img src="'+mUrl+'" loading="lazy" alt="" onerror="this.style.background=\'linear-gradient(135deg,#667eea,#764ba2)\';this.style.minHeight=\'300px\';this.src=\'\'">'; 
+            mediaHtml = imgHtml({src: mUrl, webp: p.srcset, jpg: p.srcset_jpg, tamanhos: TAM_FEED, blur: blurUrl((p.midia || {}).blurhash)});
         }
     } else {
         mediaHtml = '<div class="media-ph '+c.g+'">'+ava(c)+'</div>';
@@ -540,7 +626,7 @@ function buildPost(p) {
     var needMore = caption.length > 120;
     var comms = (p.comentarios || p.comments || []);
     if (!Array.isArray(comms)) comms = [];
-    var totalComms = comms.length;
+    var totalComms = nComms(p);
     var showComms = comms.slice(-2);
     var commHtml = '';
     if (totalComms > 2) {
@@ -579,7 +665,7 @@ function buildPost(p) {
         '</div>' +
         '<div class="post-acts">' +
             '<div class="post-acts-left">' +
-                '<button class="post-act" onclick="toggleLike(this)" data-pid="'+pid+'">\u{1F90D}</button>' +
+                '<button class="post-act'+(p.liked_by_me?' hearted':'')+'" onclick="toggleLike(this)" data-pid="'+pid+'">'+(p.liked_by_me?'\u2764\uFE0F':'\u{1F90D}')+'</button>' +
                 '<button class="post-act" onclick="triggerComment(\''+pid+'\',\''+agId+'\')" title="Comentar">\u{1F4AC}</button>' +
                 '<button class="post-act" onclick="sharePost(\''+pid+'\')" title="Share">\u{1F4E8}</button>' +
             '</div>' +
@@ -595,6 +681,16 @@ function buildPost(p) {
     '</article>';
 }
 
+// Feed vem projetado: comments = so a previa, comments_count = total
+function nComms(p) {
+    if (p.comments_count != null) return p.comments_count;
+    var c = p.comentarios || p.comments || [];
+    return Array.isArray(c) ? c.length : 0;
+}
+function viewerQS() {
+    return currentUser && currentUser.id ? '&viewer=' + encodeURIComponent(currentUser.id) : '';
+}
+
 function buildCommentHtml(com, pid) {
     var cc = ia(com.autor_nome || com.username || '');
     var comId = com.id || '';
@@ -623,6 +719,18 @@ function showAllComments(el, pid) {
     if (!post) return;
     var comms = post.comentarios || post.comments || [];
     if (!Array.isArray(comms)) comms = [];
+    if (nComms(post) > comms.length) {
+        // So a previa veio no feed: busca o resto sob demanda
+        fetch(SV + '/api/instagram/post/' + pid + '/comments?limit=200')
+            .then(function(r) { return r.json(); })
+            .then(function(d) {
+                if (!d.comments) return;
+                post.comments = d.comments;
+                post.comments_count = d.total;
+                showAllComments(null, pid);
+            }).catch(function(){});
+        return;
+    }
     var area = document.getElementById('comments-' + pid);
     if (!area) return;
     var html = '';
@@ -846,7 +954,8 @@ function searchByTag(tag) {
             for (var i=0; i<posts.length; i++) {
                 var p = posts[i]; var pc = ia(p.autor_nome || '');
                 var pmUrl = mu(p.video_url || p.media_url || p.imagem_url);
-                var pm = pmUrl ? '<img src="' + pmUrl + '">' : '<div class="reel-thumb-ph ' + pc.g + '">' + ava(pc) + '</div>';
+                var pm = pmUrl ? ((p.tipo === 'reel' || p.media_type === 'video' || p.video_url) ? '<video src="' + pmUrl + '" muted></video>' : imgGrade(p))
+                    : '<div class="reel-thumb-ph ' + pc.g + '">' + ava(pc) + '</div>';
                 ehtml += '<div class="explore-item">' + pm + '<div class="explore-overlay"><span>\u2764\uFE0F ' + fn(p.likes||0) + '</span></div></div>';
             }
             document.getElementById('exploreGrid').innerHTML = ehtml || '<div class="ig-empty" style="grid-column:1/-1">No posts with ' + tag + '</div>';
@@ -1051,7 +1160,7 @@ function openReelsViewer(idx) {
             '<div class="reel-overlay-right">' +
                 '<div class="reel-action" onclick="reelToggleMute(this)"><div>\u{1F50A}</div><span>Mute</span></div>' +
                 '<div class="reel-action" onclick="reelLike(this,\'' + (r.id||'') + '\')"><div>\u{1F90D}</div><span>' + fn(r.likes||0) + '</span></div>' +
-                '<div class="reel-action"><div>\u{1F4AC}</div><span>' + ((r.comments||r.comentarios||[]).length) + '</span></div>' +
+                '<div class="reel-action"><div>\u{1F4AC}</div><span>' + nComms(r) + '</span></div>' +
                 '<div class="reel-action"><div>\u{1F4E8}</div><span>Enviar</span></div>' +
             '</div>' +
             '<div class="reel-overlay-bottom">' +
@@ -1328,7 +1437,7 @@ function buildPPGrid(items, c) {
             if (isVideo) {
                 html += '<video src="' + pmUrl + '" muted loop onmouseenter="this.play()" onmouseleave="this.pause()"></video>';
             } else {
-                html += '<img src="' + pmUrl + '" loading="lazy" onerror="this.style.background=\'linear-gradient(135deg,#667eea,#764ba2)\';this.style.minHeight=\'100%\';this.src=\'\';">';
+                html += imgGrade(p);
             }
         } else {
             html += '<div style="width:100%;height:100%;display:flex;align-items:center;justify-content:center;font-size:32px;background:var(--bg2)">' + ava(c) + '</div>';
@@ -1338,7 +1447,7 @@ function buildPPGrid(items, c) {
         else if (isCarousel) html += '<span class="pp-grid-type">&#10064;</span>';
         // Hover overlay with likes/comments
         var lc = p.likes || 0;
-        var cc = (p.comments || []).length;
+        var cc = nComms(p);
         html += '<div class="pp-grid-overlay"><span>&#9829; ' + fn(lc) + '</span><span>&#128172; ' + fn(cc) + '</span></div>';
         html += '</div>';
     }
@@ -1523,14 +1632,14 @@ function loadSuggested() {
 var _lastPostIds = '';
 var _expandedComments = {};
 var _feedBuilt = false;
-var _feedOffset = 0;
+var _feedCursor = null;
 var _feedTotal = 0;
 var _feedLoading = false;
 var _allFeedPosts = [];
 function loadFeed() {
     if (feedPage === 1) showSkeletons(3);
 
-    return fetch(SV + '/api/instagram/feed?limit=50')
+    return fetch(SV + '/api/instagram/feed?limit=50' + viewerQS())
         .then(function(r) { return r.json(); })
         .then(function(d) {
             var posts = d.posts || [];
@@ -1540,7 +1649,6 @@ function loadFeed() {
             var all = posts.concat(reels);
             allReelsData = reels;
             _feedTotal = total;
-            _feedOffset = 50;
             _allFeedPosts = all.slice();
 
             // Header stats
@@ -1565,6 +1673,8 @@ function loadFeed() {
                     for (var i=0; i<all.length; i++) html += buildPost(all[i]);
                     document.getElementById('postsContainer').innerHTML = html;
                     _feedBuilt = true;
+                    // Cursor so volta ao topo quando a lista foi refeita
+                    _feedCursor = d.next_cursor || null;
                     // Lazy observe new images
                     setTimeout(function() { lazyObserve(document.getElementById('postsContainer')); }, 100);
                     // Restore expanded comments
@@ -1596,7 +1706,7 @@ function loadFeed() {
                                 var ch = '';
                                 for (var j=0; j<showComms.length; j++) ch += buildCommentHtml(showComms[j], pid);
                                 commArea.innerHTML = ch;
-                                if (viewBtn) viewBtn.textContent = 'View all ' + comms.length + ' comments';
+                                if (viewBtn) viewBtn.textContent = 'View all ' + nComms(p) + ' comments';
                             }
                         }
                     }
@@ -1636,13 +1746,13 @@ function loadFeed() {
                 var pm = '';
                 if (pmUrl) {
                     if (isReel) pm = '<video src="'+pmUrl+'" muted loop onmouseenter="this.play()" onmouseleave="this.pause()" style="width:100%;height:100%;object-fit:cover"></video>';
-                    else pm = '<img src="'+pmUrl+'" style="width:100%;height:100%;object-fit:cover">';
+                    else pm = imgGrade(p, isBig);
                 } else {
                     pm = '<div class="reel-thumb-ph '+pc.g+'" style="width:100%;height:100%">'+ava(pc)+'</div>';
                 }
                 ehtml += '<div class="explore-item'+(isBig?' big':'')+'">' + pm +
                     (isReel ? '<div class="explore-reel-icon">\u25B6</div>' : '') +
-                    '<div class="explore-overlay"><span>\u2764\uFE0F '+fn(p.likes||0)+'</span><span>\u{1F4AC} '+(Array.isArray(p.comments)?p.comments:Array.isArray(p.comentarios)?p.comentarios:[]).length+'</span></div></div>';
+                    '<div class="explore-overlay"><span>\u2764\uFE0F '+fn(p.likes||0)+'</span><span>\u{1F4AC} '+nComms(p)+'</span></div></div>';
             }
             document.getElementById('exploreGrid').innerHTML = ehtml || '<div class="ig-empty" style="grid-column:1/-1"><div class="ig-empty-icon">&#128269;</div>Explorando...</div>';
 
@@ -2011,18 +2121,18 @@ function loadAllReels() {
 
 // ===================== LOAD MORE POSTS (Infinite Scroll) =====================
 function loadMorePosts() {
-    if (_feedLoading || _feedOffset >= _feedTotal) return;
+    if (_feedLoading || !_feedCursor) return;
     _feedLoading = true;
     var loader = document.getElementById('feedLoader');
     if (loader) loader.style.display = 'block';
-    fetch(SV + '/api/instagram/feed?limit=50&offset=' + _feedOffset)
+    fetch(SV + '/api/instagram/feed?limit=50&cursor=' + encodeURIComponent(_feedCursor) + viewerQS())
         .then(function(r) { return r.json(); })
         .then(function(d) {
             var posts = d.posts || [];
             var reels = d.reels || [];
             var all = posts.concat(reels);
-            if (all.length === 0) { _feedOffset = _feedTotal; return; }
-            _feedOffset += 50;
+            _feedCursor = d.next_cursor || null;
+            if (all.length === 0) return;
             // Store data
             for (var i=0; i<all.length; i++) {
                 allCaptions[all[i].id] = all[i].caption || all[i].content || '';
@@ -0,0 +1,184 @@
+"""ListaObservavel (anel com observadores) e ArquivoSqlite"""
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.services.colecoes import ArquivoSqlite, ListaObservavel
+from app.services.persistencia import persistencia
+
+
+class _Espelho:
+    """Observador que mantem o multiconjunto de ids que a lista diz conter"""
+
+    def __init__(self):
+        self.ids = Counter()
+        self.saidas = []
+
+    def inserido(self, it):
+        self.ids[it["id"]] += 1
+
+    def removido(self, it):
+        self.ids[it["id"]] -= 1
+        if not self.ids[it["id"]]:
+            del self.ids[it["id"]]
+        self.saidas.append(it["id"])
+
+
+def _itens(*ids):
+    return [{"id": i, "created_at": f"2026-01-01T00:00:{i:02d}"} for i in ids]
+
+
+def _lista(capacidade=None, **kw):
+    lista = ListaObservavel(capacidade=capacidade, **kw)
+    esp = _Espelho()
+    lista.observar(esp)
+    return lista, esp
+
+
+def _ids(lista):
+    return [it["id"] for it in lista]
+
+
+def _confere(lista, esp):
+    assert esp.ids == Counter(_ids(lista))
+
+
+def test_ordem_de_insercao():
+    lista, esp = _lista()
+    a, b, c, d = _itens(1, 2, 3, 4)
+    lista.insert(0, a)
+    lista.insert(0, b)
+    lista.append(c)
+    lista.insert(1, d)
+    assert _ids(lista) == [2, 4, 1, 3]
+    lista.insert(-10, _itens(5)[0])  # antes do inicio = insert(0), como em list
+    lista.insert(99, _itens(6)[0])
+    assert _ids(lista) == [5, 2, 4, 1, 3, 6]
+    assert lista.index(a) == 3 and lista[-1]["id"] == 6
+    _confere(lista, esp)
+
+
+def test_fatias_como_list():
+    lista, esp = _lista()
+    lista.extend(_itens(*range(10)))
+    referencia = list(lista)
+    for fatia in (slice(2, 5), slice(None, 3), slice(-3, None), slice(5, 2), slice(None, None, 2), slice(8, 1, -3)):
+        assert lista[fatia] == referencia[fatia]
+        assert isinstance(lista[fatia], list)
+
+    del lista[1:3]
+    assert _ids(lista) == [0, 3, 4, 5, 6, 7, 8, 9]
+    _confere(lista, esp)
+
+
+def test_atribuir_fatia_avisa_so_quem_mudou():
+    lista, esp = _lista()
+    lista.extend(_itens(*range(5)))
+    mantidos = lista[1:3]
+    esp.saidas.clear()
+    lista[0:4] = [_itens(9)[0]] + mantidos  # troca 0 e 3 por 9, mantem 1 e 2
+    assert _ids(lista) == [9, 1, 2, 4]
+    assert sorted(esp.saidas) == [0, 3]
+    _confere(lista, esp)
+
+    lista[:] = sorted(lista, key=lambda it: it["id"])  # reordenar nao e entrada/saida
+    assert _ids(lista) == [1, 2, 4, 9]
+    assert sorted(esp.saidas) == [0, 3]
+    _confere(lista, esp)
+
+
+def test_despejo_sai_pela_ponta_mais_antiga():
+    novo_primeiro, esp1 = _lista(3)
+    for it in _itens(*range(5)):
+        novo_primeiro.insert(0, it)
+    assert _ids(novo_primeiro) == [4, 3, 2]
+    assert esp1.saidas == [0, 1] and novo_primeiro.despejados == 2
+    _confere(novo_primeiro, esp1)
+
+    velho_primeiro, esp2 = _lista(3, mais_novo_primeiro=False)
+    velho_primeiro.extend(_itens(*range(5)))
+    assert _ids(velho_primeiro) == [2, 3, 4]
+    assert esp2.saidas == [0, 1] and velho_primeiro.despejados == 2
+    _confere(velho_primeiro, esp2)
+
+    # Fatia que passa da capacidade tambem apara
+    novo_primeiro[0:0] = _itens(7, 8)
+    assert _ids(novo_primeiro) == [7, 8, 4]
+    _confere(novo_primeiro, esp1)
+
+
+def test_remocao_explicita_nao_conta_como_despejo():
+    lista, esp = _lista(5)
+    lista.extend(_itens(*range(5)))
+    lista.remove(lista[2])
+    lista.pop(0)
+    lista.pop()
+    assert _ids(lista) == [1, 3]
+    assert lista.despejados == 0
+    lista.clear()
+    assert not esp.ids and len(lista) == 0
+
+
+def test_arquivo_recebe_so_o_despejo(tmp_path):
+    arquivo = ArquivoSqlite("teste_anel", caminho=str(tmp_path / "arquivo.db"))
+    lista, _ = _lista(3, arquivo=arquivo)
+
+    async def cenario():
+        for it in _itens(*range(6)):
+            lista.insert(0, it)
+        lista.remove(lista[0])  # explicito: nao arquiva
+        await persistencia.flush("arquivo_teste_anel")
+        itens, proximo = await arquivo.pagina(limite=2)
+        assert [it["id"] for it in itens] == [2, 1] and proximo
+        resto, proximo = await arquivo.pagina(proximo, limite=2)
+        assert [it["id"] for it in resto] == [0] and proximo is None
+        await arquivo.fechar()
+
+    asyncio.run(cenario())
+    assert arquivo.arquivados == 3 and not arquivo._pendentes
+    assert sorted(it["id"] for it in arquivo.itens_sync()) == [0, 1, 2]
+    assert [it["id"] for it in arquivo.itens_sync(contendo='"id": 1')] == [1]
+
+
+def test_pagina_do_arquivo_por_criado_e_id_com_fila(tmp_path):
+    arquivo = ArquivoSqlite("teste_chave", caminho=str(tmp_path / "arquivo.db"))
+    mesma_hora = [{"id": f"v{i}", "created_at": "2026-01-01T00:00:00"} for i in range(5)]
+
+    async def cenario():
+        arquivo.guardar(mesma_hora)
+        await persistencia.flush("arquivo_teste_chave")
+        # Ainda na fila: um novo e a versao mais nova de um ja gravado
+        arquivo.guardar([{"id": "v9", "created_at": "2026-01-01T00:00:00"},
+                         {"id": "v2", "created_at": "2026-01-01T00:00:00", "editado": True}])
+        vistos, cursor = [], None
+        while True:
+            itens, cursor = await arquivo.pagina(cursor, limite=2)
+            vistos += itens
+            if not cursor:
+                break
+        assert [it["id"] for it in vistos] == ["v9", "v4", "v3", "v2", "v1", "v0"]
+        assert next(it for it in vistos if it["id"] == "v2").get("editado")
+        with pytest.raises(ValueError):
+            await arquivo.pagina("nao-e-cursor")
+        await arquivo.fechar()
+
+    asyncio.run(cenario())
+
+
+def test_espelho_nao_arquiva_o_que_o_worker_arquiva(tmp_path, monkeypatch):
+    from app.services.simulacao import Simulacao
+
+    monkeypatch.setattr(persistencia, "bloqueados", dict(persistencia.bloqueados))
+    arquivo = ArquivoSqlite("teste_espelho", caminho=str(tmp_path / "arquivo.db"))
+    lista, _ = _lista(2, arquivo=arquivo)
+
+    async def cenario():
+        sim = Simulacao(modo="api")
+        sim.espelhar("grupo_teste", lambda: None, lambda: 0, destinos=(arquivo.destino,))
+        sim._task_sync.cancel()
+        lista.extend(_itens(*range(5)))  # recarga do espelho despeja 3
+
+    asyncio.run(cenario())
+    assert persistencia.bloqueado("grupo_teste") and persistencia.bloqueado(arquivo.destino)
+    assert not arquivo._pendentes and persistencia.bloqueados[arquivo.destino] == 3
@@ -0,0 +1,55 @@
+"""Busca BM25 do Instagram: paginacao por cursor"""
+from app.routers import instagram_busca as busca
+from app.routers.instagram_busca import IndiceBusca
+
+
+def _post(i, caption):
+    return {"id": f"p{i:04d}", "username": "ag", "caption": caption, "comments": []}
+
+
+def _indice(n=60):
+    idx = IndiceBusca()
+    for i in range(n):
+        idx.adicionar(_post(i, "python " * (1 + i % 5) + "dados " * (i % 3) + f"extra{i}"))
+    return idx
+
+
+def _todas_as_paginas(idx, consulta, limit, entre_paginas=None):
+    vistos, cursor, n = [], "", 0
+    while True:
+        ids, cursor, _ = idx.buscar(consulta, limit, cursor)
+        vistos += ids
+        if not cursor:
+            return vistos
+        if entre_paginas:
+            entre_paginas(n)
+        n += 1
+
+
+def test_ranking_congelado_nao_repete_nem_pula_com_idf_mudando():
+    idx = _indice()
+    esperado = idx.buscar("python dados", 1000)[0]
+
+    def mexer(n):  # posts novos mudam IDF e tamanho medio entre as paginas
+        for j in range(20):
+            idx.adicionar(_post(1000 + n * 20 + j, "dados " * 8))
+
+    vistos = _todas_as_paginas(idx, "python dados", 7, mexer)
+    assert vistos == esperado
+
+
+def test_cursor_fora_do_lru_ainda_pagina(monkeypatch):
+    monkeypatch.setattr(busca, "RANKING_TOPO", 10)
+    idx = _indice()
+    esperado = idx.buscar("python", 1000)[0]
+    vistos = _todas_as_paginas(idx, "python", 4)  # passa do topo congelado: corte por (score, id)
+    assert vistos == esperado
+
+    ids, cursor, _ = idx.buscar("python", 4)
+    idx._rankings.clear()
+    resto = idx.buscar("python", 100, cursor)[0]
+    assert ids + resto == esperado
+
+    # cursor de outra consulta nao reaproveita o ranking congelado
+    _, cursor, _ = idx.buscar("dados", 4)
+    assert not set(idx.buscar("python", 100, cursor)[0]) - set(esperado)
@@ -0,0 +1,255 @@
+"""Persistencia incremental do Instagram (instagram_db) contra um SQLite temporario"""
+import asyncio
+
+import pytest
+
+from app.routers import instagram_db as igdb
+
+
+def _post(i, comentarios=1):
+    return {
+        "id": f"p{i:05d}", "agente_id": f"ag{i % 7}", "agente_nome": f"Agente {i % 7}",
+        "caption": f"post {i}", "created_at": f"2026-01-01T00:00:00.{i:06d}",
+        "likes": 1, "liked_by": [f"ag{(i + 1) % 7}"],
+        "comments": [{"id": f"c{i:05d}_{j}", "agente_id": "ag1", "texto": "oi",
+                      "created_at": f"2026-01-02T00:00:00.{j:06d}",
+                      "replies": [{"id": f"r{i:05d}_{j}", "agente_id": "ag2", "texto": "ola"}]}
+                     for j in range(comentarios)],
+    }
+
+
+async def _flush(posts):
+    await igdb.sync_changes_to_db(posts, [], [], [], [], {})
+
+
+async def _contar(tabela, onde="", args=()):
+    db = await igdb.get_db()
+    async with db.execute(f"SELECT COUNT(*) FROM {tabela} {onde}", args) as cur:
+        return (await cur.fetchone())[0]
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(igdb, "DB_PATH", str(tmp_path / "instagram.db"))
+    monkeypatch.setattr(igdb, "_db", None)
+    monkeypatch.setattr(igdb, "_db_lock", asyncio.Lock())
+    monkeypatch.setattr(igdb, "_estado", igdb._EstadoPersistido())
+    monkeypatch.setattr(igdb, "_frios", {"total": 0})
+    monkeypatch.setattr(igdb, "_paginas_frias", igdb.OrderedDict())
+    yield
+    asyncio.run(igdb.close_db())
+
+
+def _rodar(coro):
+    async def _com_fechamento():
+        try:
+            return await coro
+        finally:
+            await igdb.close_db()  # conexao presa ao loop deste asyncio.run
+    return asyncio.run(_com_fechamento())
+
+
+def test_janela_nunca_passa_do_anel():
+    assert igdb.JANELA_POSTS <= igdb.MAX_POSTS
+
+
+def test_despejo_do_anel_nao_apaga_do_banco(banco, monkeypatch):
+    total, janela = 1000, 300
+    monkeypatch.setattr(igdb, "JANELA_POSTS", janela)
+    todos = [_post(i) for i in reversed(range(total))]  # mais novo primeiro
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(todos, [], [], [], [], {})
+        quentes = list((await igdb.load_all_data())[0])
+        assert len(quentes) == janela and igdb._frios["total"] == total - janela
+
+        # Anel cheio: entram 5 novos no topo, saem os 5 mais antigos da janela
+        novos = [_post(i) for i in reversed(range(total, total + 5))]
+        quentes = novos + quentes[:-5]
+        await _flush(quentes)
+        assert await _contar("ig_posts") == total + 5
+        assert await _contar("ig_comments") == total + 5
+        assert await _contar("ig_comment_replies") == total + 5
+        assert await _contar("ig_post_likes") == total + 5
+        assert igdb._frios["total"] == total - janela + 5
+
+        # Paginacao fria continua do ultimo quente ate o fim, sem buraco
+        ultimo = quentes[-1]
+        antes, vistos = (ultimo["created_at"], ultimo["id"]), [p["id"] for p in quentes]
+        while antes:
+            pagina, antes = await igdb.pagina_fria(antes, 100)
+            vistos += [p["id"] for p in pagina]
+        assert len(vistos) == len(set(vistos)) == total + 5
+
+        # Flush seguinte sem mudanca nao toca em nada
+        assert igdb._estado.vazio(igdb._estado.planejar(quentes, [], [], [], [], {}, None, None, None))
+
+    _rodar(cenario())
+
+
+def test_delete_explicito_apaga_post_e_dependentes(banco):
+    posts = [_post(i, comentarios=2) for i in range(10)]
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(posts, [], [], [], [], {})
+        igdb.apagar_posts([posts[3]["id"]])
+        await _flush(posts[:3] + posts[4:])
+        assert await _contar("ig_posts") == 9
+        for tabela in ("ig_comments", "ig_comment_replies", "ig_post_likes"):
+            assert await _contar(tabela, "WHERE post_id=?", (posts[3]["id"],)) == 0
+        assert await _contar("ig_comments") == 18
+        assert not igdb._estado.apagados
+
+        # Comentario removido de post vivo continua sendo apagado
+        del posts[0]["comments"][1]
+        await _flush(posts[:3] + posts[4:])
+        assert await _contar("ig_comments", "WHERE post_id=?", (posts[0]["id"],)) == 1
+
+    _rodar(cenario())
+
+
+def test_comentarios_de_post_frio_vem_do_indice(banco, monkeypatch):
+    monkeypatch.setattr(igdb, "JANELA_POSTS", 5)
+    posts = [_post(i, comentarios=4) for i in reversed(range(20))]
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(posts, [], [], [], [], {})
+        quentes = (await igdb.load_all_data())[0]
+        frio = posts[-1]
+        assert frio["id"] not in {p["id"] for p in quentes}
+
+        coms, total = await igdb.comentarios_do_post(frio["id"], offset=1, limite=2)
+        assert total == 4
+        assert [c["id"] for c in coms] == [c["id"] for c in frio["comments"][1:3]]
+        assert [r["id"] for r in coms[0]["replies"]] == [r["id"] for r in frio["comments"][1]["replies"]]
+        assert await igdb.comentarios_do_post("nao_existe") is None
+
+    _rodar(cenario())
+
+
+def _no_commit(db, antes_do_commit):
+    """Faz antes_do_commit() rodar depois do diff e das escritas, antes do commit"""
+    original = db.commit
+
+    async def commit():
+        antes_do_commit()
+        return await original()
+    db.commit = commit
+    return original
+
+
+def test_mutacao_durante_flush_nao_se_perde(banco):
+    posts = [_post(i) for i in range(5)]
+    novo = {"id": "c_tardio", "agente_id": "ag3", "texto": "chegou durante o flush",
+            "created_at": "2026-01-03T00:00:00", "replies": []}
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(posts, [], [], [], [], {})
+        db = await igdb.get_db()
+        posts[0]["caption"] = "editado"
+        original = _no_commit(db, lambda: posts[1]["comments"].append(novo))
+        await _flush(posts)
+        db.commit = original
+        assert await _contar("ig_comments", "WHERE id=?", ("c_tardio",)) == 0
+
+        await _flush(posts)  # o diff seguinte enxerga o que entrou no meio do anterior
+        assert await _contar("ig_comments", "WHERE id=?", ("c_tardio",)) == 1
+        async with db.execute("SELECT caption FROM ig_posts WHERE id=?", (posts[0]["id"],)) as cur:
+            assert (await cur.fetchone())[0] == "editado"
+
+    _rodar(cenario())
+
+
+def test_falha_no_meio_do_flush_mantem_ultimo_commit(banco):
+    posts = [_post(i, comentarios=2) for i in range(5)]
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(posts, [], [], [], [], {})
+        db = await igdb.get_db()
+
+        def morrer():
+            raise RuntimeError("queda antes do commit")
+        posts[2]["caption"] = "nunca gravado"
+        del posts[3]["comments"][0]
+        posts.append(_post(99))
+        original = _no_commit(db, morrer)
+        with pytest.raises(RuntimeError):
+            await _flush(posts)
+        db.commit = original
+
+        # Banco continua no ultimo commit (transacao desfeita inteira)
+        assert await _contar("ig_posts") == 5
+        assert await _contar("ig_comments", "WHERE post_id=?", (posts[3]["id"],)) == 2
+        async with db.execute("SELECT caption FROM ig_posts WHERE id=?", (posts[2]["id"],)) as cur:
+            assert (await cur.fetchone())[0] == "post 2"
+
+        # e o estado nao avancou: o flush seguinte regrava tudo
+        await _flush(posts)
+        assert await _contar("ig_posts") == 6
+        assert await _contar("ig_comments", "WHERE post_id=?", (posts[3]["id"],)) == 1
+        async with db.execute("SELECT caption FROM ig_posts WHERE id=?", (posts[2]["id"],)) as cur:
+            assert (await cur.fetchone())[0] == "nunca gravado"
+
+    _rodar(cenario())
+
+
+def test_instantaneo_isola_o_planejamento():
+    import datetime
+    posts = [_post(1)]
+    agentes = {"ag1": {"seguidores": 1, "quando": datetime.datetime(2026, 1, 1)}}  # sem marshal: deepcopy
+    for args in ((posts, None), (posts, agentes)):
+        copia = igdb._instantaneo(*args)
+        posts[0]["comments"].append({"id": "depois"})
+        assert [c["id"] for c in copia[0][0]["comments"]] == ["c00001_0"]
+        posts[0]["comments"].pop()
+    assert igdb._instantaneo(posts, agentes)[1] == agentes
+
+
+def test_espelho_le_so_a_janela(banco, monkeypatch):
+    total, janela = 500, 120
+    monkeypatch.setattr(igdb, "JANELA_POSTS", janela)
+    todos = [_post(i) for i in reversed(range(total))]
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(todos, [], [], [], [], {})
+        await igdb.close_db()  # o espelho abre conexao propria numa thread
+        posts = (await igdb.ler_espelho())[0]
+        assert [p["id"] for p in posts] == [p["id"] for p in todos[:janela]]
+        assert igdb._frios["total"] == total - janela
+
+    _rodar(cenario())
+
+
+def test_midia_dos_posts_indexada_por_nome(banco):
+    prefixo = igdb.PREFIXO_MIDIA
+    posts = [_post(i) for i in range(4)]
+    posts[0]["imagem_url"] = f"{prefixo}aa/aa01.webp"
+    posts[1]["carousel_urls"] = [f"{prefixo}bb/bb01.jpg", "https://fora.example/x.jpg"]
+    posts[2]["video_url"] = f"{prefixo}cc/cc01.mp4"
+
+    async def cenario():
+        await igdb.init_tables()
+        await igdb.sync_all_to_db(posts, [], [], [], [], {})
+        candidatos = {"aa01.webp", "bb01.jpg", "cc01.mp4", "zz99.webp"}
+        assert igdb.midia_em_disco_sync(candidatos) == {"aa01.webp", "bb01.jpg", "cc01.mp4"}
+
+        # Troca de midia, despejo (vira frio) e delete explicito
+        posts[0]["imagem_url"] = f"{prefixo}dd/dd01.webp"
+        igdb.apagar_posts([posts[2]["id"]])
+        await _flush([posts[0]])  # posts[1] despejado, posts[2] apagado
+        assert igdb.midia_em_disco_sync(candidatos | {"dd01.webp"}) == {"bb01.jpg", "dd01.webp"}
+
+        # Banco antigo sem o indice: init_tables preenche uma vez a partir de ig_posts
+        db = await igdb.get_db()
+        await db.execute("DELETE FROM ig_post_midia")
+        await db.commit()
+        await igdb.init_tables()
+        assert igdb.midia_em_disco_sync({"bb01.jpg", "dd01.webp"}) == {"bb01.jpg", "dd01.webp"}
+
+    _rodar(cenario())
@@ -0,0 +1,60 @@
+"""Fila de jobs de midia: backoff fora da vaga e o que e retomado apos restart"""
+import asyncio
+import json
+
+import pytest
+
+from app.services import jobs_midia as jm
+from app.services.persistencia import persistencia
+
+
+@pytest.fixture
+def fila(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistencia, "destinos", dict(persistencia.destinos))  # nao troca o destino do singleton
+    monkeypatch.setattr(jm, "BACKOFF_S", 0.05)
+    return jm.FilaJobsMidia(estado_path=str(tmp_path / "jobs.json"))
+
+
+def test_backoff_libera_a_vaga_do_tipo(fila):
+    ordem = []
+
+    async def handler(job):
+        ordem.append((job.params["n"], job.tentativas))
+        if job.params["n"] == "a" and job.tentativas == 1:
+            raise RuntimeError("falhou")
+        return "ok"
+
+    fila.registrar_tipo("t", handler, vagas=1, tentativas=2, ao_terminar=lambda job: None)
+
+    async def cenario():
+        a = fila.enviar("t", {"n": "a"})
+        b = fila.enviar("t", {"n": "b"})
+        await asyncio.wait([a._task, b._task])
+        return a, b
+
+    a, b = asyncio.run(cenario())
+    assert ordem == [("a", 1), ("b", 1), ("a", 2)]  # b rodou durante o backoff de a
+    assert a.estado == b.estado == "ok" and a.tentativas == 2
+    assert fila.tipos["t"].rodando == 0
+
+
+def test_tipo_esperado_por_quem_chamou_nao_e_gravado_nem_retomado(fila):
+    async def handler(job):
+        return "ok"
+
+    fila.registrar_tipo("esperado", handler)
+    fila.registrar_tipo("com_fim", handler, ao_terminar=lambda job: None)
+    with open(fila.estado_path, "w") as f:
+        json.dump([jm.JobMidia("esperado", {}, id="j1").exportar(),
+                   jm.JobMidia("com_fim", {}, id="j2").exportar()], f)
+
+    async def cenario():
+        fila.retomar()
+        assert list(fila.jobs) == ["j2"]
+        await fila.jobs["j2"]._task
+        fila.enviar("esperado", {})
+        await fila._salvar_async()
+
+    asyncio.run(cenario())
+    with open(fila.estado_path) as f:
+        assert [d["tipo"] for d in json.load(f)] == ["com_fim"]
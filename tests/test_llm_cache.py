@@ -0,0 +1,13 @@
+"""Chave do cache do LLM por politica"""
+from app.services.llm_cache import chave
+
+
+def test_exato_nao_mascara_numeros_nem_caixa():
+    assert chave("m", "Resuma os 12 posts") != chave("m", "Resuma os 340 posts")
+    assert chave("m", "Resuma os posts") != chave("m", "resuma os posts")
+    assert chave("m", "Resuma  os\n posts ") == chave("m", "Resuma os posts")
+
+
+def test_variar_junta_prompts_que_so_mudam_contadores():
+    assert chave("m", "Resuma os 12 posts", politica="variar") == chave("m", "resuma os 340 posts", politica="variar")
+    assert chave("m", "Resuma os posts", politica="variar") != chave("m", "Resuma os posts")
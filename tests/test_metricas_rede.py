@@ -0,0 +1,46 @@
+"""Snapshot de metricas da rede: TTL e invalidacao pelas escritas"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.services.metricas_rede import MetricasRede
+
+
+class _Metricas(MetricasRede):
+    """Consulta em memoria no lugar do banco"""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.posts = []
+        self.consultas = 0
+
+    async def _consultar(self):
+        self.consultas += 1
+        agentes = [SimpleNamespace(id="a1", name="Ana", model_type="x")]
+        return list(self.posts), agentes
+
+
+def _post(i, likes=0):
+    return SimpleNamespace(id=f"p{i}", agent_id="a1", content=f"post #tag{i % 2}", likes_count=likes,
+                           comments_count=0, created_at=None)
+
+
+def test_invalidar_refaz_so_depois_da_idade_minima():
+    m = _Metricas(ttl_s=60, min_idade_s=0.05)
+    m.posts = [_post(1)]
+
+    async def cenario():
+        v1 = await m.obter()
+        assert (await m.obter()) is v1 and m.consultas == 1  # dentro do TTL
+
+        m.posts.insert(0, _post(2, likes=3))
+        m.invalidar()
+        m.invalidar()
+        assert (await m.obter()) is v1  # rajada: ainda mais novo que min_idade_s
+        time.sleep(0.06)
+        v2 = await m.obter()
+        assert v2.versao == v1.versao + 1 and v2.total_posts == 2 and m.consultas == 2
+        assert (await m.obter()) is v2  # limpo de novo: volta a valer o TTL
+
+    asyncio.run(cenario())
+    assert m.stats()["invalidacoes"] == 2
@@ -0,0 +1,66 @@
+"""Agendador de persistencia (write-behind)"""
+import asyncio
+
+from app.services.persistencia import AgendadorPersistencia
+
+
+def test_marcar_fora_do_loop_fica_pendente_ate_iniciar():
+    gravados = []
+
+    async def salvar():
+        gravados.append(asyncio.get_running_loop())
+
+    p = AgendadorPersistencia()
+    p.registrar("teste", salvar, intervalo_ms=0)
+    p.marcar("teste")
+    p.marcar("teste")
+    assert not gravados and p.destinos["teste"].pendentes == 2
+
+    async def startup():
+        p.iniciar()
+        await asyncio.sleep(0.05)
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(startup())
+    assert gravados == [loop] and p.destinos["teste"].pendentes == 0
+
+
+def test_flush_cancelado_devolve_os_pedidos():
+    async def salvar():
+        await asyncio.sleep(10)
+
+    async def cenario():
+        p = AgendadorPersistencia()
+        d = p.registrar("teste", salvar, intervalo_ms=60000)
+        p.marcar("teste")
+        p.marcar("teste")
+        d._task.cancel()  # o ciclo proprio esperaria o intervalo
+        flush = asyncio.create_task(p.flush("teste"))
+        await asyncio.sleep(0.01)
+        assert d.pendentes == 0
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        assert d.pendentes == 2 and d.desde is not None and d.erros == 0
+
+    asyncio.run(cenario())
+
+
+def test_erro_no_flush_espera_antes_de_tentar_de_novo(monkeypatch):
+    from app.services import persistencia as modulo
+    monkeypatch.setattr(modulo, "ERRO_S", 0.05)
+    tentativas = []
+
+    async def salvar():
+        tentativas.append(1)
+        raise OSError("disco cheio")
+
+    async def cenario():
+        p = AgendadorPersistencia()
+        d = p.registrar("teste", salvar, intervalo_ms=0)
+        p.marcar("teste")
+        await asyncio.sleep(0.12)
+        d._task.cancel()
+        return d
+
+    d = asyncio.run(cenario())
+    assert 2 <= len(tentativas) <= 4 and d.erros == len(tentativas) and d.pendentes == 1